@@ -1,14 +1,43 @@
 """REST API and HA event interface for aggregated interval data."""
 
+import asyncio
+import base64
+import gzip
+import hashlib
+import json
 import logging
 from datetime import datetime, timezone
 
+from aiohttp import web
 from appdaemon.plugins.hass.hassapi import Hass
 
+from . import constants as c
+from .data_store import page_end
+from .downsample import MIN_POINTS, downsample
 from .log_wrapper import get_class_method_logger
+from .result_cache import ResultCache, SingleFlight
 from .timer_utils import set_oneshot_timer
 
 VALID_GRANULARITIES = ("quarter_hours", "hours", "days", "weeks", "months", "years")
+VALID_FORMATS = ("rows", "columnar")
+VALID_COMPRESSIONS = ("gzip",)
+
+# Periods of these granularities are evenly spaced in UTC, so columnar
+# results share a start + step time axis instead of a period_start column.
+_AXIS_STEP_SECONDS = {"quarter_hours": 900, "hours": 3600}
+
+# Number of (start, end, granularity) query results kept in memory.
+RESULT_CACHE_SIZE = 32
+# Default and upper limit of the number of periods in one page of results;
+# bounds the memory of a query and the size of its HA event.
+MAX_PAGE_SIZE = 1000
+# Maximum number of queries in one v2g_data_batch_query.
+MAX_BATCH_QUERIES = 10
+# Content type of v2g_data_stream: one JSON period per line.
+STREAM_CONTENT_TYPE = "application/x-ndjson"
+
+# Formats of v2g_export.
+EXPORT_FORMATS = ("csv",)
 
 # Logger that controls the log level for all v2g-app modules.
 _V2G_LOGGER = logging.getLogger("AppDaemon.v2g-app")
@@ -20,9 +49,30 @@ DEFAULT_DEBUG_DURATION_HOURS = 1
 class ApiServer:
     """Provides REST API and HA event interface for querying aggregated data.
 
-    Two interfaces for querying data from the local SQLite database:
-    1. REST: GET /api/appdaemon/v2g_data?start=...&end=...&granularity=...
+    Interfaces for querying data from the local SQLite database:
+    1. REST: GET /app/v2g_data?start=...&end=...&granularity=...
     2. HA event: fire 'v2g_data_query' → receive 'v2g_data_query.result'
+    3. HA event: fire 'v2g_data_batch_query' with several queries → receive
+       'v2g_data_batch_query.result', all pages in one event
+    4. REST: GET /app/v2g_data_stream?start=...&end=...&granularity=...
+       streams the whole range, page by page (see __handle_data_stream)
+
+    Interval data is streamed as CSV with GET /app/v2g_export (see
+    __handle_export).
+
+    Results come in pages of at most max_page_size periods; a response
+    with a next_cursor is continued by passing it as cursor. They are a
+    list of period dicts, or with format=columnar one list per field (see
+    _to_columnar); compression=gzip sends them gzipped and base64 encoded.
+    With max_points a chart query gets the range in one response of at
+    most that many periods (see downsample); the range is still read one
+    page at a time (see __fetch_downsampled).
+
+    Results are cached per (start, end, granularity) and reused while the
+    data versions of their range are unchanged. REST responses carry an
+    ETag header; a request with a matching If-None-Match header gets an
+    empty 304 without any query. Identical queries arriving while one is
+    computed share its result (see query_stats).
     """
 
     def __init__(self, hass: Hass):
@@ -31,12 +81,25 @@ class ApiServer:
         self.data_store = None
         self.data_repairer = None
         self._debug_timer_handle = ""
+        self.max_page_size = MAX_PAGE_SIZE
+        self.__result_cache = ResultCache(RESULT_CACHE_SIZE)
+        self.__single_flight = SingleFlight()
+        self.__export_running = False
+        # first_available with the (all data version, timezone) it is for.
+        self.__first_available: tuple[tuple, str | None] | None = None
         self.__log("ApiServer created.")
 
     async def initialise(self):
         """Register REST endpoint and HA event listener."""
-        self.__hass.register_endpoint(self.__handle_aggregated_data, "v2g_data")
+        # Routes, unlike endpoints, return an aiohttp response: headers and
+        # streamed bodies.
+        self.__hass.register_route(self.__handle_aggregated_data, "v2g_data")
+        self.__hass.register_route(self.__handle_data_stream, "v2g_data_stream")
+        self.__hass.register_route(self.__handle_export, "v2g_export")
         await self.__hass.listen_event(self.__handle_data_query_event, "v2g_data_query")
+        await self.__hass.listen_event(
+            self.__handle_data_batch_query_event, "v2g_data_batch_query"
+        )
         await self.__hass.listen_event(
             self.__handle_run_full_repair_event, "v2g_run_full_repair"
         )
@@ -45,9 +108,74 @@ class ApiServer:
         )
         self.__log(
             "API endpoint and event listeners registered "
-            "(v2g_data_query, v2g_run_full_repair, v2g_enable_debug_logging)."
+            "(v2g_data_query, v2g_data_batch_query, v2g_run_full_repair, "
+            "v2g_enable_debug_logging)."
         )
 
+    def query_stats(self) -> dict:
+        """Return counters of the data queries: cached and shared results."""
+        return {
+            "cache_hits": self.__result_cache.hits,
+            "cache_misses": self.__result_cache.misses,
+            "computed": self.__single_flight.computed,
+            "shared": self.__single_flight.saved,
+        }
+
+    async def __handle_export(self, request, kwargs):
+        """Stream interval data as a CSV download, one export at a time.
+
+        Query parameters:
+            start: Optional ISO 8601 timestamp (inclusive lower bound)
+            end: Optional ISO 8601 timestamp (exclusive upper bound)
+            format: Optional, "csv" (default and only format)
+
+        The database is read in chunks on a reader thread and each chunk is
+        written to the response before the next is read, so neither the
+        event loop nor memory is burdened by long ranges, and no file is
+        left behind.
+
+        Returns:
+            A chunked aiohttp response with the CSV as attachment. If the
+            export fails after the first chunk the connection is closed
+            without ending the body, so the client sees it is incomplete.
+        """
+        try:
+            start, end = _parse_export_query(request.query)
+        except ValueError as e:
+            return web.json_response({"error": str(e)}, status=400)
+        if self.__export_running:
+            return web.json_response(
+                {"error": "An export is already running."}, status=409
+            )
+
+        self.__export_running = True
+        try:
+            created = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+            filename = f"v2g_liberty_intervals_{created}.csv"
+            response = web.StreamResponse(
+                headers={
+                    "Content-Type": "text/csv",
+                    "Content-Disposition": f'attachment; filename="{filename}"',
+                }
+            )
+            response.enable_chunked_encoding()
+            await response.prepare(request)
+            self.__log(f"Exporting intervals to {filename}.")
+            try:
+                rows = await self.data_store.export_intervals(
+                    response.write, start, end
+                )
+            except Exception as e:
+                self.__log(f"Error exporting data: {e}", level="ERROR")
+                if request.transport is not None:
+                    request.transport.close()
+                return response
+            await response.write_eof()
+        finally:
+            self.__export_running = False
+        self.__log(f"Exported {rows} intervals to {filename}.")
+        return response
+
     async def __handle_run_full_repair_event(self, event_name, data, kwargs):
         """Trigger a full data repair on demand.
 
@@ -102,133 +230,556 @@ class ApiServer:
         _V2G_LOGGER.setLevel(logging.INFO)
         self.__log("Debug logging disabled (timer expired).")
 
-    async def __handle_aggregated_data(self, data, kwargs):
+    async def __handle_aggregated_data(self, request, kwargs):
         """Handle requests for aggregated data.
 
         Query parameters:
             start: ISO 8601 timestamp (inclusive lower bound)
             end: ISO 8601 timestamp (exclusive upper bound)
             granularity: One of quarter_hours, hours, days, weeks, months, years
+            cursor: Optional, the next_cursor of the previous page
+            page_size: Optional, maximum number of periods in the page
+                (default and upper limit: max_page_size)
+            format: Optional, "rows" (default) or "columnar"
+            compression: Optional, "gzip"
+            max_points: Optional, downsample the range (from the cursor)
+                to at most this many periods instead of paging
 
         Returns:
-            Tuple of (response_dict, status_code).
+            An aiohttp JSON response with one page; next_cursor is set while
+            more pages follow. The ETag header identifies the page and its
+            data; with a matching If-None-Match the response is an empty 304.
         """
         try:
-            request = kwargs.get("request")
-            if request is None:
-                return {"error": "No request object."}, 400
-
-            params = request.query
-            start = params.get("start")
-            end = params.get("end")
-            granularity = params.get("granularity")
-
-            # Validate required parameters
-            missing = []
-            if not start:
-                missing.append("start")
-            if not end:
-                missing.append("end")
-            if not granularity:
-                missing.append("granularity")
-            if missing:
-                return {
-                    "error": f"Missing required parameters: {', '.join(missing)}"
-                }, 400
-
-            # Validate granularity
-            if granularity not in VALID_GRANULARITIES:
-                return {
-                    "error": (
-                        f"Invalid granularity '{granularity}'. "
-                        f"Must be one of: {', '.join(VALID_GRANULARITIES)}"
-                    )
-                }, 400
-
-            # Validate and convert to UTC for database comparison
             try:
-                start = (
-                    datetime.fromisoformat(start).astimezone(timezone.utc).isoformat()
-                )
-                end = datetime.fromisoformat(end).astimezone(timezone.utc).isoformat()
-            except ValueError:
-                return {"error": "Invalid timestamp format. Use ISO 8601."}, 400
-
-            result = self.data_store.get_aggregated_data(start, end, granularity)
-            first_available = self.data_store.get_first_available()
-            return {
-                "data": result,
-                "first_available": first_available,
-                "granularity": granularity,
-                "start": start,
-                "end": end,
-            }, 200
+                query = _parse_query(request.query, self.max_page_size)
+            except ValueError as e:
+                return web.json_response({"error": str(e)}, status=400)
+
+            plan = await self.__plan_page(**query)
+            headers = {"ETag": plan["etag"]} if plan["etag"] is not None else {}
+            if _etag_matches(plan["etag"], request.headers.get("If-None-Match")):
+                return web.Response(status=304, headers=headers)
+            results = await self.__get_results([plan])
+            return web.json_response(_page_response(plan, results[0]), headers=headers)
 
         except Exception as e:
             self.__log(f"Error handling API request: {e}", level="ERROR")
-            return {"error": "Internal server error."}, 500
+            return web.json_response({"error": "Internal server error."}, status=500)
 
-    async def __handle_data_query_event(self, event, data, kwargs):
-        """Handle HA event-based data queries from custom cards.
+    async def __handle_data_stream(self, request, kwargs):
+        """Stream all periods of a query as one chunked response.
 
-        Expects event data with keys: start, end, granularity.
-        Fires 'v2g_data_query.result' with the aggregated data or an error.
+        Takes the query parameters of v2g_data except format, compression
+        and max_points; cursor and page_size are honoured. The range is read
+        one page after the other and each page is written to the response
+        before the next is read, so memory is bounded by the page size
+        however long the range is. Pages bypass the result cache, which is
+        kept for the cards.
+
+        Returns:
+            An aiohttp response of STREAM_CONTENT_TYPE, one period dict per
+            line. An error after the first page is written as a last line
+            {"error": ...}, as the status has been sent by then.
         """
         try:
-            start = data.get("start")
-            end = data.get("end")
-            granularity = data.get("granularity")
-
-            missing = []
-            if not start:
-                missing.append("start")
-            if not end:
-                missing.append("end")
-            if not granularity:
-                missing.append("granularity")
-            if missing:
-                self.__hass.fire_event(
-                    "v2g_data_query.result",
-                    error=f"Missing required parameters: {', '.join(missing)}",
+            query = _parse_query(request.query, self.max_page_size)
+            if (
+                query["format"] != "rows"
+                or query["compression"] is not None
+                or query["max_points"] is not None
+            ):
+                raise ValueError(
+                    "format, compression and max_points are not supported "
+                    "by v2g_data_stream."
                 )
-                return
-
-            if granularity not in VALID_GRANULARITIES:
-                self.__hass.fire_event(
-                    "v2g_data_query.result",
-                    error=(
-                        f"Invalid granularity '{granularity}'. "
-                        f"Must be one of: {', '.join(VALID_GRANULARITIES)}"
-                    ),
+        except ValueError as e:
+            return web.json_response({"error": str(e)}, status=400)
+
+        response = web.StreamResponse(headers={"Content-Type": STREAM_CONTENT_TYPE})
+        response.enable_chunked_encoding()
+        await response.prepare(request)
+        end, granularity = query["end"], query["granularity"]
+        page_start = query["cursor"] or query["start"]
+        try:
+            while page_start != end:
+                page_stop = page_end(page_start, end, granularity, query["page_size"])
+                rows = await self.data_store.get_aggregated_data(
+                    page_start, page_stop, granularity
                 )
-                return
+                await response.write(_ndjson(rows))
+                page_start = page_stop
+        except Exception as e:
+            self.__log(f"Error streaming data: {e}", level="ERROR")
+            await response.write(_ndjson([{"error": "Internal server error."}]))
+        await response.write_eof()
+        return response
+
+    async def __get_page(self, **query) -> dict:
+        """Return one page of a query.
+
+        query holds the parameters from _parse_query; see __plan_page.
+        """
+        plan = await self.__plan_page(**query)
+        results = await self.__get_results([plan])
+        return _page_response(plan, results[0])
+
+    async def __get_pages(self, queries: list[dict]) -> list[dict]:
+        """Return the first page of several queries, their data read at once.
+
+        The data of all queries not in the result cache comes from one
+        get_aggregated_batch call, which reads overlapping intervals once.
+        """
+        plans = [await self.__plan_page(**query) for query in queries]
+        results = await self.__get_results(plans)
+        return [_page_response(plan, result) for plan, result in zip(plans, results)]
+
+    async def __plan_page(
+        self,
+        start: str,
+        end: str,
+        granularity: str,
+        cursor: str | None,
+        page_size: int,
+        format: str = "rows",
+        compression: str | None = None,
+        max_points: int | None = None,
+    ) -> dict:
+        """Return the range, versions and etag of one page of a query.
+
+        A page starts at the cursor (or start) and holds at most page_size
+        periods, so only that part of the range is queried and held in
+        memory. A page can hold fewer periods, even none, where data is
+        missing; callers continue while next_cursor is set.
+
+        With max_points the page is downsampled to at most max_points
+        periods and runs to end, or over at most max_points // MIN_POINTS
+        pages of max_page_size periods (see __fetch_downsampled).
+        """
+        page_start = cursor or start
+        if max_points is None:
+            page_stop = page_end(page_start, end, granularity, page_size)
+        else:
+            pages = max_points // MIN_POINTS
+            page_stop = page_end(
+                page_start, end, granularity, pages * self.max_page_size
+            )
+        versions = await self.data_store.get_data_versions(page_start, page_stop)
+        first_available = await self.__get_first_available(versions)
+        etag = _etag(
+            (page_start, page_stop, granularity, format, compression, max_points),
+            versions,
+            first_available,
+        )
+        return {
+            "start": start,
+            "end": end,
+            "granularity": granularity,
+            "format": format,
+            "compression": compression,
+            "max_points": max_points,
+            "page_start": page_start,
+            "page_stop": page_stop,
+            "versions": versions,
+            "first_available": first_available,
+            "etag": etag,
+        }
+
+    async def __get_results(self, plans: list[dict]) -> list[list[dict]]:
+        """Return the aggregated data of each page, from the cache if current.
+
+        The versions of a page must be read before its data: a write that
+        lands in between then only makes the cached result newer than its
+        version. A page that is being computed for another request at the
+        same version shares that computation.
+        """
+        tz = str(c.TZ)
+        running: dict[tuple, tuple[asyncio.Task, int]] = {}
+        results: dict[tuple, list[dict]] = {}
+        missing: dict[tuple, tuple | None] = {}
+        for plan in plans:
+            key = _result_key(plan)
+            if key in results or key in running or key in missing:
+                continue
+            versions = plan["versions"]
+            version = (versions[0], tz) if versions is not None else None
+            if version is not None:
+                result = self.__result_cache.get(key, version)
+                if result is not None:
+                    results[key] = result
+                    continue
+            joined = self.__single_flight.join((key, version))
+            if joined is not None:
+                running[key] = joined
+                continue
+            missing[key] = version
+
+        if missing:
+            task = self.__single_flight.start(
+                list(missing.items()), self.__fetch_results(list(missing))
+            )
+            running.update((key, (task, i)) for i, key in enumerate(missing))
+        for key, (task, index) in running.items():
+            # Shielded: a cancelled request must not cancel the others.
+            results[key] = (await asyncio.shield(task))[index]
+        if len(running) > len(missing):
+            stats = self.query_stats()
+            self.__log(
+                f"Joined {len(running) - len(missing)} running data queries; "
+                f"{stats['shared']} of {stats['shared'] + stats['computed']} "
+                "computations saved so far.",
+                level="DEBUG",
+            )
+
+        for key, version in missing.items():
+            if version is not None:
+                self.__result_cache.put(key, version, results[key])
+        return [results[_result_key(plan)] for plan in plans]
 
+    async def __fetch_results(self, keys: list[tuple]) -> list[list[dict]]:
+        """Read the aggregated data of result keys (see _result_key).
+
+        Keys with max_points are read by __fetch_downsampled, the others
+        together in one batch.
+        """
+        specs = [key[:3] for key in keys if key[3] is None]
+        plain = iter([])
+        if len(specs) == 1:
+            plain = iter([await self.data_store.get_aggregated_data(*specs[0])])
+        elif specs:
+            plain = iter(await self.data_store.get_aggregated_batch(specs))
+        return [
+            await self.__fetch_downsampled(*key) if key[3] is not None else next(plain)
+            for key in keys
+        ]
+
+    async def __fetch_downsampled(
+        self, start: str, end: str, granularity: str, max_points: int
+    ) -> list[dict]:
+        """Read a range page by page, downsampled to at most max_points periods.
+
+        Pages hold at most max_page_size periods, and each is downsampled to
+        its share of max_points (by duration, at least MIN_POINTS) before
+        the next is read: besides the result only one page is in memory.
+        """
+        total = _seconds(start, end)
+        result = []
+        page_start = start
+        while page_start != end:
+            page_stop = page_end(page_start, end, granularity, self.max_page_size)
+            rows = await self.data_store.get_aggregated_data(
+                page_start, page_stop, granularity
+            )
+            share = max_points * _seconds(page_start, page_stop) // total
+            result.extend(downsample(rows, max(share, MIN_POINTS)))
+            page_start = page_stop
+        # Pages raised to MIN_POINTS can add a few periods.
+        return downsample(result, max_points)
+
+    async def __get_first_available(
+        self, versions: tuple[int, int] | None
+    ) -> str | None:
+        """Return get_first_available, queried again only after data changed."""
+        version = (versions[1], str(c.TZ)) if versions is not None else None
+        if (
+            version is None
+            or self.__first_available is None
+            or self.__first_available[0] != version
+        ):
+            first_available = await self.data_store.get_first_available()
+            if version is None:
+                return first_available
+            self.__first_available = (version, first_available)
+        return self.__first_available[1]
+
+    async def __handle_data_query_event(self, event, data, kwargs):
+        """Handle HA event-based data queries from custom cards.
+
+        Expects event data with keys: start, end, granularity and optionally
+        cursor and page_size (see __handle_aggregated_data), and request_id.
+        Fires 'v2g_data_query.result' with a page of aggregated data or an
+        error, with the request_id of the query (if any) so a card can tell
+        its results from those of other cards.
+        """
+        request_id = data.get("request_id")
+        reply = {"request_id": request_id} if request_id is not None else {}
+        try:
             try:
-                start = (
-                    datetime.fromisoformat(start).astimezone(timezone.utc).isoformat()
-                )
-                end = datetime.fromisoformat(end).astimezone(timezone.utc).isoformat()
-            except ValueError:
-                self.__hass.fire_event(
-                    "v2g_data_query.result",
-                    error="Invalid timestamp format. Use ISO 8601.",
-                )
+                query = _parse_query(data, self.max_page_size)
+            except ValueError as e:
+                self.__hass.fire_event("v2g_data_query.result", error=str(e), **reply)
                 return
 
-            result = self.data_store.get_aggregated_data(start, end, granularity)
-            first_available = self.data_store.get_first_available()
+            page = await self.__get_page(**query)
+            self.__hass.fire_event("v2g_data_query.result", **page, **reply)
+
+        except Exception as e:
+            self.__log(f"Error handling data query event: {e}", level="ERROR")
             self.__hass.fire_event(
                 "v2g_data_query.result",
-                data=result,
-                first_available=first_available,
-                granularity=granularity,
-                start=start,
-                end=end,
+                error="Internal server error.",
+                **reply,
+            )
+
+    async def __handle_data_batch_query_event(self, event, data, kwargs):
+        """Handle several data queries of a card (e.g. day, week and month).
+
+        Expects event data with keys: request_id and queries, a list of
+        v2g_data_query event data (at most MAX_BATCH_QUERIES). Fires
+        'v2g_data_batch_query.result' with the request_id and results: per
+        query, in order, its first page or an error. The data of the
+        queries is read at once (see __get_pages).
+        """
+        request_id = data.get("request_id")
+        try:
+            queries = data.get("queries")
+            if not isinstance(queries, list) or not queries:
+                raise ValueError("Missing required parameter: queries")
+            if len(queries) > MAX_BATCH_QUERIES:
+                raise ValueError(
+                    f"Too many queries, at most {MAX_BATCH_QUERIES} per batch."
+                )
+        except ValueError as e:
+            self.__hass.fire_event(
+                "v2g_data_batch_query.result", request_id=request_id, error=str(e)
+            )
+            return
+
+        try:
+            results: list[dict | None] = []
+            valid = []
+            for query in queries:
+                try:
+                    valid.append(_parse_query(query, self.max_page_size))
+                    results.append(None)
+                except (AttributeError, ValueError) as e:
+                    error = str(e) if isinstance(e, ValueError) else "Invalid query."
+                    results.append({"error": error})
+
+            pages = iter(await self.__get_pages(valid))
+            for index, result in enumerate(results):
+                if result is None:
+                    results[index] = next(pages)
+            self.__hass.fire_event(
+                "v2g_data_batch_query.result", request_id=request_id, results=results
             )
 
         except Exception as e:
-            self.__log(f"Error handling data query event: {e}", level="ERROR")
+            self.__log(f"Error handling data batch query event: {e}", level="ERROR")
             self.__hass.fire_event(
-                "v2g_data_query.result",
+                "v2g_data_batch_query.result",
+                request_id=request_id,
                 error="Internal server error.",
             )
+
+
+def _result_key(plan: dict) -> tuple:
+    """Return the key of the aggregated data of a planned page.
+
+    Downsampled results are kept apart from the full results of a range.
+    """
+    return (
+        plan["page_start"],
+        plan["page_stop"],
+        plan["granularity"],
+        plan["max_points"],
+    )
+
+
+def _seconds(start: str, end: str) -> int:
+    """Return the number of seconds between two ISO 8601 timestamps."""
+    return round(
+        (datetime.fromisoformat(end) - datetime.fromisoformat(start)).total_seconds()
+    )
+
+
+def _page_response(plan: dict, result: list[dict]) -> dict:
+    """Return the response of a planned page (see __plan_page)."""
+    step_seconds = _AXIS_STEP_SECONDS.get(plan["granularity"])
+    if any("period_count" in row for row in result):
+        # Merged periods vary in length, so there is no shared time axis.
+        step_seconds = None
+    if plan["format"] == "columnar":
+        result = _to_columnar(result, step_seconds)
+    if plan["compression"] == "gzip":
+        result = _gzip_base64(result)
+    return {
+        "data": result,
+        "format": plan["format"],
+        "compression": plan["compression"],
+        "first_available": plan["first_available"],
+        "granularity": plan["granularity"],
+        "start": plan["start"],
+        "end": plan["end"],
+        "next_cursor": plan["page_stop"] if plan["page_stop"] != plan["end"] else None,
+    }
+
+
+def _parse_export_query(params) -> tuple[str | None, str | None]:
+    """Return the UTC (start, end) of v2g_export query parameters.
+
+    Raises ValueError with a message for the caller if they are invalid.
+    """
+    export_format = params.get("format") or "csv"
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(
+            f"Invalid format '{export_format}'. "
+            f"Must be one of: {', '.join(EXPORT_FORMATS)}"
+        )
+    try:
+        start, end = (
+            datetime.fromisoformat(params[key]).astimezone(timezone.utc).isoformat()
+            if params.get(key)
+            else None
+            for key in ("start", "end")
+        )
+    except (TypeError, ValueError):
+        raise ValueError("Invalid timestamp format. Use ISO 8601.") from None
+    return start, end
+
+
+def _parse_query(params, max_page_size: int) -> dict:
+    """Validate v2g_data query parameters, with timestamps converted to UTC.
+
+    Raises ValueError with a message for the caller if they are invalid.
+    """
+    missing = [key for key in ("start", "end", "granularity") if not params.get(key)]
+    if missing:
+        raise ValueError(f"Missing required parameters: {', '.join(missing)}")
+
+    granularity = params["granularity"]
+    if granularity not in VALID_GRANULARITIES:
+        raise ValueError(
+            f"Invalid granularity '{granularity}'. "
+            f"Must be one of: {', '.join(VALID_GRANULARITIES)}"
+        )
+
+    # Convert to UTC for database comparison
+    try:
+        start = datetime.fromisoformat(params["start"]).astimezone(timezone.utc)
+        end = datetime.fromisoformat(params["end"]).astimezone(timezone.utc)
+        cursor = params.get("cursor")
+        if cursor:
+            cursor = datetime.fromisoformat(cursor).astimezone(timezone.utc)
+    except (TypeError, ValueError):
+        raise ValueError("Invalid timestamp format. Use ISO 8601.") from None
+    if cursor and not start <= cursor < end:
+        raise ValueError("Invalid cursor, it is outside the requested range.")
+
+    format = params.get("format") or "rows"
+    if format not in VALID_FORMATS:
+        raise ValueError(
+            f"Invalid format '{format}'. Must be one of: {', '.join(VALID_FORMATS)}"
+        )
+    compression = params.get("compression") or None
+    if compression is not None and compression not in VALID_COMPRESSIONS:
+        raise ValueError(
+            f"Invalid compression '{compression}'. "
+            f"Must be one of: {', '.join(VALID_COMPRESSIONS)}"
+        )
+
+    try:
+        page_size = int(params.get("page_size", max_page_size))
+    except (TypeError, ValueError):
+        page_size = 0
+    if page_size < 1:
+        raise ValueError("Invalid page_size, must be a positive integer.")
+
+    max_points = params.get("max_points")
+    if max_points is not None:
+        try:
+            max_points = int(max_points)
+        except (TypeError, ValueError):
+            max_points = 0
+        if max_points < MIN_POINTS:
+            raise ValueError(
+                f"Invalid max_points, must be an integer of at least {MIN_POINTS}."
+            )
+
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "granularity": granularity,
+        "cursor": cursor.isoformat() if cursor else None,
+        "page_size": min(page_size, max_page_size),
+        "format": format,
+        "compression": compression,
+        "max_points": (
+            min(max_points, max_page_size) if max_points is not None else None
+        ),
+    }
+
+
+def _to_columnar(rows: list[dict], step_seconds: int | None) -> dict:
+    """Return aggregated rows as one list per field.
+
+    Periods of step_seconds (quarter hours, hours) share a time axis: the
+    period_start of the first row plus step_seconds per position, with
+    None in every column for periods without data. Without step_seconds
+    (longer periods vary in length: DST, months) rows keep their
+    period_start column and have no axis.
+    """
+    fields = list(dict.fromkeys(key for row in rows for key in row))
+    if step_seconds is None or not rows:
+        return {
+            "time_axis": None,
+            "columns": {field: [row.get(field) for row in rows] for field in fields},
+        }
+
+    fields.remove("period_start")
+    first = datetime.fromisoformat(rows[0]["period_start"])
+    positions = [
+        round((datetime.fromisoformat(row["period_start"]) - first).total_seconds())
+        // step_seconds
+        for row in rows
+    ]
+    length = positions[-1] + 1
+    columns = {field: [None] * length for field in fields}
+    for position, row in zip(positions, rows):
+        for field in fields:
+            columns[field][position] = row.get(field)
+    return {
+        "time_axis": {
+            "start": rows[0]["period_start"],
+            "step_seconds": step_seconds,
+            "length": length,
+        },
+        "columns": columns,
+    }
+
+
+def _ndjson(rows: list[dict]) -> bytes:
+    """Return rows as newline-delimited JSON, one row per line."""
+    return "".join(
+        json.dumps(row, separators=(",", ":")) + "\n" for row in rows
+    ).encode()
+
+
+def _gzip_base64(data) -> str:
+    """Return data as gzipped JSON, base64 encoded to travel inside JSON."""
+    payload = json.dumps(data, separators=(",", ":")).encode()
+    return base64.b64encode(gzip.compress(payload)).decode("ascii")
+
+
+def _etag(
+    query: tuple,
+    versions: tuple[int, int] | None,
+    first_available: str | None,
+) -> str | None:
+    """Return the ETag of a v2g_data response, None if not cacheable.
+
+    query holds everything that shapes the response besides the data: the
+    page range, granularity and format.
+    """
+    if versions is None:
+        return None
+    key = repr((query, versions[0], str(c.TZ), first_available))
+    return f'"{hashlib.blake2b(key.encode(), digest_size=8).hexdigest()}"'
+
+
+def _etag_matches(etag: str | None, if_none_match: str | None) -> bool:
+    """Whether an If-None-Match header matches etag (weak comparison)."""
+    if etag is None or not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in tags or "*" in tags
@@ -0,0 +1,392 @@
+"""Module for awaitable, off-loop access to the local SQLite database.
+
+DataStore runs its sqlite3 calls on the calling thread. Called from the
+AppDaemon event loop, a slow query (e.g. a year of aggregated data for the
+UI) stalls Modbus polling and the schedule timers. AsyncDataStore wraps
+DataStore so the event loop only ever awaits:
+
+- **Writes** are queued to one writer thread that owns a read/write
+  DataStore. Jobs queued while the writer is busy are committed together
+  (group commit); if such a group fails, its jobs are retried one by one
+  so a failing write cannot take the others down with it. A rollup
+  rebuild is never grouped: it runs in a transaction of its own.
+- **Reads** run on a small pool of threads, each with its own read-only
+  DataStore. In WAL mode these never wait for the writer and see every
+  write that was committed before the query started.
+"""
+
+import asyncio
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Callable
+
+import pandas as pd
+from appdaemon.plugins.hass.hassapi import Hass
+
+from .data_store import _COARSE_GRANULARITIES, DataStore
+from .log_wrapper import get_class_method_logger
+
+# (task, writes) of the open AsyncDataStore.transaction() block, or None.
+# Tasks started inside a block inherit the variable; the task check keeps
+# their writes out of it.
+_transaction_writes: ContextVar[tuple[asyncio.Task, list] | None] = ContextVar(
+    "_transaction_writes", default=None
+)
+
+
+def _pending_writes() -> list | None:
+    """Return the write list of the current task's open block, if any."""
+    block = _transaction_writes.get()
+    if block is None or block[0] is not asyncio.current_task():
+        return None
+    return block[1]
+
+
+class AsyncDataStore:
+    """Awaitable facade over DataStore that keeps sqlite3 off the event loop.
+
+    Exposes the DataStore methods used by the event-loop modules (ApiServer,
+    DataMonitor, FMDataSender and NaiveChargingSimulator) as coroutines with
+    the same arguments and return values.
+
+    Usage::
+
+        store = AsyncDataStore(hass, db_path=data_store.DB_PATH)
+        await store.initialise()
+        rows = await store.get_aggregated_data(start, end, "days")
+        async with store.transaction():
+            await store.insert_interval(...)
+            await store.insert_grid_interval(...)
+    """
+
+    def __init__(self, hass: Hass, db_path: str | None = None, readers: int = 2):
+        self.hass = hass
+        self.db_path = db_path or DataStore.DB_PATH
+        self.readers = readers
+        self.__log = get_class_method_logger(module_name="async_data_store")
+        self.__loop: asyncio.AbstractEventLoop | None = None
+        self.__writer: threading.Thread | None = None
+        self.__write_queue: queue.SimpleQueue | None = None
+        self.__reader_pool: ThreadPoolExecutor | None = None
+        self.__reader_local: threading.local | None = None
+        self.__reader_stores: list[DataStore] = []
+        self.__reader_lock = threading.Lock()
+
+    @property
+    def is_available(self) -> bool:
+        """Whether the writer thread and reader pool are running."""
+        return self.__writer is not None
+
+    async def initialise(self):
+        """Start the writer thread and the reader pool.
+
+        The database must already exist (DataStore.initialise creates and
+        migrates it). Raises if the writer cannot open it.
+        """
+        if self.is_available:
+            return
+        self.__loop = asyncio.get_running_loop()
+        self.__write_queue = queue.SimpleQueue()
+        opened = self.__loop.create_future()
+        self.__writer = threading.Thread(
+            target=self.__run_writer,
+            args=(opened,),
+            name="data_store_writer",
+            daemon=True,
+        )
+        self.__writer.start()
+        try:
+            await opened
+        except Exception:
+            self.__writer = None
+            raise
+        self.__reader_local = threading.local()
+        self.__reader_pool = ThreadPoolExecutor(
+            max_workers=self.readers, thread_name_prefix="data_store_reader"
+        )
+        self.__log(f"Started writer thread and {self.readers} reader connection(s).")
+        # Rebuild stale rollups now rather than on the first coarse query.
+        await self.__submit(lambda store: store.ensure_rollups(), alone=True)
+
+    async def close(self):
+        """Commit the queued writes, then stop the writer and the readers."""
+        if not self.is_available:
+            return
+        writer, self.__writer = self.__writer, None
+        self.__write_queue.put(None)
+        await self.__loop.run_in_executor(None, writer.join)
+        reader_pool, self.__reader_pool = self.__reader_pool, None
+        await self.__loop.run_in_executor(None, reader_pool.shutdown)
+        with self.__reader_lock:
+            for store in self.__reader_stores:
+                store.close()
+            self.__reader_stores = []
+        self.__log("Writer thread and reader connections closed.")
+
+    # ── Writer ──────────────────────────────────────────────────────
+
+    def __run_writer(self, opened: asyncio.Future):
+        """Writer thread: own the read/write connection and run queued jobs."""
+        store = DataStore(self.hass)
+        store.DB_PATH = self.db_path
+        try:
+            store.open()
+        except Exception as e:
+            self.__resolve(opened, error=e)
+            return
+        self.__resolve(opened)
+        try:
+            while True:
+                job = self.__write_queue.get()
+                if job is None:
+                    break
+                # Group everything that queued up while the last commit ran.
+                jobs = [job]
+                stop = False
+                while True:
+                    try:
+                        job = self.__write_queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if job is None:
+                        stop = True
+                        break
+                    jobs.append(job)
+                self.__run_groups(store, jobs)
+                if stop:
+                    break
+        finally:
+            store.close()
+
+    def __run_groups(self, store: DataStore, jobs: list[tuple]):
+        """Run queued jobs in groups; a job submitted alone runs by itself."""
+        group = []
+        for job in jobs:
+            if not job[2]:
+                group.append(job)
+                continue
+            if group:
+                self.__run_jobs(store, group)
+                group = []
+            self.__run_jobs(store, [job])
+        if group:
+            self.__run_jobs(store, group)
+
+    def __run_jobs(self, store: DataStore, jobs: list[tuple]):
+        """Run jobs in one DataStore transaction, one by one if that fails."""
+        try:
+            with store.transaction():
+                results = [work(store) for work, _, _ in jobs]
+        except Exception as e:
+            if len(jobs) == 1:
+                self.__resolve(jobs[0][1], error=e)
+                return
+            self.__log(
+                f"Group of {len(jobs)} writes failed ({e}), retrying one by one.",
+                level="WARNING",
+            )
+            for job in jobs:
+                self.__run_jobs(store, [job])
+            return
+        for (_, future, _), result in zip(jobs, results):
+            self.__resolve(future, result)
+
+    def __resolve(self, future: asyncio.Future, result=None, error=None):
+        """Hand a result (or exception) from a worker thread to the loop."""
+
+        def resolve():
+            if future.cancelled():
+                return
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+        self.__loop.call_soon_threadsafe(resolve)
+
+    async def __submit(self, work: Callable[[DataStore], object], alone: bool = False):
+        """Queue work(store) for the writer and await its commit.
+
+        With alone, the work is not grouped with other jobs: it gets a
+        transaction of its own, so it neither commits nor repeats theirs.
+        """
+        if not self.is_available:
+            return None
+        future = self.__loop.create_future()
+        self.__write_queue.put((work, future, alone))
+        return await future
+
+    async def __write(self, work: Callable[[DataStore], object]):
+        """Queue a write, or add it to the open transaction() block."""
+        pending = _pending_writes()
+        if pending is not None:
+            pending.append(work)
+            return None
+        return await self.__submit(work)
+
+    @asynccontextmanager
+    async def transaction(self):
+        """Commit all writes awaited inside the block as one writer job.
+
+        Inside the block the write methods return immediately; the writes
+        are queued together when the block exits and the exit awaits their
+        commit, so a failure surfaces there and writes nothing. If the block
+        raises, nothing is written. Nested blocks join the outermost one.
+        """
+        if _pending_writes() is not None:
+            yield
+            return
+        pending = []
+        token = _transaction_writes.set((asyncio.current_task(), pending))
+        try:
+            yield
+        finally:
+            _transaction_writes.reset(token)
+        if pending:
+            await self.__submit(lambda store: [work(store) for work in pending])
+
+    # ── Readers ─────────────────────────────────────────────────────
+
+    def __reader_store(self) -> DataStore:
+        """Return the read-only DataStore of the current reader thread."""
+        store = getattr(self.__reader_local, "store", None)
+        if store is None:
+            store = DataStore(self.hass, read_only=True)
+            store.DB_PATH = self.db_path
+            store.open()
+            self.__reader_local.store = store
+            with self.__reader_lock:
+                self.__reader_stores.append(store)
+        return store
+
+    async def __read(self, work: Callable[[DataStore], object], default=None):
+        """Run work(store) on a reader thread and await its result."""
+        if not self.is_available:
+            return default
+        return await self.__loop.run_in_executor(
+            self.__reader_pool, lambda: work(self.__reader_store())
+        )
+
+    async def __ensure_rollups(self):
+        """Have the writer rebuild the rollups if a reader finds them stale.
+
+        Readers cannot rebuild them. Only a query that finds them stale
+        waits for the writer (and the writes queued before the rebuild).
+        """
+        if not await self.__read(lambda store: store.ensure_rollups(), True):
+            await self.__submit(lambda store: store.ensure_rollups(), alone=True)
+
+    # ── Queries ─────────────────────────────────────────────────────
+
+    async def get_aggregated_data(
+        self, start: str, end: str, granularity: str
+    ) -> list[dict]:
+        """See DataStore.get_aggregated_data."""
+        if granularity in _COARSE_GRANULARITIES:
+            await self.__ensure_rollups()
+        return await self.__read(
+            lambda store: store.get_aggregated_data(start, end, granularity), []
+        )
+
+    async def get_aggregated_batch(
+        self, specs: list[tuple[str, str, str]]
+    ) -> list[list[dict]]:
+        """See DataStore.get_aggregated_batch."""
+        if any(granularity in _COARSE_GRANULARITIES for _, _, granularity in specs):
+            await self.__ensure_rollups()
+        return await self.__read(
+            lambda store: store.get_aggregated_batch(specs), [[] for _ in specs]
+        )
+
+    async def get_first_available(self) -> str | None:
+        """See DataStore.get_first_available."""
+        return await self.__read(lambda store: store.get_first_available())
+
+    async def get_data_versions(self, start: str, end: str) -> tuple[int, int] | None:
+        """See DataStore.get_data_versions; None when not available."""
+        return await self.__read(lambda store: store.get_data_versions(start, end))
+
+    async def export_intervals(
+        self,
+        write: Callable[[bytes], Awaitable[None]],
+        start: str | None = None,
+        end: str | None = None,
+    ) -> int:
+        """See DataStore.export_intervals; runs on a reader thread.
+
+        write is a coroutine function, awaited on the event loop with each
+        chunk. The reader thread waits for it before it reads the next
+        chunk, so a slow client holds up the export rather than filling
+        memory. An exception from write stops the export and is raised.
+        """
+        loop = self.__loop
+
+        def write_from_reader(chunk: bytes):
+            asyncio.run_coroutine_threadsafe(write(chunk), loop).result()
+
+        return await self.__read(
+            lambda store: store.export_intervals(write_from_reader, start, end), 0
+        )
+
+    async def get_price_at(self, timestamp: str) -> tuple | None:
+        """See DataStore.get_price_at."""
+        return await self.__read(lambda store: store.get_price_at(timestamp))
+
+    async def get_naive_charging_input(self) -> pd.DataFrame | None:
+        """See DataStore.get_naive_charging_input; None when not available."""
+        return await self.__read(lambda store: store.get_naive_charging_input())
+
+    async def get_last_naive_soc(self) -> float | None:
+        """See DataStore.get_last_naive_soc."""
+        return await self.__read(lambda store: store.get_last_naive_soc())
+
+    async def get_charge_power_factor(self) -> float:
+        """See DataStore.get_charge_power_factor."""
+        return await self.__read(lambda store: store.get_charge_power_factor(), 0.82)
+
+    async def get_fm_last_sent(self, data_type: str = "charger") -> str | None:
+        """See DataStore.get_fm_last_sent."""
+        return await self.__read(lambda store: store.get_fm_last_sent(data_type))
+
+    async def get_intervals_since(self, since: str) -> list[dict]:
+        """See DataStore.get_intervals_since."""
+        return await self.__read(lambda store: store.get_intervals_since(since), [])
+
+    async def get_grid_intervals_since(self, since: str) -> list[dict]:
+        """See DataStore.get_grid_intervals_since."""
+        return await self.__read(
+            lambda store: store.get_grid_intervals_since(since), []
+        )
+
+    async def get_pv_intervals_since(self, since: str) -> list[dict]:
+        """See DataStore.get_pv_intervals_since."""
+        return await self.__read(lambda store: store.get_pv_intervals_since(since), [])
+
+    # ── Writes ──────────────────────────────────────────────────────
+
+    async def insert_interval(self, **kwargs) -> None:
+        """See DataStore.insert_interval."""
+        await self.__write(lambda store: store.insert_interval(**kwargs))
+
+    async def insert_grid_interval(self, *args) -> None:
+        """See DataStore.insert_grid_interval."""
+        await self.__write(lambda store: store.insert_grid_interval(*args))
+
+    async def insert_pv_interval(self, *args) -> None:
+        """See DataStore.insert_pv_interval."""
+        await self.__write(lambda store: store.insert_pv_interval(*args))
+
+    async def insert_reservation(self, **kwargs) -> None:
+        """See DataStore.insert_reservation."""
+        await self.__write(lambda store: store.insert_reservation(**kwargs))
+
+    async def set_fm_last_sent(self, timestamp: str, data_type: str = "charger"):
+        """See DataStore.set_fm_last_sent."""
+        await self.__write(lambda store: store.set_fm_last_sent(timestamp, data_type))
+
+    async def update_naive_charging(self, rows: list[tuple[float, float, str]]):
+        """See DataStore.update_naive_charging."""
+        await self.__write(lambda store: store.update_naive_charging(rows))
@@ -0,0 +1,106 @@
+"""Module to export joined interval data to CSV files."""
+
+import sqlite3
+from collections.abc import Iterator
+from typing import Callable
+
+import pandas as pd
+
+# Rows read from the database and written to the export at a time.
+EXPORT_CHUNK_SIZE = 10_000
+
+# interval_log joined with the other per-interval tables. Grid and PV rows
+# (one per phase / panel) are summed per interval with correlated lookups
+# on their primary key, so no table is materialised and the rows stream
+# from the cursor in timestamp order.
+_EXPORT_INTERVALS_SQL = (
+    "SELECT i.timestamp, i.energy_kwh, i.app_state, "
+    "i.soc_pct, i.availability_pct, i.is_repaired, "
+    "i.naive_power_w, i.naive_soc_pct, "
+    "i.power_min_w, i.power_max_w, i.power_p95_w, i.setpoint_changes, "
+    "p.consumption_price_kwh, p.production_price_kwh, p.price_rating, "
+    "e.emission_intensity_kg_mwh, "
+    "(SELECT SUM(g.consumption_kw) FROM grid_interval_log g "
+    "WHERE g.timestamp = i.timestamp) AS grid_consumption_kw, "
+    "(SELECT SUM(g.production_kw) FROM grid_interval_log g "
+    "WHERE g.timestamp = i.timestamp) AS grid_production_kw, "
+    "(SELECT SUM(pv.power_kw) FROM pv_interval_log pv "
+    "WHERE pv.timestamp = i.timestamp) AS pv_power_kw "
+    "FROM interval_log i "
+    "LEFT JOIN price_log p ON i.timestamp = p.timestamp "
+    "LEFT JOIN emission_log e ON i.timestamp = e.timestamp "
+    "WHERE i.timestamp >= ? AND i.timestamp < ? "
+    "ORDER BY i.timestamp"
+)
+
+_EXPORT_FLOAT_COLUMNS = (
+    "energy_kwh",
+    "soc_pct",
+    "availability_pct",
+    "naive_power_w",
+    "naive_soc_pct",
+    "power_min_w",
+    "power_max_w",
+    "power_p95_w",
+    "consumption_price_kwh",
+    "production_price_kwh",
+    "emission_intensity_kg_mwh",
+    "grid_consumption_kw",
+    "grid_production_kw",
+    "pv_power_kw",
+)
+
+
+def iter_interval_chunks(
+    conn: sqlite3.Connection, start: int, end: int, chunk_size: int
+) -> Iterator[pd.DataFrame]:
+    """Yield the joined intervals in [start, end) epoch in frames of chunk_size.
+
+    Rows are fetched from one cursor chunk by chunk, so at most one chunk
+    is held in memory. timestamp is converted to a UTC datetime and the
+    numeric columns have the same dtype in every chunk (NULL is NaN, or
+    NA for the setpoint_changes count).
+    Without any intervals one empty frame is yielded, with the columns.
+    """
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    try:
+        cursor.execute(_EXPORT_INTERVALS_SQL, (start, end))
+        columns = [description[0] for description in cursor.description]
+        rows = cursor.fetchmany(chunk_size)
+        while True:
+            frame = pd.DataFrame.from_records(rows, columns=columns)
+            frame["timestamp"] = pd.to_datetime(frame["timestamp"], unit="s", utc=True)
+            for column in _EXPORT_FLOAT_COLUMNS:
+                frame[column] = frame[column].astype(float)
+            frame["setpoint_changes"] = frame["setpoint_changes"].astype("Int64")
+            yield frame
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+    finally:
+        cursor.close()
+
+
+def export_csv(
+    conn: sqlite3.Connection,
+    write: Callable[[bytes], None],
+    start: int,
+    end: int,
+    chunk_size: int = EXPORT_CHUNK_SIZE,
+) -> int:
+    """Pass the joined intervals in [start, end) epoch to write as CSV.
+
+    write is called with the encoded CSV of one chunk at a time, the first
+    with the header, so nothing but the current chunk is held in memory.
+    An exception from write stops the export.
+
+    Returns:
+        The number of intervals exported.
+    """
+    rows = 0
+    for frame in iter_interval_chunks(conn, start, end, chunk_size):
+        # Only the first chunk has no rows before it, or is empty.
+        write(frame.to_csv(header=rows == 0, index=False).encode())
+        rows += len(frame)
+    return rows
@@ -1,13 +1,17 @@
 """Module to collect and monitor charge data at regular intervals."""
 
+from contextlib import nullcontext
 from datetime import datetime, timedelta, timezone
 from typing import Union
 
 from appdaemon.plugins.hass.hassapi import Hass
 
 from . import constants as c
-from .grid_connection.power_tracker import PowerTracker
+from .day_totals import DayTotals
+from .grid_connection.power_tracker_bank import PowerTrackerBank
+from .grid_connection.state_change_coalescer import StateChangeCoalescer
 from .log_wrapper import get_class_method_logger
+from .power_samples import PowerSampleBuffer
 from .v2g_globals import get_local_now, time_ceil, time_round
 from .event_bus import EventBus
 
@@ -74,6 +78,10 @@ class DataMonitor:
     # the average power in the fixed interval
     period_power_x_duration: int = 0
 
+    # Charge power readings and setpoint changes of the current interval, for
+    # the min/max/p95 power stored next to the average.
+    _power_samples: PowerSampleBuffer
+
     # Total seconds that charger and car have been available in the current hour.
     current_availability: bool
     availability_duration_in_current_interval: int = 0
@@ -91,17 +99,22 @@ class DataMonitor:
     _app_state_durations: dict
 
     evse_client_app: object = None
-    # For persisting interval data to local SQLite database
+    # For persisting interval data to local SQLite database (AsyncDataStore)
     data_store = None
+    naive_charging_simulator = None
     # For subscribing to calendar_change events
     reservations_client = None
     hass: Hass = None
 
-    # Grid monitoring: PowerTracker per phase per direction
-    _grid_consumption_trackers: dict[int, PowerTracker]
-    _grid_production_trackers: dict[int, PowerTracker]
-    # PV monitoring: PowerTracker per configured solar panel, keyed on panel id
-    _pv_trackers: dict[str, PowerTracker]
+    # Grid monitoring: a tracker channel per phase per direction, keyed on
+    # ("consumption", phase) and ("production", phase)
+    _grid_trackers: PowerTrackerBank
+    # PV monitoring: a tracker channel per configured solar panel, keyed on
+    # panel id
+    _pv_trackers: PowerTrackerBank
+    # Grid and PV state changes, queued by the listen_state callbacks and
+    # applied to the trackers in batches (see _apply_state_changes).
+    _state_changes: StateChangeCoalescer
     # Scale factors to convert each entity's reported value to kW. Looked
     # up at setup from the entity's unit_of_measurement (W → 0.001, kW →
     # 1.0, MW → 1000). Used in the corresponding handler before passing
@@ -110,10 +123,18 @@ class DataMonitor:
     _grid_production_scales: dict[int, float]
     _pv_scales: dict[str, float]
 
+    # Running totals of today for the homepage sensors.
+    _today_totals: DayTotals
+
     def __init__(self, hass: Hass, event_bus: EventBus):
         self.hass = hass
         self.__log = get_class_method_logger(module_name="data_monitor")
         self.event_bus = event_bus
+        self._today_totals = DayTotals()
+        self._power_samples = PowerSampleBuffer()
+        self._grid_trackers = PowerTrackerBank()
+        self._pv_trackers = PowerTrackerBank()
+        self._state_changes = StateChangeCoalescer(self._apply_state_changes)
 
     async def initialize(self):
         self.__log("Initialising DataMonitor.")
@@ -136,6 +157,8 @@ class DataMonitor:
         self.power_period_duration = 0
         self.period_power_x_duration = 0
         self.current_power = 0
+        self._power_samples.reset()
+        self._power_samples.add(0, local_now)
 
         # Availability — after state is initialised
         self.availability_duration_in_current_interval = 0
@@ -156,7 +179,17 @@ class DataMonitor:
         self.event_bus.add_event_listener(
             "charge_power_change", self._process_power_change
         )
+        self.event_bus.add_event_listener(
+            "charge_power_setpoint_change", self._process_setpoint_change
+        )
         self.event_bus.add_event_listener("soc_change", self._process_soc_change)
+        # Today's totals are re-read once repairs or new prices changed them.
+        self.event_bus.add_event_listener(
+            "repairer_complete", self._handle_repairer_complete
+        )
+        self.event_bus.add_event_listener(
+            "prices_upserted", self._handle_prices_upserted
+        )
 
         # Reservation logging
         if self.reservations_client is not None:
@@ -165,16 +198,15 @@ class DataMonitor:
             )
 
         # Grid monitoring listeners
-        self._grid_consumption_trackers = {}
-        self._grid_production_trackers = {}
         self._grid_consumption_scales = {}
         self._grid_production_scales = {}
         await self._setup_grid_listeners(local_now)
 
         # PV monitoring listeners
-        self._pv_trackers = {}
         self._pv_scales = {}
         await self._setup_pv_listeners(local_now)
+        if self._grid_trackers or self._pv_trackers:
+            self._state_changes.start()
 
         runtime = time_ceil(local_now, c.EVENT_RESOLUTION)
         await self.hass.run_every(
@@ -251,7 +283,7 @@ class DataMonitor:
             target_soc_pct = event.get("target_soc_percent")
 
             try:
-                self.data_store.insert_reservation(
+                await self.data_store.insert_reservation(
                     timestamp=timestamp,
                     start_timestamp=start.astimezone(timezone.utc).isoformat(),
                     end_timestamp=end.astimezone(timezone.utc).isoformat(),
@@ -418,18 +450,14 @@ class DataMonitor:
 
         for i, entity_id in enumerate(c.GRID_CONSUMPTION_ENTITIES, start=1):
             self._grid_consumption_scales[i] = await self._get_power_scale(entity_id)
-            tracker = PowerTracker()
-            tracker.reset(local_now)
-            self._grid_consumption_trackers[i] = tracker
+            self._grid_trackers.add_channel(("consumption", i), local_now)
             await self.hass.listen_state(
                 self._handle_grid_consumption_change, entity_id, phase=i
             )
 
         for i, entity_id in enumerate(c.GRID_PRODUCTION_ENTITIES, start=1):
             self._grid_production_scales[i] = await self._get_power_scale(entity_id)
-            tracker = PowerTracker()
-            tracker.reset(local_now)
-            self._grid_production_trackers[i] = tracker
+            self._grid_trackers.add_channel(("production", i), local_now)
             await self.hass.listen_state(
                 self._handle_grid_production_change, entity_id, phase=i
             )
@@ -442,45 +470,33 @@ class DataMonitor:
     async def _handle_grid_consumption_change(
         self, entity, attribute, old, new, kwargs
     ):
-        """Called when a grid consumption entity changes state."""
-        if new in self.EMPTY_STATES:
-            return
-        try:
-            power = float(new)
-        except (TypeError, ValueError):
-            return
-        phase = kwargs.get("phase", 1)
-        tracker = self._grid_consumption_trackers.get(phase)
-        if tracker:
-            scale = self._grid_consumption_scales.get(phase, 1.0)
-            tracker.update(power * scale, get_local_now())
+        """Called when a grid consumption entity changes state.
+
+        Only queues the raw state; see _apply_state_changes.
+        """
+        self._state_changes.add(("consumption", kwargs.get("phase", 1)), new)
 
     async def _handle_grid_production_change(self, entity, attribute, old, new, kwargs):
-        """Called when a grid production entity changes state."""
-        if new in self.EMPTY_STATES:
-            return
-        try:
-            power = float(new)
-        except (TypeError, ValueError):
-            return
-        phase = kwargs.get("phase", 1)
-        tracker = self._grid_production_trackers.get(phase)
-        if tracker:
-            scale = self._grid_production_scales.get(phase, 1.0)
-            tracker.update(power * scale, get_local_now())
+        """Called when a grid production entity changes state.
 
-    def _conclude_grid_interval(self, timestamp: str, local_now: datetime):
+        Only queues the raw state; see _apply_state_changes.
+        """
+        self._state_changes.add(("production", kwargs.get("phase", 1)), new)
+
+    async def _conclude_grid_interval(self, timestamp: str, local_now: datetime):
         """Conclude grid trackers and persist to database."""
-        if not getattr(self, "_grid_consumption_trackers", None):
+        if not self._grid_trackers:
             return
 
-        for phase in self._grid_consumption_trackers:
-            cons_avg = self._grid_consumption_trackers[phase].conclude(local_now)
-            prod_tracker = self._grid_production_trackers.get(phase)
-            prod_avg = prod_tracker.conclude(local_now) if prod_tracker else None
+        averages = self._grid_trackers.conclude(local_now)
+        for direction, phase in averages:
+            if direction != "consumption":
+                continue
+            cons_avg = averages[("consumption", phase)]
+            prod_avg = averages.get(("production", phase))
 
             if self.data_store is not None:
-                self.data_store.insert_grid_interval(
+                await self.data_store.insert_grid_interval(
                     timestamp, phase, cons_avg, prod_avg
                 )
 
@@ -505,9 +521,7 @@ class DataMonitor:
             if not panel_id or not entity_id:
                 continue
             self._pv_scales[panel_id] = await self._get_power_scale(entity_id)
-            tracker = PowerTracker()
-            tracker.reset(local_now)
-            self._pv_trackers[panel_id] = tracker
+            self._pv_trackers.add_channel(panel_id, local_now)
             await self.hass.listen_state(
                 self._handle_pv_power_change, entity_id, panel_id=panel_id
             )
@@ -515,28 +529,52 @@ class DataMonitor:
         self.__log(f"PV monitoring started: {len(self._pv_trackers)} panel(s).")
 
     async def _handle_pv_power_change(self, entity, attribute, old, new, kwargs):
-        """Called when a solar panel's power entity changes state."""
-        if new in self.EMPTY_STATES:
-            return
-        try:
-            power = float(new)
-        except (TypeError, ValueError):
-            return
-        panel_id = kwargs.get("panel_id")
-        tracker = self._pv_trackers.get(panel_id)
-        if tracker:
-            scale = self._pv_scales.get(panel_id, 1.0)
-            tracker.update(power * scale, get_local_now())
+        """Called when a solar panel's power entity changes state.
+
+        Only queues the raw state; see _apply_state_changes.
+        """
+        self._state_changes.add(("pv", kwargs.get("panel_id")), new)
+
+    def _apply_state_changes(self, changes: list[tuple[tuple, object, float]]):
+        """Apply a batch of queued grid and PV state changes to the trackers.
 
-    def _conclude_pv_interval(self, timestamp: str, local_now: datetime):
+        Called by the StateChangeCoalescer every flush interval and before
+        an interval is concluded. Each change is ((kind, channel), raw
+        state, epoch seconds), kind being consumption, production or pv.
+        Empty and non-numeric states are skipped; values are scaled to kW.
+        """
+        grid_updates = []
+        pv_updates = []
+        for (kind, channel), new, timestamp in changes:
+            if new in self.EMPTY_STATES:
+                continue
+            try:
+                power = float(new)
+            except (TypeError, ValueError):
+                continue
+            if kind == "pv":
+                if channel in self._pv_trackers:
+                    scale = self._pv_scales.get(channel, 1.0)
+                    pv_updates.append((channel, power * scale, timestamp))
+            elif (kind, channel) in self._grid_trackers:
+                scales = (
+                    self._grid_consumption_scales
+                    if kind == "consumption"
+                    else self._grid_production_scales
+                )
+                scale = scales.get(channel, 1.0)
+                grid_updates.append(((kind, channel), power * scale, timestamp))
+        self._grid_trackers.extend(grid_updates)
+        self._pv_trackers.extend(pv_updates)
+
+    async def _conclude_pv_interval(self, timestamp: str, local_now: datetime):
         """Conclude PV trackers and persist to database."""
-        if not getattr(self, "_pv_trackers", None):
+        if not self._pv_trackers:
             return
 
-        for panel_id, tracker in self._pv_trackers.items():
-            avg_kw = tracker.conclude(local_now)
+        for panel_id, avg_kw in self._pv_trackers.conclude(local_now).items():
             if self.data_store is not None:
-                self.data_store.insert_pv_interval(timestamp, panel_id, avg_kw)
+                await self.data_store.insert_pv_interval(timestamp, panel_id, avg_kw)
 
     # ── Charger power monitoring ───────────────────────────────────────
 
@@ -550,6 +588,11 @@ class DataMonitor:
         self.power_period_duration += duration
         self.current_power_since = local_now
         self.current_power = new_power
+        self._power_samples.add(new_power, local_now)
+
+    async def _process_setpoint_change(self, new_setpoint: int):
+        """Count the power setpoint changes within a regular interval."""
+        self._power_samples.count_setpoint_change()
 
     async def __conclude_interval(self, *args):
         """Conclude a regular interval.
@@ -559,6 +602,9 @@ class DataMonitor:
         await self._process_power_change(self.current_power)
         await self.__record_availability(True)
         app_state = self._conclude_app_state()
+        power_stats = self._power_samples.conclude(get_local_now())
+        # Apply the grid and PV readings still queued.
+        self.__flush_state_changes()
 
         # At initialise there might be an incomplete period,
         # duration must be not more than 5% smaller than readings_resolution * 60
@@ -599,25 +645,41 @@ class DataMonitor:
                 average_power_kw * c.FM_EVENT_RESOLUTION_IN_MINUTES / 60, 6
             )
 
-            # Persist interval data to local database
-            timestamp = await self._write_interval_to_db(
-                energy_kwh, availability_pct, soc, app_state
-            )
-
-            # Persist grid monitoring data
-            if timestamp is not None:
-                self._conclude_grid_interval(timestamp, get_local_now())
-
-            # Persist PV monitoring data
-            if timestamp is not None:
-                self._conclude_pv_interval(timestamp, get_local_now())
-
-            # Notify listeners (e.g. naive charging simulator).
-            if timestamp is not None:
-                self.event_bus.emit_event("interval_concluded", timestamp=timestamp)
+            # Persist the interval, grid, PV and naive charging rows in one
+            # transaction, so the interval costs a single commit on the
+            # writer thread.
+            try:
+                async with self._interval_transaction():
+                    # Persist interval data to local database
+                    timestamp = await self._write_interval_to_db(
+                        energy_kwh, availability_pct, soc, app_state, power_stats
+                    )
+
+                    # Persist grid monitoring data
+                    if timestamp is not None:
+                        await self._conclude_grid_interval(timestamp, get_local_now())
+
+                    # Persist PV monitoring data
+                    if timestamp is not None:
+                        await self._conclude_pv_interval(timestamp, get_local_now())
+
+                    # Persist the naive charging simulation of the interval
+                    if (
+                        timestamp is not None
+                        and self.naive_charging_simulator is not None
+                    ):
+                        await self.naive_charging_simulator.conclude_interval(
+                            timestamp, soc, availability_pct
+                        )
+            except Exception as e:
+                self.__log(
+                    f"Failed to commit interval to DB: {e}",
+                    level="WARNING",
+                )
+                timestamp = None
 
             # Update homepage sensors with today's totals
-            await self._emit_today_totals()
+            await self._emit_today_totals(timestamp, energy_kwh)
 
         else:
             self.__log(
@@ -633,15 +695,41 @@ class DataMonitor:
         self.availability_duration_in_current_interval = 0
         self.un_availability_duration_in_current_interval = 0
 
+    def __flush_state_changes(self):
+        """Flush the queued grid and PV state changes and log the queue metrics."""
+        try:
+            self._state_changes.flush()
+        except Exception as e:
+            self.__log(f"Failed to apply grid/PV readings: {e}", level="WARNING")
+        metrics = self._state_changes.take_metrics()
+        if metrics["callbacks"]:
+            self.__log(
+                f"Grid/PV state changes: {metrics['callbacks']} "
+                f"({metrics['callback_rate']}/s), max queue depth "
+                f"{metrics['max_queue_depth']}, {metrics['flushes']} flush(es), "
+                f"{metrics['early_flushes']} on a full queue.",
+                level="DEBUG",
+            )
+
+    def _interval_transaction(self):
+        """Return an AsyncDataStore transaction for one interval's writes."""
+        if self.data_store is None:
+            return nullcontext()
+        return self.data_store.transaction()
+
     async def _write_interval_to_db(
         self,
         energy_kwh: float,
         availability_pct: float,
         soc: Union[int, None],
         app_state: str,
+        power_stats: dict | None = None,
     ) -> str | None:
         """Write a concluded interval to the local SQLite database.
 
+        power_stats are the PowerSampleBuffer statistics of the interval
+        (min/max/p95 power and setpoint changes), if any.
+
         Returns the UTC timestamp of the written interval, or None on failure.
         """
         if self.data_store is None:
@@ -655,12 +743,13 @@ class DataMonitor:
         timestamp = interval_start.astimezone(timezone.utc).isoformat()
 
         try:
-            self.data_store.insert_interval(
+            await self.data_store.insert_interval(
                 timestamp=timestamp,
                 energy_kwh=energy_kwh,
                 app_state=app_state,
                 soc_pct=float(soc) if soc is not None else None,
                 availability_pct=availability_pct,
+                **(power_stats or {}),
             )
             return timestamp
         except Exception as e:
@@ -670,47 +759,74 @@ class DataMonitor:
             )
             return None
 
-    async def _emit_today_totals(self):
-        """Query today's aggregated data and emit an event for homepage sensors."""
+    async def _emit_today_totals(
+        self, timestamp: str | None = None, energy_kwh: float | None = None
+    ):
+        """Emit an event with today's totals for the homepage sensors.
+
+        The totals are kept in memory: the just concluded interval (its UTC
+        timestamp and energy) is added to them. They are only (re)read from
+        the aggregated data at the first call of a local day or after a
+        repair or price update touched today.
+        """
         if self.data_store is None:
             return
 
-        now = get_local_now()
-        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        today_end = today_start + timedelta(days=1)
-
+        today_start = self.__today_start()
         try:
-            result = self.data_store.get_aggregated_data(
-                start=today_start.astimezone(timezone.utc).isoformat(),
-                end=today_end.astimezone(timezone.utc).isoformat(),
-                granularity="days",
-            )
+            if not self._today_totals.is_for(today_start.date()):
+                await self.__load_today_totals(today_start)
+            elif timestamp is not None and energy_kwh:
+                await self.__add_to_today_totals(timestamp, energy_kwh)
         except Exception as e:
+            self._today_totals.invalidate()
             self.__log(
                 f"Failed to query today's totals: {e}",
                 level="WARNING",
             )
             return
 
-        if result:
-            day = result[0]
-            charge_kwh = day["charge_kwh"]
-            charge_cost = day["charge_cost"]
-            discharge_kwh = day["discharge_kwh"]
-            discharge_revenue = day["discharge_revenue"]
-        else:
-            charge_kwh = 0.0
-            charge_cost = 0.0
-            discharge_kwh = 0.0
-            discharge_revenue = 0.0
-
-        self.event_bus.emit_event(
-            "today_energy_update",
-            charge_kwh=charge_kwh,
-            charge_cost=charge_cost,
-            discharge_kwh=discharge_kwh,
-            discharge_revenue=discharge_revenue,
+        self.event_bus.emit_event("today_energy_update", **self._today_totals.as_dict())
+
+    async def __load_today_totals(self, today_start: datetime):
+        """Reset today's totals from the aggregated data of the local day."""
+        # Adding a day keeps the wall-clock time, so this is the next local
+        # midnight, also on 23 and 25 hour DST days.
+        today_end = today_start + timedelta(days=1)
+        result = await self.data_store.get_aggregated_data(
+            start=today_start.astimezone(timezone.utc).isoformat(),
+            end=today_end.astimezone(timezone.utc).isoformat(),
+            granularity="days",
         )
+        self._today_totals.reset(today_start.date(), result[0] if result else None)
+
+    async def __add_to_today_totals(self, timestamp: str, energy_kwh: float):
+        """Add a concluded interval to today's totals."""
+        local_start = datetime.fromisoformat(timestamp).astimezone(c.TZ)
+        if not self._today_totals.is_for(local_start.date()):
+            # Concluded at midnight, the interval belongs to yesterday.
+            return
+        price = await self.data_store.get_price_at(timestamp)
+        consumption_price, production_price = price[:2] if price else (None, None)
+        self._today_totals.add(energy_kwh, consumption_price, production_price)
+
+    def __today_start(self) -> datetime:
+        """Return the start of the current local day."""
+        return get_local_now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def _handle_repairer_complete(self, **kwargs):
+        """Re-read today's totals at the next emit, repairs may have changed them."""
+        self._today_totals.invalidate()
+
+    def _handle_prices_upserted(self, start: str, end: str, **kwargs):
+        """Re-read today's totals at the next emit if the new prices touch today."""
+        today_start = self.__today_start()
+        today_end = today_start + timedelta(days=1)
+        if (
+            datetime.fromisoformat(start) < today_end
+            and datetime.fromisoformat(end) >= today_start
+        ):
+            self._today_totals.invalidate()
 
     async def __is_available(self):
         """Check if car and charger are available for automatic charging."""
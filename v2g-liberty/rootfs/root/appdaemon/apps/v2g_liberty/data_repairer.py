@@ -10,19 +10,38 @@ Ensures completeness and physical consistency of the 5-minute time series:
   Step 5:  Bounds validation — log impossible states (no modification)
   Step 6:  app_state inference — derive state from energy + availability
 
-Runs at startup (full repair) and periodically (incremental).
+Runs at startup (full repair) and periodically (incremental). The
+incremental runs only process the ranges the DataStore marked dirty since
+the previous pass.
 Repaired/added rows are marked with is_repaired=1 in interval_log.
+
+Once a day, intervals older than ARCHIVE_AFTER_DAYS get a final repair pass
+and are then compacted into hourly rows in interval_archive.
 """
 
 import asyncio
+import json
+import multiprocessing
 import sqlite3
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import timedelta
 
+import numpy as np
 import pandas as pd
 from appdaemon.plugins.hass.hassapi import Hass
 
 from . import constants as c
-from .data_store import DataStore
+from .data_store import (
+    DataStore,
+    archive_cutoff,
+    archive_intervals,
+    clear_dirty_ranges,
+    dirty_ranges,
+    epoch_to_iso,
+    iso_to_epoch,
+    refresh_interval_rollups,
+)
 from .fm_historical_importer import append_to_report
 from .log_wrapper import get_class_method_logger
 from .v2g_globals import get_local_now
@@ -32,7 +51,12 @@ from .v2g_globals import get_local_now
 # ---------------------------------------------------------------------------
 MAX_GAP_LENGTH: int = 20  # Max gap slots to fill (20 × 5 min = 100 min)
 SOC_JUMP_THRESHOLD: float = 10.0  # % SoC change considered a jump
-PERIODIC_LOOKBACK_HOURS: int = 48  # Scope for periodic (incremental) runs
+REPAIR_CONTEXT_HOURS: int = 12  # Context around dirty ranges and repair chunks
+FULL_REPAIR_CHUNK_DAYS: int = 31  # Full repair reads interval_log per chunk
+FULL_REPAIR_WORKERS: int = 1  # > 1: repair the chunks in a process pool (opt-in)
+
+# Retention: intervals older than this are archived per hour (0 = keep all)
+ARCHIVE_AFTER_DAYS: int = 365
 
 # Type B: energy interpolation
 MAX_ENERGY_INTERPOLATION_GAP: int = 12  # Max slots for energy interpolation
@@ -69,6 +93,8 @@ class DataRepairer:
     """Validates and repairs gaps in interval_log data."""
 
     _MEMO_ID = "data_repairer_db_issue"
+    # Name of the full repair's row in repair_checkpoint.
+    _CHECKPOINT = "full_repair"
 
     data_store: DataStore = None
     event_bus = None
@@ -99,13 +125,17 @@ class DataRepairer:
         await self.__hass.run_every(
             self.run_incremental_repair, "now+3600", six_hours_in_seconds
         )
+        # Archive old intervals once a day, at a quiet hour.
+        await self.__hass.run_daily(self.run_retention_async, start="03:30:00")
 
-    async def run_full_repair_async(self) -> None:
+    async def run_full_repair_async(self, report: bool = False) -> None:
         """Run the full repair off the event loop and report the result.
 
         Wraps the synchronous run_full_repair in run_in_executor so the event
         loop stays responsive on large databases. Used by the historical
-        importer's on_complete callback (via a small adapter in v2g_globals).
+        importer's on_complete callback (via a small adapter in v2g_globals),
+        which passes ``report=True`` to append the summary to the import
+        report file (see write_report).
 
         Opens its OWN sqlite3 connection inside the executor thread. SQLite
         forbids sharing a Connection across threads (and also we don't want
@@ -180,13 +210,24 @@ class DataRepairer:
                 f"Validation found {sum(violations.values())} issues: {violations}",
                 level="WARNING",
             )
+        if report:
+            self.write_report(summary)
 
         self._emit_repairer_complete()
         self._repair_running = False
 
-    def run_full_repair(self, conn=None) -> dict:
+    def run_full_repair(self, conn=None, workers: int | None = None) -> dict:
         """Repair entire interval_log from first to last record.
 
+        Streams over chunks of FULL_REPAIR_CHUNK_DAYS, each read with the
+        REPAIR_CONTEXT_HOURS before it for jump and gap context, so only one
+        chunk is in memory at a time. Progress is checkpointed after every
+        chunk; a run that was interrupted resumes at the chunk where it
+        stopped.
+
+        With more than one worker (``workers``, default FULL_REPAIR_WORKERS)
+        the chunks are repaired in a process pool, see _repair_chunks_in_pool.
+
         If ``conn`` is provided, that connection is used for all DB access
         in this run (used by the executor-based async runner so the work
         happens on a thread-local connection). Otherwise the shared
@@ -206,10 +247,110 @@ class DataRepairer:
             self.__log("No interval data to repair.")
             return _empty_summary()
 
-        return self._repair_range(row["first_ts"], row["last_ts"], conn=conn)
+        first_ts, last_ts = row["first_ts"], row["last_ts"]
+        # Ranges marked dirty before this point are covered by this run, as
+        # far as they lie in the part of interval_log it repairs.
+        _, last_dirty = dirty_ranges(conn)
+
+        start, summary = self._load_checkpoint(first_ts, conn)
+        resumed = start is not None
+        if resumed:
+            self.__log(f"Resuming full repair at {epoch_to_iso(start)}.")
+        else:
+            start, summary = first_ts, _empty_summary()
+
+        chunk = FULL_REPAIR_CHUNK_DAYS * 86400
+        chunks = [
+            (chunk_start, min(chunk_start + chunk - 1, last_ts))
+            for chunk_start in range(start, last_ts + 1, chunk)
+        ]
+        if workers is None:
+            workers = FULL_REPAIR_WORKERS
+        if workers > 1 and len(chunks) > 1:
+            repaired = self._repair_chunks_in_pool(chunks, workers, conn)
+        else:
+            repaired = self._repair_chunks(chunks, conn)
+        for next_start, chunk_summary in repaired:
+            _add_summary(summary, chunk_summary)
+            self._save_checkpoint(first_ts, next_start, summary, conn)
+
+        self._clear_checkpoint(conn)
+        # A resumed run did not repair what lies before its start: ranges
+        # marked there, e.g. by an import during the interruption, are left
+        # to the incremental repair.
+        clear_dirty_ranges(conn, last_dirty, since=start if resumed else None)
+        return summary
+
+    def _repair_chunks(self, chunks: list[tuple[int, int]], conn):
+        """Repair the chunks one by one, yielding (next start, summary) each."""
+        context = REPAIR_CONTEXT_HOURS * 3600
+        for start, end in chunks:
+            summary = self._repair_range(
+                epoch_to_iso(start - context), epoch_to_iso(end), conn=conn
+            )
+            yield end + 1, summary
+
+    def _repair_chunks_in_pool(self, chunks: list[tuple[int, int]], workers: int, conn):
+        """Repair the chunks in a process pool, yielding (next start, summary).
+
+        The workers only compute: every frame is read and every result is
+        written here, on ``conn``, in chunk order. A chunk's frame is read
+        before the result of the chunk before it is written, so each chunk
+        is repaired from the rows as they were before the run, however the
+        workers are scheduled. Where the context of a chunk overlaps the end
+        of the chunk before it, the later chunk's repairs are written last
+        and win, as in the serial run. Changes are diffed against the frame
+        a chunk was read as, so the earlier chunk's other changes stay.
+        """
+        context = REPAIR_CONTEXT_HOURS * 3600
+        pending = deque()
+        submitted = 0
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            # Forking the multi-threaded AppDaemon process is not safe.
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(c.CHARGER_MAX_CHARGE_POWER, c.CAR_MAX_CAPACITY_IN_KWH),
+        ) as pool:
+            for index, (start, end) in enumerate(chunks):
+                # Keep every worker busy, one chunk ahead of the one written.
+                while submitted < min(len(chunks), index + workers + 1):
+                    chunk_start, chunk_end = chunks[submitted]
+                    frame = _read_range(
+                        conn,
+                        epoch_to_iso(chunk_start - context),
+                        epoch_to_iso(chunk_end),
+                    )
+                    if frame.empty:
+                        pending.append(None)
+                    else:
+                        pending.append(
+                            (
+                                pool.submit(_repair_chunk, frame),
+                                frame.index[0],
+                                frame.index[-1],
+                            )
+                        )
+                    submitted += 1
+
+                job = pending.popleft()
+                if job is None:
+                    yield end + 1, _empty_summary()
+                    continue
+                future, first, last = job
+                changes, summary = future.result()
+                summary["rows_written"] = self._store_repairs(
+                    changes,
+                    epoch_to_iso(start - context),
+                    epoch_to_iso(end),
+                    first,
+                    last,
+                    conn,
+                )
+                yield end + 1, summary
 
     async def run_incremental_repair(self, _kwargs=None):
-        """Repair the last PERIODIC_LOOKBACK_HOURS hours."""
+        """Repair the ranges marked dirty since the previous pass."""
         if self._repair_running:
             self.__log(
                 "Incremental repair skipped — a repair is already running.",
@@ -218,11 +359,7 @@ class DataRepairer:
             return
         self._repair_running = True
         try:
-            now = get_local_now()
-            start = (now - timedelta(hours=PERIODIC_LOOKBACK_HOURS)).isoformat()
-            end = now.isoformat()
-
-            summary = self._repair_range(start, end)
+            summary = self._repair_dirty_ranges()
             total = _total_repairs(summary)
             if total > 0:
                 self.__log(f"Incremental repair: {_format_summary(summary)}")
@@ -230,6 +367,149 @@ class DataRepairer:
         finally:
             self._repair_running = False
 
+    def _repair_dirty_ranges(self, conn=None) -> dict:
+        """Repair the dirty ranges and clear them. Returns the summed summary.
+
+        Each range is widened by REPAIR_CONTEXT_HOURS on both sides, so jumps
+        and gaps at its edges are judged with the rows around them.
+        """
+        if conn is None:
+            conn = self.data_store.connection
+        ranges, last_dirty = dirty_ranges(conn, margin=REPAIR_CONTEXT_HOURS * 3600)
+        summary = _empty_summary()
+        for start, end in ranges:
+            _add_summary(
+                summary,
+                self._repair_range(epoch_to_iso(start), epoch_to_iso(end), conn=conn),
+            )
+        if ranges:
+            clear_dirty_ranges(conn, last_dirty)
+        return summary
+
+    def _load_checkpoint(self, first_ts: int, conn) -> tuple[int | None, dict]:
+        """Return (next chunk start, summary so far) of an interrupted full repair.
+
+        A checkpoint is ignored when the data before next_ts is not what the
+        run left: another first row, or another number of rows before it
+        (rows imported or deleted since, e.g. by a re-import). Returns
+        (None, {}) without a valid one.
+        """
+        row = conn.execute(
+            "SELECT first_ts, next_ts, rows_before, summary FROM repair_checkpoint "
+            "WHERE name = ?",
+            (self._CHECKPOINT,),
+        ).fetchone()
+        if row is None:
+            return None, {}
+        if (
+            row["first_ts"] != first_ts
+            or _rows_before(conn, row["next_ts"]) != row["rows_before"]
+        ):
+            self.__log(
+                "Data changed since the full repair was interrupted, restarting."
+            )
+            return None, {}
+        return row["next_ts"], {**_empty_summary(), **json.loads(row["summary"])}
+
+    def _save_checkpoint(
+        self, first_ts: int, next_ts: int, summary: dict, conn
+    ) -> None:
+        """Record that the full repair has done everything before next_ts."""
+        conn.execute(
+            "INSERT OR REPLACE INTO repair_checkpoint "
+            "(name, first_ts, next_ts, rows_before, summary) VALUES (?, ?, ?, ?, ?)",
+            (
+                self._CHECKPOINT,
+                first_ts,
+                next_ts,
+                _rows_before(conn, next_ts),
+                json.dumps(summary, default=int),
+            ),
+        )
+        conn.commit()
+
+    def _clear_checkpoint(self, conn) -> None:
+        """Remove the checkpoint of a completed full repair."""
+        conn.execute(
+            "DELETE FROM repair_checkpoint WHERE name = ?", (self._CHECKPOINT,)
+        )
+        conn.commit()
+
+    async def run_retention_async(self, _kwargs=None) -> None:
+        """Archive intervals older than ARCHIVE_AFTER_DAYS off the event loop.
+
+        Like run_full_repair_async this uses its own connection in an
+        executor thread, and it shares the single-flight guard with the
+        repairs as it ends with a repair pass of its own.
+        """
+        if ARCHIVE_AFTER_DAYS <= 0:
+            return
+        if self._repair_running:
+            self.__log(
+                "Retention run skipped — a repair is already running.",
+                level="WARNING",
+            )
+            return
+        self._repair_running = True
+
+        db_path = self.data_store.DB_PATH
+        before = (get_local_now() - timedelta(days=ARCHIVE_AFTER_DAYS)).isoformat()
+
+        def _run_with_own_connection() -> int:
+            conn = sqlite3.connect(db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            try:
+                return self.run_retention(before, conn=conn)
+            finally:
+                conn.close()
+
+        try:
+            loop = asyncio.get_running_loop()
+            archived = await loop.run_in_executor(None, _run_with_own_connection)
+        except Exception as e:
+            self.__log(f"Retention run failed: {e}.", level="WARNING")
+            return
+        finally:
+            self._repair_running = False
+
+        if archived > 0:
+            self.__log(f"Archived {archived} intervals from before {before}.")
+            self._emit_repairer_complete()
+
+    def run_retention(self, before: str, conn=None) -> int:
+        """Archive the intervals before ``before`` after a final repair pass.
+
+        The archived rows can no longer be repaired, so the range gets one
+        last pass first. Freed pages are returned to the OS afterwards.
+        Returns the number of intervals archived.
+        """
+        if conn is None:
+            conn = self.data_store.connection
+        cutoff = archive_cutoff(conn, before)
+        if cutoff is None:
+            return 0
+        row = conn.execute(
+            "SELECT MIN(timestamp) AS first_ts FROM interval_log WHERE timestamp < ?",
+            (iso_to_epoch(cutoff.isoformat()),),
+        ).fetchone()
+        if row["first_ts"] is None:
+            return 0
+
+        summary = self._repair_range(
+            epoch_to_iso(row["first_ts"]),
+            (cutoff - timedelta(seconds=1)).isoformat(),
+            conn=conn,
+        )
+        if _total_repairs(summary) > 0:
+            self.__log(f"Final repair before archiving: {_format_summary(summary)}")
+
+        archived = archive_intervals(conn, cutoff.isoformat())
+        if archived > 0:
+            # executescript steps the pragma to completion; execute() would
+            # stop after the first freed page.
+            conn.executescript("PRAGMA incremental_vacuum;")
+        return archived
+
     def _emit_repairer_complete(self):
         """Notify listeners that a repair run has finished."""
         if self.event_bus is not None:
@@ -248,14 +528,18 @@ class DataRepairer:
         )
         row = cursor.fetchone()
         cursor.close()
+        first_ts = last_ts = None
+        if row["first_ts"] is not None:
+            first_ts = epoch_to_iso(row["first_ts"])
+            last_ts = epoch_to_iso(row["last_ts"])
 
         lines = [
             f"Repair completed at {get_local_now().isoformat()}",
             "",
             "Summary:",
             f"  Total rows:            {row['cnt']}",
-            f"  Period:                {row['first_ts']} -- {row['last_ts']}",
-            f"  Oldest row:            {row['first_ts']}",
+            f"  Period:                {first_ts} -- {last_ts}",
+            f"  Oldest row:            {first_ts}",
             f"  Bounds corrected:      {summary['bounds_corrected']}",
             f"  SoC upward reconstr.:  {summary['soc_reconstructed_up']} (Type A-up)",
             f"  SoC values blanked:    {summary['soc_blanked']} (Type A-down)",
@@ -265,6 +549,10 @@ class DataRepairer:
             f"  SoC constant filled:   {summary['soc_constant_filled']} (Type D)",
             f"  app_state inferred:    {summary['app_state_inferred']}",
             f"  Gaps filled:           {summary['gaps_filled']}",
+            f"  Rows scanned/written:  "
+            f"{summary['rows_scanned']} / {summary['rows_written']}",
+            f"  Peak memory:           "
+            f"{summary['peak_memory_bytes'] / 1e6:.1f} MB (largest chunk)",
         ]
         violations = summary.get("violations", {})
         if violations:
@@ -281,55 +569,73 @@ class DataRepairer:
 
     def _repair_range(self, start: str, end: str, conn=None) -> dict:
         """Core repair logic for a time range. Returns summary stats."""
-        summary = _empty_summary()
         if conn is None:
             conn = self.data_store.connection
 
-        df = pd.read_sql_query(
-            "SELECT timestamp, energy_kwh, app_state, soc_pct, "
-            "availability_pct, is_repaired FROM interval_log "
-            "WHERE timestamp >= ? AND timestamp <= ? ORDER BY timestamp",
-            conn,
-            params=(start, end),
+        df = _read_range(conn, start, end)
+        if df.empty:
+            return _empty_summary()
+
+        original = df.copy()
+        df, summary = self._repair_frame(df)
+        summary["rows_written"] = self._store_repairs(
+            _diff_frames(original, df), start, end, df.index[0], df.index[-1], conn
         )
+        return summary
 
-        if df.empty:
-            return summary
+    def _repair_frame(self, df: pd.DataFrame) -> tuple[pd.DataFrame, dict]:
+        """Run repair steps 0–6 on a frame read by _read_range.
 
-        # Timestamps are stored in UTC; parse and index directly.
-        df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True)
-        df = df.set_index("timestamp").sort_index()
+        Touches no database, so it can also run in a worker process (see
+        _repair_chunk). Returns the repaired frame and the summary stats.
+        """
+        summary = _empty_summary()
+        summary["rows_scanned"] = len(df)
 
         # Step 0: Fill gaps (insert missing 5-min rows)
         df, gaps_filled = self._fill_gaps(df)
         summary["gaps_filled"] = gaps_filled
+        # The frame is at its largest once the gaps are filled.
+        summary["peak_memory_bytes"] = int(df.memory_usage(deep=True).sum())
 
         # Step 0a: Correct physically impossible values (clamp)
         df, bounds_corrected = self._correct_bounds(df)
         summary["bounds_corrected"] = bounds_corrected
 
+        # Steps 1–4 share a run-length index of the SoC column; it is only
+        # rebuilt after a step that changed SoC.
+        runs = _SocRuns(df["soc_pct"])
+
         # Step 1a: Type A-up — reconstruct SoC for upward jumps
-        df, soc_reconstructed_up = self._reconstruct_upward_jumps(df)
+        df, soc_reconstructed_up = self._reconstruct_upward_jumps(df, runs)
         summary["soc_reconstructed_up"] = soc_reconstructed_up
+        if soc_reconstructed_up:
+            runs = _SocRuns(df["soc_pct"])
 
         # Step 1b: Type A-down — blank false constant SoC before downward jumps
-        df, soc_blanked = self._blank_false_constant_soc(df)
+        df, soc_blanked = self._blank_false_constant_soc(df, runs)
         summary["soc_blanked"] = soc_blanked
+        if soc_blanked:
+            runs = _SocRuns(df["soc_pct"])
 
         # Step 1c: Linear SoC interpolation for small gaps
-        df, soc_linear_filled = self._interpolate_soc_linear(df)
+        df, soc_linear_filled = self._interpolate_soc_linear(df, runs)
         summary["soc_linear_filled"] = soc_linear_filled
+        if soc_linear_filled:
+            runs = _SocRuns(df["soc_pct"])
 
         # Step 2: Type B — interpolate energy in gap-filled rows
         df, energy_interpolated = self._interpolate_energy(df)
         summary["energy_interpolated"] = energy_interpolated
 
         # Step 3: Type C — reconstruct SoC from energy
-        df, soc_reconstructed = self._reconstruct_soc_from_energy(df)
+        df, soc_reconstructed = self._reconstruct_soc_from_energy(df, runs)
         summary["soc_reconstructed"] = soc_reconstructed
+        if soc_reconstructed:
+            runs = _SocRuns(df["soc_pct"])
 
         # Step 4: Type D — fill constant SoC (energy ≈ 0)
-        df, soc_constant_filled = self._fill_constant_soc(df)
+        df, soc_constant_filled = self._fill_constant_soc(df, runs)
         summary["soc_constant_filled"] = soc_constant_filled
 
         # Step 5: Validate bounds (log only)
@@ -339,8 +645,17 @@ class DataRepairer:
         df, app_state_inferred = self._infer_app_state(df)
         summary["app_state_inferred"] = app_state_inferred
 
-        # Write repaired rows back to DB (timestamps remain in UTC).
-        written = self._write_repaired_rows(df, conn=conn)
+        return df, summary
+
+    def _store_repairs(
+        self, changes: tuple, start: str, end: str, first, last, conn
+    ) -> int:
+        """Write the changes (see _diff_frames) of [start, end], finish the range.
+
+        ``first`` and ``last`` are the bounds of the repaired frame, which
+        include the gap-filled rows. Returns the number of rows written.
+        """
+        written = self._write_repaired_rows(changes, conn=conn)
         if written > 0:
             self.__log(f"Wrote {written} repaired rows to interval_log.")
 
@@ -351,7 +666,11 @@ class DataRepairer:
         if reviewed > 0:
             self.__log(f"Marked {reviewed} imported rows as reviewed.")
 
-        return summary
+        # Bring the aggregation rollups in line with the repaired (and newly
+        # visible) rows. Uses the UTC bounds of the frame that was processed.
+        if written > 0 or reviewed > 0:
+            refresh_interval_rollups(conn, first.isoformat(), last.isoformat())
+        return written
 
     # ------------------------------------------------------------------
     # Step 0: Gap filling (unchanged)
@@ -511,7 +830,9 @@ class DataRepairer:
     # Step 1a: Type A-up — Reconstruct SoC for upward jumps
     # ------------------------------------------------------------------
 
-    def _reconstruct_upward_jumps(self, df: pd.DataFrame) -> tuple[pd.DataFrame, int]:
+    def _reconstruct_upward_jumps(
+        self, df: pd.DataFrame, runs: "_SocRuns | None" = None
+    ) -> tuple[pd.DataFrame, int]:
         """Reconstruct or blank false constant SoC before upward jumps.
 
         For each upward jump (soc_diff > SOC_JUMP_THRESHOLD):
@@ -521,81 +842,65 @@ class DataRepairer:
            → reconstruct SoC using scaled cumulative energy
         4. Otherwise → blank the block (set SoC to NaN)
 
+        All jumps are handled at once on the constant runs of ``runs``.
         Returns (df, count_of_modified_rows).
         """
-        soc = df["soc_pct"].copy()
-        soc_valid = soc.dropna()
-
-        if len(soc_valid) < 2:
+        if runs is None:
+            runs = _SocRuns(df["soc_pct"])
+        valid_soc = runs.valid_soc
+
+        # Upward jumps, by position in the valid SoC samples. The block is
+        # the constant run ending right before the jump; at least 2 constant
+        # values make it a frozen block.
+        jumps = np.flatnonzero(np.diff(valid_soc) > SOC_JUMP_THRESHOLD) + 1
+        starts = runs.valid_run_start[jumps - 1]
+        frozen = jumps - starts >= 2
+        jumps, starts = jumps[frozen], starts[frozen]
+        if len(jumps) == 0:
             return df, 0
 
         capacity = c.CAR_MAX_CAPACITY_IN_KWH
 
-        # Find upward jumps only
-        soc_diff = soc_valid.diff()
-        jump_indices = soc_diff[soc_diff > SOC_JUMP_THRESHOLD].index
-
-        modified = 0
-        for jump_idx in jump_indices:
-            pos = soc_valid.index.get_loc(jump_idx)
-            if pos == 0:
-                continue
-
-            soc_after = soc_valid.loc[jump_idx]
-            prev_idx = soc_valid.index[pos - 1]
-            constant_value = soc_valid.loc[prev_idx]
-
-            # Walk backwards to find the constant block
-            block_indices = [prev_idx]
-            for i in range(pos - 2, -1, -1):
-                check_idx = soc_valid.index[i]
-                if soc_valid.loc[check_idx] == constant_value:
-                    block_indices.append(check_idx)
-                else:
-                    break
-
-            # Need at least 2 constant values to consider it a frozen block
-            if len(block_indices) < 2:
-                continue
+        # Charging energy of the valid SoC rows. NaN energy is treated as 0
+        # (no measurement → no known change).
+        energy = df["energy_kwh"].to_numpy(dtype=float)[runs.valid_pos]
+        charging = np.nan_to_num(energy).clip(min=0)
+        cumulative = np.concatenate(([0.0], np.cumsum(charging)))
+
+        constant_value = valid_soc[jumps - 1]
+        theoretical_jump = 100 * (cumulative[jumps] - cumulative[starts]) / capacity
+        actual_jump = valid_soc[jumps] - constant_value
+        explained = (theoretical_jump > 0) & (
+            np.abs(theoretical_jump - actual_jump) < UPWARD_JUMP_TOLERANCE
+        )
 
-            # Block indices are in reverse order; sort chronologically
-            block_indices.sort()
-
-            # Calculate theoretical jump from energy in the block.
-            # NaN energy is treated as 0 (no measurement → no known change).
-            block_energy = df.loc[block_indices, "energy_kwh"].fillna(0.0)
-            charging_energy = block_energy.clip(lower=0).sum()
-            theoretical_jump = 100 * charging_energy / capacity
-            actual_jump = soc_after - constant_value
-
-            if (
-                theoretical_jump > 0
-                and abs(theoretical_jump - actual_jump) < UPWARD_JUMP_TOLERANCE
-            ):
-                # Energy explains the jump → reconstruct SoC with scaling
-                scale = actual_jump / theoretical_jump
-                cumulative_energy = block_energy.clip(lower=0).cumsum()
-                reconstructed = (
-                    constant_value + scale * 100 * cumulative_energy / capacity
-                )
-                for idx in block_indices:
-                    df.loc[idx, "soc_pct"] = round(float(reconstructed.loc[idx]), 1)
-                    df.loc[idx, "is_repaired"] = 1
-                modified += len(block_indices)
-            else:
-                # Energy does not explain the jump → blank the block
-                for idx in block_indices:
-                    df.loc[idx, "soc_pct"] = None
-                    df.loc[idx, "is_repaired"] = 1
-                modified += len(block_indices)
+        block, offset = _expand_ranges(starts, jumps - 1)
+        samples = starts[block] + offset
+        soc = runs.soc.copy()
+        # Energy explains the jump → reconstruct SoC with scaling, otherwise
+        # blank the block.
+        cumulative_energy = cumulative[samples + 1] - cumulative[starts[block]]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            scale = actual_jump / theoretical_jump
+            reconstructed = (
+                constant_value[block]
+                + scale[block] * 100 * cumulative_energy / capacity
+            )
+        soc[runs.valid_pos[samples]] = np.where(
+            explained[block], reconstructed.round(1), np.nan
+        )
 
-        return df, modified
+        df["soc_pct"] = soc
+        df.iloc[runs.valid_pos[samples], df.columns.get_loc("is_repaired")] = 1
+        return df, len(samples)
 
     # ------------------------------------------------------------------
     # Step 1b: Type A-down — Blank false constant SoC before downward jumps
     # ------------------------------------------------------------------
 
-    def _blank_false_constant_soc(self, df: pd.DataFrame) -> tuple[pd.DataFrame, int]:
+    def _blank_false_constant_soc(
+        self, df: pd.DataFrame, runs: "_SocRuns | None" = None
+    ) -> tuple[pd.DataFrame, int]:
         """Blank false constant SoC runs before downward jumps.
 
         Detects downward SoC jumps (diff < -SOC_JUMP_THRESHOLD) and blanks
@@ -611,79 +916,56 @@ class DataRepairer:
 
         Only modifies soc_pct (sets to NaN). Marks modified rows as repaired.
         """
-        soc = df["soc_pct"].copy()
-        soc_valid = soc.dropna()
+        if runs is None:
+            runs = _SocRuns(df["soc_pct"])
+        valid_soc = runs.valid_soc
 
-        if len(soc_valid) < 2:
+        # Downward jumps, by position in the valid SoC samples.
+        jumps = np.flatnonzero(np.diff(valid_soc) < -SOC_JUMP_THRESHOLD) + 1
+        if len(jumps) == 0:
             return df, 0
 
         threshold = _negligible_energy_threshold()
-
-        # Find downward jumps only
-        soc_diff = soc_valid.diff()
-        jump_indices = soc_diff[soc_diff < -SOC_JUMP_THRESHOLD].index
-
+        energy = df["energy_kwh"].to_numpy(dtype=float)
+        availability = df["availability_pct"].to_numpy(dtype=float)
+        energy_exceeds = np.abs(energy) >= threshold
+        availability_exceeds = availability == 100
+
+        # Jumps are handled in order on the working copy: a walk may pass
+        # rows an earlier jump already blanked.
+        soc = runs.soc.copy()
+        repaired = np.zeros(len(soc), dtype=bool)
         blanked = 0
-        for jump_idx in jump_indices:
-            pos = soc_valid.index.get_loc(jump_idx)
-            if pos == 0:
-                continue
-
-            prev_idx = soc_valid.index[pos - 1]
-            constant_value = soc_valid.loc[prev_idx]
-
-            # Walk backwards over the FULL DataFrame from the row before
-            # the jump, collecting indices to blank.
-            df_pos = df.index.get_loc(prev_idx)
-            blank_indices = []
-            energy_exceeded = 0
-            availability_exceeded = 0
-
-            i = df_pos
-            while i >= 0:
-                row = df.iloc[i]
-                row_soc = row["soc_pct"]
-
-                # Stop if SoC deviates from constant value
-                if pd.notna(row_soc) and abs(row_soc - constant_value) > 0.1:
-                    break
-
-                # Update exceedance counters and check BEFORE blanking
-                energy = row["energy_kwh"]
-                if pd.notna(energy) and abs(energy) >= threshold:
-                    energy_exceeded += 1
-
-                avail = row["availability_pct"]
-                if pd.notna(avail) and avail == 100:
-                    availability_exceeded += 1
-
-                if (
-                    energy_exceeded >= EXCEEDANCE_THRESHOLD
-                    or availability_exceeded >= EXCEEDANCE_THRESHOLD
-                ):
-                    break  # Real activity proven — stop blanking
-
-                # Only blank rows that have the constant SoC value
-                if pd.notna(row_soc):
-                    blank_indices.append(df.index[i])
-
-                i -= 1
-
+        for jump in jumps:
+            last = runs.valid_pos[jump - 1]
+            stop = _walk_back(
+                soc,
+                energy_exceeds,
+                availability_exceeds,
+                last,
+                valid_soc[jump - 1],
+            )
             # Only blank if there's a run of constant values (>= 2).
             # A single value before a jump is not a "constant run".
-            if len(blank_indices) >= 2:
-                for idx in blank_indices:
-                    df.loc[idx, "soc_pct"] = None
-                    df.loc[idx, "is_repaired"] = 1
-                    blanked += 1
-
+            run = np.arange(stop + 1, last + 1)
+            run = run[~np.isnan(soc[run])]
+            if len(run) >= 2:
+                soc[run] = np.nan
+                repaired[run] = True
+                blanked += len(run)
+
+        if blanked:
+            df["soc_pct"] = soc
+            df.loc[repaired, "is_repaired"] = 1
         return df, blanked
 
     # ------------------------------------------------------------------
     # Step 1c: Linear SoC interpolation
     # ------------------------------------------------------------------
 
-    def _interpolate_soc_linear(self, df: pd.DataFrame) -> tuple[pd.DataFrame, int]:
+    def _interpolate_soc_linear(
+        self, df: pd.DataFrame, runs: "_SocRuns | None" = None
+    ) -> tuple[pd.DataFrame, int]:
         """Linearly interpolate small SoC gaps with known endpoints.
 
         For NULL SoC gaps ≤ MAX_LINEAR_SOC_GAP:
@@ -692,63 +974,43 @@ class DataRepairer:
         3. Energy direction must be consistent with SoC direction:
            - SoC rises → energy after gap must not be negative
            - SoC drops → energy after gap must not be positive
-        4. Fill with np.linspace between endpoints
+        4. Fill linearly between endpoints
 
         Returns (df, count_of_filled_rows).
         """
-        import numpy as np
-
-        is_null_soc = df["soc_pct"].isna()
-        if not is_null_soc.any():
+        if runs is None:
+            runs = _SocRuns(df["soc_pct"])
+        starts, ends = runs.gap_start, runs.gap_end
+        soc_before, soc_after = runs.gap_before, runs.gap_after
+        lengths = ends - starts + 1
+
+        # Energy direction check: energy in the interval after the gap
+        # must be consistent with SoC direction. NaN endpoints (gap at the
+        # very beginning or end) fail every comparison.
+        energy = df["energy_kwh"].to_numpy(dtype=float)
+        energy_after = energy[np.minimum(ends + 1, len(energy) - 1)]
+        soc_diff = soc_after - soc_before
+        fill = (
+            (lengths <= MAX_LINEAR_SOC_GAP)
+            & (np.abs(soc_diff) <= LINEAR_SOC_JUMP_LIMIT)
+            & ~np.isnan(energy_after)
+            & ~((soc_diff > 0) & (energy_after < 0))
+            & ~((soc_diff < 0) & (energy_after > 0))
+        )
+        if not fill.any():
             return df, 0
 
-        nan_groups = (is_null_soc != is_null_soc.shift()).cumsum()
-        filled = 0
-
-        for _, block_idx in df[is_null_soc].groupby(nan_groups).groups.items():
-            block = df.loc[block_idx]
-            if len(block) > MAX_LINEAR_SOC_GAP:
-                continue
-
-            start_pos = df.index.get_loc(block.index[0])
-            end_pos = df.index.get_loc(block.index[-1])
-
-            # Skip if block is at the very beginning or end
-            if start_pos == 0 or end_pos >= len(df) - 1:
-                continue
-
-            soc_before = df.iloc[start_pos - 1]["soc_pct"]
-            soc_after = df.iloc[end_pos + 1]["soc_pct"]
-
-            if pd.isna(soc_before) or pd.isna(soc_after):
-                continue
-
-            # SoC difference must be within limit
-            soc_diff = soc_after - soc_before
-            if abs(soc_diff) > LINEAR_SOC_JUMP_LIMIT:
-                continue
-
-            # Energy direction check: energy in the interval after the gap
-            # must be consistent with SoC direction
-            energy_after = df.iloc[end_pos + 1]["energy_kwh"]
-            if pd.isna(energy_after):
-                continue
-
-            if soc_diff > 0 and energy_after < 0:
-                continue  # SoC rises but next interval discharges
-            if soc_diff < 0 and energy_after > 0:
-                continue  # SoC drops but next interval charges
-
-            # Linearly interpolate
-            interpolated = np.linspace(soc_before, soc_after, len(block) + 2)[1:-1]
-
-            for idx, val in zip(block.index, interpolated):
-                df.loc[idx, "soc_pct"] = round(float(val), 1)
-                df.loc[idx, "is_repaired"] = 1
-
-            filled += len(block)
+        starts, lengths = starts[fill], lengths[fill]
+        soc_before, soc_diff = soc_before[fill], soc_diff[fill]
+        block, offset = _expand_ranges(starts, ends[fill])
+        step = soc_diff / (lengths + 1)
+        rows = starts[block] + offset
+        soc = runs.soc.copy()
+        soc[rows] = ((offset + 1) * step[block] + soc_before[block]).round(1)
 
-        return df, filled
+        df["soc_pct"] = soc
+        df.iloc[rows, df.columns.get_loc("is_repaired")] = 1
+        return df, len(rows)
 
     # ------------------------------------------------------------------
     # Step 2: Type B — Energy interpolation
@@ -819,7 +1081,7 @@ class DataRepairer:
     # ------------------------------------------------------------------
 
     def _reconstruct_soc_from_energy(
-        self, df: pd.DataFrame
+        self, df: pd.DataFrame, runs: "_SocRuns | None" = None
     ) -> tuple[pd.DataFrame, int]:
         """Reconstruct SoC from cumulative energy + battery capacity.
 
@@ -831,62 +1093,63 @@ class DataRepairer:
 
         Max gap: MAX_SOC_RECONSTRUCTION_GAP.
         """
-        is_null_soc = df["soc_pct"].isna()
-        if not is_null_soc.any():
-            return df, 0
+        if runs is None:
+            runs = _SocRuns(df["soc_pct"])
+        starts, ends = runs.gap_start, runs.gap_end
+        soc_before, soc_after = runs.gap_before, runs.gap_after
 
         threshold = _negligible_energy_threshold()
         capacity = c.CAR_MAX_CAPACITY_IN_KWH
-        nan_groups = (is_null_soc != is_null_soc.shift()).cumsum()
-        reconstructed_count = 0
-
-        for _, block_idx in df[is_null_soc].groupby(nan_groups).groups.items():
-            block = df.loc[block_idx]
-            if len(block) > MAX_SOC_RECONSTRUCTION_GAP:
-                continue
-
-            # Check that at least some rows have significant energy.
-            # NaN energy counts as negligible (no measurement available).
-            block_energy = df.loc[block.index, "energy_kwh"]
-            known_energy = block_energy.dropna()
-            if known_energy.empty or (known_energy.abs() <= threshold).all():
-                continue  # All negligible/unknown → Type D, not Type C
-
-            # Get SoC endpoints
-            before_soc = _get_soc_before(df, block.index[0])
-            after_soc = _get_soc_after(df, block.index[-1])
-            if before_soc is None or after_soc is None:
-                continue
+        energy = df["energy_kwh"].to_numpy(dtype=float)
+
+        # At least some rows must have significant energy. NaN energy counts
+        # as negligible (no measurement available); all negligible/unknown
+        # is Type D, not Type C.
+        significant = _count_in_ranges(np.abs(energy) > threshold, starts, ends)
+        candidate = (
+            (ends - starts + 1 <= MAX_SOC_RECONSTRUCTION_GAP)
+            & (significant > 0)
+            & ~np.isnan(soc_before)
+            & ~np.isnan(soc_after)
+        )
+        if not candidate.any():
+            return df, 0
 
-            # Reconstruct SoC cumulatively from energy.
-            # NaN energy → zero delta (no measurement, assume no change).
-            cumulative_soc = float(before_soc)
-            soc_values = []
-            for idx in block.index:
-                energy_val = df.loc[idx, "energy_kwh"]
-                energy = 0.0 if pd.isna(energy_val) else float(energy_val)
-                delta_soc = energy / capacity * 100
-                cumulative_soc += delta_soc
-                soc_values.append(round(cumulative_soc, 1))
-
-            # Validate: does the last reconstructed value match the endpoint?
-            if abs(soc_values[-1] - after_soc) > SOC_RECONSTRUCTION_TOLERANCE:
-                continue  # Too much deviation → skip
-
-            # Apply reconstructed values
-            for idx, soc_val in zip(block.index, soc_values):
-                df.loc[idx, "soc_pct"] = soc_val
-                df.loc[idx, "is_repaired"] = 1
+        starts, ends = starts[candidate], ends[candidate]
+        soc_before, soc_after = soc_before[candidate], soc_after[candidate]
+        lengths = ends - starts + 1
+
+        # Reconstruct SoC cumulatively from energy, one gap per row of a
+        # padded matrix. NaN energy → zero delta (assume no change).
+        block, offset = _expand_ranges(starts, ends)
+        rows = starts[block] + offset
+        deltas = np.zeros((len(starts), lengths.max() + 1))
+        deltas[:, 0] = soc_before
+        deltas[block, offset + 1] = np.nan_to_num(energy[rows]) / capacity * 100
+        soc_values = np.cumsum(deltas, axis=1)[:, 1:].round(1)
+
+        # Validate: does the last reconstructed value match the endpoint?
+        last = soc_values[np.arange(len(starts)), lengths - 1]
+        valid = np.abs(last - soc_after) <= SOC_RECONSTRUCTION_TOLERANCE
+        if not valid.any():
+            return df, 0
 
-            reconstructed_count += len(block)
+        keep = valid[block]
+        rows = rows[keep]
+        soc = runs.soc.copy()
+        soc[rows] = soc_values[block[keep], offset[keep]]
 
-        return df, reconstructed_count
+        df["soc_pct"] = soc
+        df.iloc[rows, df.columns.get_loc("is_repaired")] = 1
+        return df, len(rows)
 
     # ------------------------------------------------------------------
     # Step 4: Type D — SoC constant fill
     # ------------------------------------------------------------------
 
-    def _fill_constant_soc(self, df: pd.DataFrame) -> tuple[pd.DataFrame, int]:
+    def _fill_constant_soc(
+        self, df: pd.DataFrame, runs: "_SocRuns | None" = None
+    ) -> tuple[pd.DataFrame, int]:
         """Fill NULL SoC with constant value where energy is negligible.
 
         When there is no significant energy flow, SoC should not change.
@@ -894,45 +1157,38 @@ class DataRepairer:
         and they must be consistent (within SOC_JUMP_THRESHOLD).
         If availability is NaN/None for any row in the block → skip.
         """
-        is_null_soc = df["soc_pct"].isna()
-        if not is_null_soc.any():
-            return df, 0
+        if runs is None:
+            runs = _SocRuns(df["soc_pct"])
+        starts, ends = runs.gap_start, runs.gap_end
+        soc_before, soc_after = runs.gap_before, runs.gap_after
 
         threshold = _negligible_energy_threshold()
-        nan_groups = (is_null_soc != is_null_soc.shift()).cumsum()
-        filled = 0
-
-        for _, block_idx in df[is_null_soc].groupby(nan_groups).groups.items():
-            block = df.loc[block_idx]
-
-            # Availability must be known and > 95% for all rows in the block.
-            block_avail = df.loc[block.index, "availability_pct"]
-            if block_avail.isna().any():
-                continue  # Unknown availability → skip
-            if not (block_avail > 95).all():
-                continue  # Car was not (fully) connected → skip
-
-            # All energy must be negligible (NaN counts as negligible).
-            block_energy = df.loc[block.index, "energy_kwh"].dropna()
-            if not block_energy.empty and not (block_energy.abs() <= threshold).all():
-                continue  # Has significant energy → not Type D
-
-            # Require BOTH endpoints
-            before_soc = _get_soc_before(df, block.index[0])
-            after_soc = _get_soc_after(df, block.index[-1])
-            if before_soc is None or after_soc is None:
-                continue
-
-            # Endpoints must be consistent (no big jump across the gap)
-            if abs(before_soc - after_soc) > SOC_JUMP_THRESHOLD:
-                continue
+        energy = df["energy_kwh"].to_numpy(dtype=float)
+        availability = df["availability_pct"].to_numpy(dtype=float)
+
+        # Availability must be known and > 95% for all rows in the block
+        # (NaN fails the comparison), and all energy must be negligible
+        # (NaN counts as negligible).
+        disconnected = _count_in_ranges(~(availability > 95), starts, ends)
+        significant = _count_in_ranges(np.abs(energy) > threshold, starts, ends)
+        # Endpoints must be known and consistent (no big jump across the gap)
+        fill = (
+            (disconnected == 0)
+            & (significant == 0)
+            & (np.abs(soc_before - soc_after) <= SOC_JUMP_THRESHOLD)
+        )
+        if not fill.any():
+            return df, 0
 
-            # Fill with the before value (SoC didn't change)
-            df.loc[block.index, "soc_pct"] = before_soc
-            df.loc[block.index, "is_repaired"] = 1
-            filled += len(block)
+        # Fill with the before value (SoC didn't change)
+        block, offset = _expand_ranges(starts[fill], ends[fill])
+        rows = starts[fill][block] + offset
+        soc = runs.soc.copy()
+        soc[rows] = soc_before[fill][block]
 
-        return df, filled
+        df["soc_pct"] = soc
+        df.iloc[rows, df.columns.get_loc("is_repaired")] = 1
+        return df, len(rows)
 
     # ------------------------------------------------------------------
     # Step 5: Bounds validation (log only)
@@ -1093,51 +1349,33 @@ class DataRepairer:
     # Write-back
     # ------------------------------------------------------------------
 
-    def _write_repaired_rows(self, df: pd.DataFrame, conn=None) -> int:
-        """Write repaired/new rows back to interval_log.
+    def _write_repaired_rows(self, changes: tuple, conn=None) -> int:
+        """Write the changes of a repaired frame (see _diff_frames).
 
-        Only writes rows where is_repaired=1.
-        Uses INSERT OR REPLACE for both new gap-fill rows and updated rows.
-        Timestamps are kept in UTC.
+        New gap-fill rows are inserted whole; in existing rows only the
+        changed cells are updated, one executemany per column. Returns the
+        number of rows written.
         """
-        repaired = df[df["is_repaired"] == 1]
-        if repaired.empty:
-            return 0
-
-        rows = []
-        for ts, row in repaired.iterrows():
-            soc = None if pd.isna(row["soc_pct"]) else float(row["soc_pct"])
-            rows.append(
-                {
-                    "timestamp": ts.isoformat(),
-                    "energy_kwh": (
-                        None if pd.isna(row["energy_kwh"]) else float(row["energy_kwh"])
-                    ),
-                    "app_state": str(row["app_state"]),
-                    "soc_pct": soc,
-                    "availability_pct": (
-                        None
-                        if pd.isna(row["availability_pct"])
-                        else float(row["availability_pct"])
-                    ),
-                    "is_repaired": 1,
-                }
-            )
-
+        inserts, updates = changes
         if conn is None:
             conn = self.data_store.connection
         cursor = conn.cursor()
         cursor.executemany(
             "INSERT OR REPLACE INTO interval_log "
             "(timestamp, energy_kwh, app_state, soc_pct, "
-            "availability_pct, is_repaired) "
-            "VALUES (:timestamp, :energy_kwh, :app_state, :soc_pct, "
-            ":availability_pct, :is_repaired)",
-            rows,
+            "availability_pct, is_repaired) VALUES (?, ?, ?, ?, ?, 1)",
+            inserts,
         )
+        updated = set()
+        for column, cells in updates.items():
+            # Column names come from _WRITE_COLUMNS, not from the data.
+            cursor.executemany(
+                f"UPDATE interval_log SET {column} = ? WHERE timestamp = ?", cells
+            )
+            updated.update(timestamp for _, timestamp in cells)
         conn.commit()
         cursor.close()
-        return len(rows)
+        return len(inserts) + len(updated)
 
     def _mark_pending_as_reviewed(self, start: str, end: str, conn=None) -> int:
         """Mark pending-review rows as reviewed (is_repaired 2 → 0).
@@ -1152,7 +1390,7 @@ class DataRepairer:
         cursor.execute(
             "UPDATE interval_log SET is_repaired = 0 "
             "WHERE is_repaired = 2 AND timestamp >= ? AND timestamp <= ?",
-            (start, end),
+            (iso_to_epoch(start), iso_to_epoch(end)),
         )
         count = cursor.rowcount
         conn.commit()
@@ -1160,6 +1398,196 @@ class DataRepairer:
         return count
 
 
+# ---------------------------------------------------------------------------
+# Frame I/O and process-pool workers
+# ---------------------------------------------------------------------------
+
+# interval_log columns the repair writes back, is_repaired last
+_WRITE_COLUMNS = (
+    "energy_kwh",
+    "app_state",
+    "soc_pct",
+    "availability_pct",
+    "is_repaired",
+)
+
+
+def _read_range(conn, start: str, end: str) -> pd.DataFrame:
+    """Read the interval_log rows of [start, end], indexed by UTC timestamp."""
+    df = pd.read_sql_query(
+        "SELECT timestamp, energy_kwh, app_state, soc_pct, "
+        "availability_pct, is_repaired FROM interval_log "
+        "WHERE timestamp >= ? AND timestamp <= ? ORDER BY timestamp",
+        conn,
+        params=(iso_to_epoch(start), iso_to_epoch(end)),
+    )
+    # Timestamps are stored as epoch seconds; index them as UTC.
+    df["timestamp"] = pd.to_datetime(df["timestamp"], unit="s", utc=True)
+    return df.set_index("timestamp").sort_index()
+
+
+def _rows_before(conn, ts: int) -> int:
+    """Return the number of interval_log rows before epoch ts."""
+    return conn.execute(
+        "SELECT COUNT(*) FROM interval_log WHERE timestamp < ?", (ts,)
+    ).fetchone()[0]
+
+
+def _diff_frames(original: pd.DataFrame, df: pd.DataFrame) -> tuple:
+    """Return the changes of the repaired df to the original frame it was read as.
+
+    Only rows with is_repaired=1 are written. Returns (inserts, updates):
+    interval_log parameter tuples of the rows not in original (gap fills),
+    and per column of _WRITE_COLUMNS the (value, timestamp) pairs of the
+    cells that changed. Rows a previous run repaired and this one left as
+    they were are not written again.
+    """
+    repaired = df[df["is_repaired"] == 1]
+    is_new = ~repaired.index.isin(original.index)
+    new = repaired[is_new]
+    inserts = list(
+        zip(
+            new.index.as_unit("s").asi8.tolist(),
+            *(_cells(new[column]) for column in _WRITE_COLUMNS[:-1]),
+        )
+    )
+
+    existing = repaired[~is_new]
+    before = original.loc[existing.index]
+    epochs = existing.index.as_unit("s").asi8
+    updates = {}
+    for column in _WRITE_COLUMNS:
+        after, was = existing[column], before[column]
+        changed = ~((after == was) | (after.isna() & was.isna())).to_numpy()
+        if changed.any():
+            values = after[changed]
+            if column == "is_repaired":
+                values = values.astype(int)
+            updates[column] = list(zip(_cells(values), epochs[changed].tolist()))
+    return inserts, updates
+
+
+def _cells(values: pd.Series) -> list:
+    """Return values as Python scalars for sqlite3, NaN as None."""
+    return values.astype(object).where(values.notna(), None).tolist()
+
+
+def _init_worker(charger_max_charge_power: int, car_max_capacity_in_kwh: float):
+    """Process-pool initializer: copy the settings the repair steps read.
+
+    A spawned worker starts with the module defaults of constants, not the
+    values v2g_globals loaded from the settings.
+    """
+    c.CHARGER_MAX_CHARGE_POWER = charger_max_charge_power
+    c.CAR_MAX_CAPACITY_IN_KWH = car_max_capacity_in_kwh
+
+
+def _repair_chunk(df: pd.DataFrame) -> tuple[list[dict], dict]:
+    """Process-pool task: repair one chunk frame, return (changes, summary)."""
+    original = df.copy()
+    df, summary = DataRepairer(None)._repair_frame(df)
+    return _diff_frames(original, df), summary
+
+
+# ---------------------------------------------------------------------------
+# Run-length index of the SoC column (steps 1–4)
+# ---------------------------------------------------------------------------
+
+
+class _SocRuns:
+    """Constant-SoC runs and NULL-SoC gap groups of a repair frame.
+
+    Built once from the soc_pct column with NumPy, so the SoC steps can
+    handle all jumps or gaps at once instead of walking the frame row by
+    row. A step that changes SoC makes the index stale; _repair_range then
+    builds a new one for the next step.
+
+    Attributes (positions are row positions in the frame):
+        soc: soc_pct as floats, NaN for NULL.
+        valid_pos: positions of the non-NULL SoC values.
+        valid_soc: the non-NULL SoC values (soc[valid_pos]).
+        valid_run_start: per valid value, the index in valid_soc where its
+            run of equal values starts.
+        gap_start, gap_end: first and last position of each NULL-SoC gap.
+        gap_before, gap_after: SoC right before/after each gap, NaN when
+            the gap is at the very beginning/end.
+    """
+
+    def __init__(self, soc: pd.Series):
+        self.soc = soc.to_numpy(dtype=float)
+        is_null = np.isnan(self.soc)
+
+        self.valid_pos = np.flatnonzero(~is_null)
+        self.valid_soc = self.soc[self.valid_pos]
+        run_starts = np.flatnonzero(
+            np.concatenate(([True], self.valid_soc[1:] != self.valid_soc[:-1]))
+        )
+        run_lengths = np.diff(np.append(run_starts, len(self.valid_soc)))
+        self.valid_run_start = np.repeat(run_starts, run_lengths)
+
+        edges = np.diff(np.concatenate(([0], is_null.view(np.int8), [0])))
+        self.gap_start = np.flatnonzero(edges == 1)
+        self.gap_end = np.flatnonzero(edges == -1) - 1
+        padded = np.concatenate(([np.nan], self.soc, [np.nan]))
+        self.gap_before = padded[self.gap_start]
+        self.gap_after = padded[self.gap_end + 2]
+
+
+def _expand_ranges(
+    starts: np.ndarray, ends: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """Expand inclusive [start, end] ranges to one entry per position.
+
+    Returns (range index, offset within the range) per position, so the
+    positions themselves are ``starts[index] + offset``.
+    """
+    lengths = ends - starts + 1
+    index = np.repeat(np.arange(len(starts)), lengths)
+    first = np.cumsum(lengths) - lengths
+    offset = np.arange(lengths.sum()) - np.repeat(first, lengths)
+    return index, offset
+
+
+def _count_in_ranges(
+    mask: np.ndarray, starts: np.ndarray, ends: np.ndarray
+) -> np.ndarray:
+    """Count the True values of mask in each inclusive [start, end] range."""
+    cumulative = np.concatenate(([0], np.cumsum(mask)))
+    return cumulative[ends + 1] - cumulative[starts]
+
+
+def _walk_back(
+    soc: np.ndarray,
+    energy_exceeds: np.ndarray,
+    availability_exceeds: np.ndarray,
+    last: int,
+    constant_value: float,
+) -> int:
+    """Walk back from position last over a constant SoC run (Type A-down).
+
+    The walk stops at the first row whose SoC deviates more than 0.1 from
+    constant_value, or where either exceedance counter (counting that row)
+    reaches EXCEEDANCE_THRESHOLD. NULL SoC rows are passed. The window
+    grows until the stop is found, so a walk costs about its length.
+
+    Returns the position of the stop row, -1 if the walk reached the start.
+    """
+    size = 64
+    while True:
+        first = max(last + 1 - size, 0)
+        window = slice(last, first - 1 if first else None, -1)
+        stops = (
+            (np.abs(soc[window] - constant_value) > 0.1)
+            | (np.cumsum(energy_exceeds[window]) >= EXCEEDANCE_THRESHOLD)
+            | (np.cumsum(availability_exceeds[window]) >= EXCEEDANCE_THRESHOLD)
+        )
+        if stops.any():
+            return last - int(stops.argmax())
+        if first == 0:
+            return -1
+        size *= 4
+
+
 # ---------------------------------------------------------------------------
 # Helper functions
 # ---------------------------------------------------------------------------
@@ -1178,6 +1606,9 @@ def _empty_summary() -> dict:
         "soc_constant_filled": 0,
         "app_state_inferred": 0,
         "violations": {},
+        "peak_memory_bytes": 0,
+        "rows_scanned": 0,
+        "rows_written": 0,
     }
 
 
@@ -1196,6 +1627,18 @@ def _total_repairs(summary: dict) -> int:
     )
 
 
+def _add_summary(total: dict, summary: dict) -> None:
+    """Add the counts and violations of summary to total, keep the peak."""
+    for key, value in summary.items():
+        if key == "violations":
+            for name, count in value.items():
+                total[key][name] = total[key].get(name, 0) + count
+        elif key == "peak_memory_bytes":
+            total[key] = max(total[key], value)
+        else:
+            total[key] += value
+
+
 def _format_summary(summary: dict) -> str:
     """Format repair summary for logging."""
     parts = []
@@ -1,21 +1,34 @@
 """Module for local SQLite data storage."""
 
 import sqlite3
+from bisect import bisect_left, bisect_right, insort
 from collections import Counter
-from datetime import datetime, timedelta, timezone
+from contextlib import contextmanager
+from datetime import date, datetime, time, timedelta, timezone, tzinfo
+from time import perf_counter
+from typing import Callable
 
+import numpy as np
 import pandas as pd
 from appdaemon.plugins.hass.hassapi import Hass
 
+from .data_export import export_csv
+from .event_bus import EventBus
 from .log_wrapper import get_class_method_logger
 
-CURRENT_SCHEMA_VERSION = 2
+CURRENT_SCHEMA_VERSION = 11
 
 PRICE_RATING_BINS = [0, 0.15, 0.35, 0.65, 0.85, 1.0]
 PRICE_RATING_LABELS = ["very_low", "low", "average", "high", "very_high"]
 
 VALID_GRANULARITIES = ("quarter_hours", "hours", "days", "weeks", "months", "years")
 
+# Commits of a DataStore.transaction() slower than this are logged as a warning.
+_SLOW_COMMIT_MS = 500
+
+# Granularities that are answered from the day rollups instead of interval_log.
+_COARSE_GRANULARITIES = ("days", "weeks", "months", "years")
+
 # Priority for app_state tiebreaking (lower number = higher priority).
 _APP_STATE_PRIORITY = {
     "error": 1,
@@ -28,6 +41,45 @@ _APP_STATE_PRIORITY = {
     "unknown": 8,
 }
 
+# Tables keyed on an INTEGER ``timestamp`` (Unix epoch seconds) since schema
+# v4. The public DataStore methods keep taking and returning ISO 8601
+# strings; iso_to_epoch/epoch_to_iso convert at that boundary.
+_EPOCH_TABLES = (
+    "interval_log",
+    "price_log",
+    "emission_log",
+    "grid_interval_log",
+    "pv_interval_log",
+)
+
+# Charge power statistics per interval in interval_log, added in schema v8.
+_POWER_STAT_COLUMNS = (
+    ("power_min_w", "REAL"),
+    ("power_max_w", "REAL"),
+    ("power_p95_w", "REAL"),
+    ("setpoint_changes", "INTEGER"),
+)
+
+
+# Upper bound for an open-ended range of epoch timestamps (SQLite INTEGER).
+_MAX_EPOCH = 2**63 - 1
+
+
+def iso_to_epoch(timestamp: str) -> int:
+    """Convert an ISO 8601 timestamp to Unix epoch seconds.
+
+    Timestamps without a UTC offset are taken to be in UTC.
+    """
+    dt = datetime.fromisoformat(timestamp)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+
+def epoch_to_iso(epoch: int) -> str:
+    """Convert Unix epoch seconds to an ISO 8601 timestamp in UTC."""
+    return datetime.fromtimestamp(epoch, timezone.utc).isoformat()
+
 
 def calculate_price_ratings(prices_df: pd.DataFrame) -> pd.Series:
     """Calculate price ratings based on percentile position of consumption price.
@@ -57,6 +109,132 @@ def calculate_price_ratings(prices_df: pd.DataFrame) -> pd.Series:
     return ratings.astype(str)
 
 
+def _rating_for_rank(rank_pct: float) -> str:
+    """Return the rating label of a percentile rank.
+
+    Matches pd.cut in calculate_price_ratings: right-closed bins with the
+    lowest edge included.
+    """
+    position = bisect_left(PRICE_RATING_BINS, rank_pct) - 1
+    return PRICE_RATING_LABELS[min(max(position, 0), len(PRICE_RATING_LABELS) - 1)]
+
+
+class PriceRatingWindow:
+    """Price ratings of a sliding price_log window, maintained incrementally.
+
+    Mirrors the rows of the last rated window (prices and the rating stored
+    in the database) and keeps their consumption prices in a sorted list.
+    Moving to an overlapping window only loads the rows that were not
+    covered yet, a changed price is one removal and one insertion in the
+    sorted list, and rate() returns just the rows whose rating bucket
+    changed. The labels are those of calculate_price_ratings over the same
+    window: the percentile rank of a price is its average 1-based position
+    among equal prices, divided by the window size (rank(pct=True)).
+
+    Timestamps are epoch seconds and window bounds are inclusive. Rows are
+    (timestamp, consumption price, production price, rating) tuples.
+    """
+
+    def __init__(self):
+        self.__start: int | None = None
+        self.__end: int | None = None
+        self.__rows: dict[int, list] = {}
+        self.__sorted: list[float] = []
+
+    def reset(self) -> None:
+        """Forget the window, e.g. after a rollback; the next slide reloads it."""
+        self.__start = self.__end = None
+        self.__rows = {}
+        self.__sorted = []
+
+    def slide(
+        self, start: int, end: int, load: Callable[[int, int], list[tuple]]
+    ) -> None:
+        """Move the window to [start, end].
+
+        ``load(first, last)`` returns the stored rows in [first, last]; it
+        is only called for the parts the current window does not cover.
+        """
+        if self.__start is None or start > self.__end or end < self.__start:
+            self.reset()
+            missing = [(start, end)]
+        else:
+            for timestamp in [ts for ts in self.__rows if not start <= ts <= end]:
+                self.__remove(timestamp)
+            missing = []
+            if start < self.__start:
+                missing.append((start, self.__start - 1))
+            if end > self.__end:
+                missing.append((self.__end + 1, end))
+        self.__start, self.__end = start, end
+        for first, last in missing:
+            for row in load(first, last):
+                self.__set(*row)
+
+    def apply(self, rows: list[tuple]) -> None:
+        """Record rows written as they are; rows outside the window are ignored."""
+        if self.__start is None:
+            return
+        for row in rows:
+            if self.__start <= row[0] <= self.__end:
+                self.__set(*row)
+
+    def update(self, rows: list[tuple]) -> list[tuple]:
+        """Take over the prices of rows that are about to be rated.
+
+        Returns (timestamp, consumption price, production price) of the rows
+        whose prices differ from the stored ones, or that are new; only
+        those need writing. Their rating is settled by rate().
+        """
+        changed = []
+        for timestamp, consumption, production, _ in rows:
+            stored = self.__rows.get(timestamp)
+            if stored is not None and stored[:2] == [consumption, production]:
+                continue
+            rating = stored[2] if stored is not None else None
+            self.__set(timestamp, consumption, production, rating)
+            changed.append((timestamp, consumption, production))
+        return changed
+
+    def rating(self, timestamp: int) -> str | None:
+        """Return the rating recorded for a row of the window."""
+        return self.__rows[timestamp][2]
+
+    def rate(self) -> dict[int, str]:
+        """Rate the window; return {timestamp: rating} of the changed rows.
+
+        The new ratings are recorded as stored, so the caller must write
+        them (or reset() if that fails).
+        """
+        count = len(self.__sorted)
+        changed = {}
+        for timestamp, row in self.__rows.items():
+            # Average of the 1-based positions first..last of equal prices.
+            first = bisect_left(self.__sorted, row[0]) + 1
+            last = bisect_right(self.__sorted, row[0])
+            rating = _rating_for_rank((first + last) / 2 / count)
+            if rating != row[2]:
+                row[2] = rating
+                changed[timestamp] = rating
+        return changed
+
+    def __set(
+        self,
+        timestamp: int,
+        consumption: float,
+        production: float,
+        rating: str | None,
+    ) -> None:
+        if timestamp in self.__rows:
+            self.__remove(timestamp)
+        self.__rows[timestamp] = [consumption, production, rating]
+        insort(self.__sorted, consumption)
+
+    def __remove(self, timestamp: int) -> None:
+        consumption = self.__rows.pop(timestamp)[0]
+        del self.__sorted[bisect_left(self.__sorted, consumption)]
+
+
 def _period_key(timestamp_str: str, granularity: str) -> str:
     """Compute the period bucket key for a given timestamp and granularity.
 
@@ -162,61 +340,160 @@ def _dominant_price_rating(ratings: list) -> str | None:
 
 _DT_HOURS = 5 / 60  # 5-minute interval in hours
 
-
-def _calculate_savings(intervals: list[dict]) -> dict:
-    """Calculate savings vs naive charging for a set of intervals.
-
-    Returns a dict with savings_fixed_eur, savings_dynamic_eur, and
-    soc_depletion_correction_eur. Returns None values when insufficient
-    data is available (no naive_power_w or no prices).
-
-    Savings = naive_cost - algorithm_cost + soc_depletion_correction.
-    The SoC depletion correction compensates for any difference in
-    battery state between naive and real charging at the period boundaries.
+# Additive columns of interval_rollup. Together with the first/last SoC
+# columns these are the "partial totals" of a bucket: two adjacent buckets
+# can be merged without going back to interval_log.
+_TOTALS_SUM_COLUMNS = (
+    "interval_count",
+    "repaired_count",
+    "availability_sum",
+    "availability_count",
+    "charge_kwh",
+    "charge_cost",
+    "charge_co2_kg",
+    "charge_count",
+    "discharge_kwh",
+    "discharge_revenue",
+    "discharge_co2_kg",
+    "discharge_count",
+    "algo_cost",
+    "naive_count",
+    "naive_cost_dynamic",
+    "dynamic_price_count",
+    "naive_cost_fixed",
+    "fixed_price_count",
+    "cons_price_sum",
+    "cons_price_count",
+)
+_TOTALS_FIRST_LAST_COLUMNS = (
+    "first_soc_pct",
+    "last_soc_pct",
+    "first_naive_soc_pct",
+    "last_naive_soc_pct",
+)
+_TOTALS_COLUMNS = _TOTALS_SUM_COLUMNS + _TOTALS_FIRST_LAST_COLUMNS
+# Bucket reductions the quarter-hour format needs on top of the totals.
+_QUARTER_EXTRA_COLUMNS = ("energy_kwh", "prod_price_sum", "prod_price_count")
+
+
+def _new_totals() -> dict:
+    """Return empty partial totals for a period bucket."""
+    totals = dict.fromkeys(_TOTALS_SUM_COLUMNS, 0)
+    for key in ("algo_cost", "naive_cost_dynamic", "naive_cost_fixed"):
+        totals[key] = 0.0
+    totals.update(dict.fromkeys(_TOTALS_FIRST_LAST_COLUMNS))
+    return totals
+
+
+def _add_interval_to_totals(totals: dict, interval: dict) -> None:
+    """Accumulate a single 5-minute interval (joined row) into totals.
+
+    Intervals must be added in chronological order so the first/last SoC
+    values are correct.
     """
-    from . import constants as c
-
-    # Collect per-interval costs for algorithm and naive scenarios.
-    algo_cost_total = 0.0
-    naive_cost_dynamic_total = 0.0
-    naive_cost_fixed_total = 0.0
-    has_naive = False
-    has_dynamic_price = False
-    has_fixed_price = False
-
-    for i in intervals:
-        energy = i["energy_kwh"]
-        naive_power = i["naive_power_w"]
-        cons_price = i["consumption_price_kwh"]
-        ref_price = i["ref_price_kwh"]
-
-        # Algorithm cost (actual energy × actual price).
-        if energy is not None and cons_price is not None:
-            if energy > 0:
-                algo_cost_total += energy * cons_price
-            elif energy < 0:
-                prod_price = i["production_price_kwh"]
-                if prod_price is not None:
-                    algo_cost_total -= abs(energy) * prod_price
-
-        if naive_power is None:
-            continue
-        has_naive = True
-
+    energy = interval.get("energy_kwh")
+    cons_price = interval.get("consumption_price_kwh")
+    prod_price = interval.get("production_price_kwh")
+    emission = interval.get("emission_intensity_kg_mwh")
+
+    totals["interval_count"] += 1
+    if interval.get("is_repaired") == 1:
+        totals["repaired_count"] += 1
+
+    availability = interval.get("availability_pct")
+    if availability is not None:
+        totals["availability_sum"] += availability
+        totals["availability_count"] += 1
+
+    # Charge/discharge split (skip None — no measurement available)
+    if energy is not None and energy > 0:
+        totals["charge_kwh"] += energy
+        totals["charge_count"] += 1
+        if cons_price is not None:
+            totals["charge_cost"] += energy * cons_price
+        if emission is not None:
+            totals["charge_co2_kg"] += energy * emission / 1000
+    elif energy is not None and energy < 0:
+        totals["discharge_kwh"] += abs(energy)
+        totals["discharge_count"] += 1
+        if prod_price is not None:
+            totals["discharge_revenue"] += abs(energy) * prod_price
+        if emission is not None:
+            totals["discharge_co2_kg"] += abs(energy) * emission / 1000
+
+    # Algorithm cost for savings (actual energy × actual price).
+    if energy is not None and cons_price is not None:
+        if energy > 0:
+            totals["algo_cost"] += energy * cons_price
+        elif energy < 0 and prod_price is not None:
+            totals["algo_cost"] -= abs(energy) * prod_price
+
+    naive_power = interval.get("naive_power_w")
+    if naive_power is not None:
+        totals["naive_count"] += 1
         # Naive energy in kWh for this interval.
         naive_kwh = (naive_power / 1000.0) * _DT_HOURS
-
         # Naive cost on dynamic tariff.
         if cons_price is not None:
-            naive_cost_dynamic_total += naive_kwh * cons_price
-            has_dynamic_price = True
-
+            totals["naive_cost_dynamic"] += naive_kwh * cons_price
+            totals["dynamic_price_count"] += 1
         # Naive cost on fixed (CBS) tariff.
+        ref_price = interval.get("ref_price_kwh")
         if ref_price is not None:
-            naive_cost_fixed_total += naive_kwh * ref_price
-            has_fixed_price = True
+            totals["naive_cost_fixed"] += naive_kwh * ref_price
+            totals["fixed_price_count"] += 1
+
+    if cons_price is not None:
+        totals["cons_price_sum"] += cons_price
+        totals["cons_price_count"] += 1
+
+    soc = interval.get("soc_pct")
+    if soc is not None:
+        if totals["first_soc_pct"] is None:
+            totals["first_soc_pct"] = soc
+        totals["last_soc_pct"] = soc
+    naive_soc = interval.get("naive_soc_pct")
+    if naive_soc is not None:
+        if totals["first_naive_soc_pct"] is None:
+            totals["first_naive_soc_pct"] = naive_soc
+        totals["last_naive_soc_pct"] = naive_soc
+
+
+def _totals_from_intervals(intervals: list[dict]) -> dict:
+    """Build partial totals from chronologically ordered intervals."""
+    totals = _new_totals()
+    for interval in intervals:
+        _add_interval_to_totals(totals, interval)
+    return totals
+
+
+def _merge_totals(totals: dict, later: dict) -> None:
+    """Merge the totals of a later bucket into ``totals`` (in place)."""
+    for key in _TOTALS_SUM_COLUMNS:
+        totals[key] += later[key]
+    for prefix in ("soc_pct", "naive_soc_pct"):
+        if totals[f"first_{prefix}"] is None:
+            totals[f"first_{prefix}"] = later[f"first_{prefix}"]
+        if later[f"last_{prefix}"] is not None:
+            totals[f"last_{prefix}"] = later[f"last_{prefix}"]
+
+
+def _add_totals(buckets: dict[str, dict], key: str, totals: dict) -> None:
+    """Merge totals into buckets[key], in chronological order of arrival."""
+    if key in buckets:
+        _merge_totals(buckets[key], totals)
+    else:
+        buckets[key] = totals
+
+
+def _savings_from_totals(totals: dict) -> dict:
+    """Calculate savings vs naive charging from partial totals.
+
+    See _calculate_savings for the definition.
+    """
+    from . import constants as c
 
-    if not has_naive:
+    if totals["naive_count"] == 0:
         return {
             "savings_fixed_eur": None,
             "savings_dynamic_eur": None,
@@ -225,32 +502,31 @@ def _calculate_savings(intervals: list[dict]) -> dict:
     # SoC depletion correction: compensate for difference in battery state.
     # Uses first/last valid SoC values for both real and naive.
     correction = 0.0
-    real_socs = [i["soc_pct"] for i in intervals if i["soc_pct"] is not None]
-    naive_socs = [
-        i["naive_soc_pct"] for i in intervals if i["naive_soc_pct"] is not None
-    ]
-    if real_socs and naive_socs:
-        real_delta = real_socs[-1] - real_socs[0]
-        naive_delta = naive_socs[-1] - naive_socs[0]
+    if (
+        totals["first_soc_pct"] is not None
+        and totals["first_naive_soc_pct"] is not None
+    ):
+        real_delta = totals["last_soc_pct"] - totals["first_soc_pct"]
+        naive_delta = totals["last_naive_soc_pct"] - totals["first_naive_soc_pct"]
         soc_diff = naive_delta - real_delta
         capacity = c.CAR_MAX_CAPACITY_IN_KWH
         # Average consumption price for valuation.
-        cons_prices = [
-            i["consumption_price_kwh"]
-            for i in intervals
-            if i["consumption_price_kwh"] is not None
-        ]
-        avg_price = sum(cons_prices) / len(cons_prices) if cons_prices else 0.0
+        avg_price = (
+            totals["cons_price_sum"] / totals["cons_price_count"]
+            if totals["cons_price_count"]
+            else 0.0
+        )
         correction = (soc_diff / 100) * capacity * avg_price
 
+    algo_cost_total = totals["algo_cost"]
     savings_dynamic = (
-        round(naive_cost_dynamic_total - algo_cost_total + correction, 4)
-        if has_dynamic_price
+        round(totals["naive_cost_dynamic"] - algo_cost_total + correction, 4)
+        if totals["dynamic_price_count"]
         else None
     )
     savings_fixed = (
-        round(naive_cost_fixed_total - algo_cost_total + correction, 4)
-        if has_fixed_price
+        round(totals["naive_cost_fixed"] - algo_cost_total + correction, 4)
+        if totals["fixed_price_count"]
         else None
     )
 
@@ -260,6 +536,1139 @@ def _calculate_savings(intervals: list[dict]) -> dict:
     }
 
 
+def _calculate_savings(intervals: list[dict]) -> dict:
+    """Calculate savings vs naive charging for a set of intervals.
+
+    Returns a dict with savings_fixed_eur, savings_dynamic_eur, and
+    soc_depletion_correction_eur. Returns None values when insufficient
+    data is available (no naive_power_w or no prices).
+
+    Savings = naive_cost - algorithm_cost + soc_depletion_correction.
+    The SoC depletion correction compensates for any difference in
+    battery state between naive and real charging at the period boundaries.
+    """
+    return _savings_from_totals(_totals_from_intervals(intervals))
+
+
+def _totals_to_period(period_start: str, totals: dict) -> dict:
+    """Format partial totals as a day/week/month/year result dict."""
+    avg_availability = (
+        totals["availability_sum"] / totals["availability_count"]
+        if totals["availability_count"]
+        else None
+    )
+    charge_kwh = totals["charge_kwh"]
+    discharge_kwh = totals["discharge_kwh"]
+    charge_cost = totals["charge_cost"]
+    discharge_revenue = totals["discharge_revenue"]
+    co2_kg = totals["charge_co2_kg"] - totals["discharge_co2_kg"]
+
+    return {
+        "period_start": period_start,
+        "availability_pct": (
+            round(avg_availability, 1) if avg_availability is not None else None
+        ),
+        "charge_kwh": round(charge_kwh, 2),
+        "charge_cost": round(charge_cost, 4),
+        "charge_co2_kg": round(totals["charge_co2_kg"], 1),
+        "charge_duration_min": 5 * totals["charge_count"],
+        "discharge_kwh": round(discharge_kwh, 2),
+        "discharge_revenue": round(discharge_revenue, 4),
+        "discharge_co2_kg": round(totals["discharge_co2_kg"], 1),
+        "discharge_duration_min": 5 * totals["discharge_count"],
+        "net_kwh": round(charge_kwh - discharge_kwh, 2),
+        "net_cost": round(charge_cost - discharge_revenue, 4),
+        "co2_kg": round(co2_kg, 1),
+        "has_repaired": totals["repaired_count"] > 0,
+        **_savings_from_totals(totals),
+    }
+
+
+def _totals_to_quarter(
+    period_start: str,
+    totals: dict,
+    extras: dict,
+    app_state: str,
+    price_rating: str | None,
+) -> dict:
+    """Format bucket reductions as a 15-min quarter result dict."""
+    consumption_price = (
+        totals["cons_price_sum"] / totals["cons_price_count"]
+        if totals["cons_price_count"]
+        else None
+    )
+    production_price = (
+        extras["prod_price_sum"] / extras["prod_price_count"]
+        if extras["prod_price_count"]
+        else None
+    )
+    co2_kg = totals["charge_co2_kg"] - totals["discharge_co2_kg"]
+
+    return {
+        "period_start": period_start,
+        "app_state": app_state,
+        "consumption_price": (
+            round(consumption_price, 5) if consumption_price is not None else None
+        ),
+        "production_price": (
+            round(production_price, 5) if production_price is not None else None
+        ),
+        "price_rating": price_rating,
+        "soc_pct": totals["last_soc_pct"],
+        "energy_wh": round(extras["energy_kwh"] * 1000),
+        "charge_cost": round(totals["charge_cost"], 4),
+        "discharge_revenue": round(totals["discharge_revenue"], 4),
+        "charge_co2_kg": round(totals["charge_co2_kg"], 1),
+        "discharge_co2_kg": round(totals["discharge_co2_kg"], 1),
+        "co2_kg": round(co2_kg, 1),
+        "has_repaired": totals["repaired_count"] > 0,
+        **_savings_from_totals(totals),
+    }
+
+
+def _totals_to_hour(
+    period_start: str, totals: dict, app_state: str, price_rating: str | None
+) -> dict:
+    """Format bucket reductions as a 1-hour result dict."""
+    charge_kwh = totals["charge_kwh"]
+    discharge_kwh = totals["discharge_kwh"]
+    charge_cost = totals["charge_cost"]
+    discharge_revenue = totals["discharge_revenue"]
+
+    # Weighted average price
+    total_kwh = charge_kwh + discharge_kwh
+    if total_kwh > 0:
+        avg_price = (charge_cost + discharge_revenue) / total_kwh
+    elif totals["cons_price_count"]:
+        # No energy flow — simple average of available consumption prices
+        avg_price = totals["cons_price_sum"] / totals["cons_price_count"]
+    else:
+        avg_price = None
+    co2_kg = totals["charge_co2_kg"] - totals["discharge_co2_kg"]
+
+    return {
+        "period_start": period_start,
+        "app_state": app_state,
+        "avg_price": (round(avg_price, 5) if avg_price is not None else None),
+        "price_rating": price_rating,
+        "charge_wh": round(charge_kwh * 1000),
+        "charge_cost": round(charge_cost, 4),
+        "charge_co2_kg": round(totals["charge_co2_kg"], 1),
+        "charge_duration_min": 5 * totals["charge_count"],
+        "discharge_wh": round(discharge_kwh * 1000),
+        "discharge_revenue": round(discharge_revenue, 4),
+        "discharge_co2_kg": round(totals["discharge_co2_kg"], 1),
+        "discharge_duration_min": 5 * totals["discharge_count"],
+        "soc_pct": totals["last_soc_pct"],
+        "co2_kg": round(co2_kg, 1),
+        "has_repaired": totals["repaired_count"] > 0,
+        **_savings_from_totals(totals),
+    }
+
+
+# ── Columnar aggregation ───────────────────────────────────────────
+#
+# Joined intervals are read into a DataFrame and every bucket metric is
+# computed with one grouped NumPy reduction over the whole range, instead
+# of several generator passes over a list of dicts per bucket. Rows are
+# stably sorted by bucket, so each bucket is a contiguous slice that keeps
+# the chronological row order the first/last SoC and the app_state runs
+# depend on.
+
+# Reference prices are not joined here: resolving "the most recent month on
+# or before" in SQL needs a correlated subquery per interval row. They are
+# looked up afterwards in a month step index instead (see
+# _resolve_reference_prices).
+_FETCH_INTERVALS_WITH_JOINS_SQL = (
+    "SELECT i.timestamp, i.energy_kwh, i.app_state, "
+    "i.soc_pct, i.availability_pct, i.is_repaired, "
+    "i.naive_power_w, i.naive_soc_pct, "
+    "p.consumption_price_kwh, p.production_price_kwh, p.price_rating, "
+    "e.emission_intensity_kg_mwh "
+    "FROM interval_log i "
+    "LEFT JOIN price_log p ON i.timestamp = p.timestamp "
+    "LEFT JOIN emission_log e ON i.timestamp = e.timestamp "
+    "WHERE i.timestamp >= ? AND i.timestamp < ? "
+    "AND i.is_repaired < 2 "
+    "ORDER BY i.timestamp"
+)
+
+# Nullable numeric columns of the joined frame; NULL becomes NaN.
+_FRAME_FLOAT_COLUMNS = (
+    "energy_kwh",
+    "soc_pct",
+    "availability_pct",
+    "naive_power_w",
+    "naive_soc_pct",
+    "consumption_price_kwh",
+    "production_price_kwh",
+    "emission_intensity_kg_mwh",
+    "ref_price_kwh",
+)
+
+
+def _month_number(month: str) -> int:
+    """Return a YYYY-MM month as a sortable month count."""
+    year, month_of_year = month.split("-")
+    return int(year) * 12 + int(month_of_year) - 1
+
+
+def _load_reference_prices(conn: sqlite3.Connection) -> tuple[np.ndarray, np.ndarray]:
+    """Load reference_price_log as a step index: (month numbers, prices).
+
+    Both arrays are sorted by month; a month's price applies until the next
+    month in the index.
+    """
+    rows = conn.execute(
+        "SELECT month, total_price_eur_kwh FROM reference_price_log ORDER BY month"
+    ).fetchall()
+    months = np.array([_month_number(row[0]) for row in rows], dtype=np.int64)
+    prices = np.array([row[1] for row in rows], dtype=float)
+    return months, prices
+
+
+def _resolve_reference_prices(
+    utc: pd.Series, reference_prices: tuple[np.ndarray, np.ndarray]
+) -> np.ndarray:
+    """Look up the reference price per interval (NaN if none applies).
+
+    Uses the price of the most recent month on or before the interval's UTC
+    month, like get_reference_price.
+    """
+    months, prices = reference_prices
+    if len(months) == 0:
+        return np.full(len(utc), np.nan)
+    interval_months = (utc.dt.year * 12 + utc.dt.month - 1).to_numpy()
+    positions = np.searchsorted(months, interval_months, side="right") - 1
+    return np.where(positions >= 0, prices[np.maximum(positions, 0)], np.nan)
+
+
+def _fetch_interval_frame(
+    conn: sqlite3.Connection,
+    start: str,
+    end: str,
+    reference_prices: tuple[np.ndarray, np.ndarray] | None = None,
+) -> pd.DataFrame:
+    """Fetch intervals with joined price, emission and reference price data.
+
+    Adds the parsed timestamps as a ``utc`` column. ``reference_prices`` is
+    a step index from _load_reference_prices; it is loaded from ``conn``
+    when not given.
+    """
+    cursor = conn.cursor()
+    # Plain tuples: building sqlite3.Row objects only to unpack them again
+    # is a noticeable share of the fetch time for long ranges.
+    cursor.row_factory = None
+    cursor.execute(
+        _FETCH_INTERVALS_WITH_JOINS_SQL, (iso_to_epoch(start), iso_to_epoch(end))
+    )
+    columns = [description[0] for description in cursor.description]
+    frame = pd.DataFrame.from_records(cursor.fetchall(), columns=columns)
+    cursor.close()
+    frame["utc"] = pd.to_datetime(frame["timestamp"], unit="s", utc=True)
+    if reference_prices is None:
+        reference_prices = _load_reference_prices(conn)
+    frame["ref_price_kwh"] = _resolve_reference_prices(frame["utc"], reference_prices)
+    for column in _FRAME_FLOAT_COLUMNS:
+        frame[column] = frame[column].astype(float)
+    return frame
+
+
+def _slice_frame(frame: pd.DataFrame, start: int, end: int) -> pd.DataFrame:
+    """Return the rows of a fetched interval frame in [start, end) epoch."""
+    lo, hi = np.searchsorted(frame["timestamp"].to_numpy(), [start, end])
+    return frame.iloc[lo:hi].reset_index(drop=True)
+
+
+def _merge_spans(spans) -> list[tuple[int, int]]:
+    """Merge overlapping or adjacent (start, end) spans, in order."""
+    merged: list[list[int]] = []
+    for start, end in sorted(spans):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+def _period_keys(timestamps: pd.Series, granularity: str) -> np.ndarray:
+    """Vectorized _period_key for a column of ISO 8601 timestamps.
+
+    Also accepts already parsed UTC timestamps.
+
+    Rows are reduced to their local bucket with datetime64 arithmetic and
+    each distinct bucket is formatted once, in the same format as
+    _period_key.
+    """
+    from . import constants as c
+
+    if granularity not in VALID_GRANULARITIES:
+        raise ValueError(f"Unknown granularity: {granularity}")
+    parsed = pd.to_datetime(timestamps, utc=True)
+    utc = parsed.dt.tz_localize(None)
+    wall = parsed.dt.tz_convert(c.TZ).dt.tz_localize(None)
+
+    if granularity in ("quarter_hours", "hours"):
+        floored = wall.dt.floor("15min" if granularity == "quarter_hours" else "h")
+        # The UTC start of the bucket identifies both the local wall time
+        # and the UTC offset, so a repeated hour at DST fall-back stays apart.
+        codes, _ = pd.factorize(floored - (wall - utc))
+        _, first_rows = np.unique(codes, return_index=True)
+        offsets = (wall - utc).to_numpy()[first_rows] // np.timedelta64(1, "m")
+        suffixes = {
+            minutes: f"{'-' if minutes < 0 else '+'}"
+            f"{abs(minutes) // 60:02d}:{abs(minutes) % 60:02d}"
+            for minutes in set(offsets.tolist())
+        }
+        local = np.datetime_as_string(floored.to_numpy()[first_rows], unit="s")
+        keys = np.array(
+            [
+                start + suffixes[minutes]
+                for start, minutes in zip(local.tolist(), offsets.tolist())
+            ],
+            dtype=object,
+        )
+        return keys[codes]
+
+    codes, days = pd.factorize(wall.dt.normalize())
+    days = pd.DatetimeIndex(days)
+    if granularity == "weeks":
+        calendar = days.isocalendar()
+        keys = np.array(
+            [
+                f"{year}-W{week:02d}"
+                for year, week in zip(
+                    calendar["year"].tolist(), calendar["week"].tolist()
+                )
+            ],
+            dtype=object,
+        )
+    else:
+        unit = {"days": "D", "months": "M", "years": "Y"}[granularity]
+        keys = np.datetime_as_string(
+            days.to_numpy().astype(f"datetime64[{unit}]"), unit=unit
+        ).astype(object)
+    return keys[codes]
+
+
+def _group_by_period(
+    frame: pd.DataFrame, granularity: str
+) -> tuple[pd.DataFrame, np.ndarray, np.ndarray, list[str]]:
+    """Sort a joined frame into contiguous period buckets.
+
+    Returns the sorted frame, the bucket code per row, the first row of
+    each bucket and the period keys (ascending, indexed by bucket code).
+    """
+    codes, periods = pd.factorize(_period_keys(frame["utc"], granularity), sort=True)
+    order = np.argsort(codes, kind="stable")
+    codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    return frame.iloc[order], codes, starts, list(periods)
+
+
+def _reduce_buckets(frame: pd.DataFrame, starts: np.ndarray) -> dict[str, list]:
+    """Reduce a bucket-sorted frame to the partial totals of each bucket.
+
+    Mirrors _add_interval_to_totals; additionally returns the net energy and
+    production price sums needed for the quarter-hour format.
+    """
+
+    def column(name):
+        return frame[name].to_numpy(dtype=float)
+
+    def bucket_sum(values):
+        return np.add.reduceat(values, starts).tolist()
+
+    def bucket_count(mask):
+        return np.add.reduceat(mask.astype(np.int64), starts).tolist()
+
+    def first_last(values):
+        positions = np.arange(len(values))
+        valid = ~np.isnan(values)
+        first = np.minimum.reduceat(np.where(valid, positions, len(values)), starts)
+        last = np.maximum.reduceat(np.where(valid, positions, -1), starts)
+        padded = np.r_[values, np.nan].astype(object)
+        padded[np.isnan(padded.astype(float))] = None
+        return padded[first].tolist(), padded[last].tolist()
+
+    energy = column("energy_kwh")
+    cons_price = column("consumption_price_kwh")
+    prod_price = column("production_price_kwh")
+    emission = column("emission_intensity_kg_mwh")
+    availability = column("availability_pct")
+    naive_power = column("naive_power_w")
+    ref_price = column("ref_price_kwh")
+
+    # NaN compares False, so intervals without a measurement are neither.
+    charging = energy > 0
+    discharging = energy < 0
+    has_cons = ~np.isnan(cons_price)
+    has_prod = ~np.isnan(prod_price)
+    has_emission = ~np.isnan(emission)
+    has_naive = ~np.isnan(naive_power)
+    has_ref = ~np.isnan(ref_price)
+    charge_cost = np.where(charging & has_cons, energy * cons_price, 0.0)
+    discharge_revenue = np.where(discharging & has_prod, -energy * prod_price, 0.0)
+    naive_kwh = (naive_power / 1000.0) * _DT_HOURS
+
+    reductions = {
+        "interval_count": np.diff(np.r_[starts, len(frame)]).tolist(),
+        "repaired_count": bucket_count(frame["is_repaired"].to_numpy() == 1),
+        "availability_sum": bucket_sum(np.nan_to_num(availability)),
+        "availability_count": bucket_count(~np.isnan(availability)),
+        "charge_kwh": bucket_sum(np.where(charging, energy, 0.0)),
+        "charge_cost": bucket_sum(charge_cost),
+        "charge_co2_kg": bucket_sum(
+            np.where(charging & has_emission, energy * emission / 1000, 0.0)
+        ),
+        "charge_count": bucket_count(charging),
+        "discharge_kwh": bucket_sum(np.where(discharging, -energy, 0.0)),
+        "discharge_revenue": bucket_sum(discharge_revenue),
+        "discharge_co2_kg": bucket_sum(
+            np.where(discharging & has_emission, -energy * emission / 1000, 0.0)
+        ),
+        "discharge_count": bucket_count(discharging),
+        "algo_cost": bucket_sum(
+            charge_cost - np.where(has_cons, discharge_revenue, 0.0)
+        ),
+        "naive_count": bucket_count(has_naive),
+        "naive_cost_dynamic": bucket_sum(
+            np.where(has_naive & has_cons, naive_kwh * cons_price, 0.0)
+        ),
+        "dynamic_price_count": bucket_count(has_naive & has_cons),
+        "naive_cost_fixed": bucket_sum(
+            np.where(has_naive & has_ref, naive_kwh * ref_price, 0.0)
+        ),
+        "fixed_price_count": bucket_count(has_naive & has_ref),
+        "cons_price_sum": bucket_sum(np.nan_to_num(cons_price)),
+        "cons_price_count": bucket_count(has_cons),
+        "energy_kwh": bucket_sum(np.nan_to_num(energy)),
+        "prod_price_sum": bucket_sum(np.nan_to_num(prod_price)),
+        "prod_price_count": bucket_count(has_prod),
+    }
+    for prefix in ("soc_pct", "naive_soc_pct"):
+        first, last = first_last(column(prefix))
+        reductions[f"first_{prefix}"] = first
+        reductions[f"last_{prefix}"] = last
+    return reductions
+
+
+def _bucket_app_states(states: np.ndarray, codes: np.ndarray) -> list[str]:
+    """Vectorized _dominant_app_state for each bucket of a sorted frame."""
+    run_starts = np.flatnonzero(
+        np.r_[True, (states[1:] != states[:-1]) | (codes[1:] != codes[:-1])]
+    )
+    run_lengths = np.diff(np.r_[run_starts, len(states)])
+    run_codes = codes[run_starts]
+    run_states = states[run_starts]
+    priorities = pd.Series(run_states).map(_APP_STATE_PRIORITY).fillna(99).to_numpy()
+    # Longest run first, then highest priority, then earliest run.
+    order = np.lexsort(
+        (np.arange(len(run_starts)), priorities, -run_lengths, run_codes)
+    )
+    ordered_codes = run_codes[order]
+    best = order[np.r_[True, ordered_codes[1:] != ordered_codes[:-1]]]
+    # More than one run in a bucket means more than one distinct state.
+    mixed = np.bincount(run_codes) > 1
+    return [
+        state + "+" if is_mixed else state
+        for state, is_mixed in zip(run_states[best].tolist(), mixed.tolist())
+    ]
+
+
+def _bucket_price_ratings(
+    ratings: pd.Series, codes: np.ndarray, bucket_count: int
+) -> list[str | None]:
+    """Vectorized _dominant_price_rating for each bucket of a sorted frame."""
+    result: list[str | None] = [None] * bucket_count
+    valid = ratings.notna().to_numpy()
+    if not valid.any():
+        return result
+    counted = (
+        pd.DataFrame(
+            {
+                "code": codes[valid],
+                "rating": ratings.to_numpy()[valid],
+                "position": np.flatnonzero(valid),
+            }
+        )
+        .groupby(["code", "rating"], sort=False)["position"]
+        .agg(["size", "min"])
+        .reset_index()
+    )
+    # Most frequent first; ties go to the rating seen first, like Counter.
+    winners = counted.sort_values(
+        ["code", "size", "min"], ascending=[True, False, True]
+    ).drop_duplicates("code")
+    for code, rating in zip(winners["code"].tolist(), winners["rating"].tolist()):
+        result[code] = rating
+    return result
+
+
+def _bucket_dicts(reductions: dict[str, list], columns: tuple) -> list[dict]:
+    """Transpose per-column bucket reductions into one dict per bucket."""
+    return [
+        dict(zip(columns, values))
+        for values in zip(*(reductions[column] for column in columns))
+    ]
+
+
+def _bucket_totals(frame: pd.DataFrame, granularity: str) -> dict[str, dict]:
+    """Partial totals per period bucket of a joined frame, in key order."""
+    if frame.empty:
+        return {}
+    frame, _, starts, periods = _group_by_period(frame, granularity)
+    totals = _bucket_dicts(_reduce_buckets(frame, starts), _TOTALS_COLUMNS)
+    return dict(zip(periods, totals))
+
+
+def _aggregate_frame(frame: pd.DataFrame, granularity: str) -> list[dict]:
+    """Aggregate a joined frame into one result dict per period bucket.
+
+    See DataStore.get_aggregated_data for the format per granularity.
+    """
+    if frame.empty:
+        return []
+    if granularity not in ("quarter_hours", "hours"):
+        return [
+            _totals_to_period(period_start, totals)
+            for period_start, totals in _bucket_totals(frame, granularity).items()
+        ]
+
+    frame, codes, starts, periods = _group_by_period(frame, granularity)
+    reductions = _reduce_buckets(frame, starts)
+    app_states = _bucket_app_states(frame["app_state"].to_numpy(dtype=object), codes)
+    price_ratings = _bucket_price_ratings(frame["price_rating"], codes, len(periods))
+    buckets = zip(
+        periods, _bucket_dicts(reductions, _TOTALS_COLUMNS), app_states, price_ratings
+    )
+    if granularity == "hours":
+        return [_totals_to_hour(*bucket) for bucket in buckets]
+    extras = _bucket_dicts(reductions, _QUARTER_EXTRA_COLUMNS)
+    return [
+        _totals_to_quarter(period_start, totals, bucket_extras, app_state, rating)
+        for (period_start, totals, app_state, rating), bucket_extras in zip(
+            buckets, extras
+        )
+    ]
+
+
+# ── Interval rollups ───────────────────────────────────────────────
+#
+# interval_rollup holds partial totals per quarter-hour, hour and local day.
+# Quarters are recomputed from interval_log, hours from quarters (and
+# archived hours) and days from hours, so a write touching one interval
+# only recomputes one bucket per level. Period keys depend on c.TZ;
+# interval_rollup_state records the timezone the rollups were built for,
+# and a mismatch (or a missing c.TZ) means the rollups are stale and must
+# be rebuilt before use.
+#
+# The functions take a connection instead of living on DataStore so that
+# the DataRepairer can maintain the rollups from its own executor thread.
+
+_ROLLUP_LEVELS = (
+    ("quarter_hours", None),
+    ("hours", "quarter_hours"),
+    ("days", "hours"),
+)
+_ROLLUP_CHUNK = timedelta(days=28)
+
+
+def _rollup_timezone_key() -> str | None:
+    """Return the key of the configured timezone, or None if not set yet."""
+    from . import constants as c
+
+    return str(c.TZ) if isinstance(c.TZ, tzinfo) else None
+
+
+def _rollups_current(conn: sqlite3.Connection) -> bool:
+    """Whether the rollups were built for the currently configured timezone."""
+    tz_key = _rollup_timezone_key()
+    if tz_key is None:
+        return False
+    row = conn.execute(
+        "SELECT value FROM interval_rollup_state WHERE key = 'timezone'"
+    ).fetchone()
+    return row is not None and row[0] == tz_key
+
+
+def _floor_quarter(dt: datetime) -> datetime:
+    """Round a datetime down to the start of its UTC quarter-hour."""
+    dt = dt.astimezone(timezone.utc)
+    return dt.replace(minute=(dt.minute // 15) * 15, second=0, microsecond=0)
+
+
+def _local_hour_start(dt: datetime) -> datetime:
+    """Return the start (as UTC) of the local hour containing dt."""
+    return datetime.fromisoformat(_period_key(dt.isoformat(), "hours")).astimezone(
+        timezone.utc
+    )
+
+
+def _local_day_start(dt: datetime) -> datetime:
+    """Return local midnight (as UTC) of the local day containing dt."""
+    from . import constants as c
+
+    local_date = dt.astimezone(c.TZ).date()
+    return datetime.combine(local_date, time(), tzinfo=c.TZ).astimezone(timezone.utc)
+
+
+def _next_local_day_start(dt: datetime) -> datetime:
+    """Return local midnight (as UTC) of the local day after the one containing dt."""
+    from . import constants as c
+
+    local_date = dt.astimezone(c.TZ).date() + timedelta(days=1)
+    return datetime.combine(local_date, time(), tzinfo=c.TZ).astimezone(timezone.utc)
+
+
+def _bucket_utc_start(period_start: str, granularity: str) -> str:
+    """Return the UTC start of a rollup bucket given its period key."""
+    from . import constants as c
+
+    if granularity == "days":
+        bucket = datetime.combine(
+            datetime.strptime(period_start, "%Y-%m-%d").date(), time(), tzinfo=c.TZ
+        )
+    else:
+        bucket = datetime.fromisoformat(period_start)
+    return bucket.astimezone(timezone.utc).isoformat()
+
+
+def page_end(start: str, end: str, granularity: str, periods: int) -> str:
+    """Return where a page of at most ``periods`` periods from start ends.
+
+    The page covers the (possibly partial) period containing start and the
+    periods after it, so it ends on a local period boundary and a period is
+    never split over two pages. Capped at end; both bounds are ISO 8601,
+    the result is UTC.
+    """
+    from . import constants as c
+
+    start_dt = datetime.fromisoformat(start)
+    if granularity == "quarter_hours":
+        boundary = _floor_quarter(start_dt) + timedelta(minutes=15 * periods)
+    elif granularity == "hours":
+        boundary = _local_hour_start(start_dt) + timedelta(hours=periods)
+    else:
+        local_date = start_dt.astimezone(c.TZ).date()
+        if granularity == "days":
+            local_date += timedelta(days=periods)
+        elif granularity == "weeks":
+            local_date += timedelta(days=7 * periods - local_date.weekday())
+        else:
+            if granularity == "months":
+                months = local_date.year * 12 + local_date.month - 1 + periods
+            elif granularity == "years":
+                months = (local_date.year + periods) * 12
+            else:
+                raise ValueError(f"Unknown granularity: {granularity}")
+            local_date = date(months // 12, months % 12 + 1, 1)
+        boundary = datetime.combine(local_date, time(), tzinfo=c.TZ)
+    end_dt = datetime.fromisoformat(end)
+    return min(boundary, end_dt).astimezone(timezone.utc).isoformat()
+
+
+def _replace_rollups(
+    conn: sqlite3.Connection,
+    granularity: str,
+    start: datetime,
+    end: datetime,
+    buckets: dict[str, dict],
+) -> None:
+    """Replace all rollup rows of one granularity in [start, end) with buckets.
+
+    Day buckets also get their calendar_day row.
+    """
+    conn.execute(
+        "DELETE FROM interval_rollup "
+        "WHERE granularity = ? AND utc_start >= ? AND utc_start < ?",
+        (granularity, start.isoformat(), end.isoformat()),
+    )
+    if not buckets:
+        return
+    columns = ("granularity", "period_start", "utc_start") + _TOTALS_COLUMNS
+    conn.executemany(
+        f"INSERT OR REPLACE INTO interval_rollup ({', '.join(columns)}) "
+        f"VALUES ({', '.join(':' + col for col in columns)})",
+        [
+            {
+                "granularity": granularity,
+                "period_start": period_start,
+                "utc_start": _bucket_utc_start(period_start, granularity),
+                **totals,
+            }
+            for period_start, totals in buckets.items()
+        ],
+    )
+    if granularity == "days":
+        conn.executemany(
+            "INSERT OR REPLACE INTO calendar_day "
+            "(utc_start, day, week, month, year) VALUES (?, ?, ?, ?, ?)",
+            [
+                (_bucket_utc_start(day, "days"), day, *_calendar_keys(day))
+                for day in buckets
+            ],
+        )
+
+
+def _calendar_keys(day: str) -> tuple[str, str, str]:
+    """Return the week, month and year period keys of a local day key."""
+    iso_year, iso_week, _ = date.fromisoformat(day).isocalendar()
+    return f"{iso_year}-W{iso_week:02d}", day[:7], day[:4]
+
+
+# Column of calendar_day holding the period key of each coarse granularity.
+_CALENDAR_COLUMNS = {"days": "day", "weeks": "week", "months": "month", "years": "year"}
+
+
+def _fetch_rollup_periods(
+    conn: sqlite3.Connection, granularity: str, start: str, end: str
+) -> list[tuple[str, dict]]:
+    """Merge the day rollups in [start, end) into coarse periods, in SQL.
+
+    calendar_day holds the local period keys of each rollup day (computed
+    once, when the day rollup is written), so the days are grouped with
+    GROUP BY instead of converting each day to local time. Sums come from
+    one query; each first/last SoC column from one more, where SQLite takes
+    the bare column from the row with the MIN/MAX utc_start.
+
+    Returns:
+        (period_start, totals) per period, in chronological order.
+    """
+    key = _CALENDAR_COLUMNS[granularity]
+    source = (
+        "FROM interval_rollup r JOIN calendar_day c ON c.utc_start = r.utc_start "
+        "WHERE r.granularity = 'days' AND r.utc_start >= ? AND r.utc_start < ? "
+    )
+    cursor = conn.cursor()
+    cursor.execute(
+        f"SELECT c.{key}, "
+        + ", ".join(f"SUM(r.{col})" for col in _TOTALS_SUM_COLUMNS)
+        + f" {source} GROUP BY c.{key} ORDER BY MIN(r.utc_start)",
+        (start, end),
+    )
+    periods = {
+        row[0]: {
+            **dict(zip(_TOTALS_SUM_COLUMNS, row[1:])),
+            **dict.fromkeys(_TOTALS_FIRST_LAST_COLUMNS),
+        }
+        for row in cursor.fetchall()
+    }
+    for col in _TOTALS_FIRST_LAST_COLUMNS:
+        pick = "MIN" if col.startswith("first_") else "MAX"
+        cursor.execute(
+            f"SELECT c.{key}, {pick}(r.utc_start), r.{col} {source}"
+            f"AND r.{col} IS NOT NULL GROUP BY c.{key}",
+            (start, end),
+        )
+        for period, _, value in cursor.fetchall():
+            periods[period][col] = value
+    cursor.close()
+    return list(periods.items())
+
+
+def _fetch_rollups(
+    conn: sqlite3.Connection, granularity: str, start: str, end: str
+) -> list[tuple[str, str, dict]]:
+    """Fetch rollup rows as (period_start, utc_start, totals), ordered by time."""
+    cursor = conn.cursor()
+    cursor.execute(
+        f"SELECT period_start, utc_start, {', '.join(_TOTALS_COLUMNS)} "
+        "FROM interval_rollup "
+        "WHERE granularity = ? AND utc_start >= ? AND utc_start < ? "
+        "ORDER BY utc_start",
+        (granularity, start, end),
+    )
+    rows = [
+        (row[0], row[1], dict(zip(_TOTALS_COLUMNS, row[2:])))
+        for row in cursor.fetchall()
+    ]
+    cursor.close()
+    return rows
+
+
+def _recompute_rollups(
+    conn: sqlite3.Connection, start: datetime, end: datetime
+) -> None:
+    """Recompute all rollup buckets covering the intervals in [start, end]."""
+    quarter_start = _floor_quarter(start)
+    quarter_end = _floor_quarter(end) + timedelta(minutes=15)
+    last_quarter = quarter_end - timedelta(minutes=15)
+    bounds = {
+        "quarter_hours": (quarter_start, quarter_end),
+        "hours": (
+            _local_hour_start(quarter_start),
+            _local_hour_start(last_quarter) + timedelta(hours=1),
+        ),
+        "days": (
+            _local_day_start(quarter_start),
+            _next_local_day_start(last_quarter),
+        ),
+    }
+
+    # Walk day-aligned chunks so a full rebuild never holds more than a few
+    # weeks of rows in memory; quarters and hours nest inside local days.
+    chunk_start = bounds["days"][0]
+    while chunk_start < bounds["days"][1]:
+        chunk_end = min(
+            _local_day_start(chunk_start + _ROLLUP_CHUNK), bounds["days"][1]
+        )
+        if chunk_end <= chunk_start:
+            chunk_end = bounds["days"][1]
+        for granularity, child in _ROLLUP_LEVELS:
+            level_start = max(bounds[granularity][0], chunk_start)
+            level_end = min(bounds[granularity][1], chunk_end)
+            if level_start >= level_end:
+                continue
+            buckets: dict[str, dict] = {}
+            if child is None:
+                buckets = _bucket_totals(
+                    _fetch_interval_frame(
+                        conn, level_start.isoformat(), level_end.isoformat()
+                    ),
+                    granularity,
+                )
+            else:
+                if granularity == "hours":
+                    # Archived hours have no quarters; they precede them.
+                    buckets = _archive_totals(
+                        conn, level_start.isoformat(), level_end.isoformat(), "hours"
+                    )
+                for _, utc_start, totals in _fetch_rollups(
+                    conn, child, level_start.isoformat(), level_end.isoformat()
+                ):
+                    _add_totals(buckets, _period_key(utc_start, granularity), totals)
+            _replace_rollups(conn, granularity, level_start, level_end, buckets)
+        chunk_start = chunk_end
+
+
+# data_version counts the changes to the aggregated data per UTC day
+# (epoch // 86400); _ALL_DAYS counts changes that may touch every day
+# (rollup invalidation or rebuild). Versions only go up, so their sum over
+# a range changes whenever data in that range changed: ApiServer caches
+# query results against it. They are bumped wherever the rollups are
+# refreshed, which every write to aggregated data already does.
+_ALL_DAYS = -1
+
+
+def _bump_data_versions(conn: sqlite3.Connection, days: list[int]) -> None:
+    """Increment the data versions of the given days."""
+    conn.executemany(
+        "INSERT INTO data_version (day, version) VALUES (?, 1) "
+        "ON CONFLICT (day) DO UPDATE SET version = version + 1",
+        [(day,) for day in days],
+    )
+
+
+def data_versions(conn: sqlite3.Connection, start: int, end: int) -> tuple[int, int]:
+    """Return the data versions of epoch range [start, end) and of all data."""
+    row = conn.execute(
+        "SELECT COALESCE(SUM(version), 0), COALESCE(SUM(CASE WHEN day = ? "
+        "OR day BETWEEN ? AND ? THEN version END), 0) FROM data_version",
+        (_ALL_DAYS, start // 86400, (end - 1) // 86400),
+    ).fetchone()
+    return row[1], row[0]
+
+
+def mark_dirty(conn: sqlite3.Connection, start: int, end: int) -> None:
+    """Record that the intervals in epoch range [start, end] need a repair pass.
+
+    Only appends a row; dirty_ranges coalesces them. Does not commit.
+    """
+    conn.execute(
+        "INSERT INTO repair_dirty_range (start, end) VALUES (?, ?)", (start, end)
+    )
+
+
+def dirty_ranges(
+    conn: sqlite3.Connection, margin: int = 0
+) -> tuple[list[tuple[int, int]], int]:
+    """Return the coalesced dirty epoch ranges and the last rowid read.
+
+    Each range is widened by margin seconds on both sides before ranges
+    that overlap or adjoin (5-minute intervals in a row) are merged. Pass
+    the rowid to clear_dirty_ranges once the ranges are repaired, so
+    ranges marked in the meantime are kept for the next pass.
+    """
+    rows = conn.execute("SELECT rowid, start, end FROM repair_dirty_range").fetchall()
+    if not rows:
+        return [], 0
+    spans = _merge_spans((row[1] - margin, row[2] + margin + 300) for row in rows)
+    return [(start, end - 300) for start, end in spans], max(row[0] for row in rows)
+
+
+def clear_dirty_ranges(
+    conn: sqlite3.Connection, up_to: int, since: int | None = None
+) -> None:
+    """Delete the dirty ranges up to rowid up_to (see dirty_ranges).
+
+    With since, only the ranges that start at or after that epoch: a pass
+    that repaired [since, ...) leaves the ranges before it to the next.
+    """
+    if since is None:
+        conn.execute("DELETE FROM repair_dirty_range WHERE rowid <= ?", (up_to,))
+    else:
+        conn.execute(
+            "DELETE FROM repair_dirty_range WHERE rowid <= ? AND start >= ?",
+            (up_to, since),
+        )
+    conn.commit()
+
+
+def refresh_interval_rollups(
+    conn: sqlite3.Connection, start: str, end: str, commit: bool = True
+) -> None:
+    """Update the rollups after interval-related rows in [start, end] changed.
+
+    Both bounds are inclusive interval timestamps. Also bumps the data
+    versions of the range. Leaves stale rollups alone; they are rebuilt on
+    the next coarse query. Pass commit=False to leave committing to the
+    caller's transaction.
+    """
+    _bump_data_versions(
+        conn, list(range(iso_to_epoch(start) // 86400, iso_to_epoch(end) // 86400 + 1))
+    )
+    if _rollups_current(conn):
+        _recompute_rollups(
+            conn, datetime.fromisoformat(start), datetime.fromisoformat(end)
+        )
+    if commit:
+        conn.commit()
+
+
+def rebuild_interval_rollups(conn: sqlite3.Connection, commit: bool = True) -> bool:
+    """Rebuild all rollups from interval_log and interval_archive.
+
+    Builds them for the configured timezone. Returns False (and leaves the
+    rollups stale) if no timezone is set. Pass commit=False to leave
+    committing to the caller's transaction.
+    """
+    tz_key = _rollup_timezone_key()
+    if tz_key is None:
+        return False
+    conn.execute("DELETE FROM interval_rollup")
+    conn.execute("DELETE FROM calendar_day")
+    _bump_data_versions(conn, [_ALL_DAYS])
+    row = conn.execute(
+        "SELECT MIN(first), MAX(last) FROM ("
+        "SELECT MIN(timestamp) AS first, MAX(timestamp) AS last "
+        "FROM interval_log WHERE is_repaired < 2 "
+        "UNION ALL SELECT MIN(timestamp), MAX(timestamp) FROM interval_archive)"
+    ).fetchone()
+    if row[0] is not None:
+        _recompute_rollups(
+            conn,
+            datetime.fromtimestamp(row[0], timezone.utc),
+            datetime.fromtimestamp(row[1], timezone.utc),
+        )
+    conn.execute(
+        "INSERT OR REPLACE INTO interval_rollup_state (key, value) "
+        "VALUES ('timezone', ?)",
+        (tz_key,),
+    )
+    if commit:
+        conn.commit()
+    return True
+
+
+# ── Interval archive ───────────────────────────────────────────────
+#
+# Intervals older than the retention age are compacted into
+# interval_archive: one row per local hour with the partial totals of the
+# hour (which already include the joined prices, emissions and reference
+# prices) plus what the hour and quarter-hour formats need. Merging partial
+# totals is exact, so any day/week/month/year computed over archived hours
+# matches the one computed from the original 5-minute rows. Queries at
+# quarter-hour granularity return one row per archived hour.
+#
+# Archived hours align to the local hours of the timezone at archive time.
+
+_ARCHIVE_EXTRA_COLUMNS = ("app_state", "price_rating") + _QUARTER_EXTRA_COLUMNS
+_ARCHIVE_COLUMNS = ("timestamp",) + _ARCHIVE_EXTRA_COLUMNS + _TOTALS_COLUMNS
+
+
+def _fetch_archive(
+    conn: sqlite3.Connection, start: str, end: str
+) -> list[tuple[str, dict, dict]]:
+    """Fetch archived hours in [start, end) as (utc_start, totals, extras)."""
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    cursor.execute(
+        f"SELECT {', '.join(_ARCHIVE_COLUMNS)} FROM interval_archive "
+        "WHERE timestamp >= ? AND timestamp < ? ORDER BY timestamp",
+        (iso_to_epoch(start), iso_to_epoch(end)),
+    )
+    rows = []
+    for values in cursor.fetchall():
+        row = dict(zip(_ARCHIVE_COLUMNS, values))
+        rows.append(
+            (
+                epoch_to_iso(row["timestamp"]),
+                {column: row[column] for column in _TOTALS_COLUMNS},
+                {column: row[column] for column in _ARCHIVE_EXTRA_COLUMNS},
+            )
+        )
+    cursor.close()
+    return rows
+
+
+def _archive_totals(
+    conn: sqlite3.Connection, start: str, end: str, granularity: str
+) -> dict[str, dict]:
+    """Partial totals per period bucket of the archived hours in [start, end)."""
+    buckets: dict[str, dict] = {}
+    for utc_start, totals, _ in _fetch_archive(conn, start, end):
+        _add_totals(buckets, _period_key(utc_start, granularity), totals)
+    return buckets
+
+
+def _aggregate_archive(
+    conn: sqlite3.Connection, start: str, end: str, granularity: str
+) -> list[dict]:
+    """Format the archived hours in [start, end) as hour or quarter results."""
+    result = []
+    for utc_start, totals, extras in _fetch_archive(conn, start, end):
+        period_start = _period_key(utc_start, granularity)
+        if granularity == "hours":
+            result.append(
+                _totals_to_hour(
+                    period_start, totals, extras["app_state"], extras["price_rating"]
+                )
+            )
+        else:
+            result.append(
+                _totals_to_quarter(
+                    period_start,
+                    totals,
+                    extras,
+                    extras["app_state"],
+                    extras["price_rating"],
+                )
+            )
+    return result
+
+
+def archive_cutoff(conn: sqlite3.Connection, before: str) -> datetime | None:
+    """Return the UTC start of the first hour that must stay in interval_log.
+
+    ``before`` is rounded down to a local hour, and further down to keep
+    rows pending review (is_repaired=2) and rows not yet sent to
+    FlexMeasures. Returns None if no timezone is configured yet.
+    """
+    if _rollup_timezone_key() is None:
+        return None
+    cutoff = datetime.fromisoformat(before).astimezone(timezone.utc)
+    pending = conn.execute(
+        "SELECT MIN(timestamp) FROM interval_log WHERE is_repaired >= 2"
+    ).fetchone()[0]
+    if pending is not None:
+        cutoff = min(cutoff, datetime.fromtimestamp(pending, timezone.utc))
+    last_sent = conn.execute(
+        "SELECT last_sent_up_to FROM fm_send_status WHERE data_type = 'charger'"
+    ).fetchone()
+    if last_sent is not None:
+        # Intervals after last_sent_up_to are still to be sent.
+        sent_until = datetime.fromisoformat(last_sent[0]) + timedelta(seconds=1)
+        cutoff = min(cutoff, sent_until.astimezone(timezone.utc))
+    return _local_hour_start(cutoff)
+
+
+def _archive_hours(conn: sqlite3.Connection, start: datetime, end: datetime) -> int:
+    """Move the intervals in [start, end) into interval_archive.
+
+    Both bounds are local hour starts. Returns the number of interval rows
+    archived; the caller commits.
+    """
+    frame = _fetch_interval_frame(conn, start.isoformat(), end.isoformat())
+    if not frame.empty:
+        frame, codes, starts, periods = _group_by_period(frame, "hours")
+        reductions = _reduce_buckets(frame, starts)
+        app_states = _bucket_app_states(
+            frame["app_state"].to_numpy(dtype=object), codes
+        )
+        price_ratings = _bucket_price_ratings(
+            frame["price_rating"], codes, len(periods)
+        )
+        rows = [
+            {
+                "timestamp": iso_to_epoch(period_start),
+                "app_state": app_state,
+                "price_rating": price_rating,
+                **values,
+            }
+            for period_start, app_state, price_rating, values in zip(
+                periods,
+                app_states,
+                price_ratings,
+                _bucket_dicts(reductions, _QUARTER_EXTRA_COLUMNS + _TOTALS_COLUMNS),
+            )
+        ]
+        # An hour that was partly archived before (the cutoff fell inside it
+        # after a timezone change) gets the rest merged in.
+        merge = [
+            f"{column} = {column} + excluded.{column}"
+            for column in _QUARTER_EXTRA_COLUMNS + _TOTALS_SUM_COLUMNS
+        ] + [
+            f"first_{prefix} = COALESCE(first_{prefix}, excluded.first_{prefix}), "
+            f"last_{prefix} = COALESCE(excluded.last_{prefix}, last_{prefix})"
+            for prefix in ("soc_pct", "naive_soc_pct")
+        ]
+        conn.executemany(
+            f"INSERT INTO interval_archive ({', '.join(_ARCHIVE_COLUMNS)}) "
+            f"VALUES ({', '.join(':' + column for column in _ARCHIVE_COLUMNS)}) "
+            f"ON CONFLICT (timestamp) DO UPDATE SET {', '.join(merge)}",
+            rows,
+        )
+        # The prices and emissions of the archived hours are folded into
+        # interval_archive; those of hours without intervals are kept.
+        hours = [(row["timestamp"], row["timestamp"] + 3600) for row in rows]
+        for table in ("price_log", "emission_log"):
+            conn.executemany(
+                f"DELETE FROM {table} WHERE timestamp >= ? AND timestamp < ?", hours
+            )
+    bounds = (iso_to_epoch(start.isoformat()), iso_to_epoch(end.isoformat()))
+    return conn.execute(
+        "DELETE FROM interval_log WHERE timestamp >= ? AND timestamp < ?", bounds
+    ).rowcount
+
+
+def archive_intervals(conn: sqlite3.Connection, before: str) -> int:
+    """Compact interval, price and emission rows before ``before``.
+
+    The cut is made at archive_cutoff(conn, before). Works through the
+    range in chunks of a few weeks, committing each chunk together with the
+    rollup refresh it needs, so the totals never change for a reader and an
+    interrupted run simply continues next time. Returns the number of
+    interval rows archived.
+    """
+    cutoff = archive_cutoff(conn, before)
+    if cutoff is None:
+        return 0
+    row = conn.execute(
+        "SELECT MIN(timestamp) FROM interval_log WHERE timestamp < ?",
+        (iso_to_epoch(cutoff.isoformat()),),
+    ).fetchone()
+    if row[0] is None:
+        return 0
+
+    archived = 0
+    chunk_start = _local_hour_start(datetime.fromtimestamp(row[0], timezone.utc))
+    while chunk_start < cutoff:
+        chunk_end = min(_local_hour_start(chunk_start + _ROLLUP_CHUNK), cutoff)
+        archived += _archive_hours(conn, chunk_start, chunk_end)
+        # Drops the quarters of the archived hours; hours and days keep
+        # their totals, now taken from the archive.
+        refresh_interval_rollups(
+            conn,
+            chunk_start.isoformat(),
+            (chunk_end - timedelta(seconds=1)).isoformat(),
+            commit=False,
+        )
+        conn.commit()
+        chunk_start = chunk_end
+    return archived
+
+
 class DataStore:
     """Local SQLite database for interval, price, and reservation data.
 
@@ -267,14 +1676,38 @@ class DataStore:
     in a local SQLite database. Data is used for user-facing statistics and
     daily batch export to FlexMeasures.
 
+    Timestamps are stored as Unix epoch seconds; all methods take ISO 8601
+    strings and return them in UTC.
+
+    A read-only store (``read_only=True``) opens the existing database for
+    queries only: it never creates tables, migrates or rebuilds rollups, and
+    its connection may be used from a thread other than the one that opened
+    it. AsyncDataStore keeps a small pool of these next to its writer.
+
     Database location: /data/v2g_liberty_data.db
     """
 
     DB_PATH = "/data/v2g_liberty_data.db"
 
-    def __init__(self, hass: Hass):
+    # Set by the app; upsert_prices announces written prices on it.
+    event_bus: EventBus | None = None
+
+    def __init__(self, hass: Hass, read_only: bool = False):
         self.__log = get_class_method_logger(module_name="data_store")
+        self.__read_only = read_only
         self.__connection: sqlite3.Connection | None = None
+        # Month step index of reference_price_log, rebuilt on every upsert
+        # and whenever another connection has committed (data_version).
+        self.__reference_prices: tuple[np.ndarray, np.ndarray] | None = None
+        self.__reference_prices_version: int | None = None
+        # (start, end, frame) spans fetched once for get_aggregated_batch.
+        self.__shared_frames: list[tuple[int, int, pd.DataFrame]] = []
+        # State of the open transaction() block, if any.
+        self.__transaction_depth = 0
+        self.__transaction_writes = 0
+        self.__pending_rollups: tuple[int, int] | None = None
+        # Ratings of the last recalculated price window (see upsert_prices).
+        self.__rating_window = PriceRatingWindow()
         self.__log("DataStore initialised (no DB connection yet).")
 
     @property
@@ -282,15 +1715,36 @@ class DataStore:
         """Whether the database connection is open and usable."""
         return self.__connection is not None
 
+    @property
+    def read_only(self) -> bool:
+        """Whether this store was opened for queries only."""
+        return self.__read_only
+
     async def initialise(self):
         """Open database, set PRAGMAs, create tables, and check schema version."""
+        self.open()
+
+    def open(self):
+        """Synchronous body of initialise(), for use off the event loop.
+
+        A read-only store only opens the connection and sets its PRAGMAs.
+        """
         self.__log("Initialising DataStore.")
         try:
-            self.__connection = sqlite3.connect(self.DB_PATH)
-            self.__connection.row_factory = sqlite3.Row
-            self.__set_pragmas()
-            self.__create_tables()
-            self.__check_schema_version()
+            if self.__read_only:
+                # The connection is closed by AsyncDataStore from the event
+                # loop thread, not by the reader thread that opened it.
+                self.__connection = sqlite3.connect(
+                    f"file:{self.DB_PATH}?mode=ro", uri=True, check_same_thread=False
+                )
+                self.__connection.row_factory = sqlite3.Row
+                self.__set_pragmas()
+            else:
+                self.__connection = sqlite3.connect(self.DB_PATH)
+                self.__connection.row_factory = sqlite3.Row
+                self.__set_pragmas()
+                self.__create_tables()
+                self.__check_schema_version()
         except Exception:
             self.close()
             raise
@@ -299,8 +1753,14 @@ class DataStore:
     def __set_pragmas(self):
         """Configure SQLite for flash-friendly operation."""
         cursor = self.__connection.cursor()
-        cursor.execute("PRAGMA journal_mode = WAL")
-        cursor.execute("PRAGMA synchronous = NORMAL")
+        if not self.__read_only:
+            # Only takes effect while the file has no tables yet; existing
+            # databases are switched over by the v5 migration's VACUUM.
+            # Archiving then frees pages with PRAGMA incremental_vacuum.
+            cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            # Both persist in the database file; a reader just inherits them.
+            cursor.execute("PRAGMA journal_mode = WAL")
+            cursor.execute("PRAGMA synchronous = NORMAL")
         cursor.execute("PRAGMA temp_store = MEMORY")
         # Wait (instead of failing immediately with "database is locked") when
         # another connection holds the write lock. The data_repairer runs on its
@@ -317,30 +1777,8 @@ class DataStore:
 
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS schema_version (
-                version INTEGER NOT NULL,
-                applied_at TEXT NOT NULL
-            )
-        """)
-
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS interval_log (
-                timestamp TEXT PRIMARY KEY,
-                energy_kwh REAL,
-                app_state TEXT NOT NULL,
-                soc_pct REAL,
-                availability_pct REAL,
-                is_repaired INTEGER NOT NULL DEFAULT 0,
-                naive_power_w REAL,
-                naive_soc_pct REAL
-            )
-        """)
-
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS price_log (
-                timestamp TEXT PRIMARY KEY,
-                consumption_price_kwh REAL NOT NULL,
-                production_price_kwh REAL NOT NULL,
-                price_rating TEXT
+                version INTEGER NOT NULL,
+                applied_at TEXT NOT NULL
             )
         """)
 
@@ -353,13 +1791,6 @@ class DataStore:
             )
         """)
 
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS emission_log (
-                timestamp TEXT PRIMARY KEY,
-                emission_intensity_kg_mwh REAL NOT NULL
-            )
-        """)
-
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS fm_send_status (
                 data_type TEXT PRIMARY KEY,
@@ -378,28 +1809,161 @@ class DataStore:
             )
         """)
 
+        self.__create_interval_tables(cursor)
+        self.__create_rollup_tables(cursor)
+        self.__create_archive_table(cursor)
+        self.__create_data_version_table(cursor)
+        self.__create_calendar_table(cursor)
+        self.__create_dirty_range_table(cursor)
+        self.__create_repair_checkpoint_table(cursor)
+
+        self.__connection.commit()
+        cursor.close()
+        self.__log("All tables created/verified.")
+
+    @staticmethod
+    def __create_interval_tables(cursor):
+        """Create the tables keyed on epoch timestamps (see _EPOCH_TABLES).
+
+        WITHOUT ROWID stores the rows in primary-key order, so range scans
+        on timestamp read the rows themselves instead of going through a
+        separate index.
+        """
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS interval_log (
+                timestamp INTEGER PRIMARY KEY,
+                energy_kwh REAL,
+                app_state TEXT NOT NULL,
+                soc_pct REAL,
+                availability_pct REAL,
+                is_repaired INTEGER NOT NULL DEFAULT 0,
+                naive_power_w REAL,
+                naive_soc_pct REAL,
+                power_min_w REAL,
+                power_max_w REAL,
+                power_p95_w REAL,
+                setpoint_changes INTEGER
+            ) WITHOUT ROWID
+        """)
+
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS price_log (
+                timestamp INTEGER PRIMARY KEY,
+                consumption_price_kwh REAL NOT NULL,
+                production_price_kwh REAL NOT NULL,
+                price_rating TEXT
+            ) WITHOUT ROWID
+        """)
+
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS emission_log (
+                timestamp INTEGER PRIMARY KEY,
+                emission_intensity_kg_mwh REAL NOT NULL
+            ) WITHOUT ROWID
+        """)
+
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS grid_interval_log (
-                timestamp TEXT NOT NULL,
+                timestamp INTEGER NOT NULL,
                 phase INTEGER NOT NULL,
                 consumption_kw REAL,
                 production_kw REAL,
                 PRIMARY KEY (timestamp, phase)
-            )
+            ) WITHOUT ROWID
         """)
 
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS pv_interval_log (
-                timestamp TEXT NOT NULL,
+                timestamp INTEGER NOT NULL,
                 panel_id TEXT NOT NULL,
                 power_kw REAL,
                 PRIMARY KEY (timestamp, panel_id)
+            ) WITHOUT ROWID
+        """)
+
+    @staticmethod
+    def __create_rollup_tables(cursor):
+        """Create the interval_rollup tables (see refresh_interval_rollups)."""
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS interval_rollup (
+                granularity TEXT NOT NULL,
+                period_start TEXT NOT NULL,
+                utc_start TEXT NOT NULL,
+                {", ".join(f"{col} REAL NOT NULL" for col in _TOTALS_SUM_COLUMNS)},
+                {", ".join(f"{col} REAL" for col in _TOTALS_FIRST_LAST_COLUMNS)},
+                PRIMARY KEY (granularity, utc_start)
             )
         """)
 
-        self.__connection.commit()
-        cursor.close()
-        self.__log("All tables created/verified.")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS interval_rollup_state (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            )
+        """)
+
+    @staticmethod
+    def __create_archive_table(cursor):
+        """Create interval_archive (see archive_intervals)."""
+        sum_columns = ", ".join(
+            f"{col} {'INTEGER' if col.endswith('_count') else 'REAL'} NOT NULL"
+            for col in _QUARTER_EXTRA_COLUMNS + _TOTALS_SUM_COLUMNS
+        )
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS interval_archive (
+                timestamp INTEGER PRIMARY KEY,
+                app_state TEXT NOT NULL,
+                price_rating TEXT,
+                {sum_columns},
+                {", ".join(f"{col} REAL" for col in _TOTALS_FIRST_LAST_COLUMNS)}
+            ) WITHOUT ROWID
+        """)
+
+    @staticmethod
+    def __create_data_version_table(cursor):
+        """Create data_version (see data_versions)."""
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS data_version (
+                day INTEGER PRIMARY KEY,
+                version INTEGER NOT NULL
+            ) WITHOUT ROWID
+        """)
+
+    @staticmethod
+    def __create_calendar_table(cursor):
+        """Create calendar_day (see _fetch_rollup_periods)."""
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS calendar_day (
+                utc_start TEXT PRIMARY KEY,
+                day TEXT NOT NULL,
+                week TEXT NOT NULL,
+                month TEXT NOT NULL,
+                year TEXT NOT NULL
+            ) WITHOUT ROWID
+        """)
+
+    @staticmethod
+    def __create_dirty_range_table(cursor):
+        """Create repair_dirty_range (see mark_dirty)."""
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS repair_dirty_range (
+                start INTEGER NOT NULL,
+                end INTEGER NOT NULL
+            )
+        """)
+
+    @staticmethod
+    def __create_repair_checkpoint_table(cursor):
+        """Create repair_checkpoint, the progress of a chunked full repair."""
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS repair_checkpoint (
+                name TEXT PRIMARY KEY,
+                first_ts INTEGER NOT NULL,
+                next_ts INTEGER NOT NULL,
+                rows_before INTEGER NOT NULL,
+                summary TEXT NOT NULL
+            ) WITHOUT ROWID
+        """)
 
     def __check_schema_version(self):
         """Check schema version and run migrations if needed."""
@@ -483,6 +2047,102 @@ class DataStore:
                 "pv_interval_log, rebuilt fm_send_status with data_type column."
             )
 
+        if from_version < 3:
+            # v3: add interval_rollup tables. They start out empty (stale) and
+            # are built on the first coarse aggregated query.
+            self.__create_rollup_tables(cursor)
+            self.__log("Migration v2→v3: created interval_rollup tables.")
+
+        if from_version < 4:
+            # v4: epoch timestamps in WITHOUT ROWID tables. The old tables are
+            # renamed, recreated in the new layout and copied over. Rows whose
+            # timestamps differ only in their UTC offset now share a key; the
+            # measured row (lowest is_repaired) wins.
+            dropped = 0
+            for table in _EPOCH_TABLES:
+                cursor.execute(f"ALTER TABLE {table} RENAME TO {table}_v3")
+            self.__create_interval_tables(cursor)
+            for table in _EPOCH_TABLES:
+                cursor.execute(f"PRAGMA table_info({table}_v3)")
+                columns = [row["name"] for row in cursor.fetchall()]
+                values = [
+                    "CAST(strftime('%s', timestamp) AS INTEGER)"
+                    if column == "timestamp"
+                    else column
+                    for column in columns
+                ]
+                order = " ORDER BY is_repaired" if "is_repaired" in columns else ""
+                cursor.execute(
+                    f"INSERT OR IGNORE INTO {table} ({', '.join(columns)}) "
+                    f"SELECT {', '.join(values)} FROM {table}_v3 "
+                    f"WHERE strftime('%s', timestamp) IS NOT NULL{order}"
+                )
+                copied = cursor.rowcount
+                cursor.execute(f"SELECT COUNT(*) FROM {table}_v3")
+                dropped += cursor.fetchone()[0] - copied
+                cursor.execute(f"DROP TABLE {table}_v3")
+            # Duplicates may have been merged, so the rollups are rebuilt.
+            cursor.execute("DELETE FROM interval_rollup_state")
+            self.__log(
+                "Migration v3→v4: converted interval, price, emission, grid and "
+                f"PV tables to epoch timestamps ({dropped} duplicate or "
+                "unparseable row(s) dropped)."
+            )
+
+        if from_version < 5:
+            # v5: hourly archive for intervals past the retention age, and
+            # incremental auto_vacuum (applied by the VACUUM below).
+            self.__create_archive_table(cursor)
+            self.__log("Migration v4→v5: created interval_archive table.")
+
+        if from_version < 6:
+            # v6: per-day data versions for caching query results.
+            self.__create_data_version_table(cursor)
+            self.__log("Migration v5→v6: created data_version table.")
+
+        if from_version < 7:
+            # v7: local calendar keys per rollup day. Filled while the day
+            # rollups are built, so mark those stale to rebuild them.
+            self.__create_calendar_table(cursor)
+            cursor.execute("DELETE FROM interval_rollup_state")
+            self.__log("Migration v6→v7: created calendar_day table.")
+
+        if from_version < 8:
+            # v8: charge power statistics per interval. The v4 migration
+            # recreates interval_log with these columns already.
+            cursor.execute("PRAGMA table_info(interval_log)")
+            columns = {row["name"] for row in cursor.fetchall()}
+            for column, column_type in _POWER_STAT_COLUMNS:
+                if column not in columns:
+                    cursor.execute(
+                        f"ALTER TABLE interval_log ADD COLUMN {column} {column_type}"
+                    )
+            self.__log("Migration v7→v8: added power statistics to interval_log.")
+
+        if from_version < 9:
+            # v9: dirty ranges for the incremental repair. Mark the window
+            # the former fixed 48h lookback covered, so the first run after
+            # the upgrade still reviews it.
+            self.__create_dirty_range_table(cursor)
+            cursor.execute(
+                "INSERT INTO repair_dirty_range (start, end) "
+                "SELECT MAX(timestamp) - 48 * 3600, MAX(timestamp) FROM interval_log "
+                "HAVING MAX(timestamp) IS NOT NULL"
+            )
+            self.__log("Migration v8→v9: created repair_dirty_range table.")
+
+        if from_version < 10:
+            # v10: checkpoint so an interrupted full repair can resume.
+            self.__create_repair_checkpoint_table(cursor)
+            self.__log("Migration v9→v10: created repair_checkpoint table.")
+
+        if from_version < 11:
+            # v11: checkpoints also hold the number of rows before next_ts.
+            # A checkpoint is only progress, so a v10 one is dropped.
+            cursor.execute("DROP TABLE IF EXISTS repair_checkpoint")
+            self.__create_repair_checkpoint_table(cursor)
+            self.__log("Migration v10→v11: recreated repair_checkpoint table.")
+
         # Update schema version
         now = datetime.now(timezone.utc).isoformat()
         cursor.execute(
@@ -493,12 +2153,106 @@ class DataStore:
         self.__log(f"Database migrated to version {CURRENT_SCHEMA_VERSION}.")
 
         cursor.close()
+        if from_version < 5:
+            # Switch to auto_vacuum = INCREMENTAL, which needs a VACUUM on an
+            # existing file; this also gives the pages of the tables dropped
+            # by the v4 migration back to the OS.
+            self.__connection.execute("VACUUM")
 
     @property
     def connection(self) -> sqlite3.Connection | None:
         """Provide read access to the database connection for advanced queries."""
         return self.__connection
 
+    @contextmanager
+    def transaction(self):
+        """Group all writes made inside the block into a single transaction.
+
+        While the block is open the write methods skip their own commit and
+        rollup refreshes are merged into one pass over the combined range,
+        so the block costs a single commit (one fsync) however many rows it
+        writes. Nested blocks join the outermost one through a SAVEPOINT.
+        If a block raises, everything written in it is rolled back; an
+        outer block that catches the error keeps only its own writes. The
+        commit latency is logged.
+
+        Usage::
+
+            with data_store.transaction():
+                data_store.insert_interval(...)
+                data_store.insert_grid_interval(...)
+        """
+        if not self.is_available:
+            yield
+            return
+        if self.__transaction_depth == 0 and not self.__connection.in_transaction:
+            # Open the transaction now, so that the outermost SAVEPOINT of a
+            # nested block cannot commit on its RELEASE.
+            self.__connection.execute("BEGIN")
+        self.__transaction_depth += 1
+        if self.__transaction_depth > 1:
+            self.__connection.execute(
+                f"SAVEPOINT transaction_{self.__transaction_depth}"
+            )
+        try:
+            yield
+        except BaseException:
+            self.__end_transaction(commit=False)
+            raise
+        self.__end_transaction(commit=True)
+
+    def __end_transaction(self, commit: bool) -> None:
+        """Leave a transaction() block, committing or rolling back its writes.
+
+        A nested block releases or rolls back to its savepoint; the
+        outermost block commits or rolls back the transaction.
+        """
+        depth = self.__transaction_depth
+        self.__transaction_depth -= 1
+        if depth > 1:
+            if not commit:
+                self.__connection.execute(f"ROLLBACK TO transaction_{depth}")
+                self.__rating_window.reset()
+                self.__log("Nested transaction block rolled back.", level="WARNING")
+            self.__connection.execute(f"RELEASE transaction_{depth}")
+            return
+        pending, self.__pending_rollups = self.__pending_rollups, None
+        writes, self.__transaction_writes = self.__transaction_writes, 0
+        if not commit:
+            self.__connection.rollback()
+            self.__rating_window.reset()
+            self.__log(
+                f"Transaction rolled back, {writes} write(s) discarded.",
+                level="WARNING",
+            )
+            return
+        try:
+            if pending is not None:
+                refresh_interval_rollups(
+                    self.__connection,
+                    epoch_to_iso(pending[0]),
+                    epoch_to_iso(pending[1]),
+                    commit=False,
+                )
+            started = perf_counter()
+            self.__connection.commit()
+        except Exception:
+            self.__connection.rollback()
+            self.__rating_window.reset()
+            raise
+        elapsed_ms = (perf_counter() - started) * 1000
+        self.__log(
+            f"Transaction committed {writes} write(s) in {elapsed_ms:.1f} ms.",
+            level="WARNING" if elapsed_ms > _SLOW_COMMIT_MS else "DEBUG",
+        )
+
+    def __commit(self) -> None:
+        """Commit, unless a transaction() block will commit at its end."""
+        if self.__transaction_depth > 0:
+            self.__transaction_writes += 1
+            return
+        self.__connection.commit()
+
     def insert_interval(
         self,
         timestamp: str,
@@ -507,26 +2261,44 @@ class DataStore:
         soc_pct: float | None,
         availability_pct: float | None,
         is_repaired: bool = False,
+        power_min_w: float | None = None,
+        power_max_w: float | None = None,
+        power_p95_w: float | None = None,
+        setpoint_changes: int | None = None,
     ) -> None:
-        """Insert a single interval row into interval_log."""
+        """Insert a single interval row into interval_log.
+
+        The power statistics (min/max/p95 of the charge power in W and the
+        number of power setpoint changes) are only known for intervals the
+        DataMonitor measured. The interval is marked dirty for the next
+        incremental repair.
+        """
         if not self.is_available:
             return
+        epoch = iso_to_epoch(timestamp)
         cursor = self.__connection.cursor()
         cursor.execute(
             "INSERT OR REPLACE INTO interval_log "
-            "(timestamp, energy_kwh, app_state, soc_pct, "
-            "availability_pct, is_repaired) VALUES (?, ?, ?, ?, ?, ?)",
+            "(timestamp, energy_kwh, app_state, soc_pct, availability_pct, "
+            "is_repaired, power_min_w, power_max_w, power_p95_w, "
+            "setpoint_changes) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
             (
-                timestamp,
+                epoch,
                 energy_kwh,
                 app_state,
                 soc_pct,
                 availability_pct,
                 int(is_repaired),
+                power_min_w,
+                power_max_w,
+                power_p95_w,
+                setpoint_changes,
             ),
         )
-        self.__connection.commit()
+        mark_dirty(self.__connection, epoch, epoch)
+        self.__commit()
         cursor.close()
+        self.__refresh_rollups(timestamp, timestamp)
 
     def has_any_intervals(self) -> bool:
         """Return True if interval_log has at least one reviewed row.
@@ -545,6 +2317,9 @@ class DataStore:
     def bulk_insert_or_ignore_intervals(self, rows: list[dict]) -> int:
         """Insert multiple interval rows, skipping timestamps that already exist.
 
+        Rows within archived hours are skipped as well, the archive already
+        accounts for them.
+
         Returns the number of newly inserted rows.
         """
         if not self.is_available:
@@ -554,13 +2329,23 @@ class DataStore:
             "INSERT OR IGNORE INTO interval_log "
             "(timestamp, energy_kwh, app_state, soc_pct, availability_pct, "
             "is_repaired) "
-            "VALUES (:timestamp, :energy_kwh, :app_state, :soc_pct, "
-            ":availability_pct, :is_repaired)",
-            rows,
+            "SELECT :timestamp, :energy_kwh, :app_state, :soc_pct, "
+            ":availability_pct, :is_repaired "
+            "WHERE :timestamp >= "
+            "(SELECT COALESCE(MAX(timestamp) + 3600, 0) FROM interval_archive)",
+            [{**row, "timestamp": iso_to_epoch(row["timestamp"])} for row in rows],
         )
         inserted = cursor.rowcount
-        self.__connection.commit()
+        if inserted > 0:
+            epochs = [iso_to_epoch(row["timestamp"]) for row in rows]
+            mark_dirty(self.__connection, min(epochs), max(epochs))
+        self.__commit()
         cursor.close()
+        # Pending-review rows (is_repaired=2) are not part of the rollups;
+        # the repairer refreshes them once it has reviewed the range.
+        self.__refresh_rollups_for_timestamps(
+            [row["timestamp"] for row in rows if row["is_repaired"] < 2]
+        )
         return inserted
 
     def delete_historical_intervals(self) -> int:
@@ -578,8 +2363,10 @@ class DataStore:
         cursor = self.__connection.cursor()
         cursor.execute("DELETE FROM interval_log WHERE app_state = 'unknown'")
         deleted = cursor.rowcount
-        self.__connection.commit()
+        self.__commit()
         cursor.close()
+        if deleted:
+            self.__invalidate_rollups()
         return deleted
 
     def upsert_prices(
@@ -593,48 +2380,97 @@ class DataStore:
         (forecast → definitive price overwrites).
 
         When recalculate_ratings is True (default), recalculates price_rating
-        for the affected 24h window (6h back, 18h forward).
+        for the affected 24h window (6h back, 18h forward). Only rows whose
+        prices or rating changed are written then (see PriceRatingWindow).
         """
         if not self.is_available:
             return
+        epoch_rows = [(iso_to_epoch(row[0]), *row[1:]) for row in rows]
+        updates = []
+        if recalculate_ratings and rows:
+            epoch_rows, updates = self.__rate_window(epoch_rows)
+        else:
+            self.__rating_window.apply(epoch_rows)
+
         cursor = self.__connection.cursor()
-        cursor.executemany(
-            "INSERT OR REPLACE INTO price_log "
-            "(timestamp, consumption_price_kwh, production_price_kwh, "
-            "price_rating) VALUES (?, ?, ?, ?)",
-            rows,
+        try:
+            cursor.executemany(
+                "INSERT OR REPLACE INTO price_log "
+                "(timestamp, consumption_price_kwh, production_price_kwh, "
+                "price_rating) VALUES (?, ?, ?, ?)",
+                epoch_rows,
+            )
+            cursor.executemany(
+                "UPDATE price_log SET price_rating = ? WHERE timestamp = ?",
+                updates,
+            )
+            self.__commit()
+        except Exception:
+            self.__rating_window.reset()
+            raise
+        finally:
+            cursor.close()
+        # Rows re-rated through the window changed as much as the new ones.
+        timestamps = [row[0] for row in epoch_rows] + [row[1] for row in updates]
+        self.__refresh_rollups_for_timestamps(
+            [epoch_to_iso(timestamp) for timestamp in timestamps]
         )
-        self.__connection.commit()
-        cursor.close()
-
-        if recalculate_ratings and rows:
-            self.__recalculate_ratings_for_window(rows)
+        if self.event_bus is not None and timestamps:
+            self.event_bus.emit_event(
+                "prices_upserted",
+                start=epoch_to_iso(min(timestamps)),
+                end=epoch_to_iso(max(timestamps)),
+            )
 
-        self.__log(f"Upserted {len(rows)} price row(s).")
+        self.__log(
+            f"Upserted {len(rows)} price row(s), wrote {len(epoch_rows)} "
+            f"and re-rated {len(updates)}."
+        )
 
-    def __recalculate_ratings_for_window(self, rows: list[tuple]) -> None:
-        """Recalculate price_rating for the 24h window around upserted rows.
+    def __rate_window(self, rows: list[tuple]) -> tuple[list[tuple], list[tuple]]:
+        """Rate the 24h window around upserted rows.
 
         Window: 6h before earliest upserted timestamp to 18h after latest.
+        Returns the rows to insert (those with new prices, with their new
+        rating) and the (rating, timestamp) updates for the other rows
+        whose rating changed.
         """
-        timestamps = [datetime.fromisoformat(row[0]) for row in rows]
-        window_start = (min(timestamps) - timedelta(hours=6)).isoformat()
-        window_end = (max(timestamps) + timedelta(hours=18)).isoformat()
-
-        prices_df = self.get_prices_in_window(window_start, window_end)
-        if prices_df.empty:
-            return
-
-        ratings = calculate_price_ratings(prices_df)
+        timestamps = [row[0] for row in rows]
+        window = self.__rating_window
+        window.slide(
+            min(timestamps) - 6 * 3600,
+            max(timestamps) + 18 * 3600,
+            self.__load_price_ratings,
+        )
+        changed = window.update(rows)
+        rerated = window.rate()
+        inserts = [
+            (timestamp, consumption, production, window.rating(timestamp))
+            for timestamp, consumption, production in changed
+        ]
+        written = {row[0] for row in inserts}
+        updates = [
+            (rating, timestamp)
+            for timestamp, rating in rerated.items()
+            if timestamp not in written
+        ]
+        return inserts, updates
 
+    def __load_price_ratings(
+        self, first: int, last: int
+    ) -> list[tuple[int, float, float, str | None]]:
+        """Load (timestamp, consumption, production price, rating) in [first, last]."""
         cursor = self.__connection.cursor()
-        updates = list(zip(ratings, prices_df["timestamp"]))
-        cursor.executemany(
-            "UPDATE price_log SET price_rating = ? WHERE timestamp = ?",
-            updates,
+        cursor.row_factory = None
+        cursor.execute(
+            "SELECT timestamp, consumption_price_kwh, production_price_kwh, "
+            "price_rating FROM price_log "
+            "WHERE timestamp >= ? AND timestamp <= ?",
+            (first, last),
         )
-        self.__connection.commit()
+        rows = cursor.fetchall()
         cursor.close()
+        return rows
 
     def upsert_emissions(self, rows: list[tuple]) -> None:
         """Insert or replace emission rows in emission_log.
@@ -648,10 +2484,11 @@ class DataStore:
         cursor.executemany(
             "INSERT OR REPLACE INTO emission_log "
             "(timestamp, emission_intensity_kg_mwh) VALUES (?, ?)",
-            rows,
+            [(iso_to_epoch(row[0]), *row[1:]) for row in rows],
         )
-        self.__connection.commit()
+        self.__commit()
         cursor.close()
+        self.__refresh_rollups_for_timestamps([row[0] for row in rows])
         self.__log(f"Upserted {len(rows)} emission row(s).")
 
     def upsert_reference_prices(
@@ -680,8 +2517,23 @@ class DataStore:
             "VALUES (?, ?, ?, ?, ?, ?)",
             enriched,
         )
-        self.__connection.commit()
+        self.__commit()
         cursor.close()
+        self.__reference_prices = _load_reference_prices(self.__connection)
+        if rows:
+            # A month's price is also the fallback for every later month, so
+            # everything from the earliest upserted month onwards is affected.
+            first_month = min(row[0] for row in rows)
+            cursor = self.__connection.cursor()
+            cursor.execute(
+                "SELECT MIN(timestamp), MAX(timestamp) FROM interval_log "
+                "WHERE timestamp >= ? AND is_repaired < 2",
+                (iso_to_epoch(f"{first_month}-01T00:00:00+00:00"),),
+            )
+            first_ts, last_ts = cursor.fetchone()
+            cursor.close()
+            if first_ts is not None:
+                self.__refresh_rollups(epoch_to_iso(first_ts), epoch_to_iso(last_ts))
         self.__log(f"Upserted {len(rows)} reference price row(s).")
 
     def get_reference_price(self, month: str) -> float | None:
@@ -737,13 +2589,72 @@ class DataStore:
         cursor.executemany(
             "UPDATE interval_log SET naive_power_w = ?, naive_soc_pct = ? "
             "WHERE timestamp = ?",
-            rows,
+            [(*row[:2], iso_to_epoch(row[2])) for row in rows],
         )
-        self.__connection.commit()
+        self.__commit()
         updated = cursor.rowcount
         cursor.close()
+        self.__refresh_rollups_for_timestamps([row[2] for row in rows])
         self.__log(f"Updated {updated} naive charging row(s).", level="DEBUG")
 
+    def __refresh_rollups(self, start: str, end: str) -> None:
+        """Refresh the rollups for [start, end], or defer it to the transaction end."""
+        if self.__transaction_depth == 0:
+            refresh_interval_rollups(self.__connection, start, end)
+            return
+        first, last = iso_to_epoch(start), iso_to_epoch(end)
+        if self.__pending_rollups is not None:
+            first = min(first, self.__pending_rollups[0])
+            last = max(last, self.__pending_rollups[1])
+        self.__pending_rollups = (first, last)
+
+    def __refresh_rollups_for_timestamps(self, timestamps: list[str]) -> None:
+        """Refresh rollups for the range spanned by the given ISO timestamps."""
+        if not timestamps:
+            return
+        epochs = [iso_to_epoch(timestamp) for timestamp in timestamps]
+        self.__refresh_rollups(epoch_to_iso(min(epochs)), epoch_to_iso(max(epochs)))
+
+    def __invalidate_rollups(self) -> None:
+        """Mark the rollups stale so the next coarse query rebuilds them."""
+        self.__connection.execute("DELETE FROM interval_rollup_state")
+        _bump_data_versions(self.__connection, [_ALL_DAYS])
+        self.__commit()
+
+    def get_naive_charging_input(self) -> pd.DataFrame:
+        """Return all usable intervals as input for the naive charging batch.
+
+        Columns: timestamp (UTC ISO 8601), energy_kwh, soc_pct,
+        availability_pct and naive_power_w, ordered by timestamp. The full
+        history is returned because the simulated SoC carries over.
+        """
+        columns = [
+            "timestamp",
+            "energy_kwh",
+            "soc_pct",
+            "availability_pct",
+            "naive_power_w",
+        ]
+        if not self.is_available:
+            return pd.DataFrame(columns=columns)
+        cursor = self.__connection.cursor()
+        cursor.row_factory = None
+        cursor.execute(
+            "SELECT timestamp, energy_kwh, soc_pct, availability_pct, "
+            "       naive_power_w "
+            "FROM interval_log "
+            "WHERE is_repaired < 2 "
+            "ORDER BY timestamp"
+        )
+        frame = pd.DataFrame.from_records(cursor.fetchall(), columns=columns)
+        cursor.close()
+        # Vectorised epoch_to_iso.
+        seconds = frame["timestamp"].to_numpy(dtype="int64").astype("datetime64[s]")
+        frame["timestamp"] = np.char.add(
+            np.datetime_as_string(seconds, unit="s"), "+00:00"
+        )
+        return frame
+
     def get_last_naive_soc(self) -> float | None:
         """Return the most recent naive_soc_pct value, or None if unavailable."""
         if not self.is_available:
@@ -811,7 +2722,7 @@ class DataStore:
             "VALUES (?, ?, ?, ?)",
             (timestamp, start_timestamp, end_timestamp, target_soc_pct),
         )
-        self.__connection.commit()
+        self.__commit()
         cursor.close()
 
     def get_price_at(self, timestamp: str) -> tuple[float, float, str | None] | None:
@@ -826,7 +2737,7 @@ class DataStore:
         cursor.execute(
             "SELECT consumption_price_kwh, production_price_kwh, price_rating "
             "FROM price_log WHERE timestamp = ?",
-            (timestamp,),
+            (iso_to_epoch(timestamp),),
         )
         row = cursor.fetchone()
         cursor.close()
@@ -853,7 +2764,7 @@ class DataStore:
             "price_rating FROM price_log "
             "WHERE timestamp >= ? AND timestamp <= ? "
             "ORDER BY timestamp",
-            (start, end),
+            (iso_to_epoch(start), iso_to_epoch(end)),
         )
         rows = cursor.fetchall()
         cursor.close()
@@ -869,7 +2780,7 @@ class DataStore:
             )
 
         return pd.DataFrame(
-            [dict(row) for row in rows],
+            [{**row, "timestamp": epoch_to_iso(row["timestamp"])} for row in rows],
         )
 
     def get_fm_last_sent(self, data_type: str = "charger") -> str | None:
@@ -910,7 +2821,7 @@ class DataStore:
             "VALUES (?, ?)",
             (data_type, timestamp),
         )
-        self.__connection.commit()
+        self.__commit()
         cursor.close()
 
     def get_intervals_since(self, since: str) -> list[dict]:
@@ -927,11 +2838,11 @@ class DataStore:
             "FROM interval_log "
             "WHERE timestamp > ? AND is_repaired < 2 "
             "ORDER BY timestamp",
-            (since,),
+            (iso_to_epoch(since),),
         )
         rows = cursor.fetchall()
         cursor.close()
-        return [dict(row) for row in rows]
+        return [{**row, "timestamp": epoch_to_iso(row["timestamp"])} for row in rows]
 
     # ── Grid interval log ─────────────────────────────────────────────
 
@@ -950,9 +2861,9 @@ class DataStore:
             "INSERT OR REPLACE INTO grid_interval_log "
             "(timestamp, phase, consumption_kw, production_kw) "
             "VALUES (?, ?, ?, ?)",
-            (timestamp, phase, consumption_kw, production_kw),
+            (iso_to_epoch(timestamp), phase, consumption_kw, production_kw),
         )
-        self.__connection.commit()
+        self.__commit()
         cursor.close()
 
     def get_grid_intervals_since(self, since: str) -> list[dict]:
@@ -969,11 +2880,11 @@ class DataStore:
             "FROM grid_interval_log "
             "WHERE timestamp > ? "
             "ORDER BY timestamp, phase",
-            (since,),
+            (iso_to_epoch(since),),
         )
         rows = cursor.fetchall()
         cursor.close()
-        return [dict(row) for row in rows]
+        return [{**row, "timestamp": epoch_to_iso(row["timestamp"])} for row in rows]
 
     # ── PV interval log ───────────────────────────────────────────────
 
@@ -991,9 +2902,9 @@ class DataStore:
             "INSERT OR REPLACE INTO pv_interval_log "
             "(timestamp, panel_id, power_kw) "
             "VALUES (?, ?, ?)",
-            (timestamp, panel_id, power_kw),
+            (iso_to_epoch(timestamp), panel_id, power_kw),
         )
-        self.__connection.commit()
+        self.__commit()
         cursor.close()
 
     def get_pv_intervals_since(self, since: str) -> list[dict]:
@@ -1010,11 +2921,11 @@ class DataStore:
             "FROM pv_interval_log "
             "WHERE timestamp > ? "
             "ORDER BY timestamp, panel_id",
-            (since,),
+            (iso_to_epoch(since),),
         )
         rows = cursor.fetchall()
         cursor.close()
-        return [dict(row) for row in rows]
+        return [{**row, "timestamp": epoch_to_iso(row["timestamp"])} for row in rows]
 
     def get_aggregated_data(self, start: str, end: str, granularity: str) -> list[dict]:
         """Get aggregated data for a time range at the specified granularity.
@@ -1048,349 +2959,212 @@ class DataStore:
                 f"Must be one of {VALID_GRANULARITIES}."
             )
 
-        raw = self.__fetch_intervals_with_joins(start, end)
-        if not raw:
-            return []
+        if granularity in _COARSE_GRANULARITIES:
+            if self.ensure_rollups():
+                return self.__aggregate_from_rollups(start, end, granularity)
+            buckets = self.__period_totals(start, end, granularity)
+            return [
+                _totals_to_period(period_start, buckets[period_start])
+                for period_start in sorted(buckets)
+            ]
 
-        # Group intervals by period bucket
-        buckets: dict[str, list[dict]] = {}
-        for row in raw:
-            key = _period_key(row["timestamp"], granularity)
-            buckets.setdefault(key, []).append(row)
-
-        # Aggregate each bucket
-        results = []
-        for period_start in sorted(buckets):
-            intervals = buckets[period_start]
-            if granularity == "quarter_hours":
-                results.append(self.__aggregate_quarter(period_start, intervals))
-            elif granularity == "hours":
-                results.append(self.__aggregate_hour(period_start, intervals))
-            else:
-                results.append(self.__aggregate_period(period_start, intervals))
+        # Archived hours all precede the intervals still in interval_log.
+        return _aggregate_archive(
+            self.__connection, start, end, granularity
+        ) + _aggregate_frame(self.__fetch_interval_frame(start, end), granularity)
+
+    def get_aggregated_batch(
+        self, specs: list[tuple[str, str, str]]
+    ) -> list[list[dict]]:
+        """Get aggregated data for several (start, end, granularity) specs.
 
-        return results
+        The joined intervals of the quarter_hours and hours specs are
+        fetched once per overlapping span and each spec (and the partial
+        days at the edges of the coarse specs) is aggregated from its
+        slice, instead of fetching overlapping ranges again per spec.
+
+        Returns:
+            One get_aggregated_data result per spec, in order.
+        """
+        if not self.is_available:
+            return [[] for _ in specs]
+        spans = _merge_spans(
+            (iso_to_epoch(start), iso_to_epoch(end))
+            for start, end, granularity in specs
+            if granularity not in _COARSE_GRANULARITIES
+        )
+        try:
+            self.__shared_frames = [
+                (
+                    span_start,
+                    span_end,
+                    self.__fetch_interval_frame(
+                        epoch_to_iso(span_start), epoch_to_iso(span_end)
+                    ),
+                )
+                for span_start, span_end in spans
+            ]
+            return [self.get_aggregated_data(*spec) for spec in specs]
+        finally:
+            self.__shared_frames = []
 
     def get_first_available(self) -> str | None:
         """Return the period_start of the oldest row in interval_log.
 
-        Returns the earliest timestamp converted to local time, or None
-        if the table is empty. Rows with is_repaired >= 2 are excluded.
+        Archived hours count too. Returns the earliest timestamp converted
+        to local time, or None if there is no data. Rows with
+        is_repaired >= 2 are excluded.
         """
         if not self.is_available:
             return None
         from . import constants as c
 
         cursor = self.__connection.cursor()
-        cursor.execute("SELECT MIN(timestamp) FROM interval_log WHERE is_repaired < 2")
+        cursor.execute(
+            "SELECT MIN(first) FROM ("
+            "SELECT MIN(timestamp) AS first FROM interval_log WHERE is_repaired < 2 "
+            "UNION ALL SELECT MIN(timestamp) FROM interval_archive)"
+        )
         row = cursor.fetchone()
         cursor.close()
         if row is None or row[0] is None:
             return None
-        return datetime.fromisoformat(row[0]).astimezone(c.TZ).isoformat()
+        return datetime.fromtimestamp(row[0], c.TZ).isoformat()
 
-    def __fetch_intervals_with_joins(self, start: str, end: str) -> list[dict]:
-        """Fetch intervals with joined price, emission, and reference price data."""
-        cursor = self.__connection.cursor()
-        cursor.execute(
-            "SELECT i.timestamp, i.energy_kwh, i.app_state, "
-            "i.soc_pct, i.availability_pct, i.is_repaired, "
-            "i.naive_power_w, i.naive_soc_pct, "
-            "p.consumption_price_kwh, p.production_price_kwh, p.price_rating, "
-            "e.emission_intensity_kg_mwh, "
-            "r.total_price_eur_kwh AS ref_price_kwh "
-            "FROM interval_log i "
-            "LEFT JOIN price_log p ON i.timestamp = p.timestamp "
-            "LEFT JOIN emission_log e ON i.timestamp = e.timestamp "
-            "LEFT JOIN reference_price_log r ON r.month = ("
-            "  SELECT month FROM reference_price_log "
-            "  WHERE month <= strftime('%Y-%m', i.timestamp) "
-            "  ORDER BY month DESC LIMIT 1) "
-            "WHERE i.timestamp >= ? AND i.timestamp < ? "
-            "AND i.is_repaired < 2 "
-            "ORDER BY i.timestamp",
-            (start, end),
-        )
-        rows = cursor.fetchall()
-        cursor.close()
-        return [dict(row) for row in rows]
-
-    @staticmethod
-    def __aggregate_quarter(period_start: str, intervals: list[dict]) -> dict:
-        """Aggregate intervals for a 15-min quarter period."""
-        app_states = [i["app_state"] for i in intervals]
-        has_repaired = any(i["is_repaired"] == 1 for i in intervals)
-
-        # Net energy (skip None — no measurement available)
-        energy_kwh = sum(
-            i["energy_kwh"] for i in intervals if i["energy_kwh"] is not None
-        )
-        energy_wh = round(energy_kwh * 1000)
+    def get_data_versions(self, start: str, end: str) -> tuple[int, int]:
+        """Return the data versions of [start, end) and of all data.
 
-        # Average prices (non-null only)
-        cons_prices = [
-            i["consumption_price_kwh"]
-            for i in intervals
-            if i["consumption_price_kwh"] is not None
-        ]
-        prod_prices = [
-            i["production_price_kwh"]
-            for i in intervals
-            if i["production_price_kwh"] is not None
-        ]
-        consumption_price = sum(cons_prices) / len(cons_prices) if cons_prices else None
-        production_price = sum(prod_prices) / len(prod_prices) if prod_prices else None
-
-        # Price rating — most frequent
-        ratings = [i["price_rating"] for i in intervals]
-
-        # SoC — last non-null value in the period
-        soc_values = [i["soc_pct"] for i in intervals if i["soc_pct"] is not None]
-        soc_pct = soc_values[-1] if soc_values else None
-
-        # Financial: charge cost and discharge revenue
-        charge_cost = sum(
-            i["energy_kwh"] * i["consumption_price_kwh"]
-            for i in intervals
-            if i["energy_kwh"] is not None
-            and i["energy_kwh"] > 0
-            and i["consumption_price_kwh"] is not None
-        )
-        discharge_revenue = sum(
-            abs(i["energy_kwh"]) * i["production_price_kwh"]
-            for i in intervals
-            if i["energy_kwh"] is not None
-            and i["energy_kwh"] < 0
-            and i["production_price_kwh"] is not None
-        )
+        Each changes whenever aggregated data in its range changed, so a
+        query result for the range stays valid while they do not.
+        """
+        if not self.is_available:
+            return 0, 0
+        return data_versions(self.__connection, iso_to_epoch(start), iso_to_epoch(end))
 
-        # CO2: energy_kwh × emission_intensity_kg_mwh / 1000 → kg
-        charge_co2_kg = sum(
-            i["energy_kwh"] * i["emission_intensity_kg_mwh"] / 1000
-            for i in intervals
-            if i["energy_kwh"] is not None
-            and i["energy_kwh"] > 0
-            and i["emission_intensity_kg_mwh"] is not None
-        )
-        discharge_co2_kg = sum(
-            abs(i["energy_kwh"]) * i["emission_intensity_kg_mwh"] / 1000
-            for i in intervals
-            if i["energy_kwh"] is not None
-            and i["energy_kwh"] < 0
-            and i["emission_intensity_kg_mwh"] is not None
-        )
-        co2_kg = charge_co2_kg - discharge_co2_kg
+    def export_intervals(
+        self,
+        write: Callable[[bytes], None],
+        start: str | None = None,
+        end: str | None = None,
+    ) -> int:
+        """Export interval_log joined with prices, emissions, grid and PV as CSV.
 
-        return {
-            "period_start": period_start,
-            "app_state": _dominant_app_state(app_states),
-            "consumption_price": (
-                round(consumption_price, 5) if consumption_price is not None else None
-            ),
-            "production_price": (
-                round(production_price, 5) if production_price is not None else None
-            ),
-            "price_rating": _dominant_price_rating(ratings),
-            "soc_pct": soc_pct,
-            "energy_wh": energy_wh,
-            "charge_cost": round(charge_cost, 4),
-            "discharge_revenue": round(discharge_revenue, 4),
-            "charge_co2_kg": round(charge_co2_kg, 1),
-            "discharge_co2_kg": round(discharge_co2_kg, 1),
-            "co2_kg": round(co2_kg, 1),
-            "has_repaired": has_repaired,
-            **_calculate_savings(intervals),
-        }
+        See data_export.export_csv; start (inclusive) and end (exclusive)
+        are ISO 8601 timestamps, None for no bound. Archived hours are not
+        in interval_log anymore and so not exported.
 
-    @staticmethod
-    def __aggregate_hour(period_start: str, intervals: list[dict]) -> dict:
-        """Aggregate intervals for a 1-hour period."""
-        app_states = [i["app_state"] for i in intervals]
-        has_repaired = any(i["is_repaired"] == 1 for i in intervals)
-
-        # Charge/discharge split (skip None — no measurement available)
-        charge_kwh = sum(
-            i["energy_kwh"]
-            for i in intervals
-            if i["energy_kwh"] is not None and i["energy_kwh"] > 0
-        )
-        discharge_kwh = sum(
-            abs(i["energy_kwh"])
-            for i in intervals
-            if i["energy_kwh"] is not None and i["energy_kwh"] < 0
+        Returns:
+            The number of intervals exported.
+        """
+        if not self.is_available:
+            return 0
+        return export_csv(
+            self.__connection,
+            write,
+            iso_to_epoch(start) if start else 0,
+            iso_to_epoch(end) if end else _MAX_EPOCH,
         )
 
-        charge_cost = sum(
-            i["energy_kwh"] * i["consumption_price_kwh"]
-            for i in intervals
-            if i["energy_kwh"] is not None
-            and i["energy_kwh"] > 0
-            and i["consumption_price_kwh"] is not None
-        )
-        discharge_revenue = sum(
-            abs(i["energy_kwh"]) * i["production_price_kwh"]
-            for i in intervals
-            if i["energy_kwh"] is not None
-            and i["energy_kwh"] < 0
-            and i["production_price_kwh"] is not None
-        )
+    def __fetch_interval_frame(self, start: str, end: str) -> pd.DataFrame:
+        """Fetch joined intervals, resolving reference prices from the cache.
 
-        # Weighted average price
-        total_kwh = charge_kwh + discharge_kwh
-        if total_kwh > 0:
-            avg_price = (charge_cost + discharge_revenue) / total_kwh
-        else:
-            # No energy flow — simple average of available consumption prices
-            cons = [
-                i["consumption_price_kwh"]
-                for i in intervals
-                if i["consumption_price_kwh"] is not None
-            ]
-            avg_price = sum(cons) / len(cons) if cons else None
-
-        # Price rating — most frequent
-        ratings = [i["price_rating"] for i in intervals]
-
-        # SoC — last non-null value
-        soc_values = [i["soc_pct"] for i in intervals if i["soc_pct"] is not None]
-        soc_pct = soc_values[-1] if soc_values else None
-
-        # CO2: energy_kwh × emission_intensity_kg_mwh / 1000 → kg
-        charge_co2_kg = sum(
-            i["energy_kwh"] * i["emission_intensity_kg_mwh"] / 1000
-            for i in intervals
-            if i["energy_kwh"] is not None
-            and i["energy_kwh"] > 0
-            and i["emission_intensity_kg_mwh"] is not None
-        )
-        discharge_co2_kg = sum(
-            abs(i["energy_kwh"]) * i["emission_intensity_kg_mwh"] / 1000
-            for i in intervals
-            if i["energy_kwh"] is not None
-            and i["energy_kwh"] < 0
-            and i["emission_intensity_kg_mwh"] is not None
+        The cache is also dropped when another connection has committed
+        since it was built, as upserts there do not reach this instance.
+        Within get_aggregated_batch a range inside one of its shared spans
+        (or an empty one, at a whole-day edge) is sliced from that span's
+        frame.
+        """
+        if self.__shared_frames:
+            start_ts, end_ts = iso_to_epoch(start), iso_to_epoch(end)
+            for span_start, span_end, frame in self.__shared_frames:
+                if start_ts >= end_ts or span_start <= start_ts <= end_ts <= span_end:
+                    return _slice_frame(frame, start_ts, end_ts)
+        data_version = self.__connection.execute("PRAGMA data_version").fetchone()[0]
+        if data_version != self.__reference_prices_version:
+            self.__reference_prices = None
+            self.__reference_prices_version = data_version
+        if self.__reference_prices is None:
+            self.__reference_prices = _load_reference_prices(self.__connection)
+        return _fetch_interval_frame(
+            self.__connection, start, end, self.__reference_prices
         )
-        co2_kg = charge_co2_kg - discharge_co2_kg
 
-        charge_duration_min = sum(
-            5 for i in intervals if i["energy_kwh"] is not None and i["energy_kwh"] > 0
-        )
-        discharge_duration_min = sum(
-            5 for i in intervals if i["energy_kwh"] is not None and i["energy_kwh"] < 0
-        )
+    def __period_totals(
+        self, start: str, end: str, granularity: str
+    ) -> dict[str, dict]:
+        """Partial totals per period of the archived and live intervals."""
+        buckets = _archive_totals(self.__connection, start, end, granularity)
+        frame = self.__fetch_interval_frame(start, end)
+        for key, totals in _bucket_totals(frame, granularity).items():
+            _add_totals(buckets, key, totals)
+        return buckets
+
+    def ensure_rollups(self) -> bool:
+        """Make sure the rollups match the configured timezone.
+
+        Rebuilds them when stale (first use after migration, timezone change,
+        or bulk deletes). Returns False if no timezone is configured yet, in
+        which case callers must aggregate from interval_log. A read-only
+        store never rebuilds and returns False while they are stale. Inside
+        a transaction() block the rebuild is committed with the block.
+        """
+        if not self.is_available:
+            return False
+        if _rollups_current(self.__connection):
+            return True
+        if self.__read_only:
+            return False
+        self.__log("Interval rollups are stale, rebuilding from interval_log.")
+        if not rebuild_interval_rollups(
+            self.__connection, commit=self.__transaction_depth == 0
+        ):
+            return False
+        self.__log("Interval rollups rebuilt.")
+        return True
 
-        return {
-            "period_start": period_start,
-            "app_state": _dominant_app_state(app_states),
-            "avg_price": (round(avg_price, 5) if avg_price is not None else None),
-            "price_rating": _dominant_price_rating(ratings),
-            "charge_wh": round(charge_kwh * 1000),
-            "charge_cost": round(charge_cost, 4),
-            "charge_co2_kg": round(charge_co2_kg, 1),
-            "charge_duration_min": charge_duration_min,
-            "discharge_wh": round(discharge_kwh * 1000),
-            "discharge_revenue": round(discharge_revenue, 4),
-            "discharge_co2_kg": round(discharge_co2_kg, 1),
-            "discharge_duration_min": discharge_duration_min,
-            "soc_pct": soc_pct,
-            "co2_kg": round(co2_kg, 1),
-            "has_repaired": has_repaired,
-            **_calculate_savings(intervals),
-        }
+    def __aggregate_from_rollups(
+        self, start: str, end: str, granularity: str
+    ) -> list[dict]:
+        """Aggregate day/week/month/year periods from the day rollups.
 
-    @staticmethod
-    def __aggregate_period(period_start: str, intervals: list[dict]) -> dict:
-        """Aggregate intervals for day/week/month/year periods."""
-        has_repaired = any(i["is_repaired"] == 1 for i in intervals)
-
-        # Availability — average across intervals with known values
-        availability_values = [
-            i["availability_pct"]
-            for i in intervals
-            if i["availability_pct"] is not None
+        Whole local days inside [start, end) come from interval_rollup; the
+        partial days at either edge (if any) are read from interval_log and
+        interval_archive.
+        """
+        start_dt = datetime.fromisoformat(start)
+        end_dt = datetime.fromisoformat(end)
+        first_day = _local_day_start(start_dt)
+        if first_day < start_dt:
+            first_day = _next_local_day_start(start_dt)
+        last_day = _local_day_start(end_dt)
+        if first_day >= last_day:
+            # No whole day in the range, nothing to gain from the rollups.
+            first_day = last_day = end_dt
+
+        # Chronological order: head edge, whole days, tail edge.
+        buckets = self.__period_totals(start, first_day.isoformat(), granularity)
+        for period_start, totals in _fetch_rollup_periods(
+            self.__connection, granularity, first_day.isoformat(), last_day.isoformat()
+        ):
+            _add_totals(buckets, period_start, totals)
+        if last_day < end_dt:
+            tail = self.__period_totals(last_day.isoformat(), end, granularity)
+            for key, totals in tail.items():
+                _add_totals(buckets, key, totals)
+
+        return [
+            _totals_to_period(period_start, buckets[period_start])
+            for period_start in sorted(buckets)
         ]
-        avg_availability = (
-            sum(availability_values) / len(availability_values)
-            if availability_values
-            else None
-        )
-
-        # Charge/discharge split (skip None — no measurement available)
-        charge_kwh = sum(
-            i["energy_kwh"]
-            for i in intervals
-            if i["energy_kwh"] is not None and i["energy_kwh"] > 0
-        )
-        discharge_kwh = sum(
-            abs(i["energy_kwh"])
-            for i in intervals
-            if i["energy_kwh"] is not None and i["energy_kwh"] < 0
-        )
-
-        charge_cost = sum(
-            i["energy_kwh"] * i["consumption_price_kwh"]
-            for i in intervals
-            if i["energy_kwh"] is not None
-            and i["energy_kwh"] > 0
-            and i["consumption_price_kwh"] is not None
-        )
-        discharge_revenue = sum(
-            abs(i["energy_kwh"]) * i["production_price_kwh"]
-            for i in intervals
-            if i["energy_kwh"] is not None
-            and i["energy_kwh"] < 0
-            and i["production_price_kwh"] is not None
-        )
-
-        net_kwh = charge_kwh - discharge_kwh
-        net_cost = charge_cost - discharge_revenue
-
-        # CO2: energy_kwh × emission_intensity_kg_mwh / 1000 → kg
-        charge_co2_kg = sum(
-            i["energy_kwh"] * i["emission_intensity_kg_mwh"] / 1000
-            for i in intervals
-            if i["energy_kwh"] is not None
-            and i["energy_kwh"] > 0
-            and i["emission_intensity_kg_mwh"] is not None
-        )
-        discharge_co2_kg = sum(
-            abs(i["energy_kwh"]) * i["emission_intensity_kg_mwh"] / 1000
-            for i in intervals
-            if i["energy_kwh"] is not None
-            and i["energy_kwh"] < 0
-            and i["emission_intensity_kg_mwh"] is not None
-        )
-        co2_kg = charge_co2_kg - discharge_co2_kg
-
-        charge_duration_min = sum(
-            5 for i in intervals if i["energy_kwh"] is not None and i["energy_kwh"] > 0
-        )
-        discharge_duration_min = sum(
-            5 for i in intervals if i["energy_kwh"] is not None and i["energy_kwh"] < 0
-        )
-
-        return {
-            "period_start": period_start,
-            "availability_pct": (
-                round(avg_availability, 1) if avg_availability is not None else None
-            ),
-            "charge_kwh": round(charge_kwh, 2),
-            "charge_cost": round(charge_cost, 4),
-            "charge_co2_kg": round(charge_co2_kg, 1),
-            "charge_duration_min": charge_duration_min,
-            "discharge_kwh": round(discharge_kwh, 2),
-            "discharge_revenue": round(discharge_revenue, 4),
-            "discharge_co2_kg": round(discharge_co2_kg, 1),
-            "discharge_duration_min": discharge_duration_min,
-            "net_kwh": round(net_kwh, 2),
-            "net_cost": round(net_cost, 4),
-            "co2_kg": round(co2_kg, 1),
-            "has_repaired": has_repaired,
-            **_calculate_savings(intervals),
-        }
 
     def close(self):
         """Close the database connection."""
+        self.__rating_window.reset()
+        self.__reference_prices = None
+        self.__reference_prices_version = None
+        self.__transaction_depth = 0
+        self.__transaction_writes = 0
+        self.__pending_rollups = None
         if self.__connection:
             self.__connection.close()
             self.__connection = None
@@ -0,0 +1,69 @@
+"""Module with the running energy totals of the current (local) day."""
+
+from datetime import date
+
+
+class DayTotals:
+    """Charge/discharge totals of one local day, kept up to date per interval.
+
+    Reading today's totals from the database aggregates every interval of
+    the day (up to 288, or 300 on a 25-hour DST day) with its prices.
+    DayTotals is loaded from such an aggregation once (reset) and then
+    follows the concluded intervals in O(1) each (add).
+
+    The totals belong to the local date they were loaded for: when the
+    owner asks for another date (midnight) or after invalidate() (a repair
+    or price update changed today's rows) is_for() is False and the owner
+    reloads them from the database.
+    """
+
+    def __init__(self):
+        self.day: date | None = None
+        self.__charge_kwh = 0.0
+        self.__charge_cost = 0.0
+        self.__discharge_kwh = 0.0
+        self.__discharge_revenue = 0.0
+
+    def is_for(self, day: date) -> bool:
+        """Whether the totals are loaded and belong to the given local date."""
+        return self.day == day
+
+    def invalidate(self) -> None:
+        """Have the totals reloaded from the database before the next use."""
+        self.day = None
+
+    def reset(self, day: date, totals: dict | None = None) -> None:
+        """Load the totals of a day from its aggregated "days" row, if any."""
+        self.day = day
+        totals = totals or {}
+        self.__charge_kwh = totals.get("charge_kwh", 0.0)
+        self.__charge_cost = totals.get("charge_cost", 0.0)
+        self.__discharge_kwh = totals.get("discharge_kwh", 0.0)
+        self.__discharge_revenue = totals.get("discharge_revenue", 0.0)
+
+    def add(
+        self,
+        energy_kwh: float | None,
+        consumption_price: float | None,
+        production_price: float | None,
+    ) -> None:
+        """Add one interval, split like the database aggregation does."""
+        if energy_kwh is None:
+            return
+        if energy_kwh > 0:
+            self.__charge_kwh += energy_kwh
+            if consumption_price is not None:
+                self.__charge_cost += energy_kwh * consumption_price
+        elif energy_kwh < 0:
+            self.__discharge_kwh += abs(energy_kwh)
+            if production_price is not None:
+                self.__discharge_revenue += abs(energy_kwh) * production_price
+
+    def as_dict(self) -> dict:
+        """Return the totals rounded as in the aggregated "days" rows."""
+        return {
+            "charge_kwh": round(self.__charge_kwh, 2),
+            "charge_cost": round(self.__charge_cost, 4),
+            "discharge_kwh": round(self.__discharge_kwh, 2),
+            "discharge_revenue": round(self.__discharge_revenue, 4),
+        }
@@ -0,0 +1,143 @@
+"""Module to downsample aggregated v2g_data rows for charts."""
+
+import math
+from datetime import datetime
+
+# Fields that describe a level at a moment (a line in the chart). In a
+# merged bucket they take the value Largest-Triangle-Three-Buckets picks,
+# which keeps the peaks and valleys of the line visible.
+LEVEL_FIELDS = (
+    "soc_pct",
+    "consumption_price",
+    "production_price",
+    "avg_price",
+    "availability_pct",
+)
+
+# Other numbers (energy, cost, CO2, durations, savings) are amounts per
+# period: they are summed, so the downsampled rows keep the exact totals.
+# Rounded like the most precise amounts in the rows (costs).
+_AMOUNT_DECIMALS = 4
+
+MIN_POINTS = 3
+
+
+def downsample(rows: list[dict], max_points: int) -> list[dict]:
+    """Merge aggregated rows into at most max_points rows.
+
+    Buckets are formed as in Largest-Triangle-Three-Buckets: the first and
+    the last row are kept as they are, the rows between them are split
+    into max_points - 2 buckets of consecutive rows. A merged row has:
+
+    - the period_start and text fields (app_state, price_rating) of the
+      first row of its bucket,
+    - per level field the value LTTB selects from the bucket,
+    - amounts summed over the bucket,
+    - has_repaired set if any row of the bucket has it,
+    - period_count, the number of periods merged into it.
+
+    Rows are returned as they are when there are no more than max_points.
+    """
+    if max_points < MIN_POINTS:
+        raise ValueError(f"max_points must be at least {MIN_POINTS}.")
+    if len(rows) <= max_points:
+        return rows
+
+    buckets = _bucket_bounds(len(rows), max_points)
+    xs = [datetime.fromisoformat(row["period_start"]).timestamp() for row in rows]
+    fields = [field for field in LEVEL_FIELDS if field in rows[0]]
+    picks = {
+        field: _lttb_picks(xs, [row.get(field) for row in rows], buckets)
+        for field in fields
+    }
+
+    result = []
+    for index, (lo, hi) in enumerate(buckets):
+        merged = _merge(rows[lo:hi])
+        for field in fields:
+            pick = picks[field][index]
+            merged[field] = rows[pick][field] if pick is not None else None
+        result.append(merged)
+    return result
+
+
+def _bucket_bounds(length: int, max_points: int) -> list[tuple[int, int]]:
+    """Return (lo, hi) row slices of the LTTB buckets, first and last single."""
+    every = (length - 2) / (max_points - 2)
+    bounds = [(0, 1)]
+    for i in range(max_points - 2):
+        bounds.append((int(i * every) + 1, int((i + 1) * every) + 1))
+    bounds.append((length - 1, length))
+    return bounds
+
+
+def _lttb_picks(
+    xs: list[float], ys: list[float | None], buckets: list[tuple[int, int]]
+) -> list[int | None]:
+    """Return per bucket the index LTTB selects for one series.
+
+    Rows without a value (None) are skipped; a bucket without values
+    selects None.
+    """
+    picks: list[int | None] = []
+    selected = None
+    for index, (lo, hi) in enumerate(buckets):
+        candidates = [i for i in range(lo, hi) if ys[i] is not None]
+        if not candidates:
+            picks.append(None)
+            continue
+        if selected is None or len(candidates) == 1:
+            pick = candidates[0]
+        else:
+            # The last bucket holds one row, so a next bucket exists here.
+            next_lo, next_hi = buckets[index + 1]
+            cx, cy = _average(xs, ys, range(next_lo, next_hi)) or _average(
+                xs, ys, candidates
+            )
+            ax, ay = xs[selected], ys[selected]
+            pick = max(
+                candidates,
+                key=lambda i: abs((ax - cx) * (ys[i] - ay) - (ax - xs[i]) * (cy - ay)),
+            )
+        picks.append(pick)
+        selected = pick
+    return picks
+
+
+def _average(xs, ys, indices) -> tuple[float, float] | None:
+    """Return the mean point of the rows at indices that have a value."""
+    points = [(xs[i], ys[i]) for i in indices if ys[i] is not None]
+    if not points:
+        return None
+    return (
+        math.fsum(x for x, _ in points) / len(points),
+        math.fsum(y for _, y in points) / len(points),
+    )
+
+
+def _merge(bucket: list[dict]) -> dict:
+    """Merge the rows of a bucket, summing amounts (see downsample)."""
+    merged = dict(bucket[0])
+    for field, value in bucket[0].items():
+        if field in LEVEL_FIELDS:
+            continue
+        if field == "has_repaired":
+            merged[field] = any(row.get(field) for row in bucket)
+        elif isinstance(value, (int, float)) or value is None:
+            values = [row.get(field) for row in bucket]
+            merged[field] = _sum_amounts(values)
+    merged["period_count"] = sum(row.get("period_count", 1) for row in bucket)
+    return merged
+
+
+def _sum_amounts(values: list) -> int | float | str | None:
+    """Sum the amounts of a bucket; None if none of them is known."""
+    amounts = [value for value in values if value is not None]
+    if not amounts:
+        return values[0]
+    if any(not isinstance(value, (int, float)) for value in amounts):
+        # Not an amount after all (text with a missing first value).
+        return values[0]
+    if all(isinstance(value, int) for value in amounts):
+        return sum(amounts)
+    return round(math.fsum(amounts), _AMOUNT_DECIMALS)
@@ -54,6 +54,13 @@ class EventBus(AsyncIOEventEmitter):
         - **Arguments**:
             - `new_power` (int): The new power value (-7400 - 7400) in Watt, can be 'unavailable'.
 
+    - `charge_power_setpoint_change`:
+        - **Description**: A new (dis-)charge power was requested from the charger. Not emitted
+          when the requested power equals the current setting.
+        - **Emitted by** modbus_evse_client
+        - **Arguments**:
+            - `new_setpoint` (int): The requested power (-7400 - 7400) in Watt.
+
     - `charger_state_change`:
         - **Description**: Monitors changes in the chargers state (charging, idle, error etc.).
         - **Emitted by** modbus_evse_client
@@ -95,20 +102,21 @@ class EventBus(AsyncIOEventEmitter):
             - `discharge_kwh` (float): Total energy discharged today in kWh.
             - `discharge_revenue` (float): Total discharge revenue today in currency.
 
-    - `interval_concluded`:
-        - **Description**: Emitted after a 5-min interval has been written to
-          the database. Used by the naive charging simulator to update its
-          state in real-time.
-        - **Emitted by** data_monitor
-        - **Arguments**:
-            - `timestamp` (str): ISO 8601 UTC timestamp of the interval start.
-
     - `repairer_complete`:
         - **Description**: Emitted after the data repairer finishes a repair
           run (full or incremental). Used to trigger batch naive charging
           simulation over repaired/imported rows.
         - **Emitted by** data_repairer
 
+    - `prices_upserted`:
+        - **Description**: Emitted after prices were written to the local
+          database. Used to refresh today's totals when prices of today
+          changed.
+        - **Emitted by** data_store
+        - **Arguments**:
+            - `start` (str): ISO 8601 UTC timestamp of the first written price.
+            - `end` (str): ISO 8601 UTC timestamp of the last written price.
+
     """
 
     def __init__(self, hass: Hass):
@@ -32,10 +32,10 @@ class FMDataSender:
         # Ensure fm_send_status has an initial value on first start
         if self.data_store is not None:
             for data_type in ("charger", "grid", "pv"):
-                last_sent = self.data_store.get_fm_last_sent(data_type)
+                last_sent = await self.data_store.get_fm_last_sent(data_type)
                 if last_sent is None:
                     now = datetime.now(timezone.utc).isoformat()
-                    self.data_store.set_fm_last_sent(now, data_type)
+                    await self.data_store.set_fm_last_sent(now, data_type)
                     self.__log(
                         f"First start ({data_type}): set last_sent_up_to to now."
                     )
@@ -76,17 +76,17 @@ class FMDataSender:
 
     async def _send_charger_data(self):
         """Send unsent charger interval data (power, SoC, availability)."""
-        last_sent = self.data_store.get_fm_last_sent("charger")
+        last_sent = await self.data_store.get_fm_last_sent("charger")
         if last_sent is None:
             now = datetime.now(timezone.utc).isoformat()
-            self.data_store.set_fm_last_sent(now, "charger")
+            await self.data_store.set_fm_last_sent(now, "charger")
             self.__log(
                 "Charger: no last_sent_up_to, recovered by setting to now.",
                 level="WARNING",
             )
             return
 
-        intervals = self.data_store.get_intervals_since(last_sent)
+        intervals = await self.data_store.get_intervals_since(last_sent)
         if not intervals:
             self.__log("Charger: no unsent intervals.")
             return
@@ -105,7 +105,7 @@ class FMDataSender:
                 break
             if success:
                 last_timestamp = block[-1]["timestamp"]
-                self.data_store.set_fm_last_sent(last_timestamp, "charger")
+                await self.data_store.set_fm_last_sent(last_timestamp, "charger")
                 self.__log(f"Charger: block sent, advanced to {last_timestamp}.")
             else:
                 self.__log(
@@ -119,17 +119,17 @@ class FMDataSender:
         if not c.FM_GRID_CONSUMPTION_SENSOR_IDS:
             return
 
-        last_sent = self.data_store.get_fm_last_sent("grid")
+        last_sent = await self.data_store.get_fm_last_sent("grid")
         if last_sent is None:
             now = datetime.now(timezone.utc).isoformat()
-            self.data_store.set_fm_last_sent(now, "grid")
+            await self.data_store.set_fm_last_sent(now, "grid")
             self.__log(
                 "Grid: no last_sent_up_to, recovered by setting to now.",
                 level="WARNING",
             )
             return
 
-        intervals = self.data_store.get_grid_intervals_since(last_sent)
+        intervals = await self.data_store.get_grid_intervals_since(last_sent)
         if not intervals:
             self.__log("Grid: no unsent intervals.")
             return
@@ -152,7 +152,7 @@ class FMDataSender:
                 break
             if success:
                 last_ts = block_timestamps[-1]
-                self.data_store.set_fm_last_sent(last_ts, "grid")
+                await self.data_store.set_fm_last_sent(last_ts, "grid")
                 self.__log(f"Grid: block sent, advanced to {last_ts}.")
             else:
                 self.__log(
@@ -168,17 +168,17 @@ class FMDataSender:
         if not panels_with_sensor:
             return
 
-        last_sent = self.data_store.get_fm_last_sent("pv")
+        last_sent = await self.data_store.get_fm_last_sent("pv")
         if last_sent is None:
             now = datetime.now(timezone.utc).isoformat()
-            self.data_store.set_fm_last_sent(now, "pv")
+            await self.data_store.set_fm_last_sent(now, "pv")
             self.__log(
                 "PV: no last_sent_up_to, recovered by setting to now.",
                 level="WARNING",
             )
             return
 
-        intervals = self.data_store.get_pv_intervals_since(last_sent)
+        intervals = await self.data_store.get_pv_intervals_since(last_sent)
         if not intervals:
             self.__log("PV: no unsent intervals.")
             return
@@ -206,7 +206,7 @@ class FMDataSender:
                 break
             if success:
                 last_ts = block_timestamps[-1]
-                self.data_store.set_fm_last_sent(last_ts, "pv")
+                await self.data_store.set_fm_last_sent(last_ts, "pv")
                 self.__log(f"PV: block sent, advanced to {last_ts}.")
             else:
                 self.__log(
@@ -0,0 +1,180 @@
+"""Power-weighted-duration trackers for many channels in NumPy arrays.
+
+A PowerTrackerBank does for a set of channels (e.g. grid phases or PV
+panels) what a PowerTracker does for one, with the state of all channels
+in arrays. Updates are only queued; they are applied in one vectorised
+pass when the interval is concluded (or the queue is full), so a
+frequently reporting meter costs a few array appends per reading. Without
+a timestamp an update reads the system clock, which is cheaper than the
+local datetime a PowerTracker needs.
+
+Usage:
+    bank = PowerTrackerBank()
+    bank.add_channel("l1", now=datetime.now())
+    bank.add_channel("l2", now=datetime.now())
+    bank.update("l1", power=1500.0, now=datetime.now())  # power changed
+    bank.update("l2", power=1200.0, now=datetime.now())
+    avgs = bank.conclude(now=datetime.now())  # {"l1": avg, "l2": avg}
+    # avgs are ready to store; the bank is reset for the next interval
+"""
+
+import time
+from array import array
+from collections.abc import Hashable, Iterable
+from datetime import datetime
+
+import numpy as np
+
+
+class PowerTrackerBank:
+    """Tracks power×duration per channel to calculate weighted average power."""
+
+    # Queued updates are applied once this many are waiting, which bounds
+    # memory between conclusions (1 Hz readings on 6 channels queue 1800
+    # per 5 minute interval).
+    MAX_PENDING = 4096
+
+    def __init__(self):
+        self._index: dict[Hashable, int] = {}
+        self._power_x_duration = np.zeros(0)
+        self._total_duration = np.zeros(0)
+        self._current_power = np.zeros(0)
+        # Epoch seconds of the last applied update per channel.
+        self._last_update = np.zeros(0)
+        # Queued updates: channel index, power and epoch seconds.
+        self._pending_channels = array("q")
+        self._pending_powers = array("d")
+        self._pending_times = array("d")
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._index
+
+    def keys(self) -> list[Hashable]:
+        """Return the channel keys in the order they were added."""
+        return list(self._index)
+
+    def add_channel(self, key: Hashable, now: datetime):
+        """Add a channel at power 0, tracked from now on.
+
+        Raises:
+            ValueError: If a channel with this key already exists.
+        """
+        if key in self._index:
+            raise ValueError(f"Channel {key!r} already exists.")
+        self._flush()
+        self._index[key] = len(self._index)
+        self._power_x_duration = np.append(self._power_x_duration, 0.0)
+        self._total_duration = np.append(self._total_duration, 0.0)
+        self._current_power = np.append(self._current_power, 0.0)
+        self._last_update = np.append(self._last_update, now.timestamp())
+
+    def update(self, key: Hashable, power: float, now: datetime | None = None):
+        """Record a power change of a channel.
+
+        Args:
+            key: channel key, as added with add_channel
+            power: current power value (any unit, e.g. W or kW)
+            now: current timestamp, the system clock if None (cheaper
+                than creating a local datetime for every reading)
+
+        Raises:
+            KeyError: If the channel does not exist.
+        """
+        self._pending_channels.append(self._index[key])
+        self._pending_powers.append(power)
+        self._pending_times.append(time.time() if now is None else now.timestamp())
+        if len(self._pending_channels) >= self.MAX_PENDING:
+            self._flush()
+
+    def extend(self, updates: Iterable[tuple[Hashable, float, float]]):
+        """Record a batch of (key, power, epoch seconds) power changes.
+
+        Raises:
+            KeyError: If a channel does not exist.
+        """
+        index = self._index
+        for key, power, timestamp in updates:
+            self._pending_channels.append(index[key])
+            self._pending_powers.append(power)
+            self._pending_times.append(timestamp)
+        if len(self._pending_channels) >= self.MAX_PENDING:
+            self._flush()
+
+    def current_power(self, key: Hashable) -> float:
+        """Return the last recorded power of a channel."""
+        self._flush()
+        return float(self._current_power[self._index[key]])
+
+    def conclude(self, now: datetime) -> dict[Hashable, float | None]:
+        """Conclude the current interval for all channels.
+
+        Accumulates the final segment of each channel (from its last update
+        to now), calculates the averages, and resets for the next interval.
+
+        Args:
+            now: current timestamp (end of interval)
+
+        Returns:
+            Weighted average power per channel key, None for a channel
+            without data.
+        """
+        self._flush()
+        elapsed = (now.timestamp() - self._last_update).clip(min=0)
+        power_x_duration = self._power_x_duration + self._current_power * elapsed
+        total_duration = self._total_duration + elapsed
+        with np.errstate(divide="ignore", invalid="ignore"):
+            averages = (power_x_duration / total_duration).round(3)
+        result = {
+            key: float(averages[i]) if total_duration[i] > 0 else None
+            for key, i in self._index.items()
+        }
+        self.reset(now)
+        return result
+
+    def reset(self, now: datetime):
+        """Reset all channels for the next interval, keeping their power."""
+        self._flush()
+        self._power_x_duration[:] = 0.0
+        self._total_duration[:] = 0.0
+        self._last_update[:] = now.timestamp()
+
+    def _flush(self):
+        """Apply the queued updates in one vectorised pass."""
+        if not self._pending_channels:
+            return
+        # Copies, so the queues can be emptied.
+        channels = np.array(self._pending_channels, dtype=np.intp)
+        powers = np.array(self._pending_powers)
+        times = np.array(self._pending_times)
+        del self._pending_channels[:]
+        del self._pending_powers[:]
+        del self._pending_times[:]
+
+        # Group the updates per channel, keeping their order within it.
+        order = np.argsort(channels, kind="stable")
+        channels, powers, times = channels[order], powers[order], times[order]
+        first = np.ones(len(channels), dtype=bool)
+        first[1:] = channels[1:] != channels[:-1]
+        last = np.ones(len(channels), dtype=bool)
+        last[:-1] = first[1:]
+
+        # Each update closes the segment since the previous update of its
+        # channel, held at the previous power.
+        previous_powers = np.empty_like(powers)
+        previous_powers[1:] = powers[:-1]
+        previous_times = np.empty_like(times)
+        previous_times[1:] = times[:-1]
+        previous_powers[first] = self._current_power[channels[first]]
+        previous_times[first] = self._last_update[channels[first]]
+        elapsed = (times - previous_times).clip(min=0)
+
+        size = len(self._index)
+        self._power_x_duration += np.bincount(
+            channels, weights=previous_powers * elapsed, minlength=size
+        )
+        self._total_duration += np.bincount(channels, weights=elapsed, minlength=size)
+        self._current_power[channels[last]] = powers[last]
+        self._last_update[channels[last]] = times[last]
@@ -0,0 +1,125 @@
+"""Coalescing queue for high-rate Home Assistant state changes.
+
+AppDaemon schedules a callback for every state change of a listened
+entity. A P1 meter reporting every second per phase makes many of those,
+on the same event loop that drives the Modbus polling. With a
+StateChangeCoalescer a callback only queues the raw new state with the
+time it arrived; a background task hands the queued changes to a sink in
+one batch every flush interval, where they are parsed and applied.
+
+Usage:
+    coalescer = StateChangeCoalescer(sink=apply_changes, flush_interval_ms=500)
+    coalescer.start()                # from within the event loop
+    coalescer.add(("consumption", 1), "1.523")  # in the state callback
+    ...
+    coalescer.flush()                # e.g. right before concluding
+    metrics = coalescer.take_metrics()
+"""
+
+import asyncio
+import time
+from collections.abc import Callable, Hashable
+
+from ..log_wrapper import get_class_method_logger
+
+FLUSH_INTERVAL_MS = 500
+
+# Bounds the queue between flushes: when this many changes are waiting they
+# are flushed right away instead of on the timer.
+MAX_QUEUE_DEPTH = 4096
+
+
+class StateChangeCoalescer:
+    """Queues (key, value, epoch seconds) state changes, flushes them in batches."""
+
+    def __init__(
+        self,
+        sink: Callable[[list[tuple[Hashable, object, float]]], None],
+        flush_interval_ms: int = FLUSH_INTERVAL_MS,
+        max_queue_depth: int = MAX_QUEUE_DEPTH,
+    ):
+        self.__log = get_class_method_logger(module_name="state_change_coalescer")
+        self._sink = sink
+        self._flush_interval = flush_interval_ms / 1000
+        self._max_queue_depth = max_queue_depth
+        self._queue: list[tuple[Hashable, object, float]] = []
+        self._task: asyncio.Task | None = None
+        # Metrics since the previous take_metrics call.
+        self._window_start = time.monotonic()
+        self._callbacks = 0
+        self._max_depth = 0
+        self._flushes = 0
+        self._early_flushes = 0
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def add(self, key: Hashable, value: object):
+        """Queue a raw state change that arrived now."""
+        queue = self._queue
+        queue.append((key, value, time.time()))
+        self._callbacks += 1
+        depth = len(queue)
+        if depth > self._max_depth:
+            self._max_depth = depth
+        if depth >= self._max_queue_depth:
+            self._early_flushes += 1
+            self.flush()
+
+    def flush(self) -> int:
+        """Hand all queued changes to the sink, oldest first.
+
+        Returns:
+            The number of changes flushed.
+        """
+        if not self._queue:
+            return 0
+        changes, self._queue = self._queue, []
+        self._flushes += 1
+        self._sink(changes)
+        return len(changes)
+
+    def start(self):
+        """Start flushing every flush interval; call from within the event loop."""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        """Stop the flush task; queued changes are flushed first."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self.flush()
+
+    def take_metrics(self) -> dict:
+        """Return the metrics since the previous call and start a new window.
+
+        Returns:
+            Dict with queue_depth (now), max_queue_depth, callbacks,
+            callback_rate (per second), flushes and early_flushes (flushes
+            because the queue was full).
+        """
+        now = time.monotonic()
+        elapsed = now - self._window_start
+        metrics = {
+            "queue_depth": len(self._queue),
+            "max_queue_depth": self._max_depth,
+            "callbacks": self._callbacks,
+            "callback_rate": round(self._callbacks / elapsed, 2) if elapsed else 0.0,
+            "flushes": self._flushes,
+            "early_flushes": self._early_flushes,
+        }
+        self._window_start = now
+        self._callbacks = 0
+        self._max_depth = len(self._queue)
+        self._flushes = 0
+        self._early_flushes = 0
+        return metrics
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self._flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                self.__log(f"Failed to flush state changes: {e}", level="WARNING")
@@ -1103,6 +1103,9 @@ class ModbusEVSEclient(AsyncIOEventEmitter):
             source=f"set_charge_power, from {source}",
         )
         self.requested_charge_power = charge_power
+        self.event_bus.emit_event(
+            "charge_power_setpoint_change", new_setpoint=charge_power
+        )
 
         if not res:
             self.__log(
@@ -8,8 +8,12 @@ per interval so that savings calculations can be done as simple aggregations.
 Runs in two modes:
 - **Batch** (after data_repairer): fills naive_power_w for all intervals
   where it is still NULL (historical/repaired data). Uses pandas.
-- **Real-time** (after each interval conclusion): calculates naive_power
-  for the just-written interval, keeping SoC state in memory.
+- **Real-time** (called by DataMonitor for each concluded interval):
+  calculates naive_power from the interval's values, keeping SoC state in
+  memory, and writes it in the interval's transaction.
+
+Database access goes through AsyncDataStore, so neither mode blocks the
+event loop; the batch simulation itself runs in the default executor.
 """
 
 import asyncio
@@ -52,7 +56,7 @@ class NaiveChargingSimulator:
             return
 
         # Calculate charge power factor from historical data.
-        self._charge_power_factor = self.data_store.get_charge_power_factor()
+        self._charge_power_factor = await self.data_store.get_charge_power_factor()
         self.__log(
             f"Charge power factor: {self._charge_power_factor:.3f} "
             f"(effective naive power: "
@@ -60,7 +64,6 @@ class NaiveChargingSimulator:
         )
 
         # Subscribe to events.
-        self.event_bus.on("interval_concluded", self._on_interval_concluded)
         self.event_bus.on("repairer_complete", self._on_repairer_complete)
 
         # Run initial batch in the background.
@@ -68,41 +71,32 @@ class NaiveChargingSimulator:
         self.__log("Initialised, batch running in background.")
 
     # ------------------------------------------------------------------
-    #  Real-time: called after each DataMonitor interval conclusion
+    #  Real-time: called by DataMonitor for each concluded interval
     # ------------------------------------------------------------------
 
-    def _on_interval_concluded(self, timestamp: str, **kwargs):
-        """Calculate naive charging for the just-written interval."""
-        if self.data_store is None or not self.data_store.is_available:
-            return
+    async def conclude_interval(
+        self, timestamp: str, soc_pct: float | None, availability_pct: float | None
+    ):
+        """Calculate naive charging for the interval DataMonitor concludes.
 
-        # Read the interval that was just written.
-        conn = self.data_store.connection
-        if conn is None:
-            return
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT energy_kwh, soc_pct, availability_pct "
-            "FROM interval_log WHERE timestamp = ?",
-            (timestamp,),
-        )
-        row = cursor.fetchone()
-        cursor.close()
-        if row is None:
+        Called inside DataMonitor's interval transaction with the values it
+        writes, so the naive row is committed together with the interval.
+        """
+        if self.data_store is None or not self.data_store.is_available:
             return
 
         # Initialise naive SoC from DB on first call after (re)start.
         if self._naive_soc is None:
-            stored = self.data_store.get_last_naive_soc()
+            stored = await self.data_store.get_last_naive_soc()
             if stored is not None:
                 self._naive_soc = stored
-            elif row["soc_pct"] is not None:
-                self._naive_soc = row["soc_pct"]
+            elif soc_pct is not None:
+                self._naive_soc = soc_pct
             else:
                 self._naive_soc = 0.0
 
-        connected = (row["availability_pct"] or 0) > 0
-        measured_soc = row["soc_pct"]
+        connected = (availability_pct or 0) > 0
+        measured_soc = soc_pct
 
         # Detect return from trip: apply real SoC consumption to naive SoC.
         if connected and not self._prev_connected and measured_soc is not None:
@@ -132,7 +126,7 @@ class NaiveChargingSimulator:
         self._prev_connected = connected
 
         # Write to database.
-        self.data_store.update_naive_charging(
+        await self.data_store.update_naive_charging(
             [(naive_power, round(self._naive_soc, 2), timestamp)]
         )
 
@@ -149,37 +143,12 @@ class NaiveChargingSimulator:
         if self.data_store is None or not self.data_store.is_available:
             return
 
-        conn = self.data_store.connection
-        if conn is None:
-            return
-
         # Fetch all intervals (need full history for SoC tracking).
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT timestamp, energy_kwh, soc_pct, availability_pct, "
-            "       naive_power_w "
-            "FROM interval_log "
-            "WHERE is_repaired < 2 "
-            "ORDER BY timestamp"
-        )
-        rows = cursor.fetchall()
-        cursor.close()
-
-        if not rows:
+        df = await self.data_store.get_naive_charging_input()
+        if df is None or df.empty:
             self.__log("Batch: no intervals to process.")
             return
 
-        df = pd.DataFrame(
-            [dict(r) for r in rows],
-            columns=[
-                "timestamp",
-                "energy_kwh",
-                "soc_pct",
-                "availability_pct",
-                "naive_power_w",
-            ],
-        )
-
         # Check how many need simulation.
         needs_sim = df["naive_power_w"].isna()
         if not needs_sim.any():
@@ -192,14 +161,18 @@ class NaiveChargingSimulator:
         )
 
         # Run simulation over all rows (need full history for SoC state).
-        result = self._simulate(df)
+        # The per-row loop takes seconds for years of data: keep it off the
+        # event loop.
+        result = await asyncio.get_running_loop().run_in_executor(
+            None, self._simulate, df
+        )
 
         # Only write rows that were missing.
         to_update = result.loc[
             needs_sim, ["naive_power_w", "naive_soc_pct", "timestamp"]
         ]
         update_rows = list(to_update.itertuples(index=False, name=None))
-        self.data_store.update_naive_charging(update_rows)
+        await self.data_store.update_naive_charging(update_rows)
 
         # Update in-memory state to the last simulated value.
         self._naive_soc = float(result["naive_soc_pct"].iloc[-1])
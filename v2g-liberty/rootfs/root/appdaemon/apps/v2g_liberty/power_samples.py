@@ -0,0 +1,116 @@
+"""Ring buffer of timestamped charge power samples within one interval.
+
+DataMonitor feeds every charge power reading into a PowerSampleBuffer and
+concludes it together with the interval. Besides the mean (which the
+running power×duration sum already gives) this tells the spread of the
+power within the interval, to diagnose ramp rates and clipping by a load
+balancer.
+
+Usage:
+    samples = PowerSampleBuffer()
+    samples.add(power=1500, now=datetime.now())  # power reading
+    samples.count_setpoint_change()              # new power requested
+    stats = samples.conclude(now=datetime.now())  # min, max, p95, changes
+    # stats is ready to store; the buffer holds the current power only
+"""
+
+from array import array
+from datetime import datetime
+
+import numpy as np
+
+# Readings come about every 5 to 15 seconds, so a 5 minute interval has
+# tens of samples. The capacity only bounds memory for very chatty
+# chargers; when full the oldest sample is overwritten.
+DEFAULT_CAPACITY = 512
+
+_PERCENTILE = 0.95
+
+
+class PowerSampleBuffer:
+    """Bounded buffer of (time, power) samples of the current interval."""
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1.")
+        self._capacity = capacity
+        # Epoch seconds need double precision, power in W fits in a float.
+        self._times = array("d", bytes(8 * capacity))
+        self._powers = array("f", bytes(4 * capacity))
+        self._first = 0
+        self._count = 0
+        self._setpoint_changes = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def add(self, power: float, now: datetime):
+        """Record a power reading, held until the next reading."""
+        index = (self._first + self._count) % self._capacity
+        self._times[index] = now.timestamp()
+        self._powers[index] = power
+        if self._count < self._capacity:
+            self._count += 1
+        else:
+            self._first = (self._first + 1) % self._capacity
+
+    def count_setpoint_change(self):
+        """Record that a new charge power was requested from the charger."""
+        self._setpoint_changes += 1
+
+    def conclude(self, now: datetime) -> dict:
+        """Conclude the interval and return its power statistics.
+
+        The p95 is weighted by how long each power was held, up to now. The
+        buffer is reset for the next interval, starting with the last power
+        held at now.
+
+        Returns:
+            Dict with power_min_w, power_max_w, power_p95_w (None without
+            samples) and setpoint_changes.
+        """
+        stats = {
+            "power_min_w": None,
+            "power_max_w": None,
+            "power_p95_w": None,
+            "setpoint_changes": self._setpoint_changes,
+        }
+        if self._count > 0:
+            # Oldest sample first. Until the buffer has wrapped around the
+            # samples are views of the arrays; np.roll copies them in order.
+            times = np.frombuffer(self._times)
+            powers = np.frombuffer(self._powers, dtype=np.float32)
+            if self._first:
+                times = np.roll(times, -self._first)
+                powers = np.roll(powers, -self._first)
+            times = times[: self._count]
+            powers = powers[: self._count].astype(float)
+            stats["power_min_w"] = round(float(powers.min()), 1)
+            stats["power_max_w"] = round(float(powers.max()), 1)
+            stats["power_p95_w"] = round(_weighted_percentile(times, powers, now), 1)
+            last_power = float(powers[-1])
+            self.reset()
+            self.add(last_power, now)
+        else:
+            self.reset()
+        return stats
+
+    def reset(self):
+        """Drop all samples and setpoint changes."""
+        self._first = 0
+        self._count = 0
+        self._setpoint_changes = 0
+
+
+def _weighted_percentile(times: np.ndarray, powers: np.ndarray, now: datetime):
+    """Return the lowest power the power stayed at or below 95% of the time.
+
+    Samples without duration (all taken at now) count equally.
+    """
+    durations = np.diff(np.append(times, now.timestamp())).clip(min=0)
+    if durations.sum() == 0:
+        durations = np.ones_like(powers)
+    order = np.argsort(powers, kind="stable")
+    cumulative = np.cumsum(durations[order])
+    index = np.searchsorted(cumulative, _PERCENTILE * cumulative[-1])
+    return float(powers[order][min(index, len(powers) - 1)])
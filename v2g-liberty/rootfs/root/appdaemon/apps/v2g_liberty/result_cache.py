@@ -0,0 +1,90 @@
+"""Module with a small LRU cache and in-flight deduplication for query results."""
+
+import asyncio
+from collections import OrderedDict
+from collections.abc import Coroutine, Hashable
+
+
+class ResultCache:
+    """Least recently used cache of query results, each stored with a version.
+
+    A cached result is only returned while the caller asks for it with the
+    version it was stored with (e.g. DataStore.get_data_versions of its
+    range); an entry with another version is dropped. When full, the least
+    recently used entry makes room.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.__entries: OrderedDict[Hashable, tuple[Hashable, object]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    def get(self, key: Hashable, version: Hashable) -> object | None:
+        """Return the result cached for key at version, or None."""
+        entry = self.__entries.get(key)
+        if entry is None or entry[0] != version:
+            if entry is not None:
+                del self.__entries[key]
+            self.misses += 1
+            return None
+        self.__entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: Hashable, version: Hashable, result: object) -> None:
+        """Cache result for key at version."""
+        self.__entries[key] = (version, result)
+        self.__entries.move_to_end(key)
+        while len(self.__entries) > self.max_entries:
+            self.__entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop all entries."""
+        self.__entries.clear()
+
+
+class SingleFlight:
+    """Shares running query computations between identical concurrent requests.
+
+    A computation is started for one or more keys (a batch) and runs as a
+    task that returns a result per key, in order. A request for a key that
+    is being computed joins that task instead of starting its own; the key
+    is forgotten as soon as the task is done (results are kept elsewhere,
+    e.g. in a ResultCache).
+
+    computed counts the keys computed, saved the requests that joined a
+    running computation instead.
+    """
+
+    def __init__(self):
+        self.computed = 0
+        self.saved = 0
+        self.__running: dict[Hashable, tuple[asyncio.Task, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.__running)
+
+    def join(self, key: Hashable) -> tuple[asyncio.Task, int] | None:
+        """Return (task, index) of the running computation of key, or None."""
+        running = self.__running.get(key)
+        if running is not None:
+            self.saved += 1
+        return running
+
+    def start(self, keys: list[Hashable], work: Coroutine) -> asyncio.Task:
+        """Run work, returning the results of keys in order, as a task."""
+        task = asyncio.ensure_future(work)
+        for index, key in enumerate(keys):
+            self.__running[key] = (task, index)
+        self.computed += len(keys)
+        task.add_done_callback(lambda _: self.__forget(keys, task))
+        return task
+
+    def __forget(self, keys: list[Hashable], task: asyncio.Task) -> None:
+        for key in keys:
+            if self.__running.get(key, (None,))[0] is task:
+                del self.__running[key]
@@ -16,6 +16,7 @@ from .fm_data_sender import FMDataSender
 from .api_server import ApiServer
 from .data_repairer import DataRepairer
 from .data_store import DataStore
+from .async_data_store import AsyncDataStore
 from .fm_data_importer import FlexMeasuresDataImporter
 from .amber_price_data_manager import ManageAmberPriceData
 from .octopus_price_data_manager import ManageOctopusPriceData
@@ -68,6 +69,8 @@ class V2GLibertyApp(Hass):
 
         start_module = datetime.now()
         data_store = DataStore(self)
+        # Off-loop access for the modules that query from the event loop.
+        async_data_store = AsyncDataStore(self, db_path=data_store.DB_PATH)
         self._log_init_time("DataStore", start_module)
 
         start_module = datetime.now()
@@ -117,6 +120,7 @@ class V2GLibertyApp(Hass):
         v2g_globals.evse_client_app = modbus_evse_client
         v2g_globals.fm_client_app = fm_client
         v2g_globals.data_store = data_store
+        v2g_globals.async_data_store = async_data_store
         v2g_globals.calendar_client = reservations_client
         v2g_globals.amber_price_data_manager = amber_price_data_manager
         v2g_globals.octopus_price_data_manager = octopus_price_data_manager
@@ -126,16 +130,18 @@ class V2GLibertyApp(Hass):
         main_app.evse_client_app = modbus_evse_client
         main_app.fm_client_app = fm_client
         main_app.reservations_client = reservations_client
+        data_store.event_bus = event_bus
         data_repairer.data_store = data_store
         data_repairer.event_bus = event_bus
         v2g_globals.data_repairer = data_repairer
-        naive_charging_simulator.data_store = data_store
+        naive_charging_simulator.data_store = async_data_store
         data_monitor.evse_client_app = modbus_evse_client
         data_monitor.reservations_client = reservations_client
-        data_monitor.data_store = data_store
-        api_server.data_store = data_store
+        data_monitor.data_store = async_data_store
+        data_monitor.naive_charging_simulator = naive_charging_simulator
+        api_server.data_store = async_data_store
         api_server.data_repairer = data_repairer
-        fm_data_sender.data_store = data_store
+        fm_data_sender.data_store = async_data_store
         fm_data_sender.fm_client_app = fm_client
         get_fm_data.data_store = data_store
         amber_price_data_manager.data_store = data_store
@@ -164,6 +170,7 @@ class V2GLibertyApp(Hass):
         start_module = datetime.now()
         try:
             await data_store.initialise()
+            await async_data_store.initialise()
         except Exception as e:
             self.log(
                 f"Database initialisation failed: {e}. "
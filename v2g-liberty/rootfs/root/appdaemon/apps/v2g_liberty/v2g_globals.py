@@ -1407,10 +1407,12 @@ class V2GLibertyGlobals:
         self.__log(f"called with mode={mode}")
 
         if mode == "full":
+            await self.async_data_store.close()
             self.data_store.close()
             deleted = DataStore.delete_database()
             self.__log(f"Database {'deleted' if deleted else 'not found'}")
             await self.data_store.initialise()
+            await self.async_data_store.initialise()
 
         # Clear historical import flag so it re-runs
         clear_import_flag()
@@ -2014,7 +2016,7 @@ class V2GLibertyGlobals:
             async def on_import_complete():
                 # run_full_repair_async off-loads the synchronous repair to an
                 # executor so the event loop stays responsive on large DBs.
-                await repairer.run_full_repair_async()
+                await repairer.run_full_repair_async(report=True)
 
         asyncio.ensure_future(
             run_historical_import(
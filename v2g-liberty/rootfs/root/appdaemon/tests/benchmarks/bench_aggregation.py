@@ -0,0 +1,257 @@
+"""Benchmark: row-wise vs columnar aggregation of interval data.
+
+Builds a temporary database with 1, 3 and 5 years of synthetic 5-minute
+intervals (with prices, emissions and naive charging) and aggregates the
+whole range per granularity, once with the former list-of-dicts
+implementation (kept below for reference) and once with the columnar
+engine used by DataStore.get_aggregated_data. Both outputs are compared
+before the timings are printed.
+
+Not collected by pytest. Run from the v2g-liberty directory:
+
+    PYTHONPATH=rootfs/root/appdaemon \\
+        python rootfs/root/appdaemon/tests/benchmarks/bench_aggregation.py [years ...]
+"""
+
+import asyncio
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from unittest.mock import MagicMock
+from zoneinfo import ZoneInfo
+
+from apps.v2g_liberty import constants as c
+from apps.v2g_liberty.data_store import (
+    DataStore,
+    _aggregate_frame,
+    _calculate_savings,
+    _dominant_app_state,
+    _dominant_price_rating,
+    _fetch_interval_frame,
+    _period_key,
+    _totals_from_intervals,
+    _totals_to_period,
+    epoch_to_iso,
+    iso_to_epoch,
+)
+
+STATES = ("automatic", "charge", "discharge", "pause", "not_connected")
+RATINGS = ("very_low", "low", "average", "high", "very_high", None)
+
+
+# ── Former row-wise implementation ─────────────────────────────────
+
+# Reference prices were resolved with a correlated subquery per row.
+_LEGACY_FETCH_SQL = (
+    "SELECT i.timestamp, i.energy_kwh, i.app_state, "
+    "i.soc_pct, i.availability_pct, i.is_repaired, "
+    "i.naive_power_w, i.naive_soc_pct, "
+    "p.consumption_price_kwh, p.production_price_kwh, p.price_rating, "
+    "e.emission_intensity_kg_mwh, "
+    "r.total_price_eur_kwh AS ref_price_kwh "
+    "FROM interval_log i "
+    "LEFT JOIN price_log p ON i.timestamp = p.timestamp "
+    "LEFT JOIN emission_log e ON i.timestamp = e.timestamp "
+    "LEFT JOIN reference_price_log r ON r.month = ("
+    "  SELECT month FROM reference_price_log "
+    "  WHERE month <= strftime('%Y-%m', i.timestamp, 'unixepoch') "
+    "  ORDER BY month DESC LIMIT 1) "
+    "WHERE i.timestamp >= ? AND i.timestamp < ? "
+    "AND i.is_repaired < 2 "
+    "ORDER BY i.timestamp"
+)
+
+
+def _legacy_quarter(period_start, intervals):
+    energy = [i["energy_kwh"] for i in intervals if i["energy_kwh"] is not None]
+    cons = [
+        i["consumption_price_kwh"]
+        for i in intervals
+        if i["consumption_price_kwh"] is not None
+    ]
+    prod = [
+        i["production_price_kwh"]
+        for i in intervals
+        if i["production_price_kwh"] is not None
+    ]
+    soc = [i["soc_pct"] for i in intervals if i["soc_pct"] is not None]
+    totals = _totals_from_intervals(intervals)
+    co2_kg = totals["charge_co2_kg"] - totals["discharge_co2_kg"]
+    return {
+        "period_start": period_start,
+        "app_state": _dominant_app_state([i["app_state"] for i in intervals]),
+        "consumption_price": round(sum(cons) / len(cons), 5) if cons else None,
+        "production_price": round(sum(prod) / len(prod), 5) if prod else None,
+        "price_rating": _dominant_price_rating([i["price_rating"] for i in intervals]),
+        "soc_pct": soc[-1] if soc else None,
+        "energy_wh": round(sum(energy) * 1000),
+        "charge_cost": round(totals["charge_cost"], 4),
+        "discharge_revenue": round(totals["discharge_revenue"], 4),
+        "charge_co2_kg": round(totals["charge_co2_kg"], 1),
+        "discharge_co2_kg": round(totals["discharge_co2_kg"], 1),
+        "co2_kg": round(co2_kg, 1),
+        "has_repaired": any(i["is_repaired"] == 1 for i in intervals),
+        **_calculate_savings(intervals),
+    }
+
+
+def _legacy_hour(period_start, intervals):
+    totals = _totals_from_intervals(intervals)
+    total_kwh = totals["charge_kwh"] + totals["discharge_kwh"]
+    if total_kwh > 0:
+        avg_price = (totals["charge_cost"] + totals["discharge_revenue"]) / total_kwh
+    else:
+        cons = [
+            i["consumption_price_kwh"]
+            for i in intervals
+            if i["consumption_price_kwh"] is not None
+        ]
+        avg_price = sum(cons) / len(cons) if cons else None
+    soc = [i["soc_pct"] for i in intervals if i["soc_pct"] is not None]
+    co2_kg = totals["charge_co2_kg"] - totals["discharge_co2_kg"]
+    return {
+        "period_start": period_start,
+        "app_state": _dominant_app_state([i["app_state"] for i in intervals]),
+        "avg_price": round(avg_price, 5) if avg_price is not None else None,
+        "price_rating": _dominant_price_rating([i["price_rating"] for i in intervals]),
+        "charge_wh": round(totals["charge_kwh"] * 1000),
+        "charge_cost": round(totals["charge_cost"], 4),
+        "charge_co2_kg": round(totals["charge_co2_kg"], 1),
+        "charge_duration_min": 5 * totals["charge_count"],
+        "discharge_wh": round(totals["discharge_kwh"] * 1000),
+        "discharge_revenue": round(totals["discharge_revenue"], 4),
+        "discharge_co2_kg": round(totals["discharge_co2_kg"], 1),
+        "discharge_duration_min": 5 * totals["discharge_count"],
+        "soc_pct": soc[-1] if soc else None,
+        "co2_kg": round(co2_kg, 1),
+        "has_repaired": any(i["is_repaired"] == 1 for i in intervals),
+        **_calculate_savings(intervals),
+    }
+
+
+def legacy_fetch(conn, start, end):
+    cursor = conn.execute(_LEGACY_FETCH_SQL, (iso_to_epoch(start), iso_to_epoch(end)))
+    return [{**row, "timestamp": epoch_to_iso(row["timestamp"])} for row in cursor]
+
+
+def legacy_aggregate(raw, granularity):
+    buckets = {}
+    for row in raw:
+        buckets.setdefault(_period_key(row["timestamp"], granularity), []).append(row)
+    results = []
+    for period_start in sorted(buckets):
+        intervals = buckets[period_start]
+        if granularity == "quarter_hours":
+            results.append(_legacy_quarter(period_start, intervals))
+        elif granularity == "hours":
+            results.append(_legacy_hour(period_start, intervals))
+        else:
+            results.append(
+                _totals_to_period(period_start, _totals_from_intervals(intervals))
+            )
+    return results
+
+
+# ── Synthetic data ─────────────────────────────────────────────────
+
+
+def build_database(path: Path, years: int) -> DataStore:
+    store = DataStore(MagicMock())
+    store.DB_PATH = str(path)
+    asyncio.run(store.initialise())
+    rng = random.Random(years)
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc) - timedelta(days=365 * years)
+    intervals, prices, emissions = [], [], []
+    state, soc = "automatic", 50.0
+    for i in range(365 * years * 288):
+        timestamp = int((start + timedelta(minutes=5 * i)).timestamp())
+        if rng.random() < 0.05:
+            state = rng.choice(STATES)
+        energy = None if state == "not_connected" else rng.uniform(-0.6, 0.6)
+        if energy is not None:
+            soc = min(100.0, max(0.0, soc + energy))
+        intervals.append(
+            (
+                timestamp,
+                energy,
+                state,
+                None if energy is None else round(soc, 1),
+                0.0 if energy is None else 100.0,
+                1 if rng.random() < 0.01 else 0,
+                rng.uniform(0, 7400),
+                round(soc, 1),
+            )
+        )
+        prices.append(
+            (
+                timestamp,
+                rng.uniform(0.05, 0.45),
+                rng.uniform(0.0, 0.3),
+                rng.choice(RATINGS),
+            )
+        )
+        emissions.append((timestamp, rng.uniform(100, 500)))
+    conn = store.connection
+    conn.executemany(
+        "INSERT INTO interval_log VALUES (?, ?, ?, ?, ?, ?, ?, ?)", intervals
+    )
+    conn.executemany("INSERT INTO price_log VALUES (?, ?, ?, ?)", prices)
+    conn.executemany("INSERT INTO emission_log VALUES (?, ?)", emissions)
+    # Monthly reference prices with a gap, so the fallback path is exercised.
+    conn.executemany(
+        "INSERT INTO reference_price_log VALUES (?, 0.1, ?, ?, 'bench', ?)",
+        [
+            (
+                f"{2026 - years + month // 12}-{month % 12 + 1:02d}",
+                0.10 + month / 1000,
+                0.20 + month / 1000,
+                start.isoformat(),
+            )
+            for month in range(12 * years)
+            if month % 12 != 5
+        ],
+    )
+    conn.commit()
+    return store
+
+
+def timed(function, *args):
+    began = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - began
+
+
+def main(years_list):
+    c.TZ = ZoneInfo("Europe/Amsterdam")
+    print("Aggregation of the full range; the shared SQL fetch is timed separately.")
+    print(
+        f"{'years':>5} {'granularity':<14} {'rows':>8} {'row-wise':>10} "
+        f"{'columnar':>10} {'speedup':>8}  identical"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        for years in years_list:
+            store = build_database(Path(tmp) / f"bench_{years}.db", years)
+            conn = store.connection
+            start, end = "1970-01-01T00:00:00+00:00", "9999-01-01T00:00:00+00:00"
+            raw, raw_s = timed(legacy_fetch, conn, start, end)
+            frame, frame_s = timed(_fetch_interval_frame, conn, start, end)
+            print(
+                f"{years:>5} {'(fetch)':<14} {len(raw):>8} {raw_s:>9.2f}s "
+                f"{frame_s:>9.2f}s"
+            )
+            for granularity in ("quarter_hours", "hours", "days", "months"):
+                legacy, legacy_s = timed(legacy_aggregate, raw, granularity)
+                columnar, columnar_s = timed(_aggregate_frame, frame, granularity)
+                print(
+                    f"{years:>5} {granularity:<14} {len(raw):>8} {legacy_s:>9.2f}s "
+                    f"{columnar_s:>9.2f}s {legacy_s / columnar_s:>7.1f}x  "
+                    f"{legacy == columnar}"
+                )
+            store.close()
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [1, 3, 5])
@@ -0,0 +1,166 @@
+"""Benchmark: full repair with 1, 2 and 4 process-pool workers.
+
+Writes years of synthetic, dirty 5-minute intervals (the frame of
+bench_repair with its gap-filled rows left out, so step 0 has real gaps to
+fill) to a database file, and runs DataRepairer.run_full_repair on a fresh
+copy of it for every worker count. One worker is the serial run; more
+workers repair the FULL_REPAIR_CHUNK_DAYS chunks in a process pool.
+
+The runs with 2 and 4 workers must leave identical rows. Rows that differ
+from the serial run are counted and printed: a pool reads every chunk's
+context before the chunk before it is written, the serial run after.
+
+Raspberry Pi-class profile: the process (and so its workers) is pinned to
+exactly PI_CORES cores, the core count of a Pi 4 or 5; on a machine with
+fewer cores the benchmark refuses to run, as the 2 and 4 worker numbers
+would only measure the pool's overhead. The seconds are also scaled by the
+clock speed of the host to that of a Pi 4 (PI_CLOCK_MHZ), read from cpufreq
+or /proc/cpuinfo. That scaling ignores the difference in instructions per
+clock, so the Pi seconds are an estimate; the speedups are measured.
+
+Not collected by pytest. Run from the v2g-liberty directory:
+
+    PYTHONPATH=rootfs/root/appdaemon \\
+        python rootfs/root/appdaemon/tests/benchmarks/bench_parallel_repair.py [years ...]
+"""
+
+import asyncio
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+from unittest.mock import MagicMock
+
+from bench_repair import dirty_frame
+
+from apps.v2g_liberty import constants as c
+from apps.v2g_liberty.data_repairer import DataRepairer, _total_repairs
+from apps.v2g_liberty.data_store import DataStore
+
+WORKERS = (1, 2, 4)
+PI_CORES = 4
+PI_CLOCK_MHZ = 1800  # Raspberry Pi 4 (Cortex-A72); a Pi 5 runs at 2400
+
+
+# ── Profile ────────────────────────────────────────────────────────
+
+
+def pin_pi_cores() -> list[int]:
+    """Pin this process to PI_CORES cores; exit if there are fewer."""
+    available = sorted(os.sched_getaffinity(0))
+    if len(available) < PI_CORES:
+        sys.exit(
+            f"Raspberry Pi profile needs {PI_CORES} cores, "
+            f"only {len(available)} available."
+        )
+    cores = available[:PI_CORES]
+    os.sched_setaffinity(0, cores)
+    return cores
+
+
+def host_clock_mhz(core: int) -> float | None:
+    """Return the maximum clock speed of core in MHz, None if unknown."""
+    cpufreq = Path(f"/sys/devices/system/cpu/cpu{core}/cpufreq/cpuinfo_max_freq")
+    if cpufreq.exists():
+        return int(cpufreq.read_text()) / 1000
+    try:
+        cpuinfo = Path("/proc/cpuinfo").read_text()
+    except OSError:
+        return None
+    speeds = [
+        float(line.split(":")[1])
+        for line in cpuinfo.splitlines()
+        if line.startswith("cpu MHz")
+    ]
+    return max(speeds) if speeds else None
+
+
+# ── Database ───────────────────────────────────────────────────────
+
+
+def write_database(path: Path, years: int) -> int:
+    """Write the dirty intervals to a new database; return the row count."""
+    frame = dirty_frame(years)
+    frame = frame[frame["is_repaired"] == 0]
+    store = DataStore(MagicMock())
+    store.DB_PATH = str(path)
+    asyncio.run(store.initialise())
+    conn = store.connection
+    conn.executemany(
+        "INSERT INTO interval_log (timestamp, energy_kwh, app_state, soc_pct, "
+        "availability_pct, is_repaired) VALUES (?, ?, ?, ?, ?, 2)",
+        zip(
+            (int(ts.timestamp()) for ts in frame.index),
+            frame["energy_kwh"].astype(object).where(frame["energy_kwh"].notna()),
+            frame["app_state"],
+            frame["soc_pct"].astype(object).where(frame["soc_pct"].notna()),
+            frame["availability_pct"],
+        ),
+    )
+    conn.commit()
+    conn.close()
+    return len(frame)
+
+
+def run_repair(template: Path, copy: Path, workers: int):
+    """Repair a copy of template; return (seconds, summary, rows)."""
+    shutil.copy(template, copy)
+    conn = sqlite3.connect(copy, timeout=30)
+    conn.row_factory = sqlite3.Row
+    try:
+        began = time.perf_counter()
+        summary = DataRepairer(MagicMock()).run_full_repair(conn=conn, workers=workers)
+        seconds = time.perf_counter() - began
+        rows = [
+            tuple(row)
+            for row in conn.execute("SELECT * FROM interval_log ORDER BY timestamp")
+        ]
+    finally:
+        conn.close()
+    return seconds, summary, rows
+
+
+# ── Runs ───────────────────────────────────────────────────────────
+
+
+def main(years_list):
+    c.CHARGER_MAX_CHARGE_POWER = 7400
+    c.CAR_MAX_CAPACITY_IN_KWH = 60
+    cores = pin_pi_cores()
+    host_mhz = host_clock_mhz(cores[0])
+    # Seconds at the Pi's clock speed, for the same number of clock cycles.
+    pi_scale = host_mhz / PI_CLOCK_MHZ if host_mhz else float("nan")
+    print(
+        f"Raspberry Pi profile: cores {cores}, "
+        f"host {host_mhz or 'unknown'} MHz scaled to {PI_CLOCK_MHZ} MHz"
+    )
+    print(
+        f"{'years':>5} {'rows':>8} {'workers':>7} {'seconds':>8} "
+        f"{'Pi s':>8} {'speedup':>8} {'repairs':>8} {'vs serial':>9}"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        for years in years_list:
+            template = Path(tmp) / f"dirty_{years}.db"
+            count = write_database(template, years)
+            results = {
+                workers: run_repair(template, Path(tmp) / "run.db", workers)
+                for workers in WORKERS
+            }
+            assert results[2][2] == results[4][2], "pool results differ"
+
+            serial_s, _, serial_rows = results[1]
+            for workers, (seconds, summary, rows) in results.items():
+                repairs = _total_repairs(summary)
+                differ = sum(a != b for a, b in zip(rows, serial_rows))
+                print(
+                    f"{years:>5} {count:>8} {workers:>7} {seconds:>7.1f}s "
+                    f"{seconds * pi_scale:>7.1f}s {serial_s / seconds:>7.2f}x "
+                    f"{repairs:>8} {differ:>9}"
+                )
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [1, 3])
@@ -0,0 +1,160 @@
+"""Benchmark: PowerTracker per channel vs one PowerTrackerBank.
+
+Replays the readings of a three-phase DSMR meter (consumption and
+production per phase) plus the given number of PV panels, every channel
+reporting once a second, through:
+
+- trackers: a PowerTracker per channel, as DataMonitor had, looked up in
+            a dict per reading and concluded one by one.
+- bank:     one PowerTrackerBank, updated per reading and concluded in a
+            single vectorised pass.
+
+Both conclude every 5 minutes for the given number of hours, in two modes:
+
+- replay:    every reading carries its timestamp. The averages of both
+             are compared before the timings are printed.
+- callbacks: as in DataMonitor's listen_state callbacks, the time is read
+             per reading; a local datetime for the trackers, the system
+             clock (now=None) for the bank.
+
+Not collected by pytest. Run from the v2g-liberty directory:
+
+    PYTHONPATH=rootfs/root/appdaemon \\
+        python rootfs/root/appdaemon/tests/benchmarks/bench_power_trackers.py [hours] [panels]
+"""
+
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from apps.v2g_liberty.grid_connection.power_tracker import PowerTracker
+from apps.v2g_liberty.grid_connection.power_tracker_bank import PowerTrackerBank
+
+START = datetime(2026, 5, 1, tzinfo=timezone.utc)
+INTERVAL_SECONDS = 300
+LOCAL_TZ = timezone(timedelta(hours=2))
+
+
+def channels(panels: int) -> list:
+    return [
+        (direction, phase)
+        for direction in ("consumption", "production")
+        for phase in (1, 2, 3)
+    ] + [f"sp_{panel}" for panel in range(1, panels + 1)]
+
+
+def readings(keys: list, hours: int) -> list[list[tuple]]:
+    """Return per interval the (key, power, now) readings, in time order."""
+    rng = random.Random(hours)
+    intervals = []
+    for interval in range(hours * 3600 // INTERVAL_SECONDS):
+        rows = []
+        for second in range(INTERVAL_SECONDS):
+            now = START + timedelta(seconds=interval * INTERVAL_SECONDS + second)
+            for key in keys:
+                rows.append((key, round(rng.uniform(0, 5), 3), now))
+        intervals.append(rows)
+    return intervals
+
+
+def interval_end(index: int) -> datetime:
+    return START + timedelta(seconds=(index + 1) * INTERVAL_SECONDS)
+
+
+# ── Per channel PowerTracker ───────────────────────────────────────
+
+
+def run_trackers(keys: list, intervals: list, callbacks: bool):
+    trackers = {key: PowerTracker() for key in keys}
+    for tracker in trackers.values():
+        tracker.reset(START)
+    update_s = conclude_s = 0.0
+    results = []
+    for index, rows in enumerate(intervals):
+        began = time.perf_counter()
+        if callbacks:
+            for key, power, _ in rows:
+                tracker = trackers.get(key)
+                if tracker:
+                    tracker.update(power, datetime.now(tz=LOCAL_TZ))
+        else:
+            for key, power, now in rows:
+                tracker = trackers.get(key)
+                if tracker:
+                    tracker.update(power, now)
+        update_s += time.perf_counter() - began
+
+        end = interval_end(index)
+        began = time.perf_counter()
+        results.append(
+            {key: tracker.conclude(end) for key, tracker in trackers.items()}
+        )
+        conclude_s += time.perf_counter() - began
+    return update_s, conclude_s, results
+
+
+# ── PowerTrackerBank ───────────────────────────────────────────────
+
+
+def run_bank(keys: list, intervals: list, callbacks: bool):
+    bank = PowerTrackerBank()
+    for key in keys:
+        bank.add_channel(key, START)
+    update_s = conclude_s = 0.0
+    results = []
+    for index, rows in enumerate(intervals):
+        began = time.perf_counter()
+        if callbacks:
+            for key, power, _ in rows:
+                if key in bank:
+                    bank.update(key, power)
+        else:
+            for key, power, now in rows:
+                if key in bank:
+                    bank.update(key, power, now)
+        update_s += time.perf_counter() - began
+
+        began = time.perf_counter()
+        results.append(bank.conclude(interval_end(index)))
+        conclude_s += time.perf_counter() - began
+    return update_s, conclude_s, results
+
+
+def main(hours: int, panels: int):
+    keys = channels(panels)
+    intervals = readings(keys, hours)
+    count = sum(len(rows) for rows in intervals)
+    print(f"{len(keys)} channels, {count} readings, {len(intervals)} intervals")
+    print(
+        f"{'mode':<9} {'':<9} {'update':>10} {'conclude':>10} {'total':>10} "
+        f"{'speedup':>8}"
+    )
+    for mode, callbacks in (("replay", False), ("callbacks", True)):
+        tracker_update, tracker_conclude, expected = run_trackers(
+            keys, intervals, callbacks
+        )
+        bank_update, bank_conclude, actual = run_bank(keys, intervals, callbacks)
+        if not callbacks:
+            for tracker_averages, bank_averages in zip(expected, actual):
+                for key, average in tracker_averages.items():
+                    assert abs(average - bank_averages[key]) <= 0.001, f"{key} differs"
+
+        tracker_s = tracker_update + tracker_conclude
+        bank_s = bank_update + bank_conclude
+        for label, update_s, conclude_s, speedup in (
+            ("trackers", tracker_update, tracker_conclude, ""),
+            ("bank", bank_update, bank_conclude, f"{tracker_s / bank_s:.1f}x"),
+        ):
+            print(
+                f"{mode:<9} {label:<9} {update_s * 1000:>8.0f}ms "
+                f"{conclude_s * 1000:>8.1f}ms {(update_s + conclude_s) * 1000:>8.0f}ms "
+                f"{speedup:>8}"
+            )
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 6,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 2,
+    )
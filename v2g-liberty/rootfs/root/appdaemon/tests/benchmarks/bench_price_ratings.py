@@ -0,0 +1,134 @@
+"""Benchmark: full vs incremental price-rating recalculation.
+
+Replays two upsert patterns against two databases, once with the former
+recalculation (re-read the 24h window, re-rank it with
+calculate_price_ratings and UPDATE every row) and once through
+DataStore.upsert_prices, which keeps a PriceRatingWindow and only writes
+the ratings that changed:
+
+- epex:  once a day the 288 five-minute prices of the next day (hourly
+         prices upsampled), for the given number of days.
+- amber: every 5 minutes the current (definitive) price plus a 24h
+         forecast in which a few prices moved, for the given number of days.
+
+The ratings of both databases are compared before the timings and the
+number of rows written per pattern are printed.
+
+Not collected by pytest. Run from the v2g-liberty directory:
+
+    PYTHONPATH=rootfs/root/appdaemon \\
+        python rootfs/root/appdaemon/tests/benchmarks/bench_price_ratings.py [days]
+"""
+
+import asyncio
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from unittest.mock import MagicMock
+
+from apps.v2g_liberty.data_store import DataStore, calculate_price_ratings, iso_to_epoch
+
+START = datetime(2026, 3, 1, tzinfo=timezone.utc)
+
+
+# ── Former full recalculation ──────────────────────────────────────
+
+
+def legacy_upsert(store: DataStore, rows: list[tuple]) -> None:
+    store.upsert_prices(rows, recalculate_ratings=False)
+    timestamps = [datetime.fromisoformat(row[0]) for row in rows]
+    window_start = (min(timestamps) - timedelta(hours=6)).isoformat()
+    window_end = (max(timestamps) + timedelta(hours=18)).isoformat()
+    prices_df = store.get_prices_in_window(window_start, window_end)
+    if prices_df.empty:
+        return
+    ratings = calculate_price_ratings(prices_df)
+    conn = store.connection
+    conn.executemany(
+        "UPDATE price_log SET price_rating = ? WHERE timestamp = ?",
+        list(zip(ratings, prices_df["timestamp"].map(iso_to_epoch))),
+    )
+    conn.commit()
+
+
+# ── Update patterns ────────────────────────────────────────────────
+
+
+def epex_batches(days: int):
+    rng = random.Random(days)
+    for day in range(days):
+        day_start = START + timedelta(days=day)
+        hourly = [round(rng.uniform(0.05, 0.40), 5) for _ in range(24)]
+        yield [
+            (
+                (day_start + timedelta(minutes=5 * step)).isoformat(),
+                hourly[step // 12],
+                hourly[step // 12] * 0.8,
+                None,
+            )
+            for step in range(288)
+        ]
+
+
+def amber_batches(days: int):
+    rng = random.Random(days)
+    forecast = {}
+    for step in range(288 * days):
+        now = START + timedelta(minutes=5 * step)
+        rows = []
+        for ahead in range(288):
+            moment = (now + timedelta(minutes=5 * ahead)).isoformat()
+            if moment not in forecast or rng.random() < 0.05:
+                forecast[moment] = round(rng.uniform(0.05, 0.40), 5)
+            rows.append((moment, forecast[moment], forecast[moment] * 0.8, None))
+        yield rows
+
+
+def ratings(store: DataStore) -> list:
+    return store.connection.execute(
+        "SELECT timestamp, price_rating FROM price_log ORDER BY timestamp"
+    ).fetchall()
+
+
+def run(tmp: str, label: str, batches: list[list[tuple]]) -> None:
+    results = {}
+    for name, upsert in (
+        ("full", legacy_upsert),
+        ("incremental", lambda store, rows: store.upsert_prices(rows)),
+    ):
+        store = DataStore(MagicMock())
+        store.DB_PATH = str(Path(tmp) / f"{label}_{name}.db")
+        asyncio.run(store.initialise())
+        changes = store.connection.total_changes
+        began = time.perf_counter()
+        for rows in batches:
+            upsert(store, rows)
+        elapsed = time.perf_counter() - began
+        written = store.connection.total_changes - changes
+        results[name] = (elapsed, written, [tuple(row) for row in ratings(store)])
+        store.close()
+
+    assert results["full"][2] == results["incremental"][2], "ratings differ"
+    full_s, full_rows, _ = results["full"]
+    incr_s, incr_rows, _ = results["incremental"]
+    print(
+        f"{label:<6} {len(batches):>7} {full_s * 1000:>9.0f}ms {full_rows:>9} "
+        f"{incr_s * 1000:>9.0f}ms {incr_rows:>9} {full_s / incr_s:>7.1f}x"
+    )
+
+
+def main(days: int):
+    print(
+        f"{'update':<6} {'upserts':>7} {'full':>11} {'rows':>9} "
+        f"{'incremental':>11} {'rows':>9} {'speedup':>8}"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        run(tmp, "epex", list(epex_batches(days)))
+        run(tmp, "amber", list(amber_batches(days)))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 7)
@@ -0,0 +1,481 @@
+"""Benchmark: row-wise vs run-length SoC repair steps.
+
+Builds years of synthetic, dirty 5-minute intervals (car away with a stuck
+SoC sensor, charging with a frozen SoC that jumps, idle and discharging
+periods, NULL SoC holes and missing energy) and runs the SoC repair steps
+1a–4 of DataRepairer._repair_range on it twice:
+
+- rows: the former implementation (kept below for reference), which walks
+        each jump and gap with .loc/.iloc and writes row by row.
+- runs: the current implementation on the shared _SocRuns index.
+
+The repair counts, repaired flags and SoC of both are compared before the
+timings are printed. Summing energy per run instead of per block can move
+a reconstructed SoC across a rounding boundary, so SoC is compared to
+within one 0.1 pp step.
+
+Not collected by pytest. Run from the v2g-liberty directory:
+
+    PYTHONPATH=rootfs/root/appdaemon \\
+        python rootfs/root/appdaemon/tests/benchmarks/bench_repair.py [years ...]
+"""
+
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+
+import numpy as np
+import pandas as pd
+
+from apps.v2g_liberty import constants as c
+from apps.v2g_liberty.data_repairer import (
+    EXCEEDANCE_THRESHOLD,
+    LINEAR_SOC_JUMP_LIMIT,
+    MAX_LINEAR_SOC_GAP,
+    MAX_SOC_RECONSTRUCTION_GAP,
+    SOC_JUMP_THRESHOLD,
+    SOC_RECONSTRUCTION_TOLERANCE,
+    UPWARD_JUMP_TOLERANCE,
+    DataRepairer,
+    _get_soc_after,
+    _get_soc_before,
+    _negligible_energy_threshold,
+    _SocRuns,
+)
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+ROWS_PER_YEAR = 365 * 24 * 12
+
+STEPS = (
+    ("soc_reconstructed_up", "_reconstruct_upward_jumps"),
+    ("soc_blanked", "_blank_false_constant_soc"),
+    ("soc_linear_filled", "_interpolate_soc_linear"),
+    ("energy_interpolated", "_interpolate_energy"),
+    ("soc_reconstructed", "_reconstruct_soc_from_energy"),
+    ("soc_constant_filled", "_fill_constant_soc"),
+)
+
+
+# ── Former row-wise implementation ─────────────────────────────────
+
+
+class LegacyRepairer(DataRepairer):
+    """DataRepairer with the former row-wise SoC steps."""
+
+    def _reconstruct_upward_jumps(
+        self, df: pd.DataFrame, runs=None
+    ) -> tuple[pd.DataFrame, int]:
+        """Reconstruct or blank false constant SoC before upward jumps."""
+        soc = df["soc_pct"].copy()
+        soc_valid = soc.dropna()
+
+        if len(soc_valid) < 2:
+            return df, 0
+
+        capacity = c.CAR_MAX_CAPACITY_IN_KWH
+
+        # Find upward jumps only
+        soc_diff = soc_valid.diff()
+        jump_indices = soc_diff[soc_diff > SOC_JUMP_THRESHOLD].index
+
+        modified = 0
+        for jump_idx in jump_indices:
+            pos = soc_valid.index.get_loc(jump_idx)
+            if pos == 0:
+                continue
+
+            soc_after = soc_valid.loc[jump_idx]
+            prev_idx = soc_valid.index[pos - 1]
+            constant_value = soc_valid.loc[prev_idx]
+
+            # Walk backwards to find the constant block
+            block_indices = [prev_idx]
+            for i in range(pos - 2, -1, -1):
+                check_idx = soc_valid.index[i]
+                if soc_valid.loc[check_idx] == constant_value:
+                    block_indices.append(check_idx)
+                else:
+                    break
+
+            # Need at least 2 constant values to consider it a frozen block
+            if len(block_indices) < 2:
+                continue
+
+            # Block indices are in reverse order; sort chronologically
+            block_indices.sort()
+
+            # Calculate theoretical jump from energy in the block.
+            # NaN energy is treated as 0 (no measurement → no known change).
+            block_energy = df.loc[block_indices, "energy_kwh"].fillna(0.0)
+            charging_energy = block_energy.clip(lower=0).sum()
+            theoretical_jump = 100 * charging_energy / capacity
+            actual_jump = soc_after - constant_value
+
+            if (
+                theoretical_jump > 0
+                and abs(theoretical_jump - actual_jump) < UPWARD_JUMP_TOLERANCE
+            ):
+                # Energy explains the jump → reconstruct SoC with scaling
+                scale = actual_jump / theoretical_jump
+                cumulative_energy = block_energy.clip(lower=0).cumsum()
+                reconstructed = (
+                    constant_value + scale * 100 * cumulative_energy / capacity
+                )
+                for idx in block_indices:
+                    df.loc[idx, "soc_pct"] = round(float(reconstructed.loc[idx]), 1)
+                    df.loc[idx, "is_repaired"] = 1
+                modified += len(block_indices)
+            else:
+                # Energy does not explain the jump → blank the block
+                for idx in block_indices:
+                    df.loc[idx, "soc_pct"] = None
+                    df.loc[idx, "is_repaired"] = 1
+                modified += len(block_indices)
+
+        return df, modified
+
+    def _blank_false_constant_soc(
+        self, df: pd.DataFrame, runs=None
+    ) -> tuple[pd.DataFrame, int]:
+        """Blank false constant SoC runs before downward jumps."""
+        soc = df["soc_pct"].copy()
+        soc_valid = soc.dropna()
+
+        if len(soc_valid) < 2:
+            return df, 0
+
+        threshold = _negligible_energy_threshold()
+
+        # Find downward jumps only
+        soc_diff = soc_valid.diff()
+        jump_indices = soc_diff[soc_diff < -SOC_JUMP_THRESHOLD].index
+
+        blanked = 0
+        for jump_idx in jump_indices:
+            pos = soc_valid.index.get_loc(jump_idx)
+            if pos == 0:
+                continue
+
+            prev_idx = soc_valid.index[pos - 1]
+            constant_value = soc_valid.loc[prev_idx]
+
+            # Walk backwards over the FULL DataFrame from the row before
+            # the jump, collecting indices to blank.
+            df_pos = df.index.get_loc(prev_idx)
+            blank_indices = []
+            energy_exceeded = 0
+            availability_exceeded = 0
+
+            i = df_pos
+            while i >= 0:
+                row = df.iloc[i]
+                row_soc = row["soc_pct"]
+
+                # Stop if SoC deviates from constant value
+                if pd.notna(row_soc) and abs(row_soc - constant_value) > 0.1:
+                    break
+
+                # Update exceedance counters and check BEFORE blanking
+                energy = row["energy_kwh"]
+                if pd.notna(energy) and abs(energy) >= threshold:
+                    energy_exceeded += 1
+
+                avail = row["availability_pct"]
+                if pd.notna(avail) and avail == 100:
+                    availability_exceeded += 1
+
+                if (
+                    energy_exceeded >= EXCEEDANCE_THRESHOLD
+                    or availability_exceeded >= EXCEEDANCE_THRESHOLD
+                ):
+                    break  # Real activity proven — stop blanking
+
+                # Only blank rows that have the constant SoC value
+                if pd.notna(row_soc):
+                    blank_indices.append(df.index[i])
+
+                i -= 1
+
+            # Only blank if there's a run of constant values (>= 2).
+            # A single value before a jump is not a "constant run".
+            if len(blank_indices) >= 2:
+                for idx in blank_indices:
+                    df.loc[idx, "soc_pct"] = None
+                    df.loc[idx, "is_repaired"] = 1
+                    blanked += 1
+
+        return df, blanked
+
+    def _interpolate_soc_linear(
+        self, df: pd.DataFrame, runs=None
+    ) -> tuple[pd.DataFrame, int]:
+        """Linearly interpolate small SoC gaps with known endpoints."""
+        is_null_soc = df["soc_pct"].isna()
+        if not is_null_soc.any():
+            return df, 0
+
+        nan_groups = (is_null_soc != is_null_soc.shift()).cumsum()
+        filled = 0
+
+        for _, block_idx in df[is_null_soc].groupby(nan_groups).groups.items():
+            block = df.loc[block_idx]
+            if len(block) > MAX_LINEAR_SOC_GAP:
+                continue
+
+            start_pos = df.index.get_loc(block.index[0])
+            end_pos = df.index.get_loc(block.index[-1])
+
+            # Skip if block is at the very beginning or end
+            if start_pos == 0 or end_pos >= len(df) - 1:
+                continue
+
+            soc_before = df.iloc[start_pos - 1]["soc_pct"]
+            soc_after = df.iloc[end_pos + 1]["soc_pct"]
+
+            if pd.isna(soc_before) or pd.isna(soc_after):
+                continue
+
+            # SoC difference must be within limit
+            soc_diff = soc_after - soc_before
+            if abs(soc_diff) > LINEAR_SOC_JUMP_LIMIT:
+                continue
+
+            # Energy direction check: energy in the interval after the gap
+            # must be consistent with SoC direction
+            energy_after = df.iloc[end_pos + 1]["energy_kwh"]
+            if pd.isna(energy_after):
+                continue
+
+            if soc_diff > 0 and energy_after < 0:
+                continue  # SoC rises but next interval discharges
+            if soc_diff < 0 and energy_after > 0:
+                continue  # SoC drops but next interval charges
+
+            # Linearly interpolate
+            interpolated = np.linspace(soc_before, soc_after, len(block) + 2)[1:-1]
+
+            for idx, val in zip(block.index, interpolated):
+                df.loc[idx, "soc_pct"] = round(float(val), 1)
+                df.loc[idx, "is_repaired"] = 1
+
+            filled += len(block)
+
+        return df, filled
+
+    # ------------------------------------------------------------------
+
+    def _reconstruct_soc_from_energy(
+        self, df: pd.DataFrame, runs=None
+    ) -> tuple[pd.DataFrame, int]:
+        """Reconstruct SoC from cumulative energy + battery capacity."""
+        is_null_soc = df["soc_pct"].isna()
+        if not is_null_soc.any():
+            return df, 0
+
+        threshold = _negligible_energy_threshold()
+        capacity = c.CAR_MAX_CAPACITY_IN_KWH
+        nan_groups = (is_null_soc != is_null_soc.shift()).cumsum()
+        reconstructed_count = 0
+
+        for _, block_idx in df[is_null_soc].groupby(nan_groups).groups.items():
+            block = df.loc[block_idx]
+            if len(block) > MAX_SOC_RECONSTRUCTION_GAP:
+                continue
+
+            # Check that at least some rows have significant energy.
+            # NaN energy counts as negligible (no measurement available).
+            block_energy = df.loc[block.index, "energy_kwh"]
+            known_energy = block_energy.dropna()
+            if known_energy.empty or (known_energy.abs() <= threshold).all():
+                continue  # All negligible/unknown → Type D, not Type C
+
+            # Get SoC endpoints
+            before_soc = _get_soc_before(df, block.index[0])
+            after_soc = _get_soc_after(df, block.index[-1])
+            if before_soc is None or after_soc is None:
+                continue
+
+            # Reconstruct SoC cumulatively from energy.
+            # NaN energy → zero delta (no measurement, assume no change).
+            cumulative_soc = float(before_soc)
+            soc_values = []
+            for idx in block.index:
+                energy_val = df.loc[idx, "energy_kwh"]
+                energy = 0.0 if pd.isna(energy_val) else float(energy_val)
+                delta_soc = energy / capacity * 100
+                cumulative_soc += delta_soc
+                soc_values.append(round(cumulative_soc, 1))
+
+            # Validate: does the last reconstructed value match the endpoint?
+            if abs(soc_values[-1] - after_soc) > SOC_RECONSTRUCTION_TOLERANCE:
+                continue  # Too much deviation → skip
+
+            # Apply reconstructed values
+            for idx, soc_val in zip(block.index, soc_values):
+                df.loc[idx, "soc_pct"] = soc_val
+                df.loc[idx, "is_repaired"] = 1
+
+            reconstructed_count += len(block)
+
+        return df, reconstructed_count
+
+    def _fill_constant_soc(
+        self, df: pd.DataFrame, runs=None
+    ) -> tuple[pd.DataFrame, int]:
+        """Fill NULL SoC with constant value where energy is negligible."""
+        is_null_soc = df["soc_pct"].isna()
+        if not is_null_soc.any():
+            return df, 0
+
+        threshold = _negligible_energy_threshold()
+        nan_groups = (is_null_soc != is_null_soc.shift()).cumsum()
+        filled = 0
+
+        for _, block_idx in df[is_null_soc].groupby(nan_groups).groups.items():
+            block = df.loc[block_idx]
+
+            # Availability must be known and > 95% for all rows in the block.
+            block_avail = df.loc[block.index, "availability_pct"]
+            if block_avail.isna().any():
+                continue  # Unknown availability → skip
+            if not (block_avail > 95).all():
+                continue  # Car was not (fully) connected → skip
+
+            # All energy must be negligible (NaN counts as negligible).
+            block_energy = df.loc[block.index, "energy_kwh"].dropna()
+            if not block_energy.empty and not (block_energy.abs() <= threshold).all():
+                continue  # Has significant energy → not Type D
+
+            # Require BOTH endpoints
+            before_soc = _get_soc_before(df, block.index[0])
+            after_soc = _get_soc_after(df, block.index[-1])
+            if before_soc is None or after_soc is None:
+                continue
+
+            # Endpoints must be consistent (no big jump across the gap)
+            if abs(before_soc - after_soc) > SOC_JUMP_THRESHOLD:
+                continue
+
+            # Fill with the before value (SoC didn't change)
+            df.loc[block.index, "soc_pct"] = before_soc
+            df.loc[block.index, "is_repaired"] = 1
+            filled += len(block)
+
+        return df, filled
+
+
+# ── Synthetic data ─────────────────────────────────────────────────
+
+
+def dirty_frame(years: int) -> pd.DataFrame:
+    """Return a gap-filled interval frame as _repair_range sees it."""
+    rng = random.Random(years)
+    per_interval = c.CHARGER_MAX_CHARGE_POWER / 1000 * 5 / 60
+    percent_per_kwh = 100 / c.CAR_MAX_CAPACITY_IN_KWH
+    count = years * ROWS_PER_YEAR
+    energy = np.zeros(count)
+    soc = np.full(count, np.nan)
+    availability = np.zeros(count)
+    repaired = np.zeros(count, dtype=np.int64)
+    level = 60.0
+    position = 0
+    while position < count:
+        length = min(rng.randint(6, 300), count - position)
+        rows = slice(position, position + length)
+        kind = rng.choice(("away", "charge", "idle", "discharge"))
+        if kind == "away":
+            # Sensor stuck at the departure level, car returns lower.
+            if rng.random() < 0.5:
+                soc[rows] = round(level, 1)
+            level = max(level - rng.uniform(10, 40), 10.0)
+        else:
+            availability[rows] = 100.0
+            power = {"charge": 0.9, "idle": 0.0, "discharge": -0.6}[kind]
+            segment = np.full(length, power * per_interval)
+            energy[rows] = segment
+            levels = (level + np.cumsum(segment) * percent_per_kwh).clip(5, 100)
+            soc[rows] = levels.round(1)
+            if kind == "charge" and rng.random() < 0.4:
+                # Frozen SoC sensor for most of the charge: jumps at the end.
+                soc[position : position + length - 1] = round(level, 1)
+            level = float(levels[-1])
+        position += length
+
+    # NULL SoC holes, some gap-filled rows without energy, missing energy.
+    for _ in range(count // 200):
+        start = rng.randrange(count)
+        hole = slice(start, start + rng.randint(1, 15))
+        soc[hole] = np.nan
+        if rng.random() < 0.3:
+            energy[hole] = np.nan
+            repaired[hole] = 1
+    energy[np.array([rng.random() < 0.002 for _ in range(count)])] = np.nan
+
+    index = pd.date_range(START, periods=count, freq="5min")
+    return pd.DataFrame(
+        {
+            "energy_kwh": energy,
+            "app_state": "automatic",
+            "soc_pct": soc,
+            "availability_pct": availability,
+            "is_repaired": repaired,
+        },
+        index=index,
+    )
+
+
+# ── Runs ───────────────────────────────────────────────────────────
+
+
+def run_steps(repairer: DataRepairer, df: pd.DataFrame, index: bool):
+    """Run steps 1a–4 as _repair_range does; return (df, counts, seconds).
+
+    Step 2 (energy interpolation) is the same in both and is not timed.
+    """
+    counts = {}
+    seconds = 0.0
+    began = time.perf_counter()
+    runs = _SocRuns(df["soc_pct"]) if index else None
+    for key, step in STEPS:
+        if key == "energy_interpolated":
+            seconds += time.perf_counter() - began
+            df, counts[key] = getattr(repairer, step)(df)
+            began = time.perf_counter()
+            continue
+        df, counts[key] = getattr(repairer, step)(df, runs)
+        if index and counts[key]:
+            runs = _SocRuns(df["soc_pct"])
+    seconds += time.perf_counter() - began
+    return df, counts, seconds
+
+
+def main(years_list):
+    c.CHARGER_MAX_CHARGE_POWER = 7400
+    c.CAR_MAX_CAPACITY_IN_KWH = 60
+    print(
+        f"{'years':>5} {'rows':>8} {'repaired':>9} {'rows':>10} {'runs':>8} {'speedup':>8}"
+    )
+    for years in years_list:
+        frame = dirty_frame(years)
+        legacy_df, legacy_counts, legacy_s = run_steps(
+            LegacyRepairer(MagicMock()), frame.copy(), index=False
+        )
+        df, counts, runs_s = run_steps(DataRepairer(MagicMock()), frame.copy(), True)
+
+        assert counts == legacy_counts, (counts, legacy_counts)
+        legacy_soc = legacy_df["soc_pct"].to_numpy(dtype=float)
+        soc = df["soc_pct"].to_numpy(dtype=float)
+        assert np.allclose(soc, legacy_soc, atol=0.11, equal_nan=True), "SoC differs"
+        assert (df["is_repaired"] == legacy_df["is_repaired"]).all(), "flags differ"
+
+        repaired = sum(counts.values())
+        print(
+            f"{years:>5} {len(frame):>8} {repaired:>9} {legacy_s:>9.1f}s "
+            f"{runs_s:>7.3f}s {legacy_s / runs_s:>7.0f}x"
+        )
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [1, 2])
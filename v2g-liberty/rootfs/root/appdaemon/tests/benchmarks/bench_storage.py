@@ -0,0 +1,145 @@
+"""Benchmark: TEXT-keyed (schema v3) vs epoch-keyed (v4) time-series tables.
+
+Builds the same synthetic interval, price and emission rows once in the
+former layout (ISO 8601 TEXT keys in rowid tables) and once through
+DataStore (INTEGER epoch keys in WITHOUT ROWID tables), then compares the
+database size and the time of the joined range scan the aggregation uses,
+for a day, a month and the whole range.
+
+Not collected by pytest. Run from the v2g-liberty directory:
+
+    PYTHONPATH=rootfs/root/appdaemon \\
+        python rootfs/root/appdaemon/tests/benchmarks/bench_storage.py [years ...]
+"""
+
+import asyncio
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from unittest.mock import MagicMock
+
+from apps.v2g_liberty.data_store import DataStore
+
+_V3_SCHEMA = """
+    CREATE TABLE interval_log (
+        timestamp TEXT PRIMARY KEY,
+        energy_kwh REAL,
+        app_state TEXT NOT NULL,
+        soc_pct REAL,
+        availability_pct REAL,
+        is_repaired INTEGER NOT NULL DEFAULT 0,
+        naive_power_w REAL,
+        naive_soc_pct REAL
+    );
+    CREATE TABLE price_log (
+        timestamp TEXT PRIMARY KEY,
+        consumption_price_kwh REAL NOT NULL,
+        production_price_kwh REAL NOT NULL,
+        price_rating TEXT
+    );
+    CREATE TABLE emission_log (
+        timestamp TEXT PRIMARY KEY,
+        emission_intensity_kg_mwh REAL NOT NULL
+    );
+"""
+
+_SCAN_SQL = (
+    "SELECT i.timestamp, i.energy_kwh, i.app_state, i.soc_pct, "
+    "p.consumption_price_kwh, e.emission_intensity_kg_mwh "
+    "FROM interval_log i "
+    "LEFT JOIN price_log p ON i.timestamp = p.timestamp "
+    "LEFT JOIN emission_log e ON i.timestamp = e.timestamp "
+    "WHERE i.timestamp >= ? AND i.timestamp < ? AND i.is_repaired < 2 "
+    "ORDER BY i.timestamp"
+)
+
+
+def synthetic_rows(start: datetime, count: int):
+    rng = random.Random(count)
+    for i in range(count):
+        moment = start + timedelta(minutes=5 * i)
+        energy = rng.uniform(-0.6, 0.6)
+        yield (
+            moment,
+            (energy, "automatic", 50.0, 100.0, 0, rng.uniform(0, 7400), 50.0),
+            (rng.uniform(0.05, 0.45), rng.uniform(0.0, 0.3), "average"),
+            (rng.uniform(100, 500),),
+        )
+
+
+def fill(conn, rows, key):
+    intervals, prices, emissions = [], [], []
+    for moment, interval, price, emission in rows:
+        intervals.append((key(moment), *interval))
+        prices.append((key(moment), *price))
+        emissions.append((key(moment), *emission))
+    conn.executemany(
+        "INSERT INTO interval_log VALUES (?, ?, ?, ?, ?, ?, ?, ?)", intervals
+    )
+    conn.executemany("INSERT INTO price_log VALUES (?, ?, ?, ?)", prices)
+    conn.executemany("INSERT INTO emission_log VALUES (?, ?)", emissions)
+    conn.commit()
+    conn.execute("VACUUM")
+
+
+def scan(conn, start, end):
+    cursor = conn.cursor()
+    cursor.row_factory = None  # DataStore's connection uses sqlite3.Row
+    began = time.perf_counter()
+    count = len(cursor.execute(_SCAN_SQL, (start, end)).fetchall())
+    return count, time.perf_counter() - began
+
+
+def main(years_list):
+    print(
+        f"{'years':>5} {'range':<6} {'rows':>8} {'v3 TEXT':>10} "
+        f"{'v4 epoch':>10} {'speedup':>8}"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        for years in years_list:
+            start = datetime(2026, 1, 1, tzinfo=timezone.utc) - timedelta(
+                days=365 * years
+            )
+            count = 365 * years * 288
+
+            v3_path = Path(tmp) / f"v3_{years}.db"
+            v3 = sqlite3.connect(v3_path)
+            v3.executescript(_V3_SCHEMA)
+            fill(v3, synthetic_rows(start, count), lambda m: m.isoformat())
+
+            store = DataStore(MagicMock())
+            store.DB_PATH = str(Path(tmp) / f"v4_{years}.db")
+            asyncio.run(store.initialise())
+            v4 = store.connection
+            fill(v4, synthetic_rows(start, count), lambda m: int(m.timestamp()))
+
+            middle = start + timedelta(days=365 * years / 2)
+            for label, begin, length in (
+                ("day", middle, timedelta(days=1)),
+                ("month", middle, timedelta(days=30)),
+                ("all", start, timedelta(days=365 * years)),
+            ):
+                end = begin + length
+                rows, v3_s = scan(v3, begin.isoformat(), end.isoformat())
+                _, v4_s = scan(v4, int(begin.timestamp()), int(end.timestamp()))
+                print(
+                    f"{years:>5} {label:<6} {rows:>8} {v3_s * 1000:>8.1f}ms "
+                    f"{v4_s * 1000:>8.1f}ms {v3_s / v4_s:>7.1f}x"
+                )
+            v3.close()
+            store.close()
+            v3_mb = os.path.getsize(v3_path) / 1e6
+            v4_mb = os.path.getsize(store.DB_PATH) / 1e6
+            print(
+                f"{years:>5} {'size':<6} {count:>8} {v3_mb:>8.1f}MB "
+                f"{v4_mb:>8.1f}MB {v3_mb / v4_mb:>7.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [1, 3])
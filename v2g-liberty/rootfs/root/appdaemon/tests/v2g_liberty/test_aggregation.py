@@ -2,16 +2,29 @@
 
 from datetime import datetime, timedelta, timezone
 from unittest.mock import AsyncMock, patch
+from zoneinfo import ZoneInfo
 
+import numpy as np
+import pandas as pd
 import pytest
 from appdaemon.plugins.hass.hassapi import Hass
 
 from apps.v2g_liberty import constants as c
 from apps.v2g_liberty.data_store import (
+    VALID_GRANULARITIES,
     DataStore,
     _dominant_app_state,
     _dominant_price_rating,
+    _fetch_interval_frame,
     _period_key,
+    _period_keys,
+    _resolve_reference_prices,
+    _totals_from_intervals,
+    _totals_to_period,
+    archive_cutoff,
+    archive_intervals,
+    iso_to_epoch,
+    page_end,
 )
 
 # pylint: disable=C0116,W0621
@@ -228,6 +241,125 @@ class TestDominantPriceRating:
         assert result == "high"
 
 
+class TestPeriodKeys:
+    """The vectorized keys must equal _period_key row by row."""
+
+    @pytest.mark.parametrize("granularity", VALID_GRANULARITIES)
+    @pytest.mark.parametrize(
+        "zone", ["Europe/Amsterdam", "America/New_York", "Asia/Kolkata"]
+    )
+    def test_matches_period_key_across_dst(self, granularity, zone):
+        c.TZ = ZoneInfo(zone)
+        # Five-minute steps across the autumn fall-back (25 Oct 2026 in
+        # Europe, 1 Nov 2026 in the US) and a year boundary.
+        timestamps = pd.Series(
+            [
+                (start + timedelta(minutes=5 * i)).isoformat()
+                for start in (
+                    datetime(2026, 10, 24, 22, 0, tzinfo=timezone.utc),
+                    datetime(2026, 11, 1, 3, 0, tzinfo=timezone.utc),
+                    datetime(2026, 12, 31, 20, 0, tzinfo=timezone.utc),
+                )
+                for i in range(400)
+            ]
+        )
+
+        keys = _period_keys(timestamps, granularity)
+
+        assert list(keys) == [_period_key(t, granularity) for t in timestamps]
+
+    def test_mixed_offsets(self):
+        timestamps = pd.Series([ts(8, 0), utc_ts(8, 5), ts(8, 20)])
+
+        keys = _period_keys(timestamps, "quarter_hours")
+
+        assert list(keys) == [ts(8, 0), ts(8, 0), ts(8, 15)]
+
+    def test_invalid_granularity_raises(self):
+        with pytest.raises(ValueError):
+            _period_keys(pd.Series([ts(8, 0)]), "invalid")
+
+
+class TestPageEnd:
+    @pytest.mark.parametrize("granularity", VALID_GRANULARITIES)
+    @pytest.mark.parametrize(
+        "zone", ["Europe/Amsterdam", "America/New_York", "Asia/Kolkata"]
+    )
+    def test_pages_hold_whole_periods(self, granularity, zone):
+        c.TZ = ZoneInfo(zone)
+        start = datetime(2026, 10, 20, 13, 35, tzinfo=timezone.utc)
+        end = datetime(2027, 3, 1, tzinfo=timezone.utc)
+        # Hourly steps plus the minutes just before and after each hour.
+        step = timedelta(hours=1) if granularity != "quarter_hours" else None
+        timestamps = []
+        moment = start
+        while moment < end:
+            timestamps.append(moment)
+            moment += step or timedelta(minutes=5)
+            if step is None and len(timestamps) > 3000:
+                break
+        page_start, pages = start.isoformat(), []
+        while page_start != end.isoformat() and len(pages) < 3000:
+            page_stop = page_end(page_start, end.isoformat(), granularity, 3)
+            pages.append(
+                {
+                    _period_key(t.isoformat(), granularity)
+                    for t in timestamps
+                    if datetime.fromisoformat(page_start)
+                    <= t
+                    < datetime.fromisoformat(page_stop)
+                }
+            )
+            page_start = page_stop
+
+        assert all(len(keys) <= 3 for keys in pages)
+        assert sum(len(keys) for keys in pages) == len(set().union(*pages))
+
+    def test_first_page_includes_partial_period(self):
+        assert page_end(ts(8, 10), ts(23, 0), "hours", 2) == utc_ts(10, 0)
+        assert page_end(ts(8, 10), ts(9, 0), "hours", 2) == utc_ts(9, 0)
+
+    def test_months_and_years(self):
+        c.TZ = ZoneInfo("Europe/Amsterdam")
+        end = "2030-01-01T00:00:00+00:00"
+        assert page_end("2026-03-15T10:00:00+00:00", end, "months", 2) == (
+            "2026-04-30T22:00:00+00:00"
+        )
+        assert page_end("2026-03-15T10:00:00+00:00", end, "years", 1) == (
+            "2026-12-31T23:00:00+00:00"
+        )
+
+
+class TestResolveReferencePrices:
+    INDEX = (np.array([2026 * 12 + 0, 2026 * 12 + 2]), np.array([0.30, 0.40]))
+
+    def _resolve(self, *timestamps):
+        utc = pd.to_datetime(pd.Series(timestamps), utc=True)
+        return list(_resolve_reference_prices(utc, self.INDEX))
+
+    def test_exact_month(self):
+        assert self._resolve("2026-01-15T12:00:00+00:00") == [0.30]
+        assert self._resolve("2026-03-01T00:00:00+00:00") == [0.40]
+
+    def test_falls_back_to_most_recent_earlier_month(self):
+        assert self._resolve("2026-02-10T00:00:00+00:00") == [0.30]
+        assert self._resolve("2027-06-01T00:00:00+00:00") == [0.40]
+
+    def test_before_first_month_is_nan(self):
+        assert np.isnan(self._resolve("2025-12-31T23:55:00+00:00")[0])
+
+    def test_month_is_taken_in_utc(self):
+        # Local March 1st, 00:30 (+01:00) is still February in UTC.
+        assert self._resolve("2026-03-01T00:30:00+01:00") == [0.30]
+
+    def test_empty_index(self):
+        result = _resolve_reference_prices(
+            pd.to_datetime(pd.Series(["2026-01-15T12:00:00+00:00"]), utc=True),
+            (np.array([], dtype=np.int64), np.array([])),
+        )
+        assert np.isnan(result[0])
+
+
 # ── get_aggregated_data integration tests ──────────────────────────
 
 
@@ -325,6 +457,40 @@ class TestAggregatedDataQuarter:
         result = data_store.get_aggregated_data(ts(8, 0), ts(8, 15), "quarter_hours")
         assert result[0]["app_state"] == "automatic+"
 
+    @pytest.mark.asyncio
+    async def test_quarter_app_state_tie_uses_priority(self, data_store):
+        await data_store.initialise()
+        _insert_interval(data_store, ts(8, 0), 0.0, "pause")
+        _insert_interval(data_store, ts(8, 5), 0.25, "charge")
+        _insert_interval(data_store, ts(8, 15), 0.0, "pause")
+
+        result = data_store.get_aggregated_data(ts(8, 0), ts(8, 30), "quarter_hours")
+        assert [r["app_state"] for r in result] == ["charge+", "pause"]
+
+    @pytest.mark.asyncio
+    async def test_quarter_price_rating_tie_first_seen_wins(self, data_store):
+        await data_store.initialise()
+        for minute, rating in ((0, "high"), (5, "low"), (10, None)):
+            _insert_interval(data_store, ts(8, minute), 0.1, "automatic")
+            _insert_price(data_store, ts(8, minute), 0.25, 0.10, rating)
+        _insert_interval(data_store, ts(8, 15), 0.1, "automatic")
+        _insert_price(data_store, ts(8, 15), 0.25, 0.10, None)
+
+        result = data_store.get_aggregated_data(ts(8, 0), ts(8, 30), "quarter_hours")
+        assert [r["price_rating"] for r in result] == ["high", None]
+
+    @pytest.mark.asyncio
+    async def test_quarter_null_energy_ignored(self, data_store):
+        await data_store.initialise()
+        _insert_interval(data_store, ts(8, 0), None, "not_connected", soc_pct=None)
+        _insert_interval(data_store, ts(8, 5), 0.25, "charge", soc_pct=60.0)
+        _insert_interval(data_store, ts(8, 10), None, "charge", soc_pct=None)
+
+        row = data_store.get_aggregated_data(ts(8, 0), ts(8, 15), "quarter_hours")[0]
+        assert row["energy_wh"] == 250
+        assert row["soc_pct"] == 60.0
+        assert row["app_state"] == "charge+"
+
 
 class TestAggregatedDataHour:
     @pytest.mark.asyncio
@@ -530,3 +696,442 @@ class TestAggregatedDataEdgeCases:
         assert len(result) == 2
         assert result[0]["period_start"] == ts(8, 0)
         assert result[1]["period_start"] == ts(10, 0)
+
+
+# ── Interval rollups ───────────────────────────────────────────────
+
+
+def _day_ts(day: int, hour: int, minute: int = 0) -> str:
+    """Create a UTC ISO 8601 timestamp for 2026-02-<day> at local hour:minute."""
+    dt = datetime(2026, 2, day, hour, minute, 0, tzinfo=TEST_TZ)
+    return dt.astimezone(timezone.utc).isoformat()
+
+
+def _fill_days(store, days):
+    """Insert a few charge/discharge intervals with prices on each day."""
+    for day in days:
+        for hour, energy in ((0, 0.25), (8, 0.2), (13, -0.15), (23, -0.1)):
+            for minute in (0, 5, 55):
+                timestamp = _day_ts(day, hour, minute)
+                _insert_interval(store, timestamp, energy, "automatic")
+                _insert_price(store, timestamp, 0.20 + day / 100, 0.10)
+
+
+def _rollup_keys(store, granularity):
+    cursor = store.connection.cursor()
+    cursor.execute(
+        "SELECT period_start FROM interval_rollup WHERE granularity = ? "
+        "ORDER BY utc_start",
+        (granularity,),
+    )
+    keys = [row[0] for row in cursor.fetchall()]
+    cursor.close()
+    return keys
+
+
+def _raw_periods(store, start, end, granularity):
+    """Aggregate straight from interval_log, bypassing the rollups."""
+    frame = _fetch_interval_frame(store.connection, start, end)
+    raw = frame.astype(object).where(frame.notna(), None).to_dict("records")
+    buckets = {}
+    for row in raw:
+        buckets.setdefault(_period_key(row["utc"].isoformat(), granularity), []).append(
+            row
+        )
+    return [
+        _totals_to_period(key, _totals_from_intervals(buckets[key]))
+        for key in sorted(buckets)
+    ]
+
+
+def _assert_periods_equal(actual, expected):
+    assert [r["period_start"] for r in actual] == [r["period_start"] for r in expected]
+    for got, want in zip(actual, expected):
+        for key, value in want.items():
+            if isinstance(value, float):
+                assert got[key] == pytest.approx(value, abs=1e-4), key
+            else:
+                assert got[key] == value, key
+
+
+class TestRollups:
+    @pytest.mark.asyncio
+    async def test_insert_maintains_all_levels(self, data_store):
+        await data_store.initialise()
+        data_store.get_aggregated_data(ts(0), ts(1), "days")  # build (empty)
+        _insert_interval(data_store, utc_ts(8, 5), 0.25, "charge")
+
+        assert _rollup_keys(data_store, "quarter_hours") == [ts(8, 0)]
+        assert _rollup_keys(data_store, "hours") == [ts(8, 0)]
+        assert _rollup_keys(data_store, "days") == ["2026-02-23"]
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("granularity", ["days", "weeks", "months", "years"])
+    async def test_coarse_matches_raw_aggregation(self, data_store, granularity):
+        await data_store.initialise()
+        _fill_days(data_store, range(20, 27))
+        # Partial days at both edges, whole days in between.
+        start = _day_ts(20, 8)
+        end = _day_ts(26, 13, 5)
+
+        result = data_store.get_aggregated_data(start, end, granularity)
+
+        _assert_periods_equal(result, _raw_periods(data_store, start, end, granularity))
+
+    @pytest.mark.asyncio
+    async def test_price_upsert_updates_rollups(self, data_store):
+        await data_store.initialise()
+        _fill_days(data_store, [22, 23])
+        start, end = _day_ts(22, 0), _day_ts(24, 0)
+        data_store.get_aggregated_data(start, end, "days")
+
+        _insert_price(data_store, _day_ts(23, 8, 5), 1.00, 0.10)
+
+        result = data_store.get_aggregated_data(start, end, "days")
+        _assert_periods_equal(result, _raw_periods(data_store, start, end, "days"))
+
+    @pytest.mark.asyncio
+    async def test_emission_upsert_updates_rollups(self, data_store):
+        await data_store.initialise()
+        _fill_days(data_store, [23])
+        start, end = _day_ts(23, 0), _day_ts(24, 0)
+        assert data_store.get_aggregated_data(start, end, "days")[0]["co2_kg"] == 0
+
+        _insert_emission(data_store, _day_ts(23, 8, 0), 400.0)
+
+        row = data_store.get_aggregated_data(start, end, "days")[0]
+        assert row["charge_co2_kg"] == round(0.2 * 400 / 1000, 1)
+
+    @pytest.mark.asyncio
+    async def test_naive_update_updates_savings(self, data_store):
+        await data_store.initialise()
+        _fill_days(data_store, [23])
+        start, end = _day_ts(23, 0), _day_ts(24, 0)
+        assert (
+            data_store.get_aggregated_data(start, end, "days")[0]["savings_dynamic_eur"]
+            is None
+        )
+
+        data_store.update_naive_charging(
+            [(3000.0, 55.0, _day_ts(23, 8, 0)), (3000.0, 56.0, _day_ts(23, 8, 5))]
+        )
+
+        result = data_store.get_aggregated_data(start, end, "days")
+        assert result[0]["savings_dynamic_eur"] is not None
+        _assert_periods_equal(result, _raw_periods(data_store, start, end, "days"))
+
+    @pytest.mark.asyncio
+    async def test_pending_rows_excluded(self, data_store):
+        await data_store.initialise()
+        _fill_days(data_store, [23])
+        data_store.bulk_insert_or_ignore_intervals(
+            [
+                {
+                    "timestamp": _day_ts(23, 10, 0),
+                    "energy_kwh": 5.0,
+                    "app_state": "charge",
+                    "soc_pct": 50.0,
+                    "availability_pct": 100.0,
+                    "is_repaired": 2,
+                }
+            ]
+        )
+        start, end = _day_ts(23, 0), _day_ts(24, 0)
+
+        result = data_store.get_aggregated_data(start, end, "days")
+
+        _assert_periods_equal(result, _raw_periods(data_store, start, end, "days"))
+
+    @pytest.mark.asyncio
+    async def test_timezone_change_rebuilds(self, data_store):
+        await data_store.initialise()
+        _insert_interval(data_store, _day_ts(23, 0, 30), 0.25, "charge")
+        start, end = _day_ts(22, 0), _day_ts(25, 0)
+        result = data_store.get_aggregated_data(start, end, "days")
+        assert [r["period_start"] for r in result] == ["2026-02-23"]
+
+        # 2026-02-22T23:30 UTC is still the 22nd in UTC.
+        c.TZ = timezone.utc
+        result = data_store.get_aggregated_data(start, end, "days")
+        assert [r["period_start"] for r in result] == ["2026-02-22"]
+        assert _rollup_keys(data_store, "days") == ["2026-02-22"]
+        rows = data_store.connection.execute(
+            "SELECT utc_start, day FROM calendar_day"
+        ).fetchall()
+        assert [tuple(row) for row in rows] == [
+            ("2026-02-22T00:00:00+00:00", "2026-02-22")
+        ]
+
+    @pytest.mark.asyncio
+    async def test_calendar_keys_of_rollup_days(self, data_store):
+        await data_store.initialise()
+        _fill_days(data_store, [22, 23])
+        data_store.get_aggregated_data(_day_ts(22, 0), _day_ts(24, 0), "weeks")
+        rows = data_store.connection.execute(
+            "SELECT utc_start, day, week, month, year FROM calendar_day "
+            "ORDER BY utc_start"
+        ).fetchall()
+        assert [tuple(row) for row in rows] == [
+            (_day_ts(22, 0), "2026-02-22", "2026-W08", "2026-02", "2026"),
+            (_day_ts(23, 0), "2026-02-23", "2026-W09", "2026-02", "2026"),
+        ]
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("granularity", ["weeks", "months"])
+    async def test_first_and_last_soc_across_days(self, data_store, granularity):
+        await data_store.initialise()
+        for day in range(21, 27):
+            for hour in (6, 18):
+                _insert_interval(
+                    data_store,
+                    _day_ts(day, hour),
+                    0.1,
+                    "automatic",
+                    soc_pct=None if day == 21 else day + hour,
+                )
+        data_store.update_naive_charging(
+            [(3000.0, 40.0 + day, _day_ts(day, 6)) for day in range(22, 26)]
+        )
+        start, end = _day_ts(21, 0), _day_ts(27, 0)
+
+        result = data_store.get_aggregated_data(start, end, granularity)
+
+        _assert_periods_equal(result, _raw_periods(data_store, start, end, granularity))
+
+
+class TestArchive:
+    @staticmethod
+    def _fill(store):
+        _fill_days(store, range(20, 27))
+        store.update_naive_charging(
+            [(3000.0, 55.0, _day_ts(day, 8, 0)) for day in range(20, 27)]
+        )
+        store.upsert_reference_prices(
+            [("2026-01", 0.20, 0.10, "test", "2026-01-01T00:00:00+00:00")]
+        )
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("granularity", ["days", "weeks", "months", "years"])
+    async def test_coarse_totals_are_preserved(self, data_store, granularity):
+        await data_store.initialise()
+        self._fill(data_store)
+        start, end = _day_ts(20, 8), _day_ts(26, 13, 5)
+        before = data_store.get_aggregated_data(start, end, granularity)
+
+        archive_intervals(data_store.connection, _day_ts(24, 0))
+
+        assert data_store.get_aggregated_data(start, end, granularity) == before
+        # A rebuild takes the archived hours along.
+        data_store.connection.execute("DELETE FROM interval_rollup_state")
+        assert data_store.get_aggregated_data(start, end, granularity) == before
+
+    @pytest.mark.asyncio
+    async def test_coarse_totals_without_rollups(self, hass, data_store):
+        await data_store.initialise()
+        self._fill(data_store)
+        start, end = _day_ts(20, 0), _day_ts(27, 0)
+        before = data_store.get_aggregated_data(start, end, "days")
+        archive_intervals(data_store.connection, _day_ts(24, 0))
+        data_store.connection.execute("DELETE FROM interval_rollup_state")
+        data_store.connection.commit()
+
+        reader = DataStore(hass, read_only=True)
+        reader.DB_PATH = data_store.DB_PATH
+        reader.open()
+        try:
+            assert reader.get_aggregated_data(start, end, "days") == before
+        finally:
+            reader.close()
+
+    @pytest.mark.asyncio
+    async def test_hours_are_stitched(self, data_store):
+        await data_store.initialise()
+        self._fill(data_store)
+        start, end = _day_ts(23, 0), _day_ts(25, 0)
+        before = data_store.get_aggregated_data(start, end, "hours")
+
+        archive_intervals(data_store.connection, _day_ts(24, 0))
+
+        assert data_store.get_aggregated_data(start, end, "hours") == before
+
+    @pytest.mark.asyncio
+    async def test_archived_quarters_become_hours(self, data_store):
+        await data_store.initialise()
+        self._fill(data_store)
+        archive_intervals(data_store.connection, _day_ts(24, 0))
+
+        result = data_store.get_aggregated_data(
+            _day_ts(23, 8), _day_ts(24, 9), "quarter_hours"
+        )
+
+        keys = [row["period_start"] for row in result]
+        # One row per archived hour, quarters for the live data.
+        assert keys[:3] == [
+            "2026-02-23T08:00:00+01:00",
+            "2026-02-23T13:00:00+01:00",
+            "2026-02-23T23:00:00+01:00",
+        ]
+        assert result[0]["energy_wh"] == 600
+        assert result[0]["app_state"] == "automatic"
+        assert keys[3:] == [
+            "2026-02-24T00:00:00+01:00",
+            "2026-02-24T00:45:00+01:00",
+            "2026-02-24T08:00:00+01:00",
+            "2026-02-24T08:45:00+01:00",
+        ]
+
+    @pytest.mark.asyncio
+    async def test_old_rows_are_removed(self, data_store):
+        await data_store.initialise()
+        self._fill(data_store)
+        data_store.get_aggregated_data(_day_ts(20, 0), _day_ts(27, 0), "days")
+
+        archived = archive_intervals(data_store.connection, _day_ts(24, 0))
+
+        conn = data_store.connection
+        cutoff = iso_to_epoch(_day_ts(24, 0))
+        assert archived == 4 * 4 * 3
+        for table in ("interval_log", "price_log"):
+            assert (
+                conn.execute(
+                    f"SELECT COUNT(*) FROM {table} WHERE timestamp < ?", (cutoff,)
+                ).fetchone()[0]
+                == 0
+            )
+        assert conn.execute("SELECT COUNT(*) FROM interval_archive").fetchone()[0] == (
+            4 * 4
+        )
+        assert _rollup_keys(data_store, "quarter_hours")[0] == (
+            "2026-02-24T00:00:00+01:00"
+        )
+
+    @pytest.mark.asyncio
+    async def test_prices_of_hours_without_intervals_are_kept(self, data_store):
+        await data_store.initialise()
+        self._fill(data_store)
+        _insert_price(data_store, _day_ts(22, 4, 0), 0.30, 0.10)
+        data_store.upsert_emissions(
+            [(_day_ts(22, 4, 0), 300.0), (_day_ts(22, 8, 0), 310.0)]
+        )
+
+        archive_intervals(data_store.connection, _day_ts(24, 0))
+
+        conn = data_store.connection
+        kept = iso_to_epoch(_day_ts(22, 4, 0))
+        for table in ("price_log", "emission_log"):
+            rows = conn.execute(
+                f"SELECT timestamp FROM {table} WHERE timestamp < ?",
+                (iso_to_epoch(_day_ts(24, 0)),),
+            ).fetchall()
+            assert [row[0] for row in rows] == [kept]
+
+    @pytest.mark.asyncio
+    async def test_first_available_includes_archive(self, data_store):
+        await data_store.initialise()
+        self._fill(data_store)
+        first = data_store.get_first_available()
+
+        archive_intervals(data_store.connection, _day_ts(24, 0))
+
+        assert data_store.get_first_available() == first
+
+    @pytest.mark.asyncio
+    async def test_cutoff_keeps_pending_and_unsent_rows(self, data_store):
+        await data_store.initialise()
+        self._fill(data_store)
+        conn = data_store.connection
+        assert archive_cutoff(conn, _day_ts(24, 0, 30)) == datetime.fromisoformat(
+            _day_ts(24, 0)
+        )
+
+        data_store.set_fm_last_sent(_day_ts(22, 8, 5))
+        assert archive_cutoff(conn, _day_ts(24, 0)) == datetime.fromisoformat(
+            _day_ts(22, 8)
+        )
+
+        conn.execute(
+            "UPDATE interval_log SET is_repaired = 2 WHERE timestamp = ?",
+            (iso_to_epoch(_day_ts(21, 13, 5)),),
+        )
+        assert archive_cutoff(conn, _day_ts(24, 0)) == datetime.fromisoformat(
+            _day_ts(21, 13)
+        )
+
+    @pytest.mark.asyncio
+    async def test_no_timezone_archives_nothing(self, data_store):
+        await data_store.initialise()
+        self._fill(data_store)
+        c.TZ = None
+
+        assert archive_intervals(data_store.connection, _day_ts(24, 0)) == 0
+
+
+class TestReferencePriceInAggregation:
+    @pytest.mark.asyncio
+    async def test_fixed_savings_follow_reference_price_upserts(self, data_store):
+        await data_store.initialise()
+        _insert_interval(data_store, utc_ts(10, 0), 0.0, "pause")
+        data_store.update_naive_charging([(6000.0, 50.0, utc_ts(10, 0))])
+
+        def fixed_savings():
+            result = data_store.get_aggregated_data(
+                utc_ts(10, 0), utc_ts(10, 15), "quarter_hours"
+            )
+            return result[0]["savings_fixed_eur"]
+
+        # 6 kW for 5 minutes = 0.5 kWh naive energy, no actual energy.
+        assert fixed_savings() is None
+        data_store.upsert_reference_prices(
+            [("2026-03", 0.10, 0.10, "cbs", "2026-03-01T00:00:00+00:00")]
+        )
+        assert fixed_savings() is None  # March does not apply to February
+        data_store.upsert_reference_prices(
+            [("2026-01", 0.10, 0.20, "cbs", "2026-03-01T00:00:00+00:00")]
+        )
+        assert fixed_savings() == pytest.approx(0.5 * 0.30)
+        data_store.upsert_reference_prices(
+            [("2026-02", 0.10, 0.30, "cbs", "2026-03-01T00:00:00+00:00")]
+        )
+        assert fixed_savings() == pytest.approx(0.5 * 0.40)
+
+
+# ── Batch queries ──────────────────────────────────────────────────
+
+
+class TestAggregatedBatch:
+    @pytest.mark.asyncio
+    async def test_matches_separate_queries(self, data_store):
+        await data_store.initialise()
+        _fill_days(data_store, range(19, 25))
+        specs = [
+            (_day_ts(23, 0), _day_ts(24, 0), "hours"),
+            (_day_ts(23, 6), _day_ts(23, 12), "quarter_hours"),
+            (_day_ts(20, 10), _day_ts(23, 12), "days"),
+            (_day_ts(19, 0), _day_ts(19, 6), "hours"),
+        ]
+        expected = [data_store.get_aggregated_data(*spec) for spec in specs]
+        assert data_store.get_aggregated_batch(specs) == expected
+
+    @pytest.mark.asyncio
+    async def test_overlapping_intervals_are_fetched_once(self, data_store):
+        await data_store.initialise()
+        _fill_days(data_store, range(19, 25))
+        specs = [
+            (_day_ts(23, 0), _day_ts(24, 0), "hours"),
+            (_day_ts(23, 6), _day_ts(23, 12), "quarter_hours"),
+            # Its edge day 23 00:00-12:00 is inside the hours span.
+            (_day_ts(20, 0), _day_ts(23, 12), "days"),
+        ]
+        data_store.ensure_rollups()
+        with patch(
+            "apps.v2g_liberty.data_store._fetch_interval_frame",
+            wraps=_fetch_interval_frame,
+        ) as fetch:
+            data_store.get_aggregated_batch(specs)
+        assert fetch.call_count == 1
+        assert fetch.call_args.args[1:3] == (_day_ts(23, 0), _day_ts(24, 0))
+
+    def test_unavailable_store(self, data_store):
+        assert data_store.get_aggregated_batch(
+            [(utc_ts(0, 0), utc_ts(12, 0), "hours")] * 2
+        ) == [[], []]
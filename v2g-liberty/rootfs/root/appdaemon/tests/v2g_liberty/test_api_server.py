@@ -1,18 +1,32 @@
 """Unit tests for ApiServer REST endpoint and HA event handler (T23/T24/T40/T41)."""
 
+import asyncio
+import base64
+import gzip
+import json
 from datetime import datetime, timedelta, timezone
 from unittest.mock import AsyncMock, MagicMock
+from urllib.parse import urlencode
 
 import pytest
+from aiohttp.test_utils import make_mocked_request
 from appdaemon.plugins.hass.hassapi import Hass
 
+from apps.v2g_liberty import constants as c
 from apps.v2g_liberty.api_server import ApiServer, VALID_GRANULARITIES
+from apps.v2g_liberty.async_data_store import AsyncDataStore
+from apps.v2g_liberty.data_store import DataStore
 
 # pylint: disable=C0116,W0621
 
 TEST_TZ = timezone(timedelta(hours=1))
 
 
+@pytest.fixture(autouse=True)
+def _set_constants():
+    c.TZ = TEST_TZ
+
+
 def ts(hour: int, minute: int = 0) -> str:
     """Create a local ISO 8601 timestamp for 2026-02-23 at given hour:minute +01:00."""
     return datetime(2026, 2, 23, hour, minute, 0, tzinfo=TEST_TZ).isoformat()
@@ -24,19 +38,43 @@ def utc_ts(hour: int, minute: int = 0) -> str:
     return dt.astimezone(timezone.utc).isoformat()
 
 
-def _make_kwargs(start=None, end=None, granularity=None):
-    """Build kwargs dict mimicking an AppDaemon endpoint call with query params."""
-    query = {}
+def _make_request(start=None, end=None, granularity=None, headers=None, **params):
+    """Build a mocked aiohttp GET request of a route with query params."""
+    query = dict(params)
     if start is not None:
         query["start"] = start
     if end is not None:
         query["end"] = end
     if granularity is not None:
         query["granularity"] = granularity
+    return make_mocked_request("GET", f"/app/v2g_data?{urlencode(query)}", headers)
+
+
+async def _get(api_server, request):
+    """Call the v2g_data route; return (JSON body or None if empty, status)."""
+    response = await api_server._ApiServer__handle_aggregated_data(request, {})
+    return (json.loads(response.body) if response.body else None), response.status
+
+
+def _stream_request(route: str = "v2g_data_stream", **query):
+    """Build a mocked aiohttp request for a streaming route and its writer."""
+    writer = MagicMock()
+    for method in ("write_headers", "write", "write_eof", "drain"):
+        setattr(writer, method, AsyncMock())
+    request = make_mocked_request(
+        "GET", f"/app/{route}?{urlencode(query)}", writer=writer
+    )
+    return request, writer
+
 
-    request = MagicMock()
-    request.query = query
-    return {"request": request}
+def _streamed(writer) -> bytes:
+    """Return the body written to a stream_request writer."""
+    return b"".join(call.args[0] for call in writer.write.call_args_list)
+
+
+def _streamed_lines(writer) -> list[dict]:
+    """Return the JSON lines written to a stream_request writer."""
+    return [json.loads(line) for line in _streamed(writer).decode().splitlines()]
 
 
 @pytest.fixture
@@ -49,7 +87,10 @@ def hass():
 @pytest.fixture
 def api_server(hass):
     server = ApiServer(hass)
-    server.data_store = MagicMock()
+    server.data_store = AsyncMock()
+    server.data_store.get_data_versions.return_value = (1, 1)
+    server.data_store.get_first_available.return_value = None
+    server.data_store.get_aggregated_data.return_value = []
     return server
 
 
@@ -58,17 +99,22 @@ def api_server(hass):
 
 class TestInitialisation:
     @pytest.mark.asyncio
-    async def test_initialise_registers_endpoint_and_event_listener(
+    async def test_initialise_registers_routes_and_event_listeners(
         self, api_server, hass
     ):
         await api_server.initialise()
-        hass.register_endpoint.assert_called_once()
-        assert hass.register_endpoint.call_args[0][1] == "v2g_data"
-        # Three event listeners: data query, on-demand repair, debug logging.
-        assert hass.listen_event.call_count == 3
+        hass.register_endpoint.assert_not_called()
+        registered_routes = {
+            call.args[1] for call in hass.register_route.call_args_list
+        }
+        assert registered_routes == {"v2g_data", "v2g_data_stream", "v2g_export"}
+        # Four event listeners: data (batch) query, on-demand repair, debug
+        # logging.
+        assert hass.listen_event.call_count == 4
         registered_events = {call.args[1] for call in hass.listen_event.call_args_list}
         assert registered_events == {
             "v2g_data_query",
+            "v2g_data_batch_query",
             "v2g_run_full_repair",
             "v2g_enable_debug_logging",
         }
@@ -90,10 +136,8 @@ class TestInitialisation:
 class TestParameterValidation:
     @pytest.mark.asyncio
     async def test_missing_all_params(self, api_server):
-        kwargs = _make_kwargs()
-        response, status = await api_server._ApiServer__handle_aggregated_data(
-            None, kwargs
-        )
+        request = _make_request()
+        response, status = await _get(api_server, request)
         assert status == 400
         assert "start" in response["error"]
         assert "end" in response["error"]
@@ -101,65 +145,47 @@ class TestParameterValidation:
 
     @pytest.mark.asyncio
     async def test_missing_start(self, api_server):
-        kwargs = _make_kwargs(end=ts(9, 0), granularity="hours")
-        response, status = await api_server._ApiServer__handle_aggregated_data(
-            None, kwargs
-        )
+        request = _make_request(end=ts(9, 0), granularity="hours")
+        response, status = await _get(api_server, request)
         assert status == 400
         assert "start" in response["error"]
 
     @pytest.mark.asyncio
     async def test_missing_end(self, api_server):
-        kwargs = _make_kwargs(start=ts(8, 0), granularity="hours")
-        response, status = await api_server._ApiServer__handle_aggregated_data(
-            None, kwargs
-        )
+        request = _make_request(start=ts(8, 0), granularity="hours")
+        response, status = await _get(api_server, request)
         assert status == 400
         assert "end" in response["error"]
 
     @pytest.mark.asyncio
     async def test_missing_granularity(self, api_server):
-        kwargs = _make_kwargs(start=ts(8, 0), end=ts(9, 0))
-        response, status = await api_server._ApiServer__handle_aggregated_data(
-            None, kwargs
-        )
+        request = _make_request(start=ts(8, 0), end=ts(9, 0))
+        response, status = await _get(api_server, request)
         assert status == 400
         assert "granularity" in response["error"]
 
     @pytest.mark.asyncio
     async def test_invalid_granularity(self, api_server):
-        kwargs = _make_kwargs(start=ts(8, 0), end=ts(9, 0), granularity="minute")
-        response, status = await api_server._ApiServer__handle_aggregated_data(
-            None, kwargs
-        )
+        request = _make_request(start=ts(8, 0), end=ts(9, 0), granularity="minute")
+        response, status = await _get(api_server, request)
         assert status == 400
         assert "Invalid granularity" in response["error"]
         assert "minute" in response["error"]
 
     @pytest.mark.asyncio
     async def test_invalid_start_timestamp(self, api_server):
-        kwargs = _make_kwargs(start="not-a-date", end=ts(9, 0), granularity="hours")
-        response, status = await api_server._ApiServer__handle_aggregated_data(
-            None, kwargs
-        )
+        request = _make_request(start="not-a-date", end=ts(9, 0), granularity="hours")
+        response, status = await _get(api_server, request)
         assert status == 400
         assert "Invalid timestamp" in response["error"]
 
     @pytest.mark.asyncio
     async def test_invalid_end_timestamp(self, api_server):
-        kwargs = _make_kwargs(start=ts(8, 0), end="not-a-date", granularity="hours")
-        response, status = await api_server._ApiServer__handle_aggregated_data(
-            None, kwargs
-        )
+        request = _make_request(start=ts(8, 0), end="not-a-date", granularity="hours")
+        response, status = await _get(api_server, request)
         assert status == 400
         assert "Invalid timestamp" in response["error"]
 
-    @pytest.mark.asyncio
-    async def test_no_request_object(self, api_server):
-        response, status = await api_server._ApiServer__handle_aggregated_data(None, {})
-        assert status == 400
-        assert "No request object" in response["error"]
-
 
 # ── Successful requests ───────────────────────────────────────────
 
@@ -172,10 +198,8 @@ class TestSuccessfulRequests:
         ]
         api_server.data_store.get_aggregated_data.return_value = mock_result
 
-        kwargs = _make_kwargs(start=ts(8, 0), end=ts(9, 0), granularity="hours")
-        response, status = await api_server._ApiServer__handle_aggregated_data(
-            None, kwargs
-        )
+        request = _make_request(start=ts(8, 0), end=ts(9, 0), granularity="hours")
+        response, status = await _get(api_server, request)
         assert status == 200
         assert response["data"] == mock_result
         assert response["granularity"] == "hours"
@@ -186,8 +210,8 @@ class TestSuccessfulRequests:
     async def test_passes_params_to_data_store(self, api_server):
         api_server.data_store.get_aggregated_data.return_value = []
 
-        kwargs = _make_kwargs(start=ts(8, 0), end=ts(9, 0), granularity="days")
-        await api_server._ApiServer__handle_aggregated_data(None, kwargs)
+        request = _make_request(start=ts(8, 0), end=ts(9, 0), granularity="days")
+        await _get(api_server, request)
 
         api_server.data_store.get_aggregated_data.assert_called_once_with(
             utc_ts(8, 0), utc_ts(9, 0), "days"
@@ -197,10 +221,10 @@ class TestSuccessfulRequests:
     async def test_empty_result(self, api_server):
         api_server.data_store.get_aggregated_data.return_value = []
 
-        kwargs = _make_kwargs(start=ts(8, 0), end=ts(9, 0), granularity="quarter_hours")
-        response, status = await api_server._ApiServer__handle_aggregated_data(
-            None, kwargs
+        request = _make_request(
+            start=ts(8, 0), end=ts(9, 0), granularity="quarter_hours"
         )
+        response, status = await _get(api_server, request)
         assert status == 200
         assert response["data"] == []
 
@@ -208,13 +232,731 @@ class TestSuccessfulRequests:
     async def test_all_granularities_accepted(self, api_server):
         api_server.data_store.get_aggregated_data.return_value = []
         for granularity in VALID_GRANULARITIES:
-            kwargs = _make_kwargs(start=ts(8, 0), end=ts(9, 0), granularity=granularity)
-            response, status = await api_server._ApiServer__handle_aggregated_data(
-                None, kwargs
+            request = _make_request(
+                start=ts(8, 0), end=ts(9, 0), granularity=granularity
             )
+            response, status = await _get(api_server, request)
             assert status == 200, f"Granularity '{granularity}' should be accepted"
 
 
+# ── Pagination ────────────────────────────────────────────────────
+
+
+class TestPagination:
+    @pytest.mark.asyncio
+    async def test_small_range_is_one_page(self, api_server):
+        request = _make_request(start=ts(8, 0), end=ts(12, 0), granularity="hours")
+        response, _ = await _get(api_server, request)
+        assert response["next_cursor"] is None
+
+    @pytest.mark.asyncio
+    async def test_pages_follow_the_cursor(self, api_server):
+        query = {"start": ts(8, 0), "end": ts(12, 0), "granularity": "hours"}
+        request = _make_request(**query, page_size="3")
+        response, _ = await _get(api_server, request)
+        assert response["next_cursor"] == utc_ts(11, 0)
+        api_server.data_store.get_aggregated_data.assert_called_with(
+            utc_ts(8, 0), utc_ts(11, 0), "hours"
+        )
+
+        request = _make_request(**query, page_size="3", cursor=response["next_cursor"])
+        response, _ = await _get(api_server, request)
+        assert response["next_cursor"] is None
+        assert response["start"] == utc_ts(8, 0)
+        api_server.data_store.get_aggregated_data.assert_called_with(
+            utc_ts(11, 0), utc_ts(12, 0), "hours"
+        )
+
+    @pytest.mark.asyncio
+    async def test_page_size_is_capped(self, api_server):
+        api_server.max_page_size = 2
+        request = _make_request(
+            start=ts(8, 0), end=ts(12, 0), granularity="hours", page_size="100"
+        )
+        response, _ = await _get(api_server, request)
+        assert response["next_cursor"] == utc_ts(10, 0)
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("page_size", ["0", "-1", "many"])
+    async def test_invalid_page_size(self, api_server, page_size):
+        request = _make_request(
+            start=ts(8, 0), end=ts(12, 0), granularity="hours", page_size=page_size
+        )
+        response, status = await _get(api_server, request)
+        assert status == 400
+        assert "page_size" in response["error"]
+
+    @pytest.mark.asyncio
+    async def test_cursor_outside_range(self, api_server):
+        request = _make_request(
+            start=ts(8, 0), end=ts(12, 0), granularity="hours", cursor=ts(12, 0)
+        )
+        response, status = await _get(api_server, request)
+        assert status == 400
+        assert "cursor" in response["error"]
+
+    @pytest.mark.asyncio
+    async def test_event_pages(self, api_server, hass):
+        data = {
+            "start": ts(8, 0),
+            "end": ts(12, 0),
+            "granularity": "hours",
+            "page_size": 2,
+            "cursor": utc_ts(9, 0),
+        }
+        await api_server._ApiServer__handle_data_query_event("v2g_data_query", data, {})
+        assert hass.fire_event.call_args.kwargs["next_cursor"] == utc_ts(11, 0)
+        api_server.data_store.get_aggregated_data.assert_called_with(
+            utc_ts(9, 0), utc_ts(11, 0), "hours"
+        )
+
+
+# ── Streaming ─────────────────────────────────────────────────────
+
+
+class TestStreaming:
+    @pytest.mark.asyncio
+    async def test_range_is_streamed_page_by_page(self, api_server):
+        api_server.data_store.get_aggregated_data.side_effect = lambda start, *_: [
+            {"period_start": start}
+        ]
+        request, writer = _stream_request(
+            start=ts(8, 0), end=ts(12, 0), granularity="hours", page_size=3
+        )
+        response = await api_server._ApiServer__handle_data_stream(request, {})
+
+        assert response.status == 200
+        assert response.content_type == "application/x-ndjson"
+        assert response.chunked
+        assert [
+            call.args
+            for call in api_server.data_store.get_aggregated_data.call_args_list
+        ] == [
+            (utc_ts(8, 0), utc_ts(11, 0), "hours"),
+            (utc_ts(11, 0), utc_ts(12, 0), "hours"),
+        ]
+        assert _streamed_lines(writer) == [
+            {"period_start": utc_ts(8, 0)},
+            {"period_start": utc_ts(11, 0)},
+        ]
+        # Each page is written before the next is read.
+        assert writer.write.await_count == 2
+        writer.write_eof.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        "param", [{"granularity": "minute"}, {"format": "columnar"}, {"max_points": 10}]
+    )
+    async def test_invalid_stream_query(self, api_server, param):
+        query = {"start": ts(8, 0), "end": ts(12, 0), "granularity": "hours"}
+        request, writer = _stream_request(**{**query, **param})
+        response = await api_server._ApiServer__handle_data_stream(request, {})
+
+        assert response.status == 400
+        assert "error" in json.loads(response.body)
+        api_server.data_store.get_aggregated_data.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_error_ends_the_stream(self, api_server):
+        api_server.data_store.get_aggregated_data.side_effect = [
+            [{"period_start": utc_ts(8, 0)}],
+            RuntimeError("Database locked"),
+        ]
+        request, writer = _stream_request(
+            start=ts(8, 0), end=ts(12, 0), granularity="hours", page_size=2
+        )
+        response = await api_server._ApiServer__handle_data_stream(request, {})
+
+        assert response.status == 200
+        assert _streamed_lines(writer) == [
+            {"period_start": utc_ts(8, 0)},
+            {"error": "Internal server error."},
+        ]
+        writer.write_eof.assert_awaited_once()
+
+
+# ── Columnar format ───────────────────────────────────────────────
+
+HOUR_ROWS = [
+    {"period_start": utc_ts(8, 0), "charge_kwh": 1.0, "avg_soc_pct": 50.0},
+    {"period_start": utc_ts(10, 0), "charge_kwh": 2.0, "avg_soc_pct": 60.0},
+]
+
+
+class TestColumnarFormat:
+    @pytest.mark.asyncio
+    async def test_rows_are_the_default(self, api_server):
+        api_server.data_store.get_aggregated_data.return_value = HOUR_ROWS
+        request = _make_request(start=ts(8, 0), end=ts(12, 0), granularity="hours")
+        response, _ = await _get(api_server, request)
+        assert response["format"] == "rows"
+        assert response["compression"] is None
+        assert response["data"] == HOUR_ROWS
+
+    @pytest.mark.asyncio
+    async def test_hours_share_a_time_axis(self, api_server):
+        api_server.data_store.get_aggregated_data.return_value = HOUR_ROWS
+        request = _make_request(
+            start=ts(8, 0), end=ts(12, 0), granularity="hours", format="columnar"
+        )
+        response, _ = await _get(api_server, request)
+        assert response["format"] == "columnar"
+        assert response["data"] == {
+            "time_axis": {"start": utc_ts(8, 0), "step_seconds": 3600, "length": 3},
+            "columns": {
+                "charge_kwh": [1.0, None, 2.0],
+                "avg_soc_pct": [50.0, None, 60.0],
+            },
+        }
+
+    @pytest.mark.asyncio
+    async def test_days_keep_their_period_start(self, api_server):
+        rows = [
+            {"period_start": "2026-02-22T23:00:00+00:00", "charge_kwh": 5.0},
+            {"period_start": "2026-02-23T23:00:00+00:00", "charge_kwh": 6.0},
+        ]
+        api_server.data_store.get_aggregated_data.return_value = rows
+        request = _make_request(
+            start=ts(0, 0), end=ts(12, 0), granularity="days", format="columnar"
+        )
+        response, _ = await _get(api_server, request)
+        assert response["data"] == {
+            "time_axis": None,
+            "columns": {
+                "period_start": [row["period_start"] for row in rows],
+                "charge_kwh": [5.0, 6.0],
+            },
+        }
+
+    @pytest.mark.asyncio
+    async def test_gzip_compression(self, api_server):
+        api_server.data_store.get_aggregated_data.return_value = HOUR_ROWS
+        request = _make_request(
+            start=ts(8, 0),
+            end=ts(12, 0),
+            granularity="hours",
+            format="columnar",
+            compression="gzip",
+        )
+        response, _ = await _get(api_server, request)
+        assert response["compression"] == "gzip"
+        data = json.loads(gzip.decompress(base64.b64decode(response["data"])))
+        assert data["columns"]["charge_kwh"] == [1.0, None, 2.0]
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("param", [{"format": "csv"}, {"compression": "brotli"}])
+    async def test_invalid_format_or_compression(self, api_server, param):
+        request = _make_request(
+            start=ts(8, 0), end=ts(12, 0), granularity="hours", **param
+        )
+        response, status = await _get(api_server, request)
+        assert status == 400
+        assert next(iter(param)) in response["error"]
+
+    @pytest.mark.asyncio
+    async def test_format_changes_the_etag(self, api_server):
+        api_server.data_store.get_aggregated_data.return_value = HOUR_ROWS
+        query = {"start": ts(8, 0), "end": ts(12, 0), "granularity": "hours"}
+        rows = await api_server._ApiServer__handle_aggregated_data(
+            _make_request(**query), {}
+        )
+        columnar = await api_server._ApiServer__handle_aggregated_data(
+            _make_request(**query, format="columnar"), {}
+        )
+        assert rows.headers["ETag"] != columnar.headers["ETag"]
+
+    @pytest.mark.asyncio
+    async def test_event_columnar(self, api_server, hass):
+        api_server.data_store.get_aggregated_data.return_value = HOUR_ROWS
+        data = {
+            "start": ts(8, 0),
+            "end": ts(12, 0),
+            "granularity": "hours",
+            "format": "columnar",
+        }
+        await api_server._ApiServer__handle_data_query_event("v2g_data_query", data, {})
+        result = hass.fire_event.call_args.kwargs
+        assert result["format"] == "columnar"
+        assert result["data"]["time_axis"]["length"] == 3
+
+
+# ── Downsampling ──────────────────────────────────────────────────
+
+
+def _quarter_rows(count: int) -> list[dict]:
+    start = datetime(2026, 2, 23, tzinfo=timezone.utc)
+    return [
+        {
+            "period_start": (start + timedelta(minutes=15 * i)).isoformat(),
+            "soc_pct": 50.0 + i % 10,
+            "energy_wh": 100,
+        }
+        for i in range(count)
+    ]
+
+
+class TestMaxPoints:
+    @pytest.mark.asyncio
+    async def test_whole_range_is_downsampled(self, api_server):
+        api_server.data_store.get_aggregated_data.return_value = _quarter_rows(96)
+        request = _make_request(
+            start=ts(0, 0),
+            end=ts(23, 0),
+            granularity="quarter_hours",
+            page_size="4",
+            max_points="10",
+        )
+        response, _ = await _get(api_server, request)
+        assert response["next_cursor"] is None
+        api_server.data_store.get_aggregated_data.assert_called_with(
+            utc_ts(0, 0), utc_ts(23, 0), "quarter_hours"
+        )
+        assert len(response["data"]) == 10
+        assert sum(row["energy_wh"] for row in response["data"]) == 9600
+
+    @pytest.mark.asyncio
+    async def test_range_is_read_and_downsampled_per_page(self, api_server):
+        def page_rows(start, end, granularity):
+            first = datetime.fromisoformat(start)
+            count = (datetime.fromisoformat(end) - first) // timedelta(minutes=15)
+            return [
+                {
+                    "period_start": (first + timedelta(minutes=15 * i)).isoformat(),
+                    "soc_pct": 50.0 + i % 10,
+                    "energy_wh": 100,
+                }
+                for i in range(count)
+            ]
+
+        api_server.max_page_size = 24
+        api_server.data_store.get_aggregated_data.side_effect = page_rows
+        request = _make_request(
+            start=ts(0, 0), end=ts(23, 0), granularity="quarter_hours", max_points="40"
+        )
+        response, _ = await _get(api_server, request)
+
+        calls = api_server.data_store.get_aggregated_data.call_args_list
+        assert [call.args[:2] for call in calls] == [
+            (utc_ts(0, 0), utc_ts(6, 0)),
+            (utc_ts(6, 0), utc_ts(12, 0)),
+            (utc_ts(12, 0), utc_ts(18, 0)),
+            (utc_ts(18, 0), utc_ts(23, 0)),
+        ]
+        assert response["next_cursor"] is None
+        assert len(response["data"]) <= 40
+        assert sum(row["energy_wh"] for row in response["data"]) == 9200
+
+    @pytest.mark.asyncio
+    async def test_downsampled_range_is_capped(self, api_server):
+        # At most max_points // MIN_POINTS pages per response.
+        api_server.max_page_size = 4
+        request = _make_request(
+            start=ts(0, 0), end=ts(23, 0), granularity="quarter_hours", max_points="5"
+        )
+        response, _ = await _get(api_server, request)
+        assert response["next_cursor"] == utc_ts(1, 0)
+        api_server.data_store.get_aggregated_data.assert_called_once_with(
+            utc_ts(0, 0), utc_ts(1, 0), "quarter_hours"
+        )
+
+    @pytest.mark.asyncio
+    async def test_downsampled_columnar_has_no_time_axis(self, api_server):
+        api_server.data_store.get_aggregated_data.return_value = _quarter_rows(96)
+        request = _make_request(
+            start=ts(0, 0),
+            end=ts(23, 0),
+            granularity="quarter_hours",
+            format="columnar",
+            max_points="10",
+        )
+        response, _ = await _get(api_server, request)
+        assert response["data"]["time_axis"] is None
+        assert len(response["data"]["columns"]["period_start"]) == 10
+        assert sum(response["data"]["columns"]["period_count"]) == 96
+
+    @pytest.mark.asyncio
+    async def test_small_results_are_not_downsampled(self, api_server):
+        api_server.data_store.get_aggregated_data.return_value = HOUR_ROWS
+        request = _make_request(
+            start=ts(8, 0), end=ts(12, 0), granularity="hours", max_points="10"
+        )
+        response, _ = await _get(api_server, request)
+        assert response["data"] == HOUR_ROWS
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("max_points", ["2", "many"])
+    async def test_invalid_max_points(self, api_server, max_points):
+        request = _make_request(
+            start=ts(8, 0), end=ts(12, 0), granularity="hours", max_points=max_points
+        )
+        response, status = await _get(api_server, request)
+        assert status == 400
+        assert "max_points" in response["error"]
+
+
+# ── Batch queries ─────────────────────────────────────────────────
+
+
+class TestBatchQuery:
+    @pytest.mark.asyncio
+    async def test_queries_are_read_in_one_batch(self, api_server, hass):
+        api_server.data_store.get_aggregated_batch.return_value = [
+            [{"charge_wh": 1}],
+            [{"charge_kwh": 2}],
+        ]
+        data = {
+            "request_id": "card-1",
+            "queries": [
+                {"start": ts(0, 0), "end": ts(12, 0), "granularity": "hours"},
+                {"start": ts(0, 0), "end": ts(12, 0), "granularity": "days"},
+            ],
+        }
+        await api_server._ApiServer__handle_data_batch_query_event(
+            "v2g_data_batch_query", data, {}
+        )
+        api_server.data_store.get_aggregated_batch.assert_called_once_with(
+            [
+                (utc_ts(0, 0), utc_ts(12, 0), "hours"),
+                (utc_ts(0, 0), utc_ts(12, 0), "days"),
+            ]
+        )
+        api_server.data_store.get_aggregated_data.assert_not_called()
+        assert hass.fire_event.call_args.args[0] == "v2g_data_batch_query.result"
+        result = hass.fire_event.call_args.kwargs
+        assert result["request_id"] == "card-1"
+        assert [page["data"] for page in result["results"]] == [
+            [{"charge_wh": 1}],
+            [{"charge_kwh": 2}],
+        ]
+        assert "etag" not in result["results"][0]
+
+    @pytest.mark.asyncio
+    async def test_cached_results_are_not_read_again(self, api_server, hass):
+        api_server.data_store.get_aggregated_data.return_value = [{"charge_wh": 1}]
+        hours = {"start": ts(0, 0), "end": ts(12, 0), "granularity": "hours"}
+        await api_server._ApiServer__handle_data_query_event(
+            "v2g_data_query", hours, {}
+        )
+        days = {**hours, "granularity": "days"}
+        data = {"request_id": "card-1", "queries": [hours, days, hours]}
+        await api_server._ApiServer__handle_data_batch_query_event(
+            "v2g_data_batch_query", data, {}
+        )
+        api_server.data_store.get_aggregated_batch.assert_not_called()
+        api_server.data_store.get_aggregated_data.assert_called_with(
+            utc_ts(0, 0), utc_ts(12, 0), "days"
+        )
+        assert len(hass.fire_event.call_args.kwargs["results"]) == 3
+
+    @pytest.mark.asyncio
+    async def test_invalid_query_has_its_own_error(self, api_server, hass):
+        data = {
+            "request_id": "card-1",
+            "queries": [
+                {"start": ts(0, 0), "end": ts(12, 0), "granularity": "decades"},
+                {"start": ts(0, 0), "end": ts(12, 0), "granularity": "hours"},
+            ],
+        }
+        await api_server._ApiServer__handle_data_batch_query_event(
+            "v2g_data_batch_query", data, {}
+        )
+        results = hass.fire_event.call_args.kwargs["results"]
+        assert "granularity" in results[0]["error"]
+        assert results[1]["granularity"] == "hours"
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("queries", [None, [], [{}] * 11])
+    async def test_invalid_batch(self, api_server, hass, queries):
+        await api_server._ApiServer__handle_data_batch_query_event(
+            "v2g_data_batch_query", {"request_id": "card-1", "queries": queries}, {}
+        )
+        result = hass.fire_event.call_args.kwargs
+        assert result["request_id"] == "card-1"
+        assert "queries" in result["error"]
+
+    @pytest.mark.asyncio
+    async def test_single_query_echoes_request_id(self, api_server, hass):
+        data = {
+            "request_id": "card-2",
+            "start": ts(8, 0),
+            "end": ts(12, 0),
+            "granularity": "hours",
+        }
+        await api_server._ApiServer__handle_data_query_event("v2g_data_query", data, {})
+        assert hass.fire_event.call_args.kwargs["request_id"] == "card-2"
+
+
+# ── Single flight ─────────────────────────────────────────────────
+
+
+class TestSingleFlight:
+    @pytest.mark.asyncio
+    async def test_identical_queries_share_one_computation(self, api_server, hass):
+        release = asyncio.Event()
+
+        async def slow_query(*args):
+            await release.wait()
+            return [{"charge_wh": 1}]
+
+        api_server.data_store.get_aggregated_data.side_effect = slow_query
+        data = {"start": ts(8, 0), "end": ts(12, 0), "granularity": "hours"}
+        queries = [
+            asyncio.ensure_future(
+                api_server._ApiServer__handle_data_query_event(
+                    "v2g_data_query", data, {}
+                )
+            )
+            for _ in range(3)
+        ]
+        await asyncio.sleep(0.01)
+        release.set()
+        await asyncio.gather(*queries)
+
+        assert api_server.data_store.get_aggregated_data.await_count == 1
+        assert hass.fire_event.call_count == 3
+        for call in hass.fire_event.call_args_list:
+            assert call.kwargs["data"] == [{"charge_wh": 1}]
+        stats = api_server.query_stats()
+        assert (stats["computed"], stats["shared"]) == (1, 2)
+
+    @pytest.mark.asyncio
+    async def test_failure_reaches_every_request(self, api_server, hass):
+        release = asyncio.Event()
+
+        async def failing_query(*args):
+            await release.wait()
+            raise RuntimeError("database locked")
+
+        api_server.data_store.get_aggregated_data.side_effect = failing_query
+        data = {"start": ts(8, 0), "end": ts(12, 0), "granularity": "hours"}
+        queries = [
+            asyncio.ensure_future(
+                api_server._ApiServer__handle_data_query_event(
+                    "v2g_data_query", data, {}
+                )
+            )
+            for _ in range(2)
+        ]
+        await asyncio.sleep(0.01)
+        release.set()
+        await asyncio.gather(*queries)
+
+        assert api_server.data_store.get_aggregated_data.await_count == 1
+        for call in hass.fire_event.call_args_list:
+            assert call.kwargs["error"] == "Internal server error."
+
+
+# ── Export ────────────────────────────────────────────────────────
+
+
+class TestExport:
+    @pytest.mark.asyncio
+    async def test_export_is_streamed(self, api_server):
+        async def export(write, start, end):
+            await write(b"timestamp,energy_kwh\n")
+            await write(b"2026-02-23 07:00:00+00:00,0.25\n")
+            return 1
+
+        api_server.data_store.export_intervals.side_effect = export
+        request, writer = _stream_request("v2g_export", start=ts(8, 0))
+        response = await api_server._ApiServer__handle_export(request, {})
+
+        assert response.status == 200
+        assert response.content_type == "text/csv"
+        assert response.chunked
+        assert "attachment" in response.headers["Content-Disposition"]
+        assert _streamed(writer).decode().splitlines() == [
+            "timestamp,energy_kwh",
+            "2026-02-23 07:00:00+00:00,0.25",
+        ]
+        writer.write_eof.assert_awaited_once()
+        args = api_server.data_store.export_intervals.call_args.args
+        assert args[1:] == (utc_ts(8, 0), None)
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        "params",
+        [
+            {"format": "parquet"},
+            {"format": "xlsx"},
+            {"start": "yesterday"},
+            {"end": "now"},
+        ],
+    )
+    async def test_invalid_export(self, api_server, params):
+        request, _ = _stream_request("v2g_export", **params)
+        response = await api_server._ApiServer__handle_export(request, {})
+        assert response.status == 400
+        assert "error" in json.loads(response.body)
+        api_server.data_store.export_intervals.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_one_export_at_a_time(self, api_server):
+        release = asyncio.Event()
+
+        async def slow_export(*args):
+            await release.wait()
+            return 1
+
+        api_server.data_store.export_intervals.side_effect = slow_export
+        first = asyncio.ensure_future(
+            api_server._ApiServer__handle_export(_stream_request("v2g_export")[0], {})
+        )
+        await asyncio.sleep(0)
+        request, _ = _stream_request("v2g_export")
+        response = await api_server._ApiServer__handle_export(request, {})
+        assert response.status == 409
+        assert "already running" in json.loads(response.body)["error"]
+        release.set()
+        response = await first
+        assert response.status == 200
+
+    @pytest.mark.asyncio
+    async def test_failed_export_is_not_ended(self, api_server):
+        async def failing_export(write, start, end):
+            await write(b"timestamp,energy_kwh\n")
+            raise RuntimeError("Database locked")
+
+        api_server.data_store.export_intervals.side_effect = failing_export
+        request, writer = _stream_request("v2g_export")
+        await api_server._ApiServer__handle_export(request, {})
+
+        writer.write_eof.assert_not_called()
+        request.transport.close.assert_called_once()
+
+        # The next export may run.
+        api_server.data_store.export_intervals.side_effect = None
+        api_server.data_store.export_intervals.return_value = 0
+        request, _ = _stream_request("v2g_export")
+        response = await api_server._ApiServer__handle_export(request, {})
+        assert response.status == 200
+
+
+# ── Result cache and ETag ─────────────────────────────────────────
+
+
+class TestResultCache:
+    @pytest.mark.asyncio
+    async def test_unchanged_range_is_served_from_cache(self, api_server, hass):
+        api_server.data_store.get_aggregated_data.return_value = [{"charge_kwh": 1}]
+        request = _make_request(start=ts(8, 0), end=ts(9, 0), granularity="hours")
+        first, _ = await _get(api_server, request)
+        data = {"start": ts(8, 0), "end": ts(9, 0), "granularity": "hours"}
+        await api_server._ApiServer__handle_data_query_event("v2g_data_query", data, {})
+
+        api_server.data_store.get_aggregated_data.assert_awaited_once()
+        api_server.data_store.get_first_available.assert_awaited_once()
+        assert hass.fire_event.call_args.kwargs["data"] == first["data"]
+
+    @pytest.mark.asyncio
+    async def test_changed_range_is_queried_again(self, api_server):
+        request = _make_request(start=ts(8, 0), end=ts(9, 0), granularity="hours")
+        await _get(api_server, request)
+        api_server.data_store.get_data_versions.return_value = (2, 2)
+        await _get(api_server, request)
+
+        assert api_server.data_store.get_aggregated_data.await_count == 2
+        assert api_server.data_store.get_first_available.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_other_data_only_refreshes_first_available(self, api_server):
+        request = _make_request(start=ts(8, 0), end=ts(9, 0), granularity="hours")
+        await _get(api_server, request)
+        api_server.data_store.get_data_versions.return_value = (1, 2)
+        await _get(api_server, request)
+
+        api_server.data_store.get_aggregated_data.assert_awaited_once()
+        assert api_server.data_store.get_first_available.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_no_cache_without_versions(self, api_server):
+        api_server.data_store.get_data_versions.return_value = None
+        request = _make_request(start=ts(8, 0), end=ts(9, 0), granularity="hours")
+        await _get(api_server, request)
+        response = await api_server._ApiServer__handle_aggregated_data(request, {})
+
+        assert response.status == 200
+        assert "ETag" not in response.headers
+        assert api_server.data_store.get_aggregated_data.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_matching_etag_returns_not_modified(self, api_server):
+        request = _make_request(start=ts(8, 0), end=ts(9, 0), granularity="hours")
+        response = await api_server._ApiServer__handle_aggregated_data(request, {})
+        etag = response.headers["ETag"]
+        assert "etag" not in json.loads(response.body)
+        api_server.data_store.get_aggregated_data.reset_mock()
+
+        request = _make_request(
+            start=ts(8, 0),
+            end=ts(9, 0),
+            granularity="hours",
+            headers={"If-None-Match": f'"other", W/{etag}'},
+        )
+        response = await api_server._ApiServer__handle_aggregated_data(request, {})
+        assert response.status == 304
+        assert response.headers["ETag"] == etag
+        assert response.body is None
+        api_server.data_store.get_aggregated_data.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_etag_changes_with_the_data(self, api_server):
+        request = _make_request(start=ts(8, 0), end=ts(9, 0), granularity="hours")
+        response = await api_server._ApiServer__handle_aggregated_data(request, {})
+        etag = response.headers["ETag"]
+        api_server.data_store.get_data_versions.return_value = (2, 2)
+
+        request = _make_request(
+            start=ts(8, 0),
+            end=ts(9, 0),
+            granularity="hours",
+            headers={"If-None-Match": etag},
+        )
+        response = await api_server._ApiServer__handle_aggregated_data(request, {})
+        assert response.status == 200
+        assert response.headers["ETag"] != etag
+
+    @pytest.mark.asyncio
+    async def test_rerated_neighbour_is_queried_again(self, hass, tmp_path):
+        """A price upsert that re-rates a cached hour on the day before."""
+        store = DataStore(hass)
+        store.DB_PATH = str(tmp_path / "test_api_server.db")
+        await store.initialise()
+        store.insert_interval("2026-02-21T23:00:00+00:00", 0.1, "automatic", 50, 100)
+        store.upsert_prices(
+            [
+                ("2026-02-21T23:00:00+00:00", 0.10, 0.0, None),
+                ("2026-02-21T23:05:00+00:00", 0.30, 0.0, None),
+            ]
+        )
+        async_store = AsyncDataStore(hass, db_path=store.DB_PATH)
+        await async_store.initialise()
+        server = ApiServer(hass)
+        server.data_store = async_store
+        try:
+            query = {
+                "start": "2026-02-21T23:00:00+00:00",
+                "end": "2026-02-22T00:00:00+00:00",
+                "granularity": "hours",
+            }
+            cached = await server._ApiServer__handle_aggregated_data(
+                _make_request(**query), {}
+            )
+            assert json.loads(cached.body)["data"][0]["price_rating"] == "average"
+
+            # A higher price the next day re-rates 23:00 without writing it.
+            store.upsert_prices([("2026-02-22T00:00:00+00:00", 0.50, 0.0, None)])
+
+            etag = cached.headers["ETag"]
+            request = _make_request(**query, headers={"If-None-Match": etag})
+            response, status = await _get(server, request)
+        finally:
+            await async_store.close()
+            store.close()
+        assert status == 200
+        assert response["data"][0]["price_rating"] == "low"
+
+
 # ── Error handling ────────────────────────────────────────────────
 
 
@@ -223,10 +965,8 @@ class TestErrorHandling:
     async def test_data_store_exception_returns_500(self, api_server):
         api_server.data_store.get_aggregated_data.side_effect = RuntimeError("DB error")
 
-        kwargs = _make_kwargs(start=ts(8, 0), end=ts(9, 0), granularity="hours")
-        response, status = await api_server._ApiServer__handle_aggregated_data(
-            None, kwargs
-        )
+        request = _make_request(start=ts(8, 0), end=ts(9, 0), granularity="hours")
+        response, status = await _get(api_server, request)
         assert status == 500
         assert "Internal server error" in response["error"]
 
@@ -0,0 +1,312 @@
+"""Unit test (pytest) for async_data_store module."""
+
+import asyncio
+import logging
+import threading
+from datetime import timedelta, timezone
+from unittest.mock import AsyncMock
+
+import pytest
+import pytest_asyncio
+from appdaemon.plugins.hass.hassapi import Hass
+
+from apps.v2g_liberty import constants as c
+from apps.v2g_liberty.async_data_store import AsyncDataStore
+from apps.v2g_liberty.data_store import DataStore
+
+# pylint: disable=C0116,W0621
+
+TEST_TZ = timezone(timedelta(hours=1))
+
+
+@pytest.fixture(autouse=True)
+def _set_constants():
+    c.TZ = TEST_TZ
+
+
+@pytest.fixture
+def hass():
+    return AsyncMock(spec=Hass)
+
+
+@pytest_asyncio.fixture
+async def data_store(hass, tmp_path):
+    """Initialised DataStore; creates the database the facade opens."""
+    store = DataStore(hass)
+    store.DB_PATH = str(tmp_path / "test_async_data_store.db")
+    await store.initialise()
+    yield store
+    store.close()
+
+
+@pytest_asyncio.fixture
+async def async_store(hass, data_store):
+    store = AsyncDataStore(hass, db_path=data_store.DB_PATH)
+    await store.initialise()
+    yield store
+    await store.close()
+
+
+def _interval(timestamp: str, app_state: str = "automatic") -> dict:
+    return {
+        "timestamp": timestamp,
+        "energy_kwh": 0.25,
+        "app_state": app_state,
+        "soc_pct": 60.0,
+        "availability_pct": 100.0,
+    }
+
+
+class TestLifecycle:
+    @pytest.mark.asyncio
+    async def test_available_after_initialise(self, async_store):
+        assert async_store.is_available
+
+    @pytest.mark.asyncio
+    async def test_unavailable_after_close(self, async_store):
+        await async_store.close()
+        assert not async_store.is_available
+        assert await async_store.get_intervals_since("2026-01-01T00:00:00") == []
+        assert (
+            await async_store.insert_interval(**_interval("2026-01-01T00:00")) is None
+        )
+
+    @pytest.mark.asyncio
+    async def test_close_commits_queued_writes(self, async_store, data_store):
+        write = asyncio.ensure_future(
+            async_store.insert_interval(**_interval("2026-02-23T10:00:00+00:00"))
+        )
+        await asyncio.sleep(0)
+        await async_store.close()
+        await write
+        assert data_store.has_any_intervals()
+
+    @pytest.mark.asyncio
+    async def test_initialise_raises_when_database_cannot_be_opened(
+        self, hass, tmp_path
+    ):
+        store = AsyncDataStore(hass, db_path=str(tmp_path / "missing" / "x.db"))
+        with pytest.raises(Exception):
+            await store.initialise()
+        assert not store.is_available
+
+
+class TestReadsAndWrites:
+    @pytest.mark.asyncio
+    async def test_write_is_visible_to_readers(self, async_store):
+        await async_store.insert_interval(**_interval("2026-02-23T10:00:00+00:00"))
+        rows = await async_store.get_intervals_since("2026-02-23T09:55:00+00:00")
+        assert [row["timestamp"] for row in rows] == ["2026-02-23T10:00:00+00:00"]
+
+    @pytest.mark.asyncio
+    async def test_fm_last_sent_round_trip(self, async_store):
+        await async_store.set_fm_last_sent("2026-02-23T10:00:00+00:00", "grid")
+        assert await async_store.get_fm_last_sent("grid") == (
+            "2026-02-23T10:00:00+00:00"
+        )
+
+    @pytest.mark.asyncio
+    async def test_queries_run_off_the_event_loop(self, async_store, monkeypatch):
+        threads = []
+        original = DataStore.get_first_available
+
+        def record_thread(store):
+            threads.append(threading.current_thread())
+            return original(store)
+
+        monkeypatch.setattr(DataStore, "get_first_available", record_thread)
+        await async_store.get_first_available()
+        assert threads and threads[0] is not threading.main_thread()
+
+    @pytest.mark.asyncio
+    async def test_failed_write_raises_in_caller(self, async_store):
+        with pytest.raises(Exception):
+            await async_store.insert_interval(
+                **_interval("2026-02-23T10:00:00+00:00", app_state=None)
+            )
+
+    @pytest.mark.asyncio
+    async def test_failing_job_does_not_drop_queued_writes(
+        self, async_store, data_store
+    ):
+        # Hold the writer so both writes are queued and grouped.
+        release = threading.Event()
+        held = asyncio.ensure_future(
+            async_store._AsyncDataStore__submit(lambda store: release.wait())
+        )
+        await asyncio.sleep(0)
+        good = asyncio.ensure_future(
+            async_store.insert_interval(**_interval("2026-02-23T10:00:00+00:00"))
+        )
+        bad = asyncio.ensure_future(
+            async_store.insert_interval(
+                **_interval("2026-02-23T10:05:00+00:00", app_state=None)
+            )
+        )
+        await asyncio.sleep(0)
+        release.set()
+        await held
+        await good
+        with pytest.raises(Exception):
+            await bad
+        rows = data_store.get_intervals_since("2026-02-23T09:55:00+00:00")
+        assert [row["timestamp"] for row in rows] == ["2026-02-23T10:00:00+00:00"]
+
+    @pytest.mark.asyncio
+    async def test_coarse_query_rebuilds_stale_rollups(self, async_store, data_store):
+        await async_store.insert_interval(**_interval("2026-02-23T10:00:00+00:00"))
+        data_store.connection.execute("DELETE FROM interval_rollup_state")
+        data_store.connection.commit()
+        result = await async_store.get_aggregated_data(
+            "2026-02-22T23:00:00+00:00", "2026-02-23T23:00:00+00:00", "days"
+        )
+        assert result[0]["charge_kwh"] == 0.25
+        assert data_store.ensure_rollups()
+
+    @pytest.mark.asyncio
+    async def test_fresh_rollups_do_not_wait_for_the_writer(self, async_store):
+        release = threading.Event()
+        held = asyncio.ensure_future(
+            async_store._AsyncDataStore__submit(lambda store: release.wait())
+        )
+        await asyncio.sleep(0)
+        await async_store.get_aggregated_data(
+            "2026-02-22T23:00:00+00:00", "2026-02-23T23:00:00+00:00", "days"
+        )
+        release.set()
+        await held
+
+    @pytest.mark.asyncio
+    async def test_rollup_rebuild_is_not_grouped_with_a_failing_job(
+        self, async_store, data_store
+    ):
+        await async_store.insert_interval(**_interval("2026-02-23T10:00:00+00:00"))
+        data_store.connection.execute("DELETE FROM interval_rollup_state")
+        data_store.connection.commit()
+        # Hold the writer so a reservation, the rebuild and a failing write
+        # are all queued together.
+        release = threading.Event()
+        held = asyncio.ensure_future(
+            async_store._AsyncDataStore__submit(lambda store: release.wait())
+        )
+        await asyncio.sleep(0)
+        reservation = asyncio.ensure_future(
+            async_store.insert_reservation(
+                timestamp="2026-02-23T10:00:00+00:00",
+                start_timestamp="2026-02-24T08:00:00+00:00",
+                end_timestamp="2026-02-24T10:00:00+00:00",
+            )
+        )
+        query = asyncio.ensure_future(
+            async_store.get_aggregated_data(
+                "2026-02-22T23:00:00+00:00", "2026-02-23T23:00:00+00:00", "days"
+            )
+        )
+        write_queue = async_store._AsyncDataStore__write_queue
+        while write_queue.qsize() < 2:
+            await asyncio.sleep(0.01)
+        bad = asyncio.ensure_future(
+            async_store.insert_interval(
+                **_interval("2026-02-23T10:05:00+00:00", app_state=None)
+            )
+        )
+        await asyncio.sleep(0)
+        release.set()
+        await held
+        await reservation
+        assert (await query)[0]["charge_kwh"] == 0.25
+        with pytest.raises(Exception):
+            await bad
+        count = data_store.connection.execute(
+            "SELECT COUNT(*) FROM reservation_log"
+        ).fetchone()[0]
+        assert count == 1
+        assert data_store.ensure_rollups()
+
+    @pytest.mark.asyncio
+    async def test_batch_query(self, async_store, data_store):
+        await async_store.insert_interval(**_interval("2026-02-23T10:00:00+00:00"))
+        data_store.connection.execute("DELETE FROM interval_rollup_state")
+        data_store.connection.commit()
+        start, end = "2026-02-22T23:00:00+00:00", "2026-02-23T23:00:00+00:00"
+        days, hours = await async_store.get_aggregated_batch(
+            [(start, end, "days"), (start, end, "hours")]
+        )
+        assert days[0]["charge_kwh"] == 0.25
+        assert hours[0]["charge_wh"] == 250
+        assert data_store.ensure_rollups()
+
+    @pytest.mark.asyncio
+    async def test_export_chunks_are_written_on_the_event_loop(self, async_store):
+        await async_store.insert_interval(**_interval("2026-02-23T10:00:00+00:00"))
+        chunks, threads = [], []
+
+        async def write(chunk):
+            threads.append(threading.current_thread())
+            chunks.append(chunk)
+
+        assert await async_store.export_intervals(write) == 1
+        assert threads == [threading.main_thread()]
+        assert b"".join(chunks).decode().splitlines()[1].startswith("2026-02-23")
+
+    @pytest.mark.asyncio
+    async def test_failed_export_write_raises(self, async_store):
+        await async_store.insert_interval(**_interval("2026-02-23T10:00:00+00:00"))
+
+        async def write(chunk):
+            raise ConnectionResetError("Client went away")
+
+        with pytest.raises(ConnectionResetError):
+            await async_store.export_intervals(write)
+
+
+class TestTransaction:
+    @pytest.mark.asyncio
+    async def test_writes_are_committed_at_exit_in_one_commit(
+        self, async_store, data_store, caplog
+    ):
+        timestamp = "2026-02-23T10:00:00+00:00"
+        with caplog.at_level(logging.DEBUG, logger="AppDaemon.v2g-app.data_store"):
+            async with async_store.transaction():
+                await async_store.insert_interval(**_interval(timestamp))
+                await async_store.insert_grid_interval(timestamp, 1, 1.5, 0.0)
+                await async_store.insert_pv_interval(timestamp, "sp_1", 2.0)
+                assert not data_store.has_any_intervals()
+        assert data_store.has_any_intervals()
+        assert len(data_store.get_grid_intervals_since("2026-02-23T09:55:00")) == 1
+        assert "Transaction committed 3 write(s)" in caplog.text
+
+    @pytest.mark.asyncio
+    async def test_exception_in_block_writes_nothing(self, async_store, data_store):
+        with pytest.raises(RuntimeError):
+            async with async_store.transaction():
+                await async_store.insert_interval(
+                    **_interval("2026-02-23T10:00:00+00:00")
+                )
+                raise RuntimeError("boom")
+        await async_store.set_fm_last_sent("2026-02-23T10:00:00+00:00")
+        assert not data_store.has_any_intervals()
+
+    @pytest.mark.asyncio
+    async def test_failed_write_rolls_back_the_block(self, async_store, data_store):
+        with pytest.raises(Exception):
+            async with async_store.transaction():
+                await async_store.insert_interval(
+                    **_interval("2026-02-23T10:00:00+00:00")
+                )
+                await async_store.insert_interval(
+                    **_interval("2026-02-23T10:05:00+00:00", app_state=None)
+                )
+        assert not data_store.has_any_intervals()
+
+    @pytest.mark.asyncio
+    async def test_other_tasks_are_not_pulled_into_the_block(
+        self, async_store, data_store
+    ):
+        async with async_store.transaction():
+            await asyncio.ensure_future(
+                async_store.set_fm_last_sent("2026-02-23T10:00:00+00:00")
+            )
+            await async_store.insert_interval(**_interval("2026-02-23T10:00:00+00:00"))
+            assert data_store.get_fm_last_sent() == "2026-02-23T10:00:00+00:00"
+            assert not data_store.has_any_intervals()
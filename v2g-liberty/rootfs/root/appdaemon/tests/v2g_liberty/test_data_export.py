@@ -0,0 +1,102 @@
+"""Unit tests for exporting joined interval data (data_export module)."""
+
+import io
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock
+
+import pandas as pd
+import pytest
+import pytest_asyncio
+from appdaemon.plugins.hass.hassapi import Hass
+
+from apps.v2g_liberty.data_export import export_csv, iter_interval_chunks
+from apps.v2g_liberty.data_store import DataStore, iso_to_epoch
+
+# pylint: disable=C0116,W0621
+
+START = datetime(2026, 5, 1, 10, 0, tzinfo=timezone.utc)
+
+
+def ts(minutes: int) -> str:
+    return (START + timedelta(minutes=minutes)).isoformat()
+
+
+@pytest_asyncio.fixture
+async def data_store(tmp_path):
+    store = DataStore(AsyncMock(spec=Hass))
+    store.DB_PATH = str(tmp_path / "test_export.db")
+    await store.initialise()
+    for minutes in range(0, 60, 5):
+        store.insert_interval(
+            timestamp=ts(minutes),
+            energy_kwh=0.25,
+            app_state="automatic",
+            soc_pct=50.0 + minutes / 5,
+            availability_pct=100.0,
+        )
+    store.upsert_prices([(ts(0), 0.20, 0.10, None)], recalculate_ratings=False)
+    store.insert_grid_interval(ts(0), 1, 1.5, 0.0)
+    store.insert_grid_interval(ts(0), 2, 0.5, 0.25)
+    store.insert_pv_interval(ts(0), "sp_1", 2.0)
+    store.insert_pv_interval(ts(0), "sp_2", 1.0)
+    return store
+
+
+@pytest.mark.asyncio
+async def test_chunks_follow_the_cursor(data_store):
+    chunks = list(
+        iter_interval_chunks(
+            data_store.connection, iso_to_epoch(ts(0)), iso_to_epoch(ts(60)), 5
+        )
+    )
+    assert [len(chunk) for chunk in chunks] == [5, 5, 2]
+    first = chunks[0].iloc[0]
+    assert first["timestamp"] == pd.Timestamp(ts(0))
+    assert first["consumption_price_kwh"] == 0.20
+    assert first["grid_consumption_kw"] == 2.0
+    assert first["grid_production_kw"] == 0.25
+    assert first["pv_power_kw"] == 3.0
+    assert pd.isna(chunks[0].iloc[1]["pv_power_kw"])
+
+
+def _exported(data_store, *args) -> tuple[int, list[bytes]]:
+    """Export to a list; return the row count and the written chunks."""
+    chunks = []
+    return data_store.export_intervals(chunks.append, *args), chunks
+
+
+@pytest.mark.asyncio
+async def test_csv_export(data_store):
+    rows, chunks = _exported(data_store, ts(10), ts(30))
+    assert rows == 4
+    frame = pd.read_csv(io.BytesIO(b"".join(chunks)))
+    assert list(frame["soc_pct"]) == [52.0, 53.0, 54.0, 55.0]
+
+
+@pytest.mark.asyncio
+async def test_csv_is_written_per_chunk(data_store):
+    chunks = []
+    rows = export_csv(
+        data_store.connection,
+        chunks.append,
+        iso_to_epoch(ts(0)),
+        iso_to_epoch(ts(60)),
+        chunk_size=5,
+    )
+    assert rows == 12
+    assert [len(chunk.decode().splitlines()) for chunk in chunks] == [6, 5, 2]
+    assert chunks[0].startswith(b"timestamp,")
+
+
+@pytest.mark.asyncio
+async def test_empty_csv_export_has_a_header(data_store):
+    rows, chunks = _exported(data_store, ts(60), ts(90))
+    assert rows == 0
+    frame = pd.read_csv(io.BytesIO(b"".join(chunks)))
+    assert frame.empty
+    assert "pv_power_kw" in frame.columns
+
+
+@pytest.mark.asyncio
+async def test_whole_database_by_default(data_store):
+    assert _exported(data_store)[0] == 12
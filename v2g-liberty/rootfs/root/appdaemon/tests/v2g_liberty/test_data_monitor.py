@@ -8,8 +8,10 @@ Tests cover:
 - _write_interval_to_db: correct row written to DB
 """
 
+from contextlib import nullcontext
 from datetime import datetime, timedelta, timezone
 from unittest.mock import AsyncMock, MagicMock, patch
+from zoneinfo import ZoneInfo
 
 import pytest
 from appdaemon.plugins.hass.hassapi import Hass
@@ -62,8 +64,8 @@ def evse_client():
 
 @pytest.fixture
 def data_store():
-    mock_store = MagicMock()
-    mock_store.insert_interval = MagicMock()
+    mock_store = AsyncMock()
+    mock_store.transaction = MagicMock(side_effect=nullcontext)
     return mock_store
 
 
@@ -446,6 +448,32 @@ class TestWriteIntervalToDb:
         call_kwargs = data_store.insert_interval.call_args[1]
         assert call_kwargs["energy_kwh"] == -0.208333
 
+    @pytest.mark.asyncio
+    @patch("apps.v2g_liberty.data_monitor.get_local_now")
+    async def test_writes_power_stats(self, mock_now, monitor, data_store):
+        """Power samples and setpoint changes end up in the interval row."""
+        mock_now.return_value = datetime(2026, 2, 22, 12, 0, 0, tzinfo=TEST_TZ)
+        monitor.current_power_since = mock_now.return_value
+        monitor._power_samples.add(0, mock_now.return_value)
+        await monitor._process_setpoint_change(new_setpoint=7400)
+        mock_now.return_value += timedelta(seconds=30)
+        await monitor._process_power_change(7400)
+        mock_now.return_value += timedelta(seconds=270)
+
+        await monitor._write_interval_to_db(
+            energy_kwh=0.555,
+            availability_pct=100.0,
+            soc=60,
+            app_state="automatic",
+            power_stats=monitor._power_samples.conclude(mock_now.return_value),
+        )
+
+        call_kwargs = data_store.insert_interval.call_args[1]
+        assert call_kwargs["power_min_w"] == 0.0
+        assert call_kwargs["power_max_w"] == 7400.0
+        assert call_kwargs["power_p95_w"] == 7400.0
+        assert call_kwargs["setpoint_changes"] == 1
+
 
 # =====================================================================
 # _handle_calendar_change tests (T14)
@@ -628,7 +656,7 @@ class TestEmitTodayTotals:
     ):
         """When data exists for today, emit the aggregated values."""
         mock_now.return_value = datetime(2026, 2, 22, 14, 0, 0, tzinfo=TEST_TZ)
-        data_store.get_aggregated_data = MagicMock(
+        data_store.get_aggregated_data = AsyncMock(
             return_value=[
                 {
                     "period_start": "2026-02-22",
@@ -661,7 +689,7 @@ class TestEmitTodayTotals:
     ):
         """When no data exists for today (e.g. just after midnight), emit zeros."""
         mock_now.return_value = datetime(2026, 2, 22, 0, 5, 0, tzinfo=TEST_TZ)
-        data_store.get_aggregated_data = MagicMock(return_value=[])
+        data_store.get_aggregated_data = AsyncMock(return_value=[])
 
         await monitor._emit_today_totals()
 
@@ -680,7 +708,7 @@ class TestEmitTodayTotals:
     ):
         """Should query from today 00:00 to tomorrow 00:00."""
         mock_now.return_value = datetime(2026, 2, 22, 14, 30, 0, tzinfo=TEST_TZ)
-        data_store.get_aggregated_data = MagicMock(return_value=[])
+        data_store.get_aggregated_data = AsyncMock(return_value=[])
 
         await monitor._emit_today_totals()
 
@@ -711,13 +739,143 @@ class TestEmitTodayTotals:
     ):
         """DB exception should be caught gracefully, no event emitted."""
         mock_now.return_value = datetime(2026, 2, 22, 14, 0, 0, tzinfo=TEST_TZ)
-        data_store.get_aggregated_data = MagicMock(side_effect=Exception("DB locked"))
+        data_store.get_aggregated_data = AsyncMock(side_effect=Exception("DB locked"))
 
         # Should not raise
         await monitor._emit_today_totals()
 
         event_bus.emit_event.assert_not_called()
 
+    @pytest.mark.asyncio
+    @patch("apps.v2g_liberty.data_monitor.get_local_now")
+    async def test_adds_concluded_interval_without_query(
+        self, mock_now, monitor, data_store, event_bus
+    ):
+        mock_now.return_value = datetime(2026, 2, 22, 14, 0, 0, tzinfo=TEST_TZ)
+        data_store.get_aggregated_data = AsyncMock(return_value=[])
+        data_store.get_price_at = AsyncMock(return_value=(0.30, 0.20, "low"))
+        await monitor._emit_today_totals()
+
+        await monitor._emit_today_totals("2026-02-22T12:55:00+00:00", 0.5)
+        await monitor._emit_today_totals("2026-02-22T13:00:00+00:00", -0.25)
+
+        assert data_store.get_aggregated_data.await_count == 1
+        event_bus.emit_event.assert_called_with(
+            "today_energy_update",
+            charge_kwh=0.5,
+            charge_cost=0.15,
+            discharge_kwh=0.25,
+            discharge_revenue=0.05,
+        )
+
+    @pytest.mark.asyncio
+    @patch("apps.v2g_liberty.data_monitor.get_local_now")
+    async def test_reloads_at_midnight(self, mock_now, monitor, data_store, event_bus):
+        mock_now.return_value = datetime(2026, 2, 22, 23, 55, 0, tzinfo=TEST_TZ)
+        data_store.get_aggregated_data = AsyncMock(
+            return_value=[
+                {
+                    "charge_kwh": 5.5,
+                    "charge_cost": 1.23,
+                    "discharge_kwh": 0.0,
+                    "discharge_revenue": 0.0,
+                }
+            ]
+        )
+        data_store.get_price_at = AsyncMock(return_value=(0.30, 0.20, "low"))
+        await monitor._emit_today_totals()
+
+        # The 23:55 local interval concludes after midnight: it belongs to
+        # yesterday, today starts from the (empty) new day.
+        mock_now.return_value = datetime(2026, 2, 23, 0, 0, 0, tzinfo=TEST_TZ)
+        data_store.get_aggregated_data.return_value = []
+        await monitor._emit_today_totals("2026-02-22T22:55:00+00:00", 0.5)
+
+        assert data_store.get_aggregated_data.await_count == 2
+        assert data_store.get_aggregated_data.call_args[1]["start"] == (
+            "2026-02-22T23:00:00+00:00"
+        )
+        data_store.get_price_at.assert_not_awaited()
+        event_bus.emit_event.assert_called_with(
+            "today_energy_update",
+            charge_kwh=0.0,
+            charge_cost=0.0,
+            discharge_kwh=0.0,
+            discharge_revenue=0.0,
+        )
+
+    @pytest.mark.asyncio
+    @patch("apps.v2g_liberty.data_monitor.get_local_now")
+    async def test_dst_day_spans_25_hours(
+        self, mock_now, monitor, data_store, event_bus
+    ):
+        c.TZ = ZoneInfo("Europe/Amsterdam")
+        mock_now.return_value = datetime(2026, 10, 25, 1, 0, tzinfo=c.TZ)
+        data_store.get_aggregated_data = AsyncMock(return_value=[])
+        data_store.get_price_at = AsyncMock(return_value=(0.30, 0.20, "low"))
+        await monitor._emit_today_totals()
+
+        call_kwargs = data_store.get_aggregated_data.call_args[1]
+        assert call_kwargs["start"] == "2026-10-24T22:00:00+00:00"
+        assert call_kwargs["end"] == "2026-10-25T23:00:00+00:00"
+
+        # Late in the long day the totals still follow the intervals.
+        mock_now.return_value = datetime(2026, 10, 25, 23, 55, tzinfo=c.TZ)
+        await monitor._emit_today_totals("2026-10-25T22:50:00+00:00", 0.5)
+        assert data_store.get_aggregated_data.await_count == 1
+        assert event_bus.emit_event.call_args[1]["charge_kwh"] == 0.5
+
+    @pytest.mark.asyncio
+    @patch("apps.v2g_liberty.data_monitor.get_local_now")
+    async def test_repairer_complete_reloads(
+        self, mock_now, monitor, data_store, event_bus
+    ):
+        mock_now.return_value = datetime(2026, 2, 22, 14, 0, 0, tzinfo=TEST_TZ)
+        data_store.get_aggregated_data = AsyncMock(return_value=[])
+        await monitor._emit_today_totals()
+
+        monitor._handle_repairer_complete()
+        await monitor._emit_today_totals("2026-02-22T12:55:00+00:00", 0.5)
+
+        assert data_store.get_aggregated_data.await_count == 2
+
+    @pytest.mark.asyncio
+    @patch("apps.v2g_liberty.data_monitor.get_local_now")
+    async def test_only_prices_of_today_reload(
+        self, mock_now, monitor, data_store, event_bus
+    ):
+        mock_now.return_value = datetime(2026, 2, 22, 14, 0, 0, tzinfo=TEST_TZ)
+        data_store.get_aggregated_data = AsyncMock(return_value=[])
+        await monitor._emit_today_totals()
+
+        # Tomorrow's day-ahead prices leave today's totals alone.
+        monitor._handle_prices_upserted(
+            start="2026-02-22T23:00:00+00:00", end="2026-02-23T22:55:00+00:00"
+        )
+        assert monitor._today_totals.is_for(datetime(2026, 2, 22).date())
+
+        monitor._handle_prices_upserted(
+            start="2026-02-22T12:00:00+00:00", end="2026-02-22T12:55:00+00:00"
+        )
+        assert not monitor._today_totals.is_for(datetime(2026, 2, 22).date())
+
+    @pytest.mark.asyncio
+    @patch("apps.v2g_liberty.data_monitor.get_local_now")
+    async def test_failed_price_lookup_reloads_next_time(
+        self, mock_now, monitor, data_store, event_bus
+    ):
+        mock_now.return_value = datetime(2026, 2, 22, 14, 0, 0, tzinfo=TEST_TZ)
+        data_store.get_aggregated_data = AsyncMock(return_value=[])
+        data_store.get_price_at = AsyncMock(side_effect=Exception("DB locked"))
+        await monitor._emit_today_totals()
+        event_bus.emit_event.reset_mock()
+
+        await monitor._emit_today_totals("2026-02-22T12:55:00+00:00", 0.5)
+        event_bus.emit_event.assert_not_called()
+
+        await monitor._emit_today_totals()
+        assert data_store.get_aggregated_data.await_count == 2
+
 
 # =====================================================================
 # Grid monitoring tests
@@ -730,19 +888,14 @@ class TestGridMonitoringSetup:
         """Grid listeners not registered when GRID_CONSUMPTION_ENTITIES is empty."""
         c.GRID_CONSUMPTION_ENTITIES = []
         c.GRID_PRODUCTION_ENTITIES = []
-        monitor._grid_consumption_trackers = {}
-        monitor._grid_production_trackers = {}
 
         await monitor._setup_grid_listeners(TEST_NOW)
 
-        assert monitor._grid_consumption_trackers == {}
-        assert monitor._grid_production_trackers == {}
+        assert len(monitor._grid_trackers) == 0
 
     @pytest.mark.asyncio
     async def test_setup_creates_trackers_and_listeners(self, monitor, hass):
         """Grid listeners registered for each configured entity."""
-        monitor._grid_consumption_trackers = {}
-        monitor._grid_production_trackers = {}
         c.GRID_CONSUMPTION_ENTITIES = [
             "sensor.cons_l1",
             "sensor.cons_l2",
@@ -756,8 +909,14 @@ class TestGridMonitoringSetup:
 
         await monitor._setup_grid_listeners(TEST_NOW)
 
-        assert len(monitor._grid_consumption_trackers) == 3
-        assert len(monitor._grid_production_trackers) == 3
+        assert monitor._grid_trackers.keys() == [
+            ("consumption", 1),
+            ("consumption", 2),
+            ("consumption", 3),
+            ("production", 1),
+            ("production", 2),
+            ("production", 3),
+        ]
         # 6 listen_state calls for grid (3 consumption + 3 production)
         # Plus any from fixture setup
         grid_listen_calls = [
@@ -772,8 +931,6 @@ class TestGridConsumptionHandler:
     @pytest.mark.asyncio
     async def test_handles_numeric_state_change(self, monitor):
         """Consumption handler updates the correct phase tracker."""
-        monitor._grid_consumption_trackers = {}
-        monitor._grid_production_trackers = {}
         c.GRID_CONSUMPTION_ENTITIES = ["sensor.cons_l1"]
         c.GRID_PRODUCTION_ENTITIES = []
         await monitor._setup_grid_listeners(TEST_NOW)
@@ -781,15 +938,34 @@ class TestGridConsumptionHandler:
         await monitor._handle_grid_consumption_change(
             "sensor.cons_l1", "state", "0", "1500", {"phase": 1}
         )
+        # Queued until the next flush.
+        assert monitor._grid_trackers.current_power(("consumption", 1)) == 0.0
+        assert monitor._state_changes.flush() == 1
+
+        assert monitor._grid_trackers.current_power(("consumption", 1)) == 1500.0
+
+    @pytest.mark.asyncio
+    async def test_production_handler_scales_its_phase(self, monitor, hass):
+        """Production readings go to the production channel, scaled to kW."""
+        c.GRID_CONSUMPTION_ENTITIES = ["sensor.cons_l1"]
+        c.GRID_PRODUCTION_ENTITIES = ["sensor.prod_l1"]
+        hass.get_state.return_value = "W"
+        await monitor._setup_grid_listeners(TEST_NOW)
+
+        await monitor._handle_grid_production_change(
+            "sensor.prod_l1", "state", "0", "800", {"phase": 1}
+        )
+        await monitor._handle_grid_production_change(
+            "sensor.prod_l1", "state", "800", "not a number", {"phase": 1}
+        )
+        monitor._state_changes.flush()
 
-        tracker = monitor._grid_consumption_trackers[1]
-        assert tracker._current_power == 1500.0
+        assert monitor._grid_trackers.current_power(("production", 1)) == 0.8
+        assert monitor._grid_trackers.current_power(("consumption", 1)) == 0.0
 
     @pytest.mark.asyncio
     async def test_ignores_unknown_state(self, monitor):
         """Unknown/unavailable states are ignored."""
-        monitor._grid_consumption_trackers = {}
-        monitor._grid_production_trackers = {}
         c.GRID_CONSUMPTION_ENTITIES = ["sensor.cons_l1"]
         c.GRID_PRODUCTION_ENTITIES = []
         await monitor._setup_grid_listeners(TEST_NOW)
@@ -797,44 +973,34 @@ class TestGridConsumptionHandler:
         await monitor._handle_grid_consumption_change(
             "sensor.cons_l1", "state", "0", "unknown", {"phase": 1}
         )
+        monitor._state_changes.flush()
 
-        tracker = monitor._grid_consumption_trackers[1]
-        assert tracker._current_power == 0.0  # unchanged from reset default
+        # unchanged from the initial power
+        assert monitor._grid_trackers.current_power(("consumption", 1)) == 0.0
 
 
 class TestConcludeGridInterval:
-    def test_conclude_stores_to_database(self, monitor, data_store):
+    @pytest.mark.asyncio
+    async def test_conclude_stores_to_database(self, monitor, data_store):
         """Grid conclude writes avg power per phase to data store."""
         c.GRID_CONSUMPTION_ENTITIES = ["sensor.cons_l1"]
         c.GRID_PRODUCTION_ENTITIES = ["sensor.prod_l1"]
-        monitor._grid_consumption_trackers = {}
-        monitor._grid_production_trackers = {}
-
-        from apps.v2g_liberty.grid_connection.power_tracker import PowerTracker
 
         t0 = TEST_NOW
         t1 = t0 + timedelta(minutes=5)
+        await monitor._setup_grid_listeners(t0)
+        monitor._grid_trackers.update(("consumption", 1), 1500.0, t0)
 
-        cons_tracker = PowerTracker()
-        cons_tracker.update(1500.0, t0)
-        monitor._grid_consumption_trackers[1] = cons_tracker
-
-        prod_tracker = PowerTracker()
-        prod_tracker.update(0.0, t0)
-        monitor._grid_production_trackers[1] = prod_tracker
-
-        monitor._conclude_grid_interval("2026-02-22T12:05:00+01:00", t1)
+        await monitor._conclude_grid_interval("2026-02-22T12:05:00+01:00", t1)
 
         data_store.insert_grid_interval.assert_called_once_with(
             "2026-02-22T12:05:00+01:00", 1, 1500.0, 0.0
         )
 
-    def test_conclude_skips_when_no_trackers(self, monitor, data_store):
+    @pytest.mark.asyncio
+    async def test_conclude_skips_when_no_trackers(self, monitor, data_store):
         """No trackers → no database writes."""
-        monitor._grid_consumption_trackers = {}
-        monitor._grid_production_trackers = {}
-
-        monitor._conclude_grid_interval("2026-02-22T12:05:00+01:00", TEST_NOW)
+        await monitor._conclude_grid_interval("2026-02-22T12:05:00+01:00", TEST_NOW)
 
         data_store.insert_grid_interval.assert_not_called()
 
@@ -854,12 +1020,11 @@ class TestPvMonitoringSetup:
     async def test_no_setup_when_not_configured(self, monitor, hass):
         """PV listeners not registered when SOLAR_PANELS is empty."""
         c.SOLAR_PANELS = []
-        monitor._pv_trackers = {}
         monitor._pv_scales = {}
 
         await monitor._setup_pv_listeners(TEST_NOW)
 
-        assert monitor._pv_trackers == {}
+        assert len(monitor._pv_trackers) == 0
 
     @pytest.mark.asyncio
     async def test_setup_creates_trackers_and_listeners(self, monitor, hass):
@@ -868,12 +1033,11 @@ class TestPvMonitoringSetup:
             _panel("sp_1", "sensor.pv_south"),
             _panel("sp_2", "sensor.pv_north"),
         ]
-        monitor._pv_trackers = {}
         monitor._pv_scales = {}
 
         await monitor._setup_pv_listeners(TEST_NOW)
 
-        assert set(monitor._pv_trackers.keys()) == {"sp_1", "sp_2"}
+        assert monitor._pv_trackers.keys() == ["sp_1", "sp_2"]
         pv_listen_calls = [
             call
             for call in hass.listen_state.call_args_list
@@ -888,7 +1052,6 @@ class TestPvMonitoringSetup:
         """unit_of_measurement on the entity drives the scale factor:
         W → 0.001 (covers the bugfix from plan task 18)."""
         c.SOLAR_PANELS = [_panel("sp_1", "sensor.pv_south")]
-        monitor._pv_trackers = {}
         monitor._pv_scales = {}
         hass.get_state.return_value = "W"
 
@@ -902,7 +1065,6 @@ class TestPvPowerHandler:
     async def test_handles_numeric_state_with_scale(self, monitor, hass):
         """Handler multiplies the raw value by the cached scale (W → kW)."""
         c.SOLAR_PANELS = [_panel("sp_1", "sensor.pv_south")]
-        monitor._pv_trackers = {}
         monitor._pv_scales = {}
         hass.get_state.return_value = "W"
         await monitor._setup_pv_listeners(TEST_NOW)
@@ -910,15 +1072,15 @@ class TestPvPowerHandler:
         await monitor._handle_pv_power_change(
             "sensor.pv_south", "state", "0", "2500", {"panel_id": "sp_1"}
         )
+        monitor._state_changes.flush()
 
         # 2500 W × 0.001 = 2.5 kW
-        assert monitor._pv_trackers["sp_1"]._current_power == pytest.approx(2.5)
+        assert monitor._pv_trackers.current_power("sp_1") == pytest.approx(2.5)
 
     @pytest.mark.asyncio
     async def test_ignores_unknown_state(self, monitor, hass):
         """Unknown/unavailable values from the entity are dropped."""
         c.SOLAR_PANELS = [_panel("sp_1", "sensor.pv_south")]
-        monitor._pv_trackers = {}
         monitor._pv_scales = {}
         hass.get_state.return_value = "W"
         await monitor._setup_pv_listeners(TEST_NOW)
@@ -926,26 +1088,25 @@ class TestPvPowerHandler:
         await monitor._handle_pv_power_change(
             "sensor.pv_south", "state", "0", "unknown", {"panel_id": "sp_1"}
         )
+        monitor._state_changes.flush()
 
-        # Tracker stayed at its reset default (0.0).
-        assert monitor._pv_trackers["sp_1"]._current_power == 0.0
+        # Tracker stayed at its initial power (0.0).
+        assert monitor._pv_trackers.current_power("sp_1") == 0.0
 
 
 class TestConcludePvInterval:
-    def test_conclude_stores_to_database(self, monitor, data_store):
+    @pytest.mark.asyncio
+    async def test_conclude_stores_to_database(self, monitor, data_store):
         """Each panel's averaged tracker is forwarded to insert_pv_interval."""
-        from apps.v2g_liberty.grid_connection.power_tracker import PowerTracker
-
         t0 = TEST_NOW
         t1 = t0 + timedelta(minutes=5)
 
-        tracker_a = PowerTracker()
-        tracker_a.update(2.5, t0)
-        tracker_b = PowerTracker()
-        tracker_b.update(3.1, t0)
-        monitor._pv_trackers = {"sp_1": tracker_a, "sp_2": tracker_b}
+        monitor._pv_trackers.add_channel("sp_1", t0)
+        monitor._pv_trackers.add_channel("sp_2", t0)
+        monitor._pv_trackers.update("sp_1", 2.5, t0)
+        monitor._pv_trackers.update("sp_2", 3.1, t0)
 
-        monitor._conclude_pv_interval("2026-02-22T12:05:00+01:00", t1)
+        await monitor._conclude_pv_interval("2026-02-22T12:05:00+01:00", t1)
 
         assert data_store.insert_pv_interval.call_count == 2
         data_store.insert_pv_interval.assert_any_call(
@@ -955,10 +1116,9 @@ class TestConcludePvInterval:
             "2026-02-22T12:05:00+01:00", "sp_2", 3.1
         )
 
-    def test_conclude_skips_when_no_trackers(self, monitor, data_store):
+    @pytest.mark.asyncio
+    async def test_conclude_skips_when_no_trackers(self, monitor, data_store):
         """No PV trackers → no insert calls (e.g. installations without panels)."""
-        monitor._pv_trackers = {}
-
-        monitor._conclude_pv_interval("2026-02-22T12:05:00+01:00", TEST_NOW)
+        await monitor._conclude_pv_interval("2026-02-22T12:05:00+01:00", TEST_NOW)
 
         data_store.insert_pv_interval.assert_not_called()
@@ -1,6 +1,7 @@
 """Unit tests for data_repairer module."""
 
 import asyncio
+import sqlite3
 from datetime import datetime, timedelta, timezone
 from unittest.mock import AsyncMock, MagicMock, patch
 
@@ -9,17 +10,26 @@ import pytest
 from appdaemon.plugins.hass.hassapi import Hass
 
 from apps.v2g_liberty.data_repairer import (
+    ARCHIVE_AFTER_DAYS,
+    REPAIR_CONTEXT_HOURS,
     MAX_GAP_LENGTH,
-    PERIODIC_LOOKBACK_HOURS,
     DataRepairer,
+    _diff_frames,
     _empty_summary,
     _get_row_after,
     _get_row_before,
     _get_soc_after,
     _get_soc_before,
     _infer_gap_context,
+    _SocRuns,
+)
+from apps.v2g_liberty.data_store import (
+    DataStore,
+    dirty_ranges,
+    epoch_to_iso,
+    iso_to_epoch,
+    mark_dirty,
 )
-from apps.v2g_liberty.data_store import DataStore
 
 # pylint: disable=C0116,W0621
 
@@ -46,6 +56,7 @@ def _mock_constants():
 def hass():
     mock = AsyncMock(spec=Hass)
     mock.run_every = AsyncMock()
+    mock.run_daily = AsyncMock()
     return mock
 
 
@@ -81,7 +92,7 @@ def _insert_interval(
         "INSERT INTO interval_log "
         "(timestamp, energy_kwh, app_state, soc_pct, availability_pct, is_repaired) "
         "VALUES (?, ?, ?, ?, ?, ?)",
-        (ts_str, energy, state, soc, avail, repaired),
+        (iso_to_epoch(ts_str), energy, state, soc, avail, repaired),
     )
     conn.commit()
 
@@ -99,6 +110,8 @@ def _get_all_intervals(store):
     cols = [d[0] for d in cursor.description]
     rows = [dict(zip(cols, row)) for row in cursor.fetchall()]
     cursor.close()
+    for row in rows:
+        row["timestamp"] = epoch_to_iso(row["timestamp"])
     return rows
 
 
@@ -240,6 +253,28 @@ class TestGetSocBeforeAfter:
         assert _get_soc_after(df, idx[1]) is None
 
 
+class TestSocRuns:
+    def test_runs_and_gaps(self):
+        soc = pd.Series([None, 40.0, 40.0, None, 40.0, 55.0, None, None])
+        runs = _SocRuns(soc)
+
+        assert runs.valid_pos.tolist() == [1, 2, 4, 5]
+        # The NULL row between the 40s does not break their run.
+        assert runs.valid_run_start.tolist() == [0, 0, 0, 3]
+        assert runs.gap_start.tolist() == [0, 3, 6]
+        assert runs.gap_end.tolist() == [0, 3, 7]
+        assert runs.gap_before.tolist()[1:] == [40.0, 55.0]
+        assert runs.gap_after.tolist()[:2] == [40.0, 40.0]
+        assert pd.isna(runs.gap_before[0]) and pd.isna(runs.gap_after[2])
+
+    def test_all_null(self):
+        runs = _SocRuns(pd.Series([None, None], dtype=object))
+        assert len(runs.valid_pos) == 0
+        assert len(runs.valid_run_start) == 0
+        assert runs.gap_start.tolist() == [0]
+        assert runs.gap_end.tolist() == [1]
+
+
 # =====================================================================
 # Gap filling tests
 # =====================================================================
@@ -611,6 +646,30 @@ class TestSocJumpDetection:
         summary = repairer.run_full_repair()
         assert summary["soc_blanked"] == 0
 
+    def test_walk_passes_rows_blanked_for_earlier_jump(
+        self, repairer, initialised_store
+    ):
+        """SoC: 50, 50, 90, 90, 90, 50, 50, 50, 10 (car away, avail=0).
+
+        The upward jump 50→90 leaves a frozen 50-block without energy:
+        blanked by step 1a. The jump 90→50 blanks the 90s; walking back
+        from the jump 50→10 then passes those rows, blanking only the
+        later 50s (the earlier ones were already blanked by step 1a).
+        """
+        socs = [50.0, 50.0, 90.0, 90.0, 90.0, 50.0, 50.0, 50.0, 10.0]
+        for i, soc in enumerate(socs):
+            _insert_interval(
+                initialised_store, _ts(i * 5), soc=soc, energy=0.0, avail=0.0
+            )
+
+        summary = repairer.run_full_repair()
+        assert summary["soc_reconstructed_up"] == 2
+        assert summary["soc_blanked"] == 6
+
+        rows = _get_all_intervals(initialised_store)
+        assert [r["soc_pct"] for r in rows[:8]] == [None] * 8
+        assert rows[8]["soc_pct"] == 10.0
+
 
 # =====================================================================
 # Linear SoC interpolation tests
@@ -1102,6 +1161,43 @@ class TestWriteBack:
         # availability_pct should be None (NULL in DB), not NaN
         assert gap_row["availability_pct"] is None
 
+    def test_unchanged_repaired_rows_are_not_rewritten(
+        self, repairer, initialised_store
+    ):
+        _insert_interval(initialised_store, _ts(0), state="not_connected", avail=0.0)
+        _insert_interval(initialised_store, _ts(15), state="not_connected", avail=0.0)
+
+        first = repairer.run_full_repair()
+        second = repairer.run_full_repair()
+
+        assert (first["rows_scanned"], first["rows_written"]) == (2, 2)
+        # The gap rows are repaired (is_repaired=1) but no longer change.
+        assert (second["rows_scanned"], second["rows_written"]) == (4, 0)
+
+    def test_diff_holds_new_rows_and_changed_cells_only(self):
+        index = pd.date_range("2026-02-27T11:00:00Z", periods=3, freq="5min")
+        original = pd.DataFrame(
+            {
+                "energy_kwh": [0.1, 0.0, 0.2],
+                "app_state": ["charge", "charge", "charge"],
+                "soc_pct": [50.0, float("nan"), 55.0],
+                "availability_pct": [100.0, 100.0, 100.0],
+                "is_repaired": [2, 1, 0],
+            },
+            index=index,
+        )
+        df = original.reindex(index.append(index[-1:] + pd.Timedelta("5min")))
+        df.iloc[0, df.columns.get_loc("soc_pct")] = 51.0
+        df.iloc[0, df.columns.get_loc("is_repaired")] = 1
+        df.iloc[3] = [0.3, "charge", None, 100.0, 1]
+
+        inserts, updates = _diff_frames(original, df)
+
+        epoch = iso_to_epoch(index[0].isoformat())
+        assert inserts == [(epoch + 900, 0.3, "charge", None, 100.0)]
+        # Row 1 was repaired before and is unchanged; row 2 is not repaired.
+        assert updates == {"soc_pct": [(51.0, epoch)], "is_repaired": [(1, epoch)]}
+
 
 # =====================================================================
 # Safety and idempotency tests
@@ -1160,25 +1256,259 @@ class TestEmptyTable:
         assert summary == _empty_summary()
 
 
+class TestChunkedFullRepair:
+    """Full repair in chunks of one day (the context stays 12 hours)."""
+
+    @pytest.fixture(autouse=True)
+    def _one_day_chunks(self):
+        with patch("apps.v2g_liberty.data_repairer.FULL_REPAIR_CHUNK_DAYS", 1):
+            yield
+
+    @staticmethod
+    def _checkpoint(store):
+        return store.connection.execute(
+            "SELECT first_ts, next_ts, summary FROM repair_checkpoint"
+        ).fetchone()
+
+    @staticmethod
+    def _insert_checkpoint(store, first_ts, next_ts, summary="{}"):
+        """Insert the checkpoint a run over the current rows would have left."""
+        conn = store.connection
+        rows_before = conn.execute(
+            "SELECT COUNT(*) FROM interval_log WHERE timestamp < ?", (next_ts,)
+        ).fetchone()[0]
+        conn.execute(
+            "INSERT INTO repair_checkpoint VALUES ('full_repair', ?, ?, ?, ?)",
+            (first_ts, next_ts, rows_before, summary),
+        )
+        conn.commit()
+
+    @staticmethod
+    def _stuck_soc_across_chunks(store) -> int:
+        """SoC stuck at 72 for 5 rows, then a jump down to 35.
+
+        The first row is a day and 15 minutes earlier, so the boundary of
+        the first one-day chunk falls inside the stuck run. Returns the
+        epoch of the first row.
+        """
+        _insert_interval(store, _ts(-24 * 60 + 15), soc=60.0, avail=0.0)
+        for i, soc in enumerate([72.0, 72.0, 72.0, 72.0, 72.0, 35.0]):
+            _insert_interval(store, _ts(i * 5), soc=soc, avail=0.0)
+        return iso_to_epoch(_ts(-24 * 60 + 15))
+
+    def test_jump_across_chunk_boundary_is_repaired(self, repairer, initialised_store):
+        self._stuck_soc_across_chunks(initialised_store)
+
+        summary = repairer.run_full_repair()
+
+        assert summary["soc_blanked"] == 5
+        rows = _get_all_intervals(initialised_store)
+        assert [r["soc_pct"] for r in rows[-6:]] == [None] * 5 + [35.0]
+        assert self._checkpoint(initialised_store) is None
+
+    def test_interrupted_repair_keeps_checkpoint(self, repairer, initialised_store):
+        self._stuck_soc_across_chunks(initialised_store)
+        repair_range = repairer._repair_range
+        calls = []
+
+        def _fail_second_chunk(start, end, conn=None):
+            calls.append(start)
+            if len(calls) == 2:
+                raise sqlite3.OperationalError("database is locked")
+            return repair_range(start, end, conn=conn)
+
+        repairer._repair_range = _fail_second_chunk
+        with pytest.raises(sqlite3.OperationalError):
+            repairer.run_full_repair()
+
+        first_ts, next_ts, _ = self._checkpoint(initialised_store)
+        assert next_ts == first_ts + 86400
+
+    def test_resumes_at_checkpoint(self, repairer, initialised_store):
+        first_ts = self._stuck_soc_across_chunks(initialised_store)
+        self._insert_checkpoint(
+            initialised_store, first_ts, first_ts + 86400, '{"gaps_filled": 7}'
+        )
+        repairer._repair_range = MagicMock(return_value=_empty_summary())
+
+        summary = repairer.run_full_repair()
+
+        # Only the chunk after the checkpoint, read with 12 h of context.
+        repairer._repair_range.assert_called_once()
+        chunk_start = repairer._repair_range.call_args[0][0]
+        assert iso_to_epoch(chunk_start) == first_ts + 86400 - 12 * 3600
+        assert summary["gaps_filled"] == 7
+        assert self._checkpoint(initialised_store) is None
+
+    def test_checkpoint_of_other_data_is_ignored(self, repairer, initialised_store):
+        first_ts = self._stuck_soc_across_chunks(initialised_store)
+        self._insert_checkpoint(initialised_store, first_ts + 300, first_ts + 86400)
+
+        summary = repairer.run_full_repair()
+
+        assert summary["soc_blanked"] == 5
+
+    def test_checkpoint_with_rows_imported_before_it_is_ignored(
+        self, repairer, initialised_store
+    ):
+        first_ts = self._stuck_soc_across_chunks(initialised_store)
+        self._insert_checkpoint(initialised_store, first_ts, first_ts + 86400)
+        # Imported into the part the interrupted run had already repaired.
+        _insert_interval(initialised_store, _ts(-60), soc=60.0, avail=0.0)
+
+        summary = repairer.run_full_repair()
+
+        assert summary["soc_blanked"] == 5
+        assert self._checkpoint(initialised_store) is None
+
+    def test_resumed_repair_keeps_dirty_ranges_before_its_start(
+        self, repairer, initialised_store
+    ):
+        first_ts = self._stuck_soc_across_chunks(initialised_store)
+        next_ts = first_ts + 86400
+        self._insert_checkpoint(initialised_store, first_ts, next_ts)
+        conn = initialised_store.connection
+        # Marked during the interruption, before and after the resume point.
+        mark_dirty(conn, first_ts + 3600, first_ts + 3600)
+        mark_dirty(conn, next_ts + 300, next_ts + 300)
+        conn.commit()
+
+        repairer.run_full_repair()
+
+        assert dirty_ranges(conn)[0] == [(first_ts + 3600, first_ts + 3600)]
+
+    @patch("apps.v2g_liberty.data_repairer.get_local_now", return_value=TEST_NOW)
+    def test_report_shows_peak_memory(self, _mock_now, repairer, initialised_store):
+        self._stuck_soc_across_chunks(initialised_store)
+        summary = repairer.run_full_repair()
+        assert summary["peak_memory_bytes"] > 0
+
+        with patch("apps.v2g_liberty.data_repairer.append_to_report") as append:
+            repairer.write_report(summary)
+
+        assert "Peak memory:" in append.call_args[0][0]
+        assert "Rows scanned/written:" in append.call_args[0][0]
+
+    def test_parallel_repair_of_jump_across_chunk_boundary(
+        self, repairer, initialised_store
+    ):
+        self._stuck_soc_across_chunks(initialised_store)
+
+        summary = repairer.run_full_repair(workers=2)
+
+        assert summary["soc_blanked"] == 5
+        rows = _get_all_intervals(initialised_store)
+        assert [r["soc_pct"] for r in rows[-6:]] == [None] * 5 + [35.0]
+        assert self._checkpoint(initialised_store) is None
+
+    def test_parallel_repair_matches_serial(self, hass, initialised_store, tmp_path):
+        """Gaps, stuck SoC and pending rows over four chunks, 2 workers vs 1."""
+        serial_store = DataStore(hass)
+        serial_store.DB_PATH = str(tmp_path / "serial.db")
+        asyncio.get_event_loop().run_until_complete(serial_store.initialise())
+        for store in (initialised_store, serial_store):
+            for day in range(4):
+                base = (day - 3) * 24 * 60
+                for i, soc in enumerate([60.0, 60.0, 60.0, 60.0, 20.0, 21.0]):
+                    _insert_interval(store, _ts(base + i * 5), soc=soc, avail=0.0)
+                _insert_interval(store, _ts(base + 60), soc=25.0, repaired=2)
+
+        results = []
+        for store, workers in ((serial_store, 1), (initialised_store, 2)):
+            r = DataRepairer(hass)
+            r.data_store = store
+            summary = r.run_full_repair(workers=workers)
+            results.append((summary, _get_all_intervals(store)))
+
+        assert results[0][0]["gaps_filled"] > 0
+        assert results[0][0]["soc_blanked"] > 0
+        assert results[1] == results[0]
+
+    def test_single_worker_does_not_start_a_pool(self, repairer, initialised_store):
+        self._stuck_soc_across_chunks(initialised_store)
+        with patch("apps.v2g_liberty.data_repairer.ProcessPoolExecutor") as pool:
+            repairer.run_full_repair()
+        pool.assert_not_called()
+
+
 # =====================================================================
 # Incremental repair test
 # =====================================================================
 
 
 class TestIncrementalRepair:
+    @staticmethod
+    def _dirty_rows(store):
+        return store.connection.execute(
+            "SELECT COUNT(*) FROM repair_dirty_range"
+        ).fetchone()[0]
+
     @pytest.mark.asyncio
-    @patch("apps.v2g_liberty.data_repairer.get_local_now", return_value=TEST_NOW)
-    async def test_incremental_repair_runs(self, mock_now, repairer, initialised_store):
-        """Incremental repair should run without errors."""
-        # Insert some data within the lookback window
-        lookback_start = TEST_NOW - timedelta(hours=PERIODIC_LOOKBACK_HOURS)
-        ts1 = lookback_start.isoformat()
-        ts2 = (lookback_start + timedelta(minutes=5)).isoformat()
-        _insert_interval(initialised_store, ts1, state="charge")
-        _insert_interval(initialised_store, ts2, state="charge")
+    async def test_repairs_dirty_range_and_clears_it(self, repairer, initialised_store):
+        """A stuck SoC written through the DataStore is repaired incrementally."""
+        for i, soc in enumerate([72.0, 72.0, 72.0, 35.0, 34.0]):
+            initialised_store.insert_interval(_ts(i * 5), 0.0, "charge", soc, 0.0)
+        assert self._dirty_rows(initialised_store) == 5
 
         await repairer.run_incremental_repair()
-        # No assertion beyond "no exception"
+
+        rows = _get_all_intervals(initialised_store)
+        assert [r["soc_pct"] for r in rows[:3]] == [None, None, None]
+        assert self._dirty_rows(initialised_store) == 0
+
+    @pytest.mark.asyncio
+    async def test_rows_outside_the_context_are_not_touched(
+        self, repairer, initialised_store
+    ):
+        """Clean history far before the dirty range is not re-read."""
+        old = -(REPAIR_CONTEXT_HOURS + 2) * 60
+        for i, soc in enumerate([72.0, 72.0, 72.0, 35.0]):
+            _insert_interval(initialised_store, _ts(old + i * 5), soc=soc, avail=0.0)
+        initialised_store.insert_interval(_ts(0), 0.0, "charge", 50.0, 100.0)
+
+        await repairer.run_incremental_repair()
+
+        rows = _get_all_intervals(initialised_store)
+        assert [r["soc_pct"] for r in rows[:3]] == [72.0, 72.0, 72.0]
+
+    @pytest.mark.asyncio
+    async def test_nothing_dirty_skips_repair(self, repairer, initialised_store):
+        _insert_interval(initialised_store, _ts(0))
+        repairer._repair_range = MagicMock()
+
+        await repairer.run_incremental_repair()
+
+        repairer._repair_range.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_separate_ranges_sum_their_summaries(
+        self, repairer, initialised_store
+    ):
+        far = (2 * REPAIR_CONTEXT_HOURS + 1) * 60
+        for start in (0, far):
+            for i, soc in enumerate([72.0, 72.0, 72.0, 35.0, 34.0]):
+                initialised_store.insert_interval(
+                    _ts(start + i * 5), 0.0, "charge", soc, 0.0
+                )
+        calls = []
+        repair_range = repairer._repair_range
+
+        def _spy(start, end, conn=None):
+            calls.append((start, end))
+            return repair_range(start, end, conn=conn)
+
+        repairer._repair_range = _spy
+        summary = repairer._repair_dirty_ranges()
+
+        assert len(calls) == 2
+        assert summary["soc_blanked"] == 6
+
+    def test_full_repair_clears_dirty_ranges(self, repairer, initialised_store):
+        initialised_store.insert_interval(_ts(0), 0.0, "charge", 50.0, 100.0)
+
+        repairer.run_full_repair()
+
+        assert self._dirty_rows(initialised_store) == 0
 
 
 # =====================================================================
@@ -1195,6 +1525,9 @@ class TestInitialise:
         args = hass.run_every.call_args
         assert args[0][0] == repairer.run_incremental_repair
         assert args[0][2] == 6 * 60 * 60
+        hass.run_daily.assert_awaited_once_with(
+            repairer.run_retention_async, start="03:30:00"
+        )
 
 
 # =====================================================================
@@ -1411,6 +1744,43 @@ class TestPendingReview:
         for r in filled:
             assert r["is_repaired"] == 1
 
+    def test_repair_refreshes_interval_rollups(
+        self, repairer, initialised_store, monkeypatch
+    ):
+        """Reviewed and gap-filled rows show up in the day rollups."""
+        from apps.v2g_liberty import constants as real_c
+
+        monkeypatch.setattr(real_c, "TZ", TEST_TZ)
+        start, end = _ts(-60), _ts(60)
+        # Builds the (empty) rollups for TEST_TZ.
+        assert initialised_store.get_aggregated_data(start, end, "days") == []
+        _insert_interval(
+            initialised_store,
+            _ts(0),
+            energy=0.5,
+            soc=50.0,
+            state="charge",
+            repaired=2,
+        )
+        _insert_interval(
+            initialised_store,
+            _ts(15),
+            energy=0.5,
+            soc=54.0,
+            state="charge",
+            repaired=2,
+        )
+
+        repairer.run_full_repair()
+
+        cursor = initialised_store.connection.cursor()
+        cursor.execute(
+            "SELECT interval_count, repaired_count FROM interval_rollup "
+            "WHERE granularity = 'days'"
+        )
+        assert [tuple(row) for row in cursor.fetchall()] == [(4, 2)]
+        cursor.close()
+
 
 class TestRepairSingleFlight:
     """Only one repair (full or incremental) may run at a time.
@@ -1448,3 +1818,68 @@ class TestRepairSingleFlight:
         await repairer.run_incremental_repair()
 
         repairer._repair_range.assert_not_called()
+
+
+class TestRetention:
+    @pytest.fixture(autouse=True)
+    def _set_tz(self, monkeypatch):
+        from apps.v2g_liberty import constants
+
+        monkeypatch.setattr(constants, "TZ", TEST_TZ, raising=False)
+
+    def test_final_repair_runs_before_archiving(self, repairer, initialised_store):
+        # The gap at 10 and 15 is filled before the hour is archived.
+        for minutes in (0, 5, 20, 60):
+            _insert_interval(initialised_store, _ts(minutes), state="pause")
+
+        archived = repairer.run_retention(_ts(60))
+
+        assert archived == 5
+        conn = initialised_store.connection
+        row = conn.execute(
+            "SELECT interval_count, repaired_count FROM interval_archive"
+        ).fetchone()
+        assert tuple(row) == (5, 2)
+        assert [r["timestamp"] for r in _get_all_intervals(initialised_store)] == [
+            _ts(60)
+        ]
+
+    def test_freed_pages_are_reclaimed(self, repairer, initialised_store):
+        conn = initialised_store.connection
+        conn.executemany(
+            "INSERT INTO interval_log "
+            "(timestamp, energy_kwh, app_state, soc_pct, availability_pct) "
+            "VALUES (?, 0.1, 'charge', 50.0, 100.0)",
+            [(iso_to_epoch(_ts(-5 * i)),) for i in range(1, 5000)],
+        )
+        conn.commit()
+
+        assert repairer.run_retention(_ts(0)) > 0
+
+        assert conn.execute("PRAGMA freelist_count").fetchone()[0] == 0
+
+    @pytest.mark.asyncio
+    async def test_skipped_when_repair_running(self, repairer):
+        repairer.run_retention = MagicMock()
+        repairer._repair_running = True
+
+        await repairer.run_retention_async()
+
+        repairer.run_retention.assert_not_called()
+        assert repairer._repair_running is True
+
+    @pytest.mark.asyncio
+    @patch("apps.v2g_liberty.data_repairer.get_local_now", return_value=TEST_NOW)
+    async def test_async_run_archives_old_intervals(
+        self, mock_now, repairer, initialised_store
+    ):
+        old = TEST_NOW - timedelta(days=ARCHIVE_AFTER_DAYS + 1)
+        _insert_interval(initialised_store, old.isoformat(), state="pause")
+        _insert_interval(initialised_store, _ts(0), state="pause")
+
+        await repairer.run_retention_async()
+
+        assert [r["timestamp"] for r in _get_all_intervals(initialised_store)] == [
+            _ts(0)
+        ]
+        assert repairer._repair_running is False
@@ -1,18 +1,25 @@
 """Unit test (pytest) for data_store module."""
 
 import logging
+import random
+import sqlite3
 from datetime import datetime, timezone, timedelta
-from unittest.mock import AsyncMock
+from unittest.mock import AsyncMock, MagicMock
 
 import pytest
 from appdaemon.plugins.hass.hassapi import Hass
 
 import pandas as pd
 
+from apps.v2g_liberty import constants as c
 from apps.v2g_liberty.data_store import (
     CURRENT_SCHEMA_VERSION,
     DataStore,
     calculate_price_ratings,
+    clear_dirty_ranges,
+    dirty_ranges,
+    iso_to_epoch,
+    mark_dirty,
 )
 
 # pylint: disable=C0116,W0621
@@ -74,6 +81,12 @@ class TestInitialisation:
         cursor.close()
         assert value == 2
 
+    @pytest.mark.asyncio
+    async def test_initialise_sets_incremental_auto_vacuum(self, data_store):
+        await data_store.initialise()
+        # INCREMENTAL = 2
+        assert data_store.connection.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+
 
 class TestTableCreation:
     @pytest.mark.asyncio
@@ -91,6 +104,7 @@ class TestTableCreation:
         assert "emission_log" in tables
         assert "reservation_log" in tables
         assert "reference_price_log" in tables
+        assert "interval_archive" in tables
 
     @pytest.mark.asyncio
     async def test_interval_log_columns(self, data_store):
@@ -99,7 +113,7 @@ class TestTableCreation:
         cursor.execute("PRAGMA table_info(interval_log)")
         columns = {row[1]: row[2] for row in cursor.fetchall()}
         cursor.close()
-        assert columns["timestamp"] == "TEXT"
+        assert columns["timestamp"] == "INTEGER"
         assert "power_kw" not in columns
         assert columns["energy_kwh"] == "REAL"
         assert columns["app_state"] == "TEXT"
@@ -116,7 +130,7 @@ class TestTableCreation:
         cursor.execute("PRAGMA table_info(price_log)")
         columns = {row[1]: row[2] for row in cursor.fetchall()}
         cursor.close()
-        assert columns["timestamp"] == "TEXT"
+        assert columns["timestamp"] == "INTEGER"
         assert columns["consumption_price_kwh"] == "REAL"
         assert columns["production_price_kwh"] == "REAL"
         assert columns["price_rating"] == "TEXT"
@@ -128,7 +142,7 @@ class TestTableCreation:
         cursor.execute("PRAGMA table_info(emission_log)")
         columns = {row[1]: row[2] for row in cursor.fetchall()}
         cursor.close()
-        assert columns["timestamp"] == "TEXT"
+        assert columns["timestamp"] == "INTEGER"
         assert columns["emission_intensity_kg_mwh"] == "REAL"
 
     @pytest.mark.asyncio
@@ -231,7 +245,7 @@ class TestSchemaVersion:
         cursor.execute(
             "INSERT INTO price_log (timestamp, consumption_price_kwh, "
             "production_price_kwh, price_rating) VALUES (?, ?, ?, ?)",
-            ("2026-02-21T12:00:00+01:00", 0.25, 0.10, "average"),
+            (iso_to_epoch("2026-02-21T12:00:00+01:00"), 0.25, 0.10, "average"),
         )
         data_store.connection.commit()
         cursor.close()
@@ -283,7 +297,7 @@ class TestInsertInterval:
         cursor.execute("SELECT * FROM interval_log")
         row = cursor.fetchone()
         cursor.close()
-        assert row["timestamp"] == "2026-02-21T12:00:00+01:00"
+        assert row["timestamp"] == iso_to_epoch("2026-02-21T12:00:00+01:00")
         assert row["energy_kwh"] == 0.292
         assert row["app_state"] == "automatic"
         assert row["soc_pct"] == 55.0
@@ -305,6 +319,28 @@ class TestInsertInterval:
         cursor.close()
         assert row["soc_pct"] is None
 
+    @pytest.mark.asyncio
+    async def test_insert_interval_power_stats(self, data_store):
+        await data_store.initialise()
+        data_store.insert_interval(
+            timestamp="2026-02-21T12:00:00+01:00",
+            energy_kwh=0.5,
+            app_state="automatic",
+            soc_pct=55.0,
+            availability_pct=100.0,
+            power_min_w=0.0,
+            power_max_w=7400.0,
+            power_p95_w=7400.0,
+            setpoint_changes=2,
+        )
+        cursor = data_store.connection.cursor()
+        cursor.execute(
+            "SELECT power_min_w, power_max_w, power_p95_w, setpoint_changes "
+            "FROM interval_log"
+        )
+        assert tuple(cursor.fetchone()) == (0.0, 7400.0, 7400.0, 2)
+        cursor.close()
+
     @pytest.mark.asyncio
     async def test_insert_interval_duplicate_timestamp_replaces(self, data_store):
         """A second insert on the same timestamp replaces the earlier row (INSERT OR REPLACE)."""
@@ -506,8 +542,9 @@ class TestGetPricesInWindow:
             "2026-02-21T12:00:00+01:00", "2026-02-21T12:10:00+01:00"
         )
         assert len(df) == 3
-        assert df.iloc[0]["timestamp"] == "2026-02-21T12:00:00+01:00"
-        assert df.iloc[2]["timestamp"] == "2026-02-21T12:10:00+01:00"
+        # Timestamps come back normalised to UTC.
+        assert df.iloc[0]["timestamp"] == "2026-02-21T11:00:00+00:00"
+        assert df.iloc[2]["timestamp"] == "2026-02-21T11:10:00+00:00"
 
     @pytest.mark.asyncio
     async def test_window_returns_ordered_by_timestamp(self, data_store):
@@ -525,9 +562,9 @@ class TestGetPricesInWindow:
         )
         timestamps = df["timestamp"].tolist()
         assert timestamps == [
-            "2026-02-21T12:00:00+01:00",
-            "2026-02-21T12:05:00+01:00",
-            "2026-02-21T12:10:00+01:00",
+            "2026-02-21T11:00:00+00:00",
+            "2026-02-21T11:05:00+00:00",
+            "2026-02-21T11:10:00+00:00",
         ]
 
     @pytest.mark.asyncio
@@ -673,6 +710,114 @@ class TestUpsertPricesRecalculation:
         assert after[2] == "high"  # 0.25: rank 0.833 → (0.65, 0.85]
         # Key: the overwritten price now has a different rating than before
 
+    @pytest.mark.asyncio
+    async def test_ratings_match_full_recalculation(self, data_store):
+        """Sliding, overlapping and rewritten windows rate like a full pass."""
+        await data_store.initialise()
+        rng = random.Random(8)
+        base = datetime(2026, 2, 21, 0, 0, tzinfo=timezone.utc)
+
+        def ts(step):
+            return (base + timedelta(minutes=5 * step)).isoformat()
+
+        batches = [(0, 288), (288, 288), (200, 12), (500, 1), (150, 400), (0, 3)]
+        batches += [(rng.randrange(0, 700), rng.randrange(1, 300)) for _ in range(20)]
+        for first, count in batches:
+            # Two decimals, so equal prices (ties) are common.
+            rows = [
+                (ts(step), round(rng.uniform(0.05, 0.3), 2), 0.1, None)
+                for step in range(first, first + count)
+            ]
+            data_store.upsert_prices(rows)
+
+            window = data_store.get_prices_in_window(
+                (datetime.fromisoformat(ts(first)) - timedelta(hours=6)).isoformat(),
+                (
+                    datetime.fromisoformat(ts(first + count - 1)) + timedelta(hours=18)
+                ).isoformat(),
+            )
+            expected = calculate_price_ratings(window)
+            assert list(window["price_rating"]) == list(expected)
+
+    @pytest.mark.asyncio
+    async def test_only_changed_ratings_are_written(self, data_store):
+        await data_store.initialise()
+        base = datetime(2026, 2, 21, 12, 0, tzinfo=timezone(timedelta(hours=1)))
+        rows = [
+            ((base + timedelta(minutes=5 * i)).isoformat(), 0.01 * (i + 1), 0.0, None)
+            for i in range(20)
+        ]
+        data_store.upsert_prices(rows)
+        conn = data_store.connection
+
+        # Same price again: nothing to write.
+        before = conn.total_changes
+        data_store.upsert_prices([rows[5]])
+        assert conn.total_changes - before == 0
+        assert data_store.get_price_at(rows[5][0])[2] is not None
+
+        # Swapping the two lowest prices changes the bucket of neither:
+        # only the two new prices are written (and their day's data version).
+        before = conn.total_changes
+        data_store.upsert_prices(
+            [(rows[0][0], 0.02, 0.0, None), (rows[1][0], 0.01, 0.0, None)]
+        )
+        assert conn.total_changes - before == 3
+
+    @pytest.mark.asyncio
+    async def test_written_prices_are_announced(self, data_store):
+        await data_store.initialise()
+        data_store.event_bus = MagicMock()
+        base = datetime(2026, 2, 21, 12, 0, tzinfo=timezone.utc)
+        rows = [
+            ((base + timedelta(minutes=5 * i)).isoformat(), 0.01 * (i + 1), 0.0, None)
+            for i in range(3)
+        ]
+        data_store.upsert_prices(rows)
+        data_store.event_bus.emit_event.assert_called_once_with(
+            "prices_upserted",
+            start="2026-02-21T12:00:00+00:00",
+            end="2026-02-21T12:10:00+00:00",
+        )
+
+        # Unchanged prices are not written, so not announced either.
+        data_store.event_bus.reset_mock()
+        data_store.upsert_prices(rows)
+        data_store.event_bus.emit_event.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_rerated_neighbours_are_announced_and_refreshed(
+        self, data_store, monkeypatch
+    ):
+        from apps.v2g_liberty import data_store as data_store_module
+
+        await data_store.initialise()
+        data_store.upsert_prices(
+            [
+                ("2026-02-21T12:00:00+00:00", 0.10, 0.0, None),
+                ("2026-02-21T12:05:00+00:00", 0.30, 0.0, None),
+            ]
+        )
+        data_store.event_bus = MagicMock()
+        refreshed = []
+        monkeypatch.setattr(
+            data_store_module,
+            "refresh_interval_rollups",
+            lambda conn, first, last, commit=True: refreshed.append((first, last)),
+        )
+
+        # A higher price re-rates both earlier rows (average/very_high to
+        # low/high) without writing their prices.
+        data_store.upsert_prices([("2026-02-21T12:10:00+00:00", 0.50, 0.0, None)])
+
+        assert data_store.get_price_at("2026-02-21T12:00:00+00:00")[2] == "low"
+        data_store.event_bus.emit_event.assert_called_once_with(
+            "prices_upserted",
+            start="2026-02-21T12:00:00+00:00",
+            end="2026-02-21T12:10:00+00:00",
+        )
+        assert refreshed == [("2026-02-21T12:00:00+00:00", "2026-02-21T12:10:00+00:00")]
+
 
 class TestUpsertEmissions:
     @pytest.mark.asyncio
@@ -698,7 +843,7 @@ class TestUpsertEmissions:
         cursor.execute("SELECT * FROM emission_log")
         row = cursor.fetchone()
         cursor.close()
-        assert row["timestamp"] == "2026-02-21T12:00:00+01:00"
+        assert row["timestamp"] == iso_to_epoch("2026-02-21T12:00:00+01:00")
         assert row["emission_intensity_kg_mwh"] == 350.5
 
     @pytest.mark.asyncio
@@ -922,12 +1067,12 @@ class TestPvIntervalLog:
         rows = data_store.get_pv_intervals_since("2026-05-01T11:00:00+02:00")
         assert len(rows) == 3
         assert rows[0] == {
-            "timestamp": "2026-05-01T12:00:00+02:00",
+            "timestamp": "2026-05-01T10:00:00+00:00",
             "panel_id": "sp_1",
             "power_kw": 2.4,
         }
         assert rows[1]["panel_id"] == "sp_2"
-        assert rows[2]["timestamp"] == "2026-05-01T12:05:00+02:00"
+        assert rows[2]["timestamp"] == "2026-05-01T10:05:00+00:00"
 
     @pytest.mark.asyncio
     async def test_retrieve_filters_by_timestamp(self, data_store):
@@ -980,3 +1125,555 @@ class TestSchemaMigration:
         )
         row = cursor.fetchone()
         assert row["version"] == CURRENT_SCHEMA_VERSION
+
+    @pytest.mark.asyncio
+    async def test_migration_from_v3_converts_timestamps_to_epoch(self, data_store):
+        conn = sqlite3.connect(data_store.DB_PATH)
+        conn.executescript(
+            """
+            CREATE TABLE schema_version (version INTEGER NOT NULL, applied_at TEXT);
+            INSERT INTO schema_version VALUES (3, '2026-01-01T00:00:00+00:00');
+            CREATE TABLE interval_log (
+                timestamp TEXT PRIMARY KEY, energy_kwh REAL,
+                app_state TEXT NOT NULL, soc_pct REAL, availability_pct REAL,
+                is_repaired INTEGER NOT NULL DEFAULT 0,
+                naive_power_w REAL, naive_soc_pct REAL
+            );
+            CREATE TABLE price_log (
+                timestamp TEXT PRIMARY KEY, consumption_price_kwh REAL NOT NULL,
+                production_price_kwh REAL NOT NULL, price_rating TEXT
+            );
+            CREATE TABLE emission_log (
+                timestamp TEXT PRIMARY KEY, emission_intensity_kg_mwh REAL NOT NULL
+            );
+            CREATE TABLE grid_interval_log (
+                timestamp TEXT NOT NULL, phase INTEGER NOT NULL,
+                consumption_kw REAL, production_kw REAL,
+                PRIMARY KEY (timestamp, phase)
+            );
+            CREATE TABLE pv_interval_log (
+                timestamp TEXT NOT NULL, panel_id TEXT NOT NULL, power_kw REAL,
+                PRIMARY KEY (timestamp, panel_id)
+            );
+            INSERT INTO interval_log VALUES
+                ('2026-02-21T11:00:00+00:00', 0.1, 'charge', 50.0, 100.0, 0, NULL, NULL),
+                ('2026-02-21T12:00:00+01:00', 0.9, 'unknown', NULL, 100.0, 2, NULL, NULL),
+                ('2026-02-21T11:05:00+00:00', 0.2, 'charge', 51.0, 100.0, 0, 7400, 52.0),
+                ('not a timestamp', 0.3, 'charge', 52.0, 100.0, 0, NULL, NULL);
+            INSERT INTO price_log VALUES ('2026-02-21T12:00:00+01:00', 0.25, 0.1, 'low');
+            INSERT INTO emission_log VALUES ('2026-02-21T11:00:00+00:00', 350.0);
+            INSERT INTO grid_interval_log VALUES ('2026-02-21T11:00:00+00:00', 1, 2.0, 0.0);
+            INSERT INTO pv_interval_log VALUES ('2026-02-21T11:00:00+00:00', 'sp_1', 1.5);
+            """
+        )
+        conn.commit()
+        conn.close()
+
+        await data_store.initialise()
+
+        cursor = data_store.connection.cursor()
+        cursor.execute("SELECT version FROM schema_version ORDER BY version DESC")
+        assert cursor.fetchone()["version"] == CURRENT_SCHEMA_VERSION
+        cursor.execute("SELECT * FROM interval_log ORDER BY timestamp")
+        rows = [dict(row) for row in cursor.fetchall()]
+        cursor.close()
+        # The duplicate with a local offset collapses onto the measured row
+        # and the unparseable row is dropped.
+        assert [row["timestamp"] for row in rows] == [
+            iso_to_epoch("2026-02-21T11:00:00+00:00"),
+            iso_to_epoch("2026-02-21T11:05:00+00:00"),
+        ]
+        assert rows[0]["energy_kwh"] == 0.1
+        assert rows[0]["is_repaired"] == 0
+        assert rows[1]["naive_power_w"] == 7400
+
+        assert data_store.get_price_at("2026-02-21T11:00:00+00:00") == (
+            0.25,
+            0.1,
+            "low",
+        )
+        assert data_store.get_grid_intervals_since("2026-02-21T10:00:00+00:00") == [
+            {
+                "timestamp": "2026-02-21T11:00:00+00:00",
+                "phase": 1,
+                "consumption_kw": 2.0,
+                "production_kw": 0.0,
+            }
+        ]
+        assert data_store.get_pv_intervals_since("2026-02-21T10:00:00+00:00") == [
+            {
+                "timestamp": "2026-02-21T11:00:00+00:00",
+                "panel_id": "sp_1",
+                "power_kw": 1.5,
+            }
+        ]
+
+    @pytest.mark.asyncio
+    async def test_migration_from_v4_enables_incremental_vacuum(self, data_store):
+        conn = sqlite3.connect(data_store.DB_PATH)
+        conn.executescript(
+            """
+            CREATE TABLE schema_version (version INTEGER NOT NULL, applied_at TEXT);
+            INSERT INTO schema_version VALUES (4, '2026-01-01T00:00:00+00:00');
+            """
+        )
+        conn.close()
+
+        await data_store.initialise()
+
+        cursor = data_store.connection.cursor()
+        cursor.execute("SELECT version FROM schema_version ORDER BY version DESC")
+        assert cursor.fetchone()["version"] == CURRENT_SCHEMA_VERSION
+        cursor.execute("PRAGMA auto_vacuum")
+        assert cursor.fetchone()[0] == 2
+        cursor.execute("SELECT name FROM sqlite_master WHERE name = 'interval_archive'")
+        assert cursor.fetchone() is not None
+        cursor.close()
+
+    @pytest.mark.asyncio
+    async def test_migration_from_v6_rebuilds_rollups_with_calendar(
+        self, data_store, hass
+    ):
+        await data_store.initialise()
+        data_store.connection.executescript(
+            """
+            DROP TABLE calendar_day;
+            INSERT INTO interval_rollup_state VALUES ('timezone', 'UTC');
+            INSERT INTO schema_version VALUES (6, '2026-01-01T00:00:00+00:00');
+            DELETE FROM schema_version WHERE version > 6;
+            """
+        )
+        data_store.close()
+
+        store = DataStore(hass)
+        store.DB_PATH = data_store.DB_PATH
+        await store.initialise()
+
+        cursor = store.connection.cursor()
+        cursor.execute("SELECT version FROM schema_version ORDER BY version DESC")
+        assert cursor.fetchone()["version"] == CURRENT_SCHEMA_VERSION
+        cursor.execute("SELECT name FROM sqlite_master WHERE name = 'calendar_day'")
+        assert cursor.fetchone() is not None
+        cursor.execute("SELECT COUNT(*) FROM interval_rollup_state")
+        assert cursor.fetchone()[0] == 0
+        cursor.close()
+        store.close()
+
+    @pytest.mark.asyncio
+    async def test_migration_from_v7_adds_power_stat_columns(self, data_store, hass):
+        await data_store.initialise()
+        data_store.insert_interval("2026-02-21T11:00:00+00:00", 0.1, "charge", 50, 100)
+        data_store.connection.executescript(
+            """
+            ALTER TABLE interval_log DROP COLUMN power_min_w;
+            ALTER TABLE interval_log DROP COLUMN power_max_w;
+            ALTER TABLE interval_log DROP COLUMN power_p95_w;
+            ALTER TABLE interval_log DROP COLUMN setpoint_changes;
+            DELETE FROM schema_version;
+            INSERT INTO schema_version VALUES (7, '2026-01-01T00:00:00+00:00');
+            """
+        )
+        data_store.close()
+
+        store = DataStore(hass)
+        store.DB_PATH = data_store.DB_PATH
+        await store.initialise()
+
+        cursor = store.connection.cursor()
+        cursor.execute("SELECT version FROM schema_version ORDER BY version DESC")
+        assert cursor.fetchone()["version"] == CURRENT_SCHEMA_VERSION
+        cursor.execute("SELECT * FROM interval_log")
+        row = dict(cursor.fetchone())
+        assert row["energy_kwh"] == 0.1
+        assert row["power_p95_w"] is None
+        assert row["setpoint_changes"] is None
+        cursor.close()
+        store.close()
+
+    @pytest.mark.asyncio
+    async def test_migration_from_v8_marks_last_48_hours_dirty(self, data_store, hass):
+        await data_store.initialise()
+        data_store.insert_interval("2026-02-21T11:00:00+00:00", 0.1, "charge", 50, 100)
+        data_store.connection.executescript(
+            """
+            DROP TABLE repair_dirty_range;
+            DELETE FROM schema_version;
+            INSERT INTO schema_version VALUES (8, '2026-01-01T00:00:00+00:00');
+            """
+        )
+        data_store.close()
+
+        store = DataStore(hass)
+        store.DB_PATH = data_store.DB_PATH
+        await store.initialise()
+
+        last = iso_to_epoch("2026-02-21T11:00:00+00:00")
+        assert dirty_ranges(store.connection)[0] == [(last - 48 * 3600, last)]
+        store.close()
+
+    @pytest.mark.asyncio
+    async def test_interval_tables_are_without_rowid(self, data_store):
+        await data_store.initialise()
+        cursor = data_store.connection.cursor()
+        for table in (
+            "interval_log",
+            "price_log",
+            "emission_log",
+            "grid_interval_log",
+            "pv_interval_log",
+            "interval_archive",
+            "data_version",
+            "calendar_day",
+        ):
+            cursor.execute(f"SELECT sql FROM sqlite_master WHERE name = '{table}'")
+            assert "WITHOUT ROWID" in cursor.fetchone()[0]
+        cursor.close()
+
+
+class TestDataVersions:
+    DAY = ("2026-02-21T00:00:00+00:00", "2026-02-22T00:00:00+00:00")
+    NEXT_DAY = ("2026-02-22T00:00:00+00:00", "2026-02-23T00:00:00+00:00")
+
+    @pytest.mark.asyncio
+    async def test_write_bumps_only_its_day(self, data_store):
+        await data_store.initialise()
+        day, next_day = (
+            data_store.get_data_versions(*self.DAY),
+            data_store.get_data_versions(*self.NEXT_DAY),
+        )
+        data_store.insert_interval("2026-02-21T11:00:00+00:00", 0.1, "charge", 50, 100)
+
+        assert data_store.get_data_versions(*self.DAY)[0] > day[0]
+        assert data_store.get_data_versions(*self.NEXT_DAY)[0] == next_day[0]
+        # The version of all data changes with any write.
+        assert data_store.get_data_versions(*self.NEXT_DAY)[1] > next_day[1]
+
+    @pytest.mark.asyncio
+    async def test_price_write_bumps_its_day(self, data_store):
+        await data_store.initialise()
+        before = data_store.get_data_versions(*self.DAY)
+        data_store.upsert_prices([("2026-02-21T11:00:00+00:00", 0.2, 0.1, None)])
+        assert data_store.get_data_versions(*self.DAY)[0] > before[0]
+
+    @pytest.mark.asyncio
+    async def test_rollup_invalidation_bumps_every_day(self, data_store):
+        await data_store.initialise()
+        data_store.bulk_insert_or_ignore_intervals(
+            [
+                {
+                    "timestamp": "2026-02-21T11:00:00+00:00",
+                    "energy_kwh": 0.1,
+                    "app_state": "unknown",
+                    "soc_pct": None,
+                    "availability_pct": None,
+                    "is_repaired": 0,
+                }
+            ]
+        )
+        before = data_store.get_data_versions(*self.NEXT_DAY)
+        data_store.delete_historical_intervals()
+        assert data_store.get_data_versions(*self.NEXT_DAY)[0] > before[0]
+
+
+class TestDirtyRanges:
+    @pytest.mark.asyncio
+    async def test_insert_interval_marks_it_dirty(self, data_store):
+        await data_store.initialise()
+        for minute in (0, 5, 10, 30):
+            data_store.insert_interval(
+                f"2026-02-21T11:{minute:02d}:00+00:00", 0.1, "charge", 50, 100
+            )
+
+        start = iso_to_epoch("2026-02-21T11:00:00+00:00")
+        ranges, last = dirty_ranges(data_store.connection)
+        # Adjacent intervals coalesce, the one at :30 stays apart.
+        assert ranges == [(start, start + 600), (start + 1800, start + 1800)]
+        assert last == 4
+
+    @pytest.mark.asyncio
+    async def test_bulk_insert_marks_its_span_dirty(self, data_store):
+        await data_store.initialise()
+        rows = [
+            {
+                "timestamp": f"2026-02-21T11:{minute:02d}:00+00:00",
+                "energy_kwh": 0.1,
+                "app_state": "unknown",
+                "soc_pct": None,
+                "availability_pct": None,
+                "is_repaired": 2,
+            }
+            for minute in (0, 20)
+        ]
+        data_store.bulk_insert_or_ignore_intervals(rows)
+        # Nothing new inserted: nothing marked.
+        data_store.bulk_insert_or_ignore_intervals(rows)
+
+        start = iso_to_epoch("2026-02-21T11:00:00+00:00")
+        assert dirty_ranges(data_store.connection) == ([(start, start + 1200)], 1)
+
+    @pytest.mark.asyncio
+    async def test_margin_merges_nearby_ranges(self, data_store):
+        await data_store.initialise()
+        conn = data_store.connection
+        mark_dirty(conn, 10_000, 10_000)
+        mark_dirty(conn, 13_000, 13_600)
+
+        assert dirty_ranges(conn, margin=1500)[0] == [(8_500, 15_100)]
+        assert len(dirty_ranges(conn, margin=1000)[0]) == 2
+
+    @pytest.mark.asyncio
+    async def test_clear_keeps_ranges_marked_later(self, data_store):
+        await data_store.initialise()
+        conn = data_store.connection
+        mark_dirty(conn, 10_000, 10_000)
+        _, last = dirty_ranges(conn)
+        mark_dirty(conn, 20_000, 20_000)
+
+        clear_dirty_ranges(conn, last)
+
+        assert dirty_ranges(conn)[0] == [(20_000, 20_000)]
+
+    @pytest.mark.asyncio
+    async def test_clear_since_keeps_ranges_starting_before_it(self, data_store):
+        await data_store.initialise()
+        conn = data_store.connection
+        mark_dirty(conn, 10_000, 20_000)
+        mark_dirty(conn, 30_000, 30_000)
+        _, last = dirty_ranges(conn)
+
+        clear_dirty_ranges(conn, last, since=15_000)
+
+        assert dirty_ranges(conn)[0] == [(10_000, 20_000)]
+
+
+class TestTransaction:
+    @pytest.mark.asyncio
+    async def test_writes_are_committed_at_block_end(self, data_store):
+        await data_store.initialise()
+        reader = sqlite3.connect(data_store.DB_PATH)
+        with data_store.transaction():
+            data_store.insert_interval(
+                "2026-02-21T11:00:00+00:00", 0.1, "charge", 50, 100
+            )
+            data_store.insert_grid_interval("2026-02-21T11:00:00+00:00", 1, 1.5, 0.0)
+            data_store.insert_pv_interval("2026-02-21T11:00:00+00:00", "sp_1", 2.0)
+            assert (
+                reader.execute("SELECT COUNT(*) FROM interval_log").fetchone()[0] == 0
+            )
+        assert reader.execute("SELECT COUNT(*) FROM interval_log").fetchone()[0] == 1
+        assert (
+            reader.execute("SELECT COUNT(*) FROM grid_interval_log").fetchone()[0] == 1
+        )
+        assert reader.execute("SELECT COUNT(*) FROM pv_interval_log").fetchone()[0] == 1
+        reader.close()
+
+    @pytest.mark.asyncio
+    async def test_exception_rolls_back_all_writes(self, data_store):
+        await data_store.initialise()
+        with pytest.raises(RuntimeError):
+            with data_store.transaction():
+                data_store.insert_interval(
+                    "2026-02-21T11:00:00+00:00", 0.1, "charge", 50, 100
+                )
+                data_store.insert_grid_interval(
+                    "2026-02-21T11:00:00+00:00", 1, 1.5, 0.0
+                )
+                raise RuntimeError("boom")
+        assert data_store.has_any_intervals() is False
+        assert data_store.get_grid_intervals_since("2026-02-21T00:00:00+00:00") == []
+
+    @pytest.mark.asyncio
+    async def test_rollup_rebuild_does_not_commit_the_block(
+        self, data_store, monkeypatch
+    ):
+        monkeypatch.setattr(c, "TZ", TEST_TZ)
+        await data_store.initialise()
+        data_store.connection.execute("DELETE FROM interval_rollup_state")
+        data_store.connection.commit()
+        with pytest.raises(RuntimeError):
+            with data_store.transaction():
+                data_store.insert_interval(
+                    "2026-02-21T11:00:00+00:00", 0.1, "charge", 50, 100
+                )
+                assert data_store.ensure_rollups()
+                raise RuntimeError("boom")
+        assert data_store.has_any_intervals() is False
+        state = data_store.connection.execute(
+            "SELECT COUNT(*) FROM interval_rollup_state"
+        ).fetchone()[0]
+        assert state == 0
+
+    @pytest.mark.asyncio
+    async def test_nested_blocks_join_the_outer_transaction(self, data_store):
+        await data_store.initialise()
+        with data_store.transaction():
+            with data_store.transaction():
+                data_store.insert_interval(
+                    "2026-02-21T11:00:00+00:00", 0.1, "charge", 50, 100
+                )
+            assert data_store.connection.in_transaction
+        assert not data_store.connection.in_transaction
+
+    @pytest.mark.asyncio
+    async def test_failed_nested_block_is_rolled_back_alone(self, data_store):
+        await data_store.initialise()
+        with data_store.transaction():
+            data_store.insert_grid_interval("2026-02-21T11:00:00+00:00", 1, 1.5, 0.0)
+            with pytest.raises(RuntimeError):
+                with data_store.transaction():
+                    data_store.insert_interval(
+                        "2026-02-21T11:00:00+00:00", 0.1, "charge", 50, 100
+                    )
+                    raise RuntimeError("boom")
+            data_store.insert_grid_interval("2026-02-21T11:00:00+00:00", 2, 1.5, 0.0)
+
+        assert data_store.has_any_intervals() is False
+        assert (
+            len(data_store.get_grid_intervals_since("2026-02-21T00:00:00+00:00")) == 2
+        )
+
+    @pytest.mark.asyncio
+    async def test_nested_block_without_outer_writes_commits_with_outer(
+        self, data_store
+    ):
+        await data_store.initialise()
+        reader = sqlite3.connect(data_store.DB_PATH)
+        with pytest.raises(RuntimeError):
+            with data_store.transaction():
+                with data_store.transaction():
+                    data_store.insert_interval(
+                        "2026-02-21T11:00:00+00:00", 0.1, "charge", 50, 100
+                    )
+                count = reader.execute("SELECT COUNT(*) FROM interval_log")
+                assert count.fetchone()[0] == 0
+                raise RuntimeError("boom")
+        assert data_store.has_any_intervals() is False
+        reader.close()
+
+    @pytest.mark.asyncio
+    async def test_rollups_refreshed_once_at_commit(self, data_store, monkeypatch):
+        from apps.v2g_liberty import data_store as data_store_module
+
+        monkeypatch.setattr(c, "TZ", TEST_TZ)
+        await data_store.initialise()
+        start, end = "2026-02-20T23:00:00+00:00", "2026-02-21T23:00:00+00:00"
+        data_store.get_aggregated_data(start, end, "days")  # builds the rollups
+
+        refreshed = []
+        original = data_store_module.refresh_interval_rollups
+        monkeypatch.setattr(
+            data_store_module,
+            "refresh_interval_rollups",
+            lambda conn, first, last, commit=True: (
+                refreshed.append((first, last)),
+                original(conn, first, last, commit),
+            ),
+        )
+        with data_store.transaction():
+            data_store.insert_interval(
+                "2026-02-21T11:00:00+00:00", 0.1, "charge", 50, 100
+            )
+            data_store.upsert_emissions([("2026-02-21T11:05:00+00:00", 300.0)])
+            data_store.insert_interval(
+                "2026-02-21T11:05:00+00:00", 0.2, "charge", 51, 100
+            )
+
+        assert refreshed == [("2026-02-21T11:00:00+00:00", "2026-02-21T11:05:00+00:00")]
+        (day,) = data_store.get_aggregated_data(start, end, "days")
+        assert day["charge_kwh"] == pytest.approx(0.3)
+
+    @pytest.mark.asyncio
+    async def test_commit_latency_is_logged(self, data_store, caplog):
+        await data_store.initialise()
+        with caplog.at_level(logging.DEBUG, logger="AppDaemon.v2g-app.data_store"):
+            with data_store.transaction():
+                data_store.insert_grid_interval(
+                    "2026-02-21T11:00:00+00:00", 1, 1.5, 0.0
+                )
+                data_store.insert_grid_interval(
+                    "2026-02-21T11:00:00+00:00", 2, 1.5, 0.0
+                )
+        assert "Transaction committed 2 write(s) in" in caplog.text
+
+
+class TestReadOnly:
+    @pytest.fixture
+    def reader(self, hass, data_store):
+        store = DataStore(hass, read_only=True)
+        store.DB_PATH = data_store.DB_PATH
+        yield store
+        store.close()
+
+    @pytest.mark.asyncio
+    async def test_reads_committed_data(self, data_store, reader):
+        await data_store.initialise()
+        reader.open()
+        assert reader.read_only
+        data_store.insert_interval("2026-02-21T11:00:00+00:00", 0.1, "charge", 50, 100)
+        rows = reader.get_intervals_since("2026-02-21T10:55:00+00:00")
+        assert [row["timestamp"] for row in rows] == ["2026-02-21T11:00:00+00:00"]
+
+    @pytest.mark.asyncio
+    async def test_cannot_write(self, data_store, reader):
+        await data_store.initialise()
+        reader.open()
+        with pytest.raises(sqlite3.OperationalError):
+            reader.insert_interval("2026-02-21T11:00:00+00:00", 0.1, "charge", 50, 100)
+
+    def test_does_not_create_database(self, reader):
+        with pytest.raises(sqlite3.OperationalError):
+            reader.open()
+        assert not reader.is_available
+
+    @pytest.mark.asyncio
+    async def test_does_not_rebuild_stale_rollups(
+        self, data_store, reader, monkeypatch
+    ):
+        monkeypatch.setattr(c, "TZ", TEST_TZ)
+        await data_store.initialise()
+        reader.open()
+        data_store.insert_interval("2026-02-21T11:00:00+00:00", 0.1, "charge", 50, 100)
+        data_store.connection.execute("DELETE FROM interval_rollup_state")
+        data_store.connection.commit()
+        assert not reader.ensure_rollups()
+        # Falls back to interval_log.
+        (day,) = reader.get_aggregated_data(
+            "2026-02-20T23:00:00+00:00", "2026-02-21T23:00:00+00:00", "days"
+        )
+        assert day["charge_kwh"] == pytest.approx(0.1)
+        assert data_store.ensure_rollups()
+        assert reader.ensure_rollups()
+
+    @pytest.mark.asyncio
+    async def test_sees_reference_prices_upserted_elsewhere(self, data_store, reader):
+        await data_store.initialise()
+        reader.open()
+        data_store.insert_interval("2026-02-21T11:00:00+00:00", 0.1, "charge", 50, 100)
+        fetch = reader._DataStore__fetch_interval_frame
+        start, end = "2026-02-21T11:00:00+00:00", "2026-02-21T11:05:00+00:00"
+        assert pd.isna(fetch(start, end)["ref_price_kwh"].iloc[0])
+        data_store.upsert_reference_prices(
+            [("2026-02", 0.1, 0.3, "test", "2026-02-01T00:00:00+00:00")]
+        )
+        assert fetch(start, end)["ref_price_kwh"].iloc[0] == pytest.approx(0.4)
+
+
+class TestNaiveChargingQueries:
+    @pytest.mark.asyncio
+    async def test_get_naive_charging_input(self, data_store):
+        await data_store.initialise()
+        data_store.insert_interval("2026-02-21T11:05:00+00:00", 0.2, "charge", 51, 100)
+        data_store.insert_interval("2026-02-21T11:00:00+00:00", 0.1, "charge", 50, 100)
+        data_store.update_naive_charging([(5000.0, 55.0, "2026-02-21T11:00:00+00:00")])
+        frame = data_store.get_naive_charging_input()
+        assert list(frame["timestamp"]) == [
+            "2026-02-21T11:00:00+00:00",
+            "2026-02-21T11:05:00+00:00",
+        ]
+        assert frame["naive_power_w"].iloc[0] == 5000.0
+        assert pd.isna(frame["naive_power_w"].iloc[1])
+
+    @pytest.mark.asyncio
+    async def test_get_naive_charging_input_empty(self, data_store):
+        await data_store.initialise()
+        assert data_store.get_naive_charging_input().empty
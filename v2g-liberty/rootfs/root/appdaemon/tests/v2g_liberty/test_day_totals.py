@@ -0,0 +1,61 @@
+"""Unit test (pytest) for day_totals module."""
+
+from datetime import date
+
+from apps.v2g_liberty.day_totals import DayTotals
+
+# pylint: disable=C0116
+
+DAY = date(2026, 2, 22)
+
+
+def test_not_loaded_until_reset():
+    totals = DayTotals()
+    assert not totals.is_for(DAY)
+    totals.reset(DAY)
+    assert totals.is_for(DAY)
+    assert not totals.is_for(date(2026, 2, 23))
+
+
+def test_reset_from_aggregated_day():
+    totals = DayTotals()
+    totals.reset(
+        DAY,
+        {
+            "period_start": "2026-02-22",
+            "charge_kwh": 5.5,
+            "charge_cost": 1.23,
+            "discharge_kwh": 3.2,
+            "discharge_revenue": 0.89,
+            "net_kwh": 2.3,
+        },
+    )
+    assert totals.as_dict() == {
+        "charge_kwh": 5.5,
+        "charge_cost": 1.23,
+        "discharge_kwh": 3.2,
+        "discharge_revenue": 0.89,
+    }
+
+
+def test_add_splits_charge_and_discharge():
+    totals = DayTotals()
+    totals.reset(DAY)
+    totals.add(0.5, 0.30, 0.20)
+    totals.add(-0.25, 0.30, 0.20)
+    totals.add(0.25, None, None)
+    totals.add(None, 0.30, 0.20)
+    totals.add(0.0, 0.30, 0.20)
+    assert totals.as_dict() == {
+        "charge_kwh": 0.75,
+        "charge_cost": 0.15,
+        "discharge_kwh": 0.25,
+        "discharge_revenue": 0.05,
+    }
+
+
+def test_invalidate():
+    totals = DayTotals()
+    totals.reset(DAY)
+    totals.invalidate()
+    assert not totals.is_for(DAY)
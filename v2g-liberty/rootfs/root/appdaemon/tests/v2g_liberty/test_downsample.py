@@ -0,0 +1,79 @@
+"""Unit test (pytest) for downsample module."""
+
+import math
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from apps.v2g_liberty.downsample import downsample
+
+# pylint: disable=C0116
+
+START = datetime(2026, 2, 23, tzinfo=timezone.utc)
+
+
+def _quarters(socs: list[float | None]) -> list[dict]:
+    return [
+        {
+            "period_start": (START + timedelta(minutes=15 * i)).isoformat(),
+            "app_state": "automatic",
+            "consumption_price": 0.2 + i / 1000,
+            "soc_pct": soc,
+            "energy_wh": 250 * (i % 3) - 250,
+            "charge_cost": round(0.0123 * i, 4),
+            "savings_fixed_eur": None,
+            "has_repaired": i == 7,
+        }
+        for i, soc in enumerate(socs)
+    ]
+
+
+def test_few_rows_are_returned_as_they_are():
+    rows = _quarters([50.0] * 5)
+    assert downsample(rows, 5) is rows
+
+
+def test_at_least_three_points():
+    with pytest.raises(ValueError):
+        downsample(_quarters([50.0] * 5), 2)
+
+
+def test_totals_are_kept():
+    rows = _quarters([50.0 + i % 7 for i in range(100)])
+    result = downsample(rows, 10)
+    assert len(result) == 10
+    assert sum(row["period_count"] for row in result) == 100
+    assert sum(row["energy_wh"] for row in result) == sum(
+        row["energy_wh"] for row in rows
+    )
+    assert math.isclose(
+        sum(row["charge_cost"] for row in result),
+        sum(row["charge_cost"] for row in rows),
+        abs_tol=1e-9,
+    )
+    assert result[0] == {**rows[0], "period_count": 1}
+    assert result[-1] == {**rows[-1], "period_count": 1}
+    assert sum(row["has_repaired"] for row in result) == 1
+    assert all(row["savings_fixed_eur"] is None for row in result)
+
+
+def test_buckets_start_at_their_first_period():
+    rows = _quarters([50.0] * 20)
+    result = downsample(rows, 5)
+    starts = [row["period_start"] for row in rows]
+    assert [starts.index(row["period_start"]) for row in result] == [0, 1, 7, 13, 19]
+
+
+def test_peaks_are_kept():
+    socs = [50.0] * 20
+    socs[5] = 90.0
+    socs[15] = 10.0
+    result = downsample(_quarters(socs), 5)
+    assert [row["soc_pct"] for row in result] == [50.0, 90.0, 50.0, 10.0, 50.0]
+
+
+def test_missing_values_are_skipped():
+    socs = [None] * 20
+    socs[3] = 40.0
+    result = downsample(_quarters(socs), 5)
+    assert [row["soc_pct"] for row in result] == [None, 40.0, None, None, None]
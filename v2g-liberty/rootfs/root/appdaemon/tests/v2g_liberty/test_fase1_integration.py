@@ -6,19 +6,25 @@ Tests the complete chain:
   3. Calendar change → reservation_log row
 
 Uses a REAL DataStore with SQLite (temp directory) — no mocking of the DB layer.
-DataMonitor's hass/event_bus/evse_client remain mocked.
+DataMonitor writes through a real AsyncDataStore on the same database, as
+wired in V2GLibertyApp. DataMonitor's hass/event_bus/evse_client remain mocked.
 """
 
+import logging
+import sqlite3
 from datetime import datetime, timedelta, timezone
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
+import pytest_asyncio
 from appdaemon.plugins.hass.hassapi import Hass
 
 from apps.v2g_liberty import constants as c
+from apps.v2g_liberty.async_data_store import AsyncDataStore
 from apps.v2g_liberty.data_monitor import DataMonitor
-from apps.v2g_liberty.data_store import DataStore
+from apps.v2g_liberty.data_store import DataStore, iso_to_epoch
 from apps.v2g_liberty.event_bus import EventBus
+from apps.v2g_liberty.naive_charging_simulator import NaiveChargingSimulator
 
 # pylint: disable=C0116,W0621
 
@@ -83,12 +89,21 @@ def data_store(hass, tmp_path):
     return store
 
 
+@pytest_asyncio.fixture
+async def async_store(hass, data_store):
+    """Real AsyncDataStore on the same database as ``data_store``."""
+    store = AsyncDataStore(hass, db_path=data_store.DB_PATH)
+    await store.initialise()
+    yield store
+    await store.close()
+
+
 @pytest.fixture
-def monitor(hass, event_bus, evse_client, data_store):
-    """DataMonitor wired to a real DataStore (not mocked)."""
+def monitor(hass, event_bus, evse_client, async_store):
+    """DataMonitor wired to a real AsyncDataStore (not mocked)."""
     dm = DataMonitor(hass, event_bus)
     dm.evse_client_app = evse_client
-    dm.data_store = data_store
+    dm.data_store = async_store
     # Pre-initialise state as initialize() would
     dm._current_charger_state = None
     dm._current_charge_mode = "Automatic"
@@ -143,7 +158,7 @@ class TestIntervalWriteFlow:
         assert len(intervals) == 1
 
         row = intervals[0]
-        assert row["timestamp"] == "2026-02-22T10:55:00+00:00"
+        assert row["timestamp"] == iso_to_epoch("2026-02-22T10:55:00+00:00")
         assert row["app_state"] == "automatic"
         assert row["soc_pct"] == 60.0
         assert row["availability_pct"] == 100.0
@@ -328,12 +343,46 @@ class TestFullConcludeInterval:
         intervals = _query_all(data_store, "interval_log")
         assert len(intervals) == 1
         row = intervals[0]
-        assert row["timestamp"] == "2026-02-22T10:55:00+00:00"
+        assert row["timestamp"] == iso_to_epoch("2026-02-22T10:55:00+00:00")
         # Energy: 3000W avg for 5 min → 3.0 × 5/60 = 0.25 kWh
         assert row["energy_kwh"] == 0.25
         assert row["app_state"] == "automatic"
         assert row["soc_pct"] == 60.0
 
+    @pytest.mark.asyncio
+    @patch("apps.v2g_liberty.data_monitor.get_local_now")
+    async def test_conclude_interval_commits_all_rows_at_once(
+        self, mock_now, hass, monitor, data_store, event_bus, caplog, monkeypatch
+    ):
+        """Interval, grid, PV and naive charging rows are committed in one transaction."""
+        mock_now.return_value = TEST_NOW
+        monkeypatch.setattr(c, "CAR_MAX_SOC_IN_PERCENT", 80)
+        monkeypatch.setattr(c, "CAR_MAX_CAPACITY_IN_KWH", 59)
+        start = TEST_NOW - timedelta(minutes=5)
+        for phase in (1, 2, 3):
+            monitor._grid_trackers.add_channel(("consumption", phase), start)
+            monitor._grid_trackers.update(("consumption", phase), 1.5, start)
+        monitor._pv_trackers.add_channel("sp_1", start)
+        monitor._pv_trackers.update("sp_1", 2.0, start)
+        simulator = NaiveChargingSimulator(hass, event_bus)
+        simulator.data_store = monitor.data_store
+        monitor.naive_charging_simulator = simulator
+
+        with caplog.at_level(logging.DEBUG, logger="AppDaemon.v2g-app.data_store"):
+            await monitor._DataMonitor__conclude_interval()
+
+        # All six rows in a single commit.
+        assert "Transaction committed 6 write(s)" in caplog.text
+        reader = sqlite3.connect(data_store.DB_PATH)
+        counts = [
+            reader.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in ("interval_log", "grid_interval_log", "pv_interval_log")
+        ]
+        naive = reader.execute("SELECT naive_soc_pct FROM interval_log").fetchone()[0]
+        reader.close()
+        assert counts == [1, 3, 1]
+        assert naive is not None
+
     @pytest.mark.asyncio
     @patch("apps.v2g_liberty.data_monitor.get_local_now")
     async def test_short_interval_is_discarded(self, mock_now, monitor, data_store):
@@ -59,7 +59,7 @@ def fm_client():
 
 @pytest.fixture
 def data_store():
-    mock_store = MagicMock()
+    mock_store = AsyncMock()
     # Default: charger has a timestamp, grid returns None (not configured)
     _last_sent = {}
 
@@ -69,11 +69,11 @@ def data_store():
     def fake_set(timestamp, data_type="charger"):
         _last_sent[data_type] = timestamp
 
-    mock_store.get_fm_last_sent = MagicMock(side_effect=fake_get)
-    mock_store.set_fm_last_sent = MagicMock(side_effect=fake_set)
-    mock_store.get_intervals_since = MagicMock(return_value=[])
-    mock_store.get_grid_intervals_since = MagicMock(return_value=[])
-    mock_store.get_pv_intervals_since = MagicMock(return_value=[])
+    mock_store.get_fm_last_sent = AsyncMock(side_effect=fake_get)
+    mock_store.set_fm_last_sent = AsyncMock(side_effect=fake_set)
+    mock_store.get_intervals_since = AsyncMock(return_value=[])
+    mock_store.get_grid_intervals_since = AsyncMock(return_value=[])
+    mock_store.get_pv_intervals_since = AsyncMock(return_value=[])
     mock_store._last_sent = _last_sent
     return mock_store
 
@@ -879,7 +879,9 @@ class TestDataStoreFmSendStatus:
         # Query since 09:55 → should return both
         rows = real_data_store.get_intervals_since(_ts(9, 55))
         assert len(rows) == 2
-        assert rows[0]["timestamp"] == _ts(10, 0)
+        assert datetime.fromisoformat(rows[0]["timestamp"]) == datetime.fromisoformat(
+            _ts(10, 0)
+        )
         assert rows[0]["energy_kwh"] == 0.125
 
     @pytest.mark.asyncio
@@ -903,7 +905,9 @@ class TestDataStoreFmSendStatus:
         # Query since 10:00 → should only return 10:05
         rows = real_data_store.get_intervals_since(_ts(10, 0))
         assert len(rows) == 1
-        assert rows[0]["timestamp"] == _ts(10, 5)
+        assert datetime.fromisoformat(rows[0]["timestamp"]) == datetime.fromisoformat(
+            _ts(10, 5)
+        )
 
     @pytest.mark.asyncio
     async def test_get_intervals_since_returns_only_needed_columns(
@@ -79,18 +79,27 @@ def data_store():
     conn.executescript(
         """
         CREATE TABLE interval_log (
-            timestamp TEXT PRIMARY KEY,
+            timestamp INTEGER PRIMARY KEY,
             energy_kwh REAL NOT NULL,
             app_state TEXT NOT NULL,
             soc_pct REAL,
             availability_pct REAL NOT NULL,
             is_repaired INTEGER NOT NULL DEFAULT 0
-        );
+        ) WITHOUT ROWID;
         CREATE TABLE schema_version (version INTEGER NOT NULL, applied_at TEXT NOT NULL);
-        INSERT INTO schema_version VALUES (2, '2026-01-01T00:00:00');
+        INSERT INTO schema_version VALUES (10, '2026-01-01T00:00:00');
+        CREATE TABLE interval_rollup_state (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+        CREATE TABLE interval_archive (timestamp INTEGER PRIMARY KEY) WITHOUT ROWID;
+        CREATE TABLE data_version (
+            day INTEGER PRIMARY KEY, version INTEGER NOT NULL
+        ) WITHOUT ROWID;
+        CREATE TABLE calendar_day (utc_start TEXT PRIMARY KEY) WITHOUT ROWID;
+        CREATE TABLE repair_dirty_range (
+            start INTEGER NOT NULL, end INTEGER NOT NULL
+        );
         """
     )
-    store = DataStore.__new__(DataStore)
+    store = DataStore(MagicMock())
     store._DataStore__connection = conn  # inject the in-memory connection
     store._DataStore__log = MagicMock()
     return store
@@ -176,7 +185,7 @@ async def test_aborts_when_power_source_id_unknown(data_store, log_fn, tmp_path)
 async def test_runs_even_when_db_has_intervals(data_store, log_fn, tmp_path):
     """Import runs even when the database already has some intervals (no flag file)."""
     data_store._DataStore__connection.execute(
-        "INSERT INTO interval_log VALUES ('2026-01-01T00:00:00+00:00', 0.1, 'charge', 80.0, 100.0, 0)"
+        "INSERT INTO interval_log VALUES (1767225600, 0.1, 'charge', 80.0, 100.0, 0)"
     )
     data_store._DataStore__connection.commit()
 
@@ -376,8 +385,8 @@ def test_delete_historical_intervals_removes_unknown(data_store):
     conn = data_store._DataStore__connection
     conn.executescript(
         """
-        INSERT INTO interval_log VALUES ('2024-11-01T00:00:00+00:00', 0.1, 'unknown', 50.0, 100.0, 0);
-        INSERT INTO interval_log VALUES ('2024-11-01T00:05:00+00:00', 0.2, 'charge', 80.0, 100.0, 0);
+        INSERT INTO interval_log VALUES (1730419200, 0.1, 'unknown', 50.0, 100.0, 0);
+        INSERT INTO interval_log VALUES (1730419500, 0.2, 'charge', 80.0, 100.0, 0);
         """
     )
     deleted = data_store.delete_historical_intervals()
@@ -392,7 +401,7 @@ def test_has_any_intervals_empty(data_store):
 
 def test_has_any_intervals_with_row(data_store):
     data_store._DataStore__connection.execute(
-        "INSERT INTO interval_log VALUES ('2024-11-01T00:00:00+00:00', 0.1, 'charge', 80.0, 100.0, 0)"
+        "INSERT INTO interval_log VALUES (1730419200, 0.1, 'charge', 80.0, 100.0, 0)"
     )
     data_store._DataStore__connection.commit()
     assert data_store.has_any_intervals() is True
@@ -430,7 +439,7 @@ def test_bulk_insert_or_ignore_skips_existing(data_store):
     """Existing rows are not overwritten — their values are preserved."""
     ts = "2024-11-01T00:00:00+00:00"
     data_store._DataStore__connection.execute(
-        f"INSERT INTO interval_log VALUES ('{ts}', 0.5, 'charge', 80.0, 100.0, 0)"
+        "INSERT INTO interval_log VALUES (1730419200, 0.5, 'charge', 80.0, 100.0, 0)"
     )
     data_store._DataStore__connection.commit()
 
@@ -449,11 +458,30 @@ def test_bulk_insert_or_ignore_skips_existing(data_store):
 
     # Original value must be intact.
     row = data_store._DataStore__connection.execute(
-        f"SELECT energy_kwh FROM interval_log WHERE timestamp = '{ts}'"
+        "SELECT energy_kwh FROM interval_log WHERE timestamp = 1730419200"
     ).fetchone()
     assert row[0] == pytest.approx(0.5)
 
 
+def test_bulk_insert_or_ignore_skips_archived_hours(data_store):
+    """Rows within an archived hour are already counted in the archive."""
+    data_store._DataStore__connection.execute(
+        "INSERT INTO interval_archive VALUES (1730419200)"
+    )
+    rows = [
+        {
+            "timestamp": ts,
+            "energy_kwh": 0.1,
+            "app_state": "unknown",
+            "soc_pct": None,
+            "availability_pct": 100.0,
+            "is_repaired": 2,
+        }
+        for ts in ("2024-11-01T00:55:00+00:00", "2024-11-01T01:00:00+00:00")
+    ]
+    assert data_store.bulk_insert_or_ignore_intervals(rows) == 1
+
+
 def test_energy_kwh_conversion():
     """power_kW * 5 / 60 converts kW to kWh for a 5-min interval."""
     power_kw = 6.0  # 6 kW
@@ -13,9 +13,11 @@ from unittest.mock import AsyncMock, MagicMock
 
 import pandas as pd
 import pytest
+import pytest_asyncio
 from appdaemon.plugins.hass.hassapi import Hass
 
 from apps.v2g_liberty import constants as c
+from apps.v2g_liberty.async_data_store import AsyncDataStore
 from apps.v2g_liberty.data_store import DataStore, _calculate_savings
 from apps.v2g_liberty.naive_charging_simulator import NaiveChargingSimulator
 
@@ -269,6 +271,51 @@ class TestBatchSimulation:
         )
 
 
+# ── Real-time and batch through AsyncDataStore ───────────────────
+
+
+@pytest_asyncio.fixture
+async def simulator(hass, data_store):
+    await data_store.initialise()
+    async_store = AsyncDataStore(hass, db_path=data_store.DB_PATH)
+    await async_store.initialise()
+    sim = NaiveChargingSimulator(hass, MagicMock())
+    sim.data_store = async_store
+    sim._charge_power_factor = 1.0
+    yield sim
+    await async_store.close()
+    data_store.close()
+
+
+class TestWithDataStore:
+    """conclude_interval and _run_batch against a real database."""
+
+    @pytest.mark.asyncio
+    async def test_real_time_updates_concluded_interval(self, simulator, data_store):
+        data_store.insert_interval(utc_ts(10), 0.1, "automatic", 40.0, 100.0)
+        await simulator.conclude_interval(utc_ts(10), 40.0, 100.0)
+        (row,) = data_store.get_naive_charging_input().itertuples()
+        assert row.naive_power_w == 5750.0
+        assert simulator._naive_soc > 40.0
+
+    @pytest.mark.asyncio
+    async def test_real_time_uses_values_of_the_interval(self, simulator):
+        await simulator.conclude_interval(utc_ts(10), 40.0, 0.0)
+        assert simulator._naive_soc == 40.0
+        assert simulator._prev_connected is False
+
+    @pytest.mark.asyncio
+    async def test_batch_fills_missing_rows_only(self, simulator, data_store):
+        for minute in (0, 5, 10):
+            data_store.insert_interval(
+                utc_ts(10, minute), 0.1, "automatic", 40.0, 100.0
+            )
+        data_store.update_naive_charging([(1234.0, 41.0, utc_ts(10, 0))])
+        await simulator._run_batch()
+        frame = data_store.get_naive_charging_input()
+        assert list(frame["naive_power_w"]) == [1234.0, 5750.0, 5750.0]
+
+
 # ── get_charge_power_factor tests ────────────────────────────────
 
 
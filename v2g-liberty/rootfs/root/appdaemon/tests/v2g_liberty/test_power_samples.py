@@ -0,0 +1,86 @@
+"""Unit tests for PowerSampleBuffer."""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from apps.v2g_liberty.power_samples import PowerSampleBuffer
+
+T0 = datetime(2026, 5, 1, 12, 0, 0, tzinfo=timezone.utc)
+
+
+def at(seconds: int) -> datetime:
+    return T0 + timedelta(seconds=seconds)
+
+
+@pytest.fixture
+def samples():
+    return PowerSampleBuffer()
+
+
+class TestConclude:
+    def test_no_samples(self, samples):
+        assert samples.conclude(at(300)) == {
+            "power_min_w": None,
+            "power_max_w": None,
+            "power_p95_w": None,
+            "setpoint_changes": 0,
+        }
+
+    def test_min_max_and_setpoint_changes(self, samples):
+        samples.add(1000, at(0))
+        samples.add(-2500, at(100))
+        samples.add(7400, at(200))
+        samples.count_setpoint_change()
+        samples.count_setpoint_change()
+
+        stats = samples.conclude(at(300))
+
+        assert stats["power_min_w"] == -2500.0
+        assert stats["power_max_w"] == 7400.0
+        assert stats["setpoint_changes"] == 2
+
+    def test_p95_is_weighted_by_duration(self, samples):
+        """A short peak does not make the p95, a long one does."""
+        samples.add(1000, at(0))
+        samples.add(7400, at(290))
+        assert samples.conclude(at(300))["power_p95_w"] == 1000.0
+
+        samples.add(7400, at(310))
+        assert samples.conclude(at(600))["power_p95_w"] == 7400.0
+
+    def test_samples_at_conclusion_count_equally(self, samples):
+        for power in range(0, 2000, 100):
+            samples.add(power, at(0))
+        assert samples.conclude(at(0))["power_p95_w"] == 1800.0
+
+    def test_next_interval_starts_with_last_power(self, samples):
+        samples.add(1000, at(0))
+        samples.add(3000, at(100))
+        samples.count_setpoint_change()
+        samples.conclude(at(300))
+
+        assert len(samples) == 1
+        assert samples.conclude(at(600)) == {
+            "power_min_w": 3000.0,
+            "power_max_w": 3000.0,
+            "power_p95_w": 3000.0,
+            "setpoint_changes": 0,
+        }
+
+
+class TestCapacity:
+    def test_full_buffer_drops_oldest_samples(self):
+        samples = PowerSampleBuffer(capacity=4)
+        for second, power in enumerate([9000, 1, 2, 3, 4, 5]):
+            samples.add(power, at(second))
+
+        assert len(samples) == 4
+        stats = samples.conclude(at(10))
+        assert stats["power_min_w"] == 2.0
+        assert stats["power_max_w"] == 5.0
+        assert stats["power_p95_w"] == 5.0
+
+    def test_capacity_must_be_positive(self):
+        with pytest.raises(ValueError):
+            PowerSampleBuffer(capacity=0)
@@ -0,0 +1,102 @@
+"""Unit tests for PowerTrackerBank."""
+
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from apps.v2g_liberty.grid_connection.power_tracker import PowerTracker
+from apps.v2g_liberty.grid_connection.power_tracker_bank import PowerTrackerBank
+
+T0 = datetime(2026, 5, 1, 12, 0, 0)
+
+
+def at(seconds: float) -> datetime:
+    return T0 + timedelta(seconds=seconds)
+
+
+@pytest.fixture
+def bank():
+    bank = PowerTrackerBank()
+    bank.add_channel("l1", T0)
+    bank.add_channel("l2", T0)
+    return bank
+
+
+class TestChannels:
+    def test_keys_in_order_added(self, bank):
+        assert bank.keys() == ["l1", "l2"]
+        assert len(bank) == 2
+        assert "l1" in bank
+        assert "l3" not in bank
+
+    def test_duplicate_channel_raises(self, bank):
+        with pytest.raises(ValueError):
+            bank.add_channel("l1", T0)
+
+    def test_update_of_unknown_channel_raises(self, bank):
+        with pytest.raises(KeyError):
+            bank.update("l3", 1000.0, T0)
+
+    def test_current_power(self, bank):
+        bank.update("l1", 1500.0, at(10))
+        assert bank.current_power("l1") == 1500.0
+        assert bank.current_power("l2") == 0.0
+
+
+class TestConclude:
+    def test_weighted_average_per_channel(self, bank):
+        bank.update("l1", 1000.0, at(0))
+        bank.update("l2", 500.0, at(0))
+        bank.update("l1", 2000.0, at(20))
+
+        result = bank.conclude(at(30))
+
+        # l1: (1000 × 20 + 2000 × 10) / 30
+        assert result == {"l1": 1333.333, "l2": 500.0}
+
+    def test_no_duration_returns_none(self, bank):
+        assert bank.conclude(T0) == {"l1": None, "l2": None}
+
+    def test_conclude_resets_and_keeps_power(self, bank):
+        bank.update("l1", 1000.0, at(0))
+        bank.conclude(at(30))
+
+        bank.update("l1", 3000.0, at(40))
+        # 1000 × 10 + 3000 × 20 over 30 s
+        assert bank.conclude(at(60))["l1"] == pytest.approx(2333.333)
+
+    def test_going_back_in_time_does_not_accumulate(self, bank):
+        bank.update("l1", 1000.0, at(20))
+        bank.update("l1", 2000.0, at(10))
+        # 0 W × 20 s, the 1000 W segment is skipped, then 2000 W × 10 s
+        assert bank.conclude(at(20))["l1"] == 666.667
+
+    def test_queue_is_applied_when_full(self, bank):
+        bank.MAX_PENDING = 3
+        for second in range(4):
+            bank.update("l1", 100.0 * second, at(second))
+        assert len(bank._pending_channels) == 1
+        assert bank.conclude(at(4))["l1"] == 150.0
+
+    def test_matches_power_tracker(self):
+        rng = random.Random(7)
+        keys = ["c1", "c2", "c3", "p1", "sp_1"]
+        bank = PowerTrackerBank()
+        trackers = {}
+        for key in keys:
+            bank.add_channel(key, T0)
+            trackers[key] = PowerTracker()
+            trackers[key].reset(T0)
+
+        seconds = 0.0
+        for interval in range(1, 4):
+            while seconds < 300 * interval:
+                key = rng.choice(keys)
+                power = rng.uniform(-5, 5)
+                bank.update(key, power, at(seconds))
+                trackers[key].update(power, at(seconds))
+                seconds += rng.uniform(0, 4)
+            end = at(300 * interval)
+            expected = {key: tracker.conclude(end) for key, tracker in trackers.items()}
+            assert bank.conclude(end) == pytest.approx(expected, abs=0.001)
@@ -0,0 +1,54 @@
+"""Unit test (pytest) for result_cache module."""
+
+import asyncio
+
+import pytest
+
+from apps.v2g_liberty.result_cache import ResultCache, SingleFlight
+
+# pylint: disable=C0116
+
+
+def test_returns_result_for_same_version():
+    cache = ResultCache(2)
+    cache.put("a", 1, [1])
+    assert cache.get("a", 1) == [1]
+    assert (cache.hits, cache.misses) == (1, 0)
+
+
+def test_other_version_drops_entry():
+    cache = ResultCache(2)
+    cache.put("a", 1, [1])
+    assert cache.get("a", 2) is None
+    assert len(cache) == 0
+    assert cache.misses == 1
+
+
+def test_evicts_least_recently_used():
+    cache = ResultCache(2)
+    cache.put("a", 1, [1])
+    cache.put("b", 1, [2])
+    cache.get("a", 1)
+    cache.put("c", 1, [3])
+    assert cache.get("b", 1) is None
+    assert cache.get("a", 1) == [1]
+    assert cache.get("c", 1) == [3]
+
+
+@pytest.mark.asyncio
+async def test_single_flight_shares_running_computation():
+    flight = SingleFlight()
+    release = asyncio.Event()
+
+    async def work():
+        await release.wait()
+        return [["a"], ["b"]]
+
+    assert flight.join("a") is None
+    task = flight.start(["a", "b"], work())
+    assert flight.join("b") == (task, 1)
+    release.set()
+    assert await task == [["a"], ["b"]]
+    assert len(flight) == 0
+    assert flight.join("b") is None
+    assert (flight.computed, flight.saved) == (2, 1)
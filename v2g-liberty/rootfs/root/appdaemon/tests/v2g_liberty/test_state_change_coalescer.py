@@ -0,0 +1,105 @@
+"""Unit tests for StateChangeCoalescer."""
+
+import asyncio
+
+import pytest
+
+from apps.v2g_liberty.grid_connection.state_change_coalescer import (
+    StateChangeCoalescer,
+)
+
+
+@pytest.fixture
+def batches():
+    return []
+
+
+@pytest.fixture
+def coalescer(batches):
+    return StateChangeCoalescer(batches.append, flush_interval_ms=10)
+
+
+class TestFlush:
+    def test_changes_are_flushed_in_order(self, coalescer, batches):
+        coalescer.add("l1", "1.5")
+        coalescer.add("l2", "0.5")
+        coalescer.add("l1", "1.6")
+        assert len(coalescer) == 3
+        assert batches == []
+
+        assert coalescer.flush() == 3
+
+        assert [(key, value) for key, value, _ in batches[0]] == [
+            ("l1", "1.5"),
+            ("l2", "0.5"),
+            ("l1", "1.6"),
+        ]
+        times = [timestamp for _, _, timestamp in batches[0]]
+        assert times == sorted(times)
+        assert len(coalescer) == 0
+
+    def test_empty_flush_skips_the_sink(self, coalescer, batches):
+        assert coalescer.flush() == 0
+        assert batches == []
+
+    def test_full_queue_is_flushed_right_away(self, batches):
+        coalescer = StateChangeCoalescer(batches.append, max_queue_depth=3)
+        for value in range(7):
+            coalescer.add("l1", value)
+
+        assert [len(batch) for batch in batches] == [3, 3]
+        assert len(coalescer) == 1
+        assert coalescer.take_metrics()["early_flushes"] == 2
+
+
+class TestTimer:
+    @pytest.mark.asyncio
+    async def test_started_coalescer_flushes_on_its_own(self, coalescer, batches):
+        coalescer.start()
+        coalescer.add("l1", "1.5")
+        await asyncio.sleep(0.05)
+        assert len(batches) == 1
+
+        coalescer.add("l1", "1.6")
+        coalescer.stop()
+        assert len(batches) == 2
+
+    @pytest.mark.asyncio
+    async def test_failing_sink_does_not_stop_the_timer(self, batches):
+        calls = []
+
+        def sink(changes):
+            calls.append(changes)
+            if len(calls) == 1:
+                raise ValueError("boom")
+
+        coalescer = StateChangeCoalescer(sink, flush_interval_ms=10)
+        coalescer.start()
+        coalescer.add("l1", "1.5")
+        await asyncio.sleep(0.05)
+        coalescer.add("l1", "1.6")
+        await asyncio.sleep(0.05)
+        coalescer.stop()
+        assert len(calls) == 2
+
+
+class TestMetrics:
+    def test_metrics_per_window(self, coalescer):
+        for value in range(5):
+            coalescer.add("l1", value)
+        coalescer.flush()
+        coalescer.add("l1", 5)
+
+        metrics = coalescer.take_metrics()
+
+        assert metrics["queue_depth"] == 1
+        assert metrics["max_queue_depth"] == 5
+        assert metrics["callbacks"] == 6
+        assert metrics["callback_rate"] > 0
+        assert metrics["flushes"] == 1
+        assert metrics["early_flushes"] == 0
+
+        metrics = coalescer.take_metrics()
+        assert metrics["callbacks"] == 0
+        assert metrics["max_queue_depth"] == 1
+        assert metrics["flushes"] == 0